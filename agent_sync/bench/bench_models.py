@@ -0,0 +1,89 @@
+"""
+Benchmark: slotted LogEntry with hand-rolled (de)serialization vs. the
+original plain dataclass with dataclasses.asdict and LogEntry(**data).
+
+Usage:
+    python -m agent_sync.bench.bench_models [SIZE ...]
+
+For every log size it times from_dict and to_dict over the whole log, and
+measures the memory held by the LogEntry objects with tracemalloc. The
+entries are round-tripped through JSON first, like entries read from disk,
+so every string starts out as its own object.
+"""
+import dataclasses
+import json
+import sys
+import tracemalloc
+from typing import Optional
+from ..src import models
+from .bench_read import _best_of
+from .workload import generate_logs
+
+# Log sizes used when none are given on the command line.
+DEFAULT_SIZES = [100_000, 300_000]
+
+
+@dataclasses.dataclass
+class LegacyLogEntry:
+    """
+    LogEntry as it was before: a plain dataclass, so every instance has a __dict__.
+    """
+    id: str
+    creator: str
+    creator_role: str
+    created_timestamp: int
+    description: str
+    priority: str
+    status: str
+    completer: Optional[str] = None
+    completer_role: Optional[str] = None
+    completion_timestamp: Optional[int] = None
+
+
+def legacy_to_dict(entry: LegacyLogEntry) -> dict:
+    return dataclasses.asdict(entry)
+
+
+def legacy_from_dict(data: dict) -> LegacyLogEntry:
+    return LegacyLogEntry(**data)
+
+
+def _held_memory(from_dict, log_json: str) -> int:
+    """
+    Returns the bytes still allocated after decoding the log and building
+    the entries (the decoded dictionaries themselves are released).
+    """
+    tracemalloc.start()
+    try:
+        entries = [from_dict(d) for d in json.loads(log_json)]
+        held, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del entries
+    return held
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    implementations = [
+        ("dataclass + asdict", legacy_from_dict, legacy_to_dict),
+        ("slots + hand-rolled", models.from_dict, models.to_dict),
+    ]
+
+    print(f"{'entries':>9}  {'implementation':<20} {'from_dict':>10} {'to_dict':>10} {'memory':>10}")
+    for size in sizes:
+        log_json = json.dumps(generate_logs(size))
+        log_dicts = json.loads(log_json)
+        outputs = []
+        for name, from_dict, to_dict in implementations:
+            from_time, entries = _best_of(3, lambda: [from_dict(d) for d in log_dicts])
+            to_time, dicts = _best_of(3, lambda: [to_dict(entry) for entry in entries])
+            held = _held_memory(from_dict, log_json)
+            outputs.append(dicts)
+            print(f"{size:>9}  {name:<20} {from_time * 1000:>8.1f}ms {to_time * 1000:>8.1f}ms "
+                  f"{held / 2**20:>8.1f}MB")
+        assert outputs[0] == outputs[1], "round trips differ"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark: `read --limit/--pending-only` top-K selection vs. a full sort.
+
+Usage:
+    python -m agent_sync.bench.bench_read [SIZE ...]
+
+For every log size it times the old read path (build every LogEntry, run
+manager.sort_logs, take the head) against manager.select_logs, and checks
+that both return the same entries.
+"""
+import sys
+import time
+from ..src import manager, models
+from .workload import generate_logs
+
+# Log sizes used when none are given on the command line.
+DEFAULT_SIZES = [100_000, 300_000]
+
+# The `--limit` used for the top-K runs.
+LIMIT = 10
+
+
+def _best_of(runs: int, func) -> tuple:
+    """
+    Returns (best wall time in seconds, result of the last run).
+    """
+    best = float('inf')
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def full_sort(log_dicts: list, limit, pending_only: bool) -> list:
+    """
+    The read path before top-K selection.
+    """
+    sorted_logs = manager.sort_logs([models.from_dict(d) for d in log_dicts])
+    if pending_only:
+        sorted_logs = [entry for entry in sorted_logs if entry.status == "pending"]
+    return sorted_logs if limit is None else sorted_logs[:limit]
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    cases = [
+        (f"--limit {LIMIT}", LIMIT, False),
+        (f"--limit {LIMIT} --pending-only", LIMIT, True),
+        ("--pending-only", None, True),
+    ]
+
+    print(f"{'entries':>9}  {'case':<28} {'full sort':>10} {'select':>10} {'speedup':>8}")
+    for size in sizes:
+        log_dicts = generate_logs(size)
+        for name, limit, pending_only in cases:
+            old_time, old = _best_of(3, lambda: full_sort(log_dicts, limit, pending_only))
+            new_time, new = _best_of(3, lambda: manager.select_logs(log_dicts, limit, pending_only))
+            assert [e.id for e in old] == [e.id for e in new], "selection differs from sort_logs"
+            print(f"{size:>9}  {name:<28} {old_time * 1000:>8.1f}ms {new_time * 1000:>8.1f}ms "
+                  f"{old_time / new_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Benchmark suite: a performance baseline for storage, models, sorting and
+the end-to-end CLI, with machine-readable results.
+
+Usage:
+    python -m agent_sync.bench.suite run [--sizes N ...] [--cases NAME ...]
+                                         [--output FILE] [workload options]
+    python -m agent_sync.bench.suite compare OLD.json NEW.json [--threshold 0.1]
+
+`run` builds one synthetic log per size (see workload.generate_logs) and
+runs every case in a fresh interpreter, so peak RSS belongs to that case
+alone. Each case is warmed up once, then timed `--repeat` times. In-process
+cases are run once more under tracemalloc to record the peak of traced
+allocations. CLI cases run `python -m agent_sync.src.main` as a child
+process against a copy of the log (with the server bypassed), and report
+the peak RSS of that child. The cases that write (WRITE_CASES) are run once
+per durability level given with `--durability` (default: all of them), so
+the cost of each fsync policy shows up as its own result.
+
+`compare` matches the cases of two runs and flags those whose best wall
+time or peak RSS grew by more than the threshold. It exits with status 1
+if there are regressions, so it can gate CI.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+from ..src import storage, manager, models, history
+from . import workload
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+# Log sizes used when none are given on the command line.
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+# Timed runs per case, after one warm-up run.
+DEFAULT_REPEAT = 5
+
+# Relative growth of wall time or peak RSS that compare reports as a regression.
+DEFAULT_THRESHOLD = 0.10
+
+# Version of the result file layout.
+RESULT_VERSION = 1
+
+# The environment of CLI runs: never talk to a server that happens to be running.
+_CLI_ENV = dict(os.environ, AGENT_SYNC_NO_SERVER="1")
+
+
+def _load(db_path: str) -> List[dict]:
+    return storage.load_logs(db_path)
+
+
+def _case_load_logs(db_path: str) -> Callable[[], object]:
+    return lambda: storage.load_logs(db_path)
+
+
+def _case_save_logs(db_path: str) -> Callable[[], object]:
+    logs = _load(db_path)
+    return lambda: storage.save_logs(db_path, logs)
+
+
+def _case_from_dict(db_path: str) -> Callable[[], object]:
+    logs = _load(db_path)
+    return lambda: [models.from_dict(d) for d in logs]
+
+
+def _case_to_dict(db_path: str) -> Callable[[], object]:
+    entries = [models.from_dict(d) for d in _load(db_path)]
+    return lambda: [models.to_dict(entry) for entry in entries]
+
+
+def _case_sort_logs(db_path: str) -> Callable[[], object]:
+    # Shuffled by ID, so the sort does real work
+    entries = sorted((models.from_dict(d) for d in _load(db_path)), key=lambda entry: entry.id)
+    return lambda: manager.sort_logs(entries)
+
+
+def _cli(db_path: str, *args: str) -> Callable[[], object]:
+    """
+    Returns a run of the CLI in the directory of the log, where it looks for it.
+    """
+    command = [sys.executable, '-m', 'agent_sync.src.main', '--json', '--durability', storage.durability(), *args]
+    source_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(_CLI_ENV, PYTHONPATH=os.pathsep.join(filter(None, [source_root, _CLI_ENV.get('PYTHONPATH')])))
+    return lambda: subprocess.run(
+        command, cwd=os.path.dirname(db_path), env=env, stdout=subprocess.DEVNULL, check=True
+    )
+
+
+def _case_append_records(db_path: str) -> Callable[[], object]:
+    record = storage.add_record(workload.generate_logs(1)[0])
+    return lambda: storage.append_records(db_path, [record])
+
+
+def _case_history_record(db_path: str) -> Callable[[], object]:
+    # The extra fsync'd append every write makes; the warm-up run records the baseline checkpoint
+    entry = workload.generate_logs(1)[0]
+    return lambda: history.record(db_path, [(None, entry)], lambda: _load(db_path))
+
+
+def _case_cli_add(db_path: str) -> Callable[[], object]:
+    return _cli(db_path, 'add', '--desc', 'Benchmark task', '--priority', 'tier1',
+                '--user', 'bench', '--role', 'engineer')
+
+
+def _case_cli_read(db_path: str) -> Callable[[], object]:
+    return _cli(db_path, 'read')
+
+
+def _case_cli_read_limit(db_path: str) -> Callable[[], object]:
+    return _cli(db_path, 'read', '--pending-only', '--limit', '10')
+
+
+def _case_cli_complete(db_path: str) -> Callable[[], object]:
+    # Every run completes a different pending entry
+    pending = iter([d["id"] for d in _load(db_path) if d["status"] == "pending"])
+    return lambda: _cli(db_path, 'complete', '--id', next(pending), '--user', 'bench', '--role', 'engineer')()
+
+
+# Every case: its setup (given the path to a private copy of the log)
+# returns the operation to time.
+CASES: Dict[str, Callable[[str], Callable[[], object]]] = {
+    'load_logs': _case_load_logs,
+    'save_logs': _case_save_logs,
+    'append_records': _case_append_records,
+    'history_record': _case_history_record,
+    'from_dict': _case_from_dict,
+    'to_dict': _case_to_dict,
+    'sort_logs': _case_sort_logs,
+    'cli_add': _case_cli_add,
+    'cli_read': _case_cli_read,
+    'cli_read_limit': _case_cli_read_limit,
+    'cli_complete': _case_cli_complete,
+}
+
+# The cases that write the log, timed at every durability level.
+WRITE_CASES = ('save_logs', 'append_records', 'history_record', 'cli_add', 'cli_complete')
+
+
+def _peak_rss_bytes(children: bool) -> Optional[int]:
+    """
+    Returns the peak resident set size of this process or of its largest child.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(name: str, template_path: str, repeat: int, durability: Optional[str] = None) -> dict:
+    """
+    Runs one case. Meant to be called in a fresh process (see run).
+
+    Args:
+        name: The case name (a key of CASES).
+        template_path: The log to benchmark against; it is copied first.
+        repeat: The number of timed runs.
+        durability: The durability level of the writes (default: storage.DEFAULT_DURABILITY).
+
+    Returns:
+        The measurements: 'wall_s' (best run), 'median_s', 'runs',
+        'peak_rss_bytes' and 'alloc_peak_bytes' (None for CLI cases).
+    """
+    storage.set_durability(durability or storage.DEFAULT_DURABILITY)
+    workdir = tempfile.mkdtemp(prefix='agent-sync-bench-')
+    try:
+        db_path = os.path.join(workdir, os.path.basename(template_path))
+        shutil.copyfile(template_path, db_path)
+        operation = CASES[name](db_path)
+
+        operation()
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            operation()
+            runs.append(time.perf_counter() - start)
+
+        is_cli = name.startswith('cli_')
+        alloc_peak = None
+        if not is_cli:
+            tracemalloc.start()
+            try:
+                operation()
+                _, alloc_peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+        return {
+            "wall_s": min(runs),
+            "median_s": statistics.median(runs),
+            "runs": runs,
+            "peak_rss_bytes": _peak_rss_bytes(children=is_cli),
+            "alloc_peak_bytes": alloc_peak,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _git_revision() -> Optional[str]:
+    """
+    Returns the checked out commit, if the source lives in a git work tree.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes: List[int], cases: List[str], repeat: int, seed: int, pending_ratio: float,
+        priority_mix: Dict[str, float], description_length: int,
+        durabilities: List[str] = storage.DURABILITY_LEVELS) -> dict:
+    """
+    Runs the selected cases for every size, and the write cases for every
+    durability level.
+
+    Returns:
+        The result document: environment, workload configuration and one
+        result per (case, size, durability). 'durability' is None for the
+        cases that don't write.
+    """
+    config = {
+        "sizes": sizes, "cases": cases, "repeat": repeat, "seed": seed,
+        "pending_ratio": pending_ratio, "priority_mix": priority_mix,
+        "description_length": description_length, "durability": list(durabilities),
+    }
+    document = {
+        "version": RESULT_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": [],
+    }
+
+    spawn = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='agent-sync-bench-') as tmpdir:
+        for size in sizes:
+            logs = workload.generate_logs(size, seed, pending_ratio, priority_mix, description_length)
+            template_path = os.path.join(tmpdir, 'status_log.json')
+            # Stored the way compaction leaves it
+            storage.save_logs(template_path, sorted(logs, key=manager.dict_sort_key))
+            del logs
+
+            for name in cases:
+                for durability in (durabilities if name in WRITE_CASES else [None]):
+                    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                        measured = pool.submit(run_case, name, template_path, repeat, durability).result()
+                    document["results"].append(dict({"case": name, "size": size, "durability": durability},
+                                                    **measured))
+                    print(f"{_label(name, durability):<21} {size:>9}  {measured['wall_s'] * 1000:>10.2f}ms  "
+                          f"rss {_megabytes(measured['peak_rss_bytes'])}", file=sys.stderr)
+    return document
+
+
+def _label(case: str, durability: Optional[str]) -> str:
+    return case if durability is None else f"{case}[{durability}]"
+
+
+def _megabytes(value: Optional[int]) -> str:
+    return "-" if value is None else f"{value / 2**20:.1f}MB"
+
+
+def compare(old: dict, new: dict, threshold: float) -> List[dict]:
+    """
+    Compares two result documents case by case.
+
+    Args:
+        old: The baseline result document.
+        new: The result document to check.
+        threshold: The relative growth that counts as a regression.
+
+    Returns:
+        One row per (case, size, durability) present in both runs, with the
+        'wall_ratio' and 'rss_ratio' (new / old) and a 'verdict' of
+        'regression', 'improvement' or 'same'.
+    """
+    # Results written before durability levels existed have no 'durability'
+    baseline = {(r["case"], r["size"], r.get("durability")): r for r in old["results"]}
+    rows = []
+    for result in new["results"]:
+        before = baseline.get((result["case"], result["size"], result.get("durability")))
+        if before is None:
+            continue
+        wall_ratio = result["wall_s"] / before["wall_s"] if before["wall_s"] else None
+        rss_ratio = None
+        if result.get("peak_rss_bytes") and before.get("peak_rss_bytes"):
+            rss_ratio = result["peak_rss_bytes"] / before["peak_rss_bytes"]
+
+        ratios = [ratio for ratio in (wall_ratio, rss_ratio) if ratio is not None]
+        if any(ratio > 1 + threshold for ratio in ratios):
+            verdict = "regression"
+        elif wall_ratio is not None and wall_ratio < 1 - threshold:
+            verdict = "improvement"
+        else:
+            verdict = "same"
+        rows.append({
+            "case": result["case"], "size": result["size"], "durability": result.get("durability"),
+            "old_wall_s": before["wall_s"], "new_wall_s": result["wall_s"],
+            "wall_ratio": wall_ratio, "rss_ratio": rss_ratio, "verdict": verdict,
+        })
+    return rows
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark suite for the Project Status Log tool")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks and write JSON results')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, metavar='N',
+                            help=f'Log sizes (default: {" ".join(map(str, DEFAULT_SIZES))})')
+    run_parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES), metavar='NAME',
+                            help=f'Cases to run (default: all of {", ".join(CASES)})')
+    run_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                            help=f'Timed runs per case (default: {DEFAULT_REPEAT})')
+    run_parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic logs')
+    run_parser.add_argument('--pending-ratio', type=float, default=0.3,
+                            help='Share of pending entries (default: 0.3)')
+    run_parser.add_argument('--priority-mix', type=workload.parse_priority_mix,
+                            default=workload.DEFAULT_PRIORITY_MIX, metavar='MIX',
+                            help='Priority weights, e.g. tier0=1,tier1=2,tier2=4,tier3=3')
+    run_parser.add_argument('--desc-length', type=int, default=24,
+                            help='Approximate description length (default: 24)')
+    run_parser.add_argument('--durability', nargs='+', choices=storage.DURABILITY_LEVELS,
+                            default=list(storage.DURABILITY_LEVELS), metavar='LEVEL',
+                            help=f'Durability levels of the write cases ({", ".join(WRITE_CASES)}; '
+                                 f'default: all of {", ".join(storage.DURABILITY_LEVELS)})')
+    run_parser.add_argument('--output', metavar='FILE', help='Write the JSON results here instead of stdout')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('old', help='Baseline results')
+    compare_parser.add_argument('new', help='Results to check')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help=f'Relative growth reported as a regression (default: {DEFAULT_THRESHOLD})')
+    compare_parser.add_argument('--json', action='store_true', help='Print the comparison as JSON')
+
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_arguments(argv)
+
+    if args.command == 'run':
+        document = run(args.sizes, args.cases, args.repeat, args.seed, args.pending_ratio,
+                       args.priority_mix, args.desc_length, args.durability)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(document, f, indent=2)
+                f.write('\n')
+        else:
+            json.dump(document, sys.stdout, indent=2)
+            print()
+        return
+
+    with open(args.old, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    rows = compare(old, new, args.threshold)
+
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"{'case':<21} {'entries':>9} {'old':>11} {'new':>11} {'time':>7} {'rss':>7}  verdict")
+        for row in rows:
+            rss = "-" if row["rss_ratio"] is None else f"{row['rss_ratio']:.2f}x"
+            time_ratio = "-" if row["wall_ratio"] is None else f"{row['wall_ratio']:.2f}x"
+            print(f"{_label(row['case'], row['durability']):<21} {row['size']:>9} {row['old_wall_s'] * 1000:>9.2f}ms "
+                  f"{row['new_wall_s'] * 1000:>9.2f}ms {time_ratio:>7} {rss:>7}  {row['verdict']}")
+
+    if any(row["verdict"] == "regression" for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Synthetic, reproducible logs for the benchmarks.
+
+The same seed and parameters always produce the same entries, so two
+benchmark runs (e.g. before and after a change) work on identical data.
+"""
+import random
+import uuid
+from typing import Dict, Optional
+from ..src import models
+
+# Share of entries per priority when no mix is given: few critical, many TODOs.
+DEFAULT_PRIORITY_MIX = {"tier0": 1, "tier1": 2, "tier2": 4, "tier3": 3}
+
+# Creation time of the first synthetic entry (2023-11-14).
+BASE_TIMESTAMP = 1_700_000_000
+
+
+def parse_priority_mix(value: str) -> Dict[str, float]:
+    """
+    Parses a priority mix such as 'tier0=1,tier1=2,tier2=4,tier3=3'.
+    Priorities that are left out never occur.
+
+    Args:
+        value: The comma separated priority=weight pairs.
+
+    Returns:
+        The weight of each priority.
+
+    Raises:
+        ValueError: If a priority is unknown or a weight is not a number.
+    """
+    mix = {}
+    for pair in value.split(','):
+        priority, _, weight = pair.partition('=')
+        if priority.strip() not in models.PRIORITY_MAP:
+            raise ValueError(f"Invalid priority: {priority}. Must be one of {list(models.PRIORITY_MAP)}")
+        mix[priority.strip()] = float(weight)
+    return mix
+
+
+def generate_logs(count: int, seed: int = 0, pending_ratio: float = 0.3,
+                  priority_mix: Optional[Dict[str, float]] = None,
+                  description_length: int = 24) -> list:
+    """
+    Builds `count` synthetic entries as dictionaries, in creation order.
+
+    Args:
+        count: The number of entries.
+        seed: The random seed.
+        pending_ratio: The share of entries that are still pending.
+        priority_mix: The relative weight of each priority
+            (defaults to DEFAULT_PRIORITY_MIX).
+        description_length: The approximate length of each description.
+
+    Returns:
+        The log entries as dictionaries.
+    """
+    rng = random.Random(seed)
+    mix = priority_mix or DEFAULT_PRIORITY_MIX
+    priorities = list(mix)
+    weights = [mix[priority] for priority in priorities]
+    words = ["fix", "leak", "update", "docs", "refactor", "parser", "cache", "test", "flaky", "login"]
+
+    logs = []
+    for i in range(count):
+        completed = rng.random() >= pending_ratio
+        description = f"Synthetic task {i}"
+        while len(description) < description_length:
+            description += " " + rng.choice(words)
+        logs.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "creator": rng.choice(["gemini", "claude", "human"]),
+            "creator_role": rng.choice(list(models.ROLES)),
+            "created_timestamp": BASE_TIMESTAMP + i,
+            "description": description,
+            "priority": rng.choices(priorities, weights)[0],
+            "status": "completed" if completed else "pending",
+            "completer": "claude" if completed else None,
+            "completer_role": "engineer" if completed else None,
+            "completion_timestamp": BASE_TIMESTAMP + count + i if completed else None,
+        })
+    return logs
@@ -0,0 +1,246 @@
+"""
+In-process Python API for agents that live in a long-running process.
+
+StatusLog keeps the parsed log in memory, in 3-tier order, instead of
+re-parsing the JSON file on every call like load_logs does. Before every
+call the cache is revalidated against the (inode, mtime_ns, size) of the
+snapshot and of the journal, two stat calls, and the log is only reloaded
+when another process actually changed one of them. Writes made through the
+StatusLog append to the journal like the CLI does and update the cache in
+place.
+
+    log = StatusLog.open("status_log.json")
+    entry = log.add("Fix memory leak", "tier0", "gemini", "engineer")
+    for entry in log.query(limit=5, pending_only=True):
+        print(entry.priority, entry.description)
+    log.complete(entry.id[:8], "claude", "engineer")
+"""
+import heapq
+from typing import Dict, Iterator, List, Optional
+from . import storage, manager, models, index, backends, stats, history
+from .models import LogEntry
+
+
+class StatusLog:
+    """
+    A JSON status log with an in-memory, mtime-validated parse cache.
+
+    The LogEntry objects returned are the cached ones: they stay current
+    as the log changes and must not be modified by the caller.
+
+    Attributes:
+        filepath (str): The path to the JSON database file.
+        lock_wait (float): Seconds the last add or complete waited for the lock.
+    """
+
+    def __init__(self, filepath: str):
+        """
+        Args:
+            filepath: The path to the JSON database file. It is read on first use.
+
+        Raises:
+            ValueError: If the path names a SQLite or columnar database.
+        """
+        if filepath.lower().endswith(backends.SQLITE_EXTENSIONS):
+            raise ValueError("StatusLog caches a JSON log; query the SQLite backend directly")
+        if filepath.lower().endswith(backends.COLUMNAR_EXTENSIONS):
+            raise ValueError("StatusLog caches a JSON log; query the columnar backend directly")
+        self.filepath = filepath
+        self.lock_wait = 0.0
+        self._by_id: Dict[str, LogEntry] = {}
+        # Load order of every entry, which breaks ties like sort_logs does
+        self._positions: Dict[str, int] = {}
+        self._secondary = index.SecondaryIndex()
+        self._ordered = manager.SortedLog()
+        self._signature = None
+
+    @classmethod
+    def open(cls, filepath: str) -> 'StatusLog':
+        """
+        Returns a StatusLog for the file with the log already loaded.
+        """
+        log = cls(filepath)
+        with storage.lock(filepath, exclusive=False):
+            log.refresh()
+        return log
+
+    def __len__(self) -> int:
+        return len(self._ordered)
+
+    def _file_signature(self) -> tuple:
+        return (index.snapshot_signature(self.filepath),
+                index.snapshot_signature(storage.journal_path(self.filepath)))
+
+    def refresh(self) -> bool:
+        """
+        Reloads the log if the files changed since they were last seen.
+        The caller must hold the lock (shared or exclusive).
+
+        Returns:
+            True if the log was reloaded.
+        """
+        signature = self._file_signature()
+        if signature == self._signature:
+            return False
+        logs = [models.from_dict(d) for d in storage.load_logs(self.filepath)]
+        self._by_id = {entry.id: entry for entry in logs}
+        self._positions = {entry.id: i for i, entry in enumerate(logs)}
+        self._secondary = index.SecondaryIndex.from_entries(
+            (entry.id, models.to_dict(entry)) for entry in logs
+        )
+        self._ordered = manager.SortedLog(logs)
+        self._signature = signature
+        self._reloaded()
+        return True
+
+    def _revalidate(self) -> None:
+        # Unchanged files need no lock: a writer changes at least one signature
+        if self._signature is None or self._file_signature() != self._signature:
+            with storage.lock(self.filepath, exclusive=False):
+                self.refresh()
+
+    def _appended(self, snapshot: Optional[list]) -> None:
+        """
+        Records the files as seen after this process appended to the journal.
+        """
+        signature = self._file_signature()
+        # The append compacted the journal, which may have archived entries
+        self._signature = signature if signature[0] == snapshot else None
+
+    def add(self, description: str, priority: str, user: str, role: str) -> LogEntry:
+        """
+        Adds a new pending entry.
+
+        Args:
+            description: The task description.
+            priority: The priority tier (tier0-tier3).
+            user: The name of the creator.
+            role: The role of the creator.
+
+        Returns:
+            The new LogEntry.
+
+        Raises:
+            ValueError: If the priority or role is invalid.
+        """
+        entry = manager.create_entry(description=description, priority=priority, creator=user, role=role)
+        with storage.lock(self.filepath) as waited:
+            # Another process may have written since our last call
+            self.refresh()
+            snapshot = self._signature[0]
+            changes = [(None, models.to_dict(entry))]
+            stats.append_records(self.filepath, [storage.add_record(models.to_dict(entry))], changes,
+                                 entries=lambda: storage.load_logs(self.filepath, intact=True))
+            history.record(self.filepath, changes, lambda: storage.load_logs(self.filepath, intact=True))
+            self._appended(snapshot)
+        self.lock_wait = waited
+
+        self._positions[entry.id] = len(self._positions)
+        self._by_id[entry.id] = entry
+        self._secondary.add(entry.id, models.to_dict(entry))
+        self._added(entry, self._ordered.add(entry))
+        return entry
+
+    def complete(self, id_or_prefix: str, user: str, role: str) -> LogEntry:
+        """
+        Marks an entry as completed.
+
+        Args:
+            id_or_prefix: The ID of the entry or a unique prefix of it
+                (at least index.MIN_PREFIX_LENGTH characters).
+            user: The name of the completer.
+            role: The role of the completer.
+
+        Returns:
+            The completed LogEntry.
+
+        Raises:
+            ValueError: If no entry or several entries match, or the role is invalid.
+        """
+        with storage.lock(self.filepath) as waited:
+            # Another process may have written since our last call
+            self.refresh()
+            if id_or_prefix in self._by_id:
+                log_id = id_or_prefix
+            else:
+                log_id = index.resolve_id(id_or_prefix, (i for i in self._by_id if i.startswith(id_or_prefix)))
+            snapshot = self._signature[0]
+            before = models.to_dict(self._by_id[log_id])
+            entry = manager.mark_completed(self._by_id[log_id], user, role)
+            try:
+                changes = [(before, models.to_dict(entry))]
+                stats.append_records(self.filepath, [storage.complete_record(entry)], changes,
+                                     entries=lambda: storage.load_logs(self.filepath, intact=True))
+                history.record(self.filepath, changes, lambda: storage.load_logs(self.filepath, intact=True))
+            except Exception:
+                # The cached entry was completed in place; reload it from disk
+                self._signature = None
+                raise
+            self._appended(snapshot)
+        self.lock_wait = waited
+
+        self._secondary.complete(log_id, models.to_dict(entry))
+        self._completed(entry, *self._ordered.update(entry))
+        return entry
+
+    def query(self, limit: Optional[int] = None, pending_only: bool = False, **filters) -> List[LogEntry]:
+        """
+        Returns entries in 3-tier order, like the `read` command.
+
+        Args:
+            limit: The maximum number of entries to return. None returns all.
+            pending_only: Skip completed entries.
+            **filters: The filters accepted by manager.matches.
+
+        Returns:
+            The matching LogEntry objects.
+        """
+        self._revalidate()
+        keys = self._secondary.lookup(**filters)
+        if keys is None:
+            count = self._ordered.pending_count() if pending_only else len(self._ordered)
+            if limit is not None:
+                count = min(count, limit)
+            return self._ordered.entries()[:count]
+
+        # Only the candidates are checked and ranked. The buckets match the
+        # other filters exactly; the time range may not have been applied.
+        since, until = filters.get('since'), filters.get('until')
+        candidates = [
+            entry for entry in (self._by_id[key] for key in keys)
+            if (not pending_only or entry.status == 'pending')
+            and (since is None or entry.created_timestamp >= since)
+            and (until is None or entry.created_timestamp < until)
+        ]
+        positions = self._positions
+
+        def key(entry: LogEntry) -> tuple:
+            return manager.sort_key(entry) + (positions[entry.id],)
+
+        if limit is None:
+            return sorted(candidates, key=key)
+        return heapq.nsmallest(limit, candidates, key=key)
+
+    def iter_sorted(self, pending_only: bool = False) -> Iterator[LogEntry]:
+        """
+        Yields every entry in 3-tier order, as of the start of the iteration.
+
+        Args:
+            pending_only: Stop after the pending entries.
+        """
+        yield from self.query(pending_only=pending_only)
+
+    def _reloaded(self) -> None:
+        """
+        Called after the log was reloaded from disk.
+        """
+
+    def _added(self, entry: LogEntry, position: int) -> None:
+        """
+        Called after an entry was added at a position of the 3-tier order.
+        """
+
+    def _completed(self, entry: LogEntry, old_position: int, position: int) -> None:
+        """
+        Called after a completed entry moved in the 3-tier order (see manager.SortedLog.update).
+        """
@@ -0,0 +1,262 @@
+"""
+Moves old completed entries out of the hot log into compressed segments.
+
+Completed entries sort after every pending one and are rarely read, yet
+they make up most of a long-lived log. Archiving moves the ones completed
+more than N days ago into gzip'd segment files, one per month of completion
+(status_log.json.archive/2024-05.jsonl.gz). Each segment holds one entry
+per line in 3-tier order, so `read --include-archived` can merge the
+segments with the hot log lazily and stop as soon as its result is complete.
+"""
+import heapq
+import json
+import os
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+from . import storage, manager
+
+# Suffix of the directory that holds the segments, next to the database file.
+ARCHIVE_SUFFIX = '.archive'
+
+# Extension of a segment file.
+SEGMENT_EXTENSION = '.jsonl.gz'
+
+# Completed entries older than this many days are archived by default.
+ARCHIVE_AFTER_DAYS = 30
+
+# Compaction archives automatically once the snapshot grows past this many bytes.
+AUTO_ARCHIVE_BYTES = 8 * 1024 * 1024
+
+
+def archive_dir(filepath: str) -> str:
+    """
+    Returns the path of the segment directory for a database file.
+
+    Args:
+        filepath: The path to the JSON database file.
+
+    Returns:
+        The path to the archive directory.
+    """
+    return filepath + ARCHIVE_SUFFIX
+
+
+def segment_name(completion_timestamp: int) -> str:
+    """
+    Returns the segment an entry completed at a given time belongs to.
+
+    Args:
+        completion_timestamp: The Unix timestamp of completion.
+
+    Returns:
+        The segment name, e.g. '2024-05' (UTC month).
+    """
+    return time.strftime('%Y-%m', time.gmtime(completion_timestamp))
+
+
+def _segment_end(name: str) -> int:
+    """
+    Returns the Unix timestamp at which a segment's month ends.
+    """
+    year, month = (int(part) for part in name.split('-'))
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    # Imported here so the commands that don't touch the archive don't pay for it
+    import calendar
+    return calendar.timegm((year, month, 1, 0, 0, 0))
+
+
+def list_segments(filepath: str) -> List[str]:
+    """
+    Returns the names of the existing segments, oldest first.
+
+    Args:
+        filepath: The path to the JSON database file.
+    """
+    try:
+        names = os.listdir(archive_dir(filepath))
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-len(SEGMENT_EXTENSION)] for name in names if name.endswith(SEGMENT_EXTENSION))
+
+
+def iter_segment(filepath: str, name: str) -> Iterator[dict]:
+    """
+    Streams the entries of a segment in 3-tier order, decompressing lazily.
+
+    Args:
+        filepath: The path to the JSON database file.
+        name: The segment name (see segment_name).
+
+    Yields:
+        The archived entries as dictionaries.
+    """
+    path = os.path.join(archive_dir(filepath), name + SEGMENT_EXTENSION)
+    # Imported here, like in _segment_end
+    import gzip
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def check_segment(filepath: str, name: str) -> dict:
+    """
+    Reads a segment through, for `verify`. A gzip member ends with the
+    CRC32 and length of its data, which decompression checks.
+
+    Args:
+        filepath: The path to the JSON database file.
+        name: The segment name (see segment_name).
+
+    Returns:
+        {"bytes": ..., "entries": ..., "damaged": [(start, end, reason)]},
+        where a damaged segment is reported as a whole.
+    """
+    path = os.path.join(archive_dir(filepath), name + SEGMENT_EXTENSION)
+    result = {"bytes": os.path.getsize(path), "entries": 0, "damaged": []}
+    try:
+        for _ in iter_segment(filepath, name):
+            result["entries"] += 1
+    except (OSError, EOFError, zlib.error, ValueError) as e:
+        result["damaged"].append((0, result["bytes"], f"unreadable segment: {e}"))
+    return result
+
+
+def _write_segment(filepath: str, name: str, entries: List[dict]) -> None:
+    """
+    Writes a segment atomically, synced as the durability level asks (see
+    storage.durability): the entries it holds are about to be removed from
+    the hot log.
+    """
+    directory = archive_dir(filepath)
+    # Imported here, like in _segment_end
+    import gzip
+    fd, temp_path = storage.temp_file(directory, '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n')
+            f.close()
+            storage.sync_file(raw)
+        os.replace(temp_path, os.path.join(directory, name + SEGMENT_EXTENSION))
+        storage.sync_directory(directory)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def archive_entries(filepath: str, logs: List[dict], older_than_days: int,
+                    now: Optional[float] = None) -> Tuple[List[dict], List[str]]:
+    """
+    Writes the completed entries older than the cutoff to their segments and
+    returns the entries that stay in the hot log. The caller must hold the
+    exclusive lock and then save the returned entries as the new snapshot.
+
+    Segments are written before the snapshot. An entry that ends up in both
+    after a crash is deduplicated by ID the next time its segment is written,
+    and by `read --include-archived` in the meantime.
+
+    Args:
+        filepath: The path to the JSON database file.
+        logs: All entries of the hot log, in load order.
+        older_than_days: Archive entries completed at least this many days ago.
+        now: The current Unix timestamp (defaults to time.time()).
+
+    Returns:
+        A tuple of (the entries to keep in load order, the names of the
+        segments that were written).
+    """
+    cutoff = (time.time() if now is None else now) - older_than_days * 86400
+    keep = []
+    by_segment: Dict[str, List[dict]] = {}
+    for entry in logs:
+        completed_at = entry.get("completion_timestamp")
+        if entry["status"] == "completed" and completed_at is not None and completed_at < cutoff:
+            by_segment.setdefault(segment_name(completed_at), []).append(entry)
+        else:
+            keep.append(entry)
+    if not by_segment:
+        return logs, []
+
+    os.makedirs(archive_dir(filepath), exist_ok=True)
+    existing = set(list_segments(filepath))
+    for name, entries in by_segment.items():
+        if name in existing:
+            # Re-archived copies (after a crash) replace the old ones
+            new_ids = {entry["id"] for entry in entries}
+            entries = [e for e in iter_segment(filepath, name) if e["id"] not in new_ids] + entries
+        # Stable: ties keep the order in which entries were archived
+        _write_segment(filepath, name, sorted(entries, key=manager.dict_sort_key))
+    return keep, sorted(by_segment)
+
+
+def archive_logs(filepath: str, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                 now: Optional[float] = None) -> dict:
+    """
+    Archives old completed entries and rewrites the hot log without them.
+    The caller must hold the exclusive lock.
+
+    Args:
+        filepath: The path to the JSON database file.
+        older_than_days: Archive entries completed at least this many days ago.
+        now: The current Unix timestamp (defaults to time.time()).
+
+    Returns:
+        A summary with the number of 'archived' and 'remaining' entries and
+        the names of the 'segments' that were written.
+
+    Raises:
+        storage.CorruptLogError: If part of the log is damaged; it would be dropped.
+    """
+    logs = storage.load_logs(filepath, intact=True)
+    keep, segments = archive_entries(filepath, logs, older_than_days, now)
+    storage.save_logs(filepath, sorted(keep, key=manager.dict_sort_key))
+    return {
+        "status": "success",
+        "archived": len(logs) - len(keep),
+        "remaining": len(keep),
+        "segments": segments,
+    }
+
+
+def merge(filepath: str, hot: List[dict], limit: Optional[int] = None, **filters) -> List[dict]:
+    """
+    Merges archived entries into a read result, in 3-tier order.
+
+    The hot result is already sorted and all archived entries are completed,
+    so the segments are merged lazily (heapq.merge over streaming gzip
+    readers) and reading stops once `limit` entries are out. Segments whose
+    month ends before `since` can't hold a match and are never opened.
+    On ties, archived entries come first, oldest segment first.
+    The caller must hold the lock (shared or exclusive).
+
+    Args:
+        filepath: The path to the JSON database file.
+        hot: The sorted result from the hot log.
+        limit: The maximum number of entries to return. None returns all.
+        **filters: The filters accepted by manager.matches.
+
+    Returns:
+        The merged entries as dictionaries.
+    """
+    if filters.get('status') is not None and 'completed' not in filters['status']:
+        return hot[:limit]
+
+    since = filters.get('since')
+    streams = [
+        (entry for entry in iter_segment(filepath, name) if manager.matches(entry, **filters))
+        for name in list_segments(filepath)
+        if since is None or _segment_end(name) > since
+    ]
+    merged = heapq.merge(*streams, hot, key=manager.dict_sort_key)
+
+    result = []
+    seen = set()
+    for entry in merged:
+        if limit is not None and len(result) >= limit:
+            break
+        if entry["id"] not in seen:
+            seen.add(entry["id"])
+            result.append(entry)
+    return result
@@ -0,0 +1,405 @@
+"""
+The storage interface main.py talks to, and its JSON implementation.
+
+A backend is chosen by the extension of the database path: '.db',
+'.sqlite' and '.sqlite3' files use the SQLite backend (sqlite_backend.py),
+'.cols' files the memory-mapped columnar snapshot (columnar_backend.py),
+anything else the JSON snapshot + journal (storage.py). A directory is a
+workspace whose shards are files of any kind (workspace.py). All expose the
+same operations, so every command works the same on either, and
+export/import_entries convert between them.
+
+The modules behind the commands that not every CLI call runs (commit,
+follow, archive, stats, history, integrity) are imported by the methods
+that use them, so a `read` doesn't load the write path.
+"""
+import abc
+import itertools
+import os
+from typing import Iterator, List, Optional, Tuple
+from . import storage, manager, models, index, search, timings, paging
+
+# Database files with one of these extensions are opened with the SQLite backend.
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# Database files with one of these extensions are opened with the columnar backend.
+COLUMNAR_EXTENSIONS = ('.cols',)
+
+# The name of a workspace's manifest file (see workspace.py).
+WORKSPACE_MANIFEST_NAME = 'workspace.json'
+
+
+def is_workspace(path: str) -> bool:
+    """
+    Returns True if a --db path names a workspace rather than a log file:
+    a directory, or a manifest file. Here rather than in workspace.py, so
+    telling them apart doesn't import the workspace code.
+    """
+    return os.path.basename(path) == WORKSPACE_MANIFEST_NAME or os.path.isdir(path)
+
+
+class Backend(abc.ABC):
+    """
+    The operations the CLI needs from a storage format.
+
+    Attributes:
+        filepath (str): The path to the database file.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+
+    @abc.abstractmethod
+    def commit(self, ops: List[dict]) -> Tuple[List[dict], dict]:
+        """
+        Applies add and complete operations (see commit.add_op/complete_op).
+
+        Args:
+            ops: The operations, applied in order.
+
+        Returns:
+            A tuple of (results, meta) shaped like commit.submit's: one
+            {"status": "success", "record": ...} or {"status": "error",
+            "message": ...} per operation, and a meta block with
+            'lock_wait_ms' and 'group_size'.
+        """
+
+    @abc.abstractmethod
+    def read_hot(self, limit=None, pending_only=False, **filters) -> List[dict]:
+        """
+        Returns the entries of the live log in 3-tier order (see read).
+        """
+
+    @abc.abstractmethod
+    def resolve(self, id_or_prefix: str) -> str:
+        """
+        Resolves an ID or unique ID prefix to the full ID (see index.resolve_id).
+
+        Raises:
+            index.UnknownIdError: If no entry matches.
+            ValueError: If the prefix is ambiguous.
+        """
+
+    @abc.abstractmethod
+    def search(self, text: str, limit=search.DEFAULT_LIMIT, **filters) -> List[dict]:
+        """
+        Returns the entries whose description best matches text, best
+        first, each with its BM25 'score' (see search.search).
+        """
+
+    @abc.abstractmethod
+    def search_candidates(self, text: str, **filters) -> dict:
+        """
+        Returns the word statistics of the log and its unranked matches,
+        for ranking several logs as one (see search.candidates).
+        """
+
+    @abc.abstractmethod
+    def follower(self):
+        """
+        Returns an object whose poll() returns the 'added' and 'completed'
+        events since the previous poll (see follow.py).
+        """
+
+    @abc.abstractmethod
+    def archive(self, older_than_days: int) -> dict:
+        """
+        Moves completed entries older than the cutoff to the archive
+        segments (see archive.archive_logs for the summary returned).
+        """
+
+    @abc.abstractmethod
+    def stats(self, rebuild: bool = False) -> 'stats.Summary':
+        """
+        Returns the counts and completion latencies of the log, archive
+        included, as maintained by its writes (see stats.py).
+
+        Args:
+            rebuild: Recompute the summary from the entries and record
+                whether the maintained one matched (Summary.verified).
+        """
+
+    @abc.abstractmethod
+    def verify(self) -> dict:
+        """
+        Checks every file of the log against its checksums in one streaming
+        pass (see integrity.verify for the report returned).
+        """
+
+    @abc.abstractmethod
+    def repair(self, force: bool = False) -> dict:
+        """
+        Rewrites a damaged log from its intact entries, restoring the
+        damaged ones from the history (see integrity.repair for the
+        summary returned). Without an intact history, only with force.
+        """
+
+    @abc.abstractmethod
+    def export(self) -> List[dict]:
+        """
+        Returns every entry of the live log in load order.
+        """
+
+    @abc.abstractmethod
+    def import_entries(self, entries: List[dict]) -> None:
+        """
+        Stores entries (in load order) in an empty database.
+
+        Raises:
+            ValueError: If the database already holds entries.
+        """
+
+    def close(self) -> None:
+        """
+        Releases whatever the backend holds open.
+        """
+
+    def read(self, limit=None, pending_only=False, include_archived=False, **filters) -> List[dict]:
+        """
+        Returns the entries in 3-tier order.
+
+        Args:
+            limit: The maximum number of entries to return. None returns all.
+            pending_only: Skip completed entries.
+            include_archived: Merge in the entries moved to the archive.
+            **filters: The filters accepted by manager.matches.
+
+        Returns:
+            The entries as dictionaries.
+        """
+        result = self.read_hot(limit, pending_only, **filters)
+        if include_archived and not pending_only:
+            # Archived entries are all completed
+            result = self.merge_archived(result, limit, **filters)
+        return result
+
+    def iter_read(self, limit=None, pending_only=False, include_archived=False, **filters) -> Iterator[dict]:
+        """
+        Yields the entries of read one by one. Backends that can stream them
+        without holding the whole result keep memory flat for large logs.
+        """
+        return iter(self.read(limit, pending_only, include_archived, **filters))
+
+    def read_after(self, after: Optional[paging.PageKey], limit: int, pending_only=False,
+                   **filters) -> List[dict]:
+        """
+        Returns entries in page order (3-tier order, ties by ID) strictly
+        after a page key (see paging.py). This default sorts the whole
+        result; backends that can seek to the key override it.
+
+        Args:
+            after: The page key to start after, or None to start at the beginning.
+            limit: The maximum number of entries to return.
+            pending_only: Skip completed entries.
+            **filters: The filters accepted by manager.matches.
+
+        Returns:
+            The entries as dictionaries.
+        """
+        entries = sorted(self.read_hot(None, pending_only, **filters), key=paging.page_key)
+        if after is not None:
+            entries = [entry for entry in entries if paging.page_key(entry) > after]
+        return entries[:limit]
+
+    def page(self, page_size: int, cursor: Optional[str] = None, pending_only=False, **filters) -> dict:
+        """
+        Returns one page of `read --page-size` (see paging.page).
+
+        Args:
+            page_size: The maximum number of entries on the page.
+            cursor: The next_cursor of the previous page, or None for the first page.
+            pending_only: Skip completed entries.
+            **filters: The filters accepted by manager.matches.
+
+        Raises:
+            ValueError: If the cursor is invalid.
+        """
+        after = None if cursor is None else paging.decode_cursor(cursor)
+        return paging.page(self.read_after(after, page_size + 1, pending_only, **filters), page_size)
+
+    def read_as_of(self, timestamp: int, limit=None, pending_only=False, **filters) -> List[dict]:
+        """
+        Returns the entries as they were at a time, archived ones included,
+        in 3-tier order (see history.read_as_of).
+
+        Raises:
+            ValueError: If the history doesn't reach back that far.
+        """
+        # Imported here: only the commands that look back in time need it
+        from . import history
+        return history.read_as_of(self.filepath, timestamp, limit, pending_only, **filters)
+
+    def history(self, id_or_prefix: str) -> List[dict]:
+        """
+        Returns the events of one entry, oldest first (see history.entry_history).
+
+        Raises:
+            index.UnknownIdError: If no entry matches.
+            ValueError: If the prefix is ambiguous.
+        """
+        from . import history
+        return history.entry_history(self.filepath, id_or_prefix)
+
+    def version(self) -> Optional[list]:
+        """
+        Returns a value that changes whenever the log changes, so results can
+        be cached against it, or None if the backend can't tell cheaply.
+        """
+        return None
+
+    def merge_archived(self, hot: List[dict], limit=None, **filters) -> List[dict]:
+        """
+        Merges the archive segments into a sorted hot result (see archive.merge).
+        An entry archived since the hot read shows up once.
+        """
+        # Imported here: most reads leave the archive alone
+        from . import archive
+        return [models.to_dict(models.from_dict(d)) for d in archive.merge(self.filepath, hot, limit, **filters)]
+
+
+class JsonBackend(Backend):
+    """
+    The JSON snapshot with its journal and sidecar indexes (see storage.py).
+    """
+
+    def commit(self, ops: List[dict]) -> Tuple[List[dict], dict]:
+        # Imported here so reads don't load the write path (and its stats and history)
+        from . import commit
+        # Concurrent writers are batched into one journal append
+        return commit.submit(self.filepath, ops)
+
+    def read_hot(self, limit=None, pending_only=False, **filters) -> List[dict]:
+        # Unfiltered: stream the snapshot, which is stored in 3-tier order.
+        # Filtered: load only the candidates from the secondary indexes and
+        # select them (with a limit: top-K instead of a full sort)
+        # Streamed reads parse as they go: that time counts as loading
+        with storage.lock(self.filepath, exclusive=False), timings.phase('load'):
+            if any(value is not None for value in filters.values()):
+                log_dicts = index.query(self.filepath, **filters)
+            else:
+                ordered = index.ordered(self.filepath, limit, pending_only)
+                log_dicts = storage.load_logs(self.filepath) if ordered is None else None
+        if log_dicts is None:
+            with timings.phase('model'):
+                sorted_logs = [models.from_dict(d) for d in ordered]
+        else:
+            with timings.phase('select'):
+                sorted_logs = manager.select_logs(log_dicts, limit, pending_only)
+        with timings.phase('serialize'):
+            return [models.to_dict(entry) for entry in sorted_logs]
+
+    def iter_read(self, limit=None, pending_only=False, include_archived=False, **filters) -> Iterator[dict]:
+        if include_archived or any(value is not None for value in filters.values()):
+            yield from self.read(limit, pending_only, include_archived, **filters)
+            return
+        # Writers wait until the stream is consumed, not just until it is opened
+        with storage.lock(self.filepath, exclusive=False):
+            stream = index.iter_ordered(self.filepath, pending_only)
+            if stream is not None:
+                for entry in itertools.islice(stream, limit):
+                    yield models.to_dict(models.from_dict(entry))
+                return
+        yield from self.read(limit, pending_only, **filters)
+
+    def read_after(self, after: Optional[paging.PageKey], limit: int, pending_only=False,
+                   **filters) -> List[dict]:
+        # Seeks through the sorted snapshot instead of reading up to the cursor
+        with storage.lock(self.filepath, exclusive=False), timings.phase('load'):
+            stream = index.iter_after(self.filepath, after, pending_only, **filters)
+            if stream is not None:
+                return [models.to_dict(models.from_dict(entry)) for entry in itertools.islice(stream, limit)]
+        return super().read_after(after, limit, pending_only, **filters)
+
+    def version(self) -> list:
+        return index.log_version(self.filepath)
+
+    def merge_archived(self, hot: List[dict], limit=None, **filters) -> List[dict]:
+        with storage.lock(self.filepath, exclusive=False):
+            return super().merge_archived(hot, limit, **filters)
+
+    def resolve(self, id_or_prefix: str) -> str:
+        with storage.lock(self.filepath, exclusive=False):
+            return index.IdIndex(self.filepath).resolve(id_or_prefix)
+
+    def search(self, text: str, limit=search.DEFAULT_LIMIT, **filters) -> List[dict]:
+        with storage.lock(self.filepath, exclusive=False):
+            return search.search(self.filepath, text, limit, **filters)
+
+    def search_candidates(self, text: str, **filters) -> dict:
+        with storage.lock(self.filepath, exclusive=False):
+            return search.candidates(self.filepath, text, **filters)
+
+    def follower(self) -> 'follow.JsonFollower':
+        from . import follow
+        return follow.JsonFollower(self.filepath)
+
+    def archive(self, older_than_days: int) -> dict:
+        from . import archive, stats
+        with storage.lock(self.filepath):
+            version = self.version()
+            result = archive.archive_logs(self.filepath, older_than_days)
+            # The summary covers the archive too
+            stats.restamp(self.filepath, version)
+            return result
+
+    def stats(self, rebuild: bool = False) -> 'stats.Summary':
+        from . import stats
+        # A rebuild saves the sidecar, which only writers do
+        with storage.lock(self.filepath, exclusive=rebuild):
+            return stats.maintained(self.filepath, self.version(),
+                                    lambda: storage.load_logs(self.filepath), rebuild)
+
+    def verify(self) -> dict:
+        from . import integrity
+        with storage.lock(self.filepath, exclusive=False):
+            return integrity.verify(self.filepath, storage.check_snapshot)
+
+    def repair(self, force: bool = False) -> dict:
+        from . import integrity
+        with storage.lock(self.filepath):
+            return integrity.repair(
+                self.filepath, lambda: storage.read_logs(self.filepath),
+                lambda entries: storage.save_logs(self.filepath, sorted(entries, key=manager.dict_sort_key)),
+                force
+            )
+
+    def export(self) -> List[dict]:
+        with storage.lock(self.filepath, exclusive=False):
+            return storage.load_logs(self.filepath)
+
+    def import_entries(self, entries: List[dict]) -> None:
+        from . import stats
+        with storage.lock(self.filepath):
+            if storage.load_logs(self.filepath):
+                raise ValueError(f"{self.filepath} already holds entries; import into an empty database")
+            # Stored the way compaction leaves it
+            storage.save_logs(self.filepath, sorted(entries, key=manager.dict_sort_key))
+            # Like any write, it leaves the summary current
+            stats.save(self.filepath, stats.summarize(self.filepath, entries), self.version())
+
+
+def open_backend(filepath: str) -> Backend:
+    """
+    Returns the backend for a database file, chosen by its extension.
+
+    Args:
+        filepath: The path to the database file, or to a workspace (see workspace.py).
+
+    Returns:
+        A ShardedBackend for a workspace, a SqliteBackend for
+        SQLITE_EXTENSIONS, a ColumnarBackend for COLUMNAR_EXTENSIONS, a
+        JsonBackend otherwise.
+    """
+    if is_workspace(filepath):
+        # Imported here: workspace.py builds on this module
+        from . import workspace
+        return workspace.ShardedBackend(filepath)
+    if os.path.splitext(filepath)[1].lower() in SQLITE_EXTENSIONS:
+        # Imported here so the JSON path doesn't pay for sqlite3
+        from .sqlite_backend import SqliteBackend
+        return SqliteBackend(filepath)
+    if os.path.splitext(filepath)[1].lower() in COLUMNAR_EXTENSIONS:
+        # Imported here so the JSON path doesn't pay for mmap
+        from .columnar_backend import ColumnarBackend
+        return ColumnarBackend(filepath)
+    return JsonBackend(filepath)
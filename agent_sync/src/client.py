@@ -0,0 +1,69 @@
+"""
+Lightweight client for the status log server (see server.py).
+
+Kept separate from the server so the CLI only imports `socket` when it
+talks to a running server.
+"""
+import json
+import os
+from typing import Optional
+
+# Suffix of the Unix-domain socket that lives next to the database file.
+SOCKET_SUFFIX = '.sock'
+
+# Seconds to wait for the server to answer a request.
+REQUEST_TIMEOUT = 30.0
+
+
+def socket_path(filepath: str) -> str:
+    """
+    Returns the path of the server socket that belongs to a database file.
+
+    Args:
+        filepath: The path to the JSON database file.
+
+    Returns:
+        The path to the Unix-domain socket.
+    """
+    return filepath + SOCKET_SUFFIX
+
+
+def request(path: str, command: str, params: dict) -> Optional[dict]:
+    """
+    Sends a single command to the server and returns its response.
+
+    Args:
+        path: The path to the server socket.
+        command: The subcommand name ('add', 'read' or 'complete').
+        params: The subcommand parameters.
+
+    Returns:
+        The response dictionary with a 'status' key ('success', 'error' or
+        'unsupported'), or None if no server is listening on the socket.
+    """
+    if not os.path.exists(path):
+        # No server
+        return None
+    # Imported here so the regular CLI path doesn't pay for it
+    import socket
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            # No server (or a stale socket file left by a dead one)
+            return None
+
+        # Once connected, failures are real errors: the command may already
+        # have been applied, so falling back to a local run could repeat it.
+        sock.settimeout(REQUEST_TIMEOUT)
+        payload = json.dumps({"command": command, "params": params}, ensure_ascii=False)
+        sock.sendall(payload.encode('utf-8') + b'\n')
+
+        with sock.makefile('rb') as f:
+            line = f.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection without a response")
+        return json.loads(line)
+    finally:
+        sock.close()
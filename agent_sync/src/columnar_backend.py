@@ -0,0 +1,711 @@
+"""
+Memory-mapped columnar storage backend, selected for '.cols' database files.
+
+The snapshot stores every field in a column of its own. What reads sort
+and filter on is fixed-width: status and priority bytes, int64 timestamps,
+and the creator, completer and role names as codes into a name table. IDs
+and descriptions live in two string heaps with an offset column each. The
+file is memory-mapped and the columns are used in place through typed
+memoryviews, so opening a log allocates no per-entry objects, and the
+strings of a row are only decoded when the row is returned.
+
+Rows are stored in 3-tier order. Status, priority and the time range of a
+read are therefore contiguous row ranges, found by binary search over the
+packed columns; a top-N read decodes N rows. A permutation of the rows in
+ID order resolves IDs and prefixes by binary search.
+
+Writes append to the same journal as the JSON log (see storage.py), which
+is folded into a new snapshot once it grows past
+storage.JOURNAL_COMPACT_BYTES. The header holds the CRC32 of every column;
+opening a snapshot doesn't check them, `verify` and compaction do.
+
+    python -m agent_sync.src.main migrate --to status_log.cols
+"""
+import array
+import bisect
+import heapq
+import itertools
+import json
+import mmap
+import os
+import sys
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from . import storage, manager, models, index, archive, search, follow, stats, timings, paging, history
+from . import integrity
+from .backends import Backend
+from .models import PRIORITY_MAP
+
+# The first line of every columnar snapshot.
+MAGIC = b'AGENT_SYNC COLUMNAR 1\n'
+
+# The columns and their array typecodes, in file order. The offset columns
+# have one more item than there are rows: row i spans offsets[i]:offsets[i + 1].
+COLUMNS = (
+    ('status', 'B'), ('priority', 'B'), ('created_timestamp', 'q'), ('completion_timestamp', 'q'),
+    ('creator', 'I'), ('creator_role', 'I'), ('completer', 'I'), ('completer_role', 'I'),
+    ('id_offsets', 'Q'), ('description_offsets', 'Q'), ('id_order', 'I'),
+    ('ids', 'B'), ('descriptions', 'B'),
+)
+
+# Stored for a missing completion timestamp and a missing completer (role).
+NULL_TIMESTAMP = -2 ** 63
+NULL_NAME = 2 ** 32 - 1
+
+# Status codes, and the priority names by rank.
+_STATUSES = ('pending', 'completed')
+_PRIORITIES = tuple(sorted(PRIORITY_MAP, key=PRIORITY_MAP.get))
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def write_snapshot(filepath: str, logs: List[dict]) -> None:
+    """
+    Writes the entries as a columnar snapshot, atomically like
+    storage.save_logs, and removes the journal it supersedes.
+
+    Args:
+        filepath: The path to the columnar database file.
+        logs: The log entries as dictionaries, in load order. They are
+            stored in 3-tier order; the sort is stable.
+    """
+    with timings.phase('select'):
+        logs = sorted(logs, key=manager.dict_sort_key)
+
+    with timings.phase('serialize'):
+        names: Dict[str, int] = {}
+        columns = {name: array.array(typecode) for name, typecode in COLUMNS}
+        ids, descriptions = bytearray(), bytearray()
+        encoded_ids = []
+        columns['id_offsets'].append(0)
+        columns['description_offsets'].append(0)
+        for entry in logs:
+            columns['status'].append(_STATUSES.index(entry["status"]))
+            columns['priority'].append(PRIORITY_MAP[entry["priority"]])
+            columns['created_timestamp'].append(entry["created_timestamp"])
+            completion = entry.get("completion_timestamp")
+            columns['completion_timestamp'].append(NULL_TIMESTAMP if completion is None else completion)
+            for field in ('creator', 'creator_role', 'completer', 'completer_role'):
+                name = entry.get(field)
+                columns[field].append(NULL_NAME if name is None else names.setdefault(name, len(names)))
+            encoded_ids.append(entry["id"].encode('utf-8'))
+            ids += encoded_ids[-1]
+            columns['id_offsets'].append(len(ids))
+            descriptions += entry["description"].encode('utf-8')
+            columns['description_offsets'].append(len(descriptions))
+        columns['id_order'].extend(sorted(range(len(logs)), key=encoded_ids.__getitem__))
+        columns['ids'].frombytes(ids)
+        columns['descriptions'].frombytes(descriptions)
+
+        layout = {}
+        offset = 0
+        for name, _ in COLUMNS:
+            size = len(columns[name]) * columns[name].itemsize
+            layout[name] = [offset, size]
+            offset = _align(offset + size)
+        header = json.dumps({
+            "count": len(logs), "byteorder": sys.byteorder, "names": list(names), "columns": layout,
+            "crcs": {name: zlib.crc32(columns[name]) for name, _ in COLUMNS},
+        }, ensure_ascii=False).encode('utf-8') + b'\n'
+        data_start = _align(len(MAGIC) + len(header))
+
+    directory = os.path.dirname(filepath) or '.'
+    fd, temp_path = storage.temp_file(directory, '.cols.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f, timings.phase('write'):
+            f.write(MAGIC + header)
+            for name, _ in COLUMNS:
+                f.seek(data_start + layout[name][0])
+                columns[name].tofile(f)
+            f.truncate(data_start + offset)
+            storage.sync_file(f)
+        os.replace(temp_path, filepath)
+        storage.sync_directory(directory)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # Like storage.save_logs: the snapshot now holds everything the journal recorded
+    try:
+        os.remove(storage.journal_path(filepath))
+    except FileNotFoundError:
+        pass
+
+
+def check_snapshot(filepath: str) -> dict:
+    """
+    Checks every column of a snapshot against the CRC32 in its header,
+    reading the file a block at a time.
+
+    Args:
+        filepath: The path to the columnar database file.
+
+    Returns:
+        {"bytes": ..., "entries": ..., "damaged": [(start, end, reason), ...],
+        "checksummed": ...} like storage.check_snapshot; checksummed is
+        False for snapshots written before the columns had checksums.
+    """
+    result = {"bytes": 0, "entries": 0, "damaged": [], "checksummed": False}
+    try:
+        f = open(filepath, 'rb')
+    except FileNotFoundError:
+        return result
+    with f:
+        result["bytes"] = size = os.fstat(f.fileno()).st_size
+        if not size:
+            return result
+        try:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("not a columnar snapshot")
+            header_line = f.readline()
+            header = json.loads(header_line)
+            crcs = header.get("crcs")
+            result["entries"] = header["count"]
+        except (ValueError, KeyError):
+            result["damaged"].append((0, size, "unreadable header"))
+            return result
+        result["checksummed"] = crcs is not None
+        data_start = _align(len(MAGIC) + len(header_line))
+        for name, _ in COLUMNS:
+            offset, length = header["columns"][name]
+            start = data_start + offset
+            f.seek(start)
+            crc = 0
+            remaining = length
+            while remaining:
+                block = f.read(min(remaining, storage.SUM_BLOCK_BYTES))
+                if not block:
+                    break
+                crc = zlib.crc32(block, crc)
+                remaining -= len(block)
+            if remaining:
+                result["damaged"].append((min(start, size), start + length, f"column {name} is truncated"))
+            elif crcs is not None and crc != crcs.get(name):
+                result["damaged"].append((start, start + length, f"column {name} fails its checksum"))
+    return result
+
+
+def _require_intact(filepath: str) -> None:
+    """
+    Raises storage.CorruptLogError if the snapshot or the journal is
+    damaged, before a rewrite would drop what can't be read.
+    """
+    damaged = [(filepath, start, end) for start, end, _ in check_snapshot(filepath)["damaged"]]
+    journal = storage.journal_path(filepath)
+    damaged += [(journal, start, end) for start, end in storage.read_records(journal)[1]]
+    if damaged:
+        raise storage.CorruptLogError(filepath, damaged)
+
+
+class Snapshot:
+    """
+    The memory-mapped columns of a snapshot (see the module docstring).
+
+    Every column of COLUMNS is an attribute, a typed memoryview over the
+    mapping. Use it as a context manager: the columns are only valid until
+    the snapshot is closed.
+
+    Attributes:
+        count (int): The number of rows.
+        names (List[str]): The name table the name columns point into.
+    """
+
+    def __init__(self, filepath: str):
+        """
+        Args:
+            filepath: The path to the columnar database file. A missing file is empty.
+
+        Raises:
+            ValueError: If the file is not a columnar snapshot of this machine's byte order.
+        """
+        self.count = 0
+        self.names: List[str] = []
+        self._mmap = None
+        self._views: List[memoryview] = []
+        try:
+            with open(filepath, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            pass
+        if self._mmap is None:
+            for name, typecode in COLUMNS:
+                setattr(self, name, array.array(typecode, [0] if name.endswith('_offsets') else []))
+            return
+
+        try:
+            if self._mmap[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{filepath} is not a columnar log")
+            header_line = self._mmap[len(MAGIC):self._mmap.find(b'\n', len(MAGIC)) + 1]
+            header = json.loads(header_line)
+            if header["byteorder"] != sys.byteorder:
+                raise ValueError(f"{filepath} was written on a {header['byteorder']}-endian machine; "
+                                 f"migrate it there into a JSON log to move it")
+            data_start = _align(len(MAGIC) + len(header_line))
+            mapping = memoryview(self._mmap)
+            self._views.append(mapping)
+            for name, typecode in COLUMNS:
+                offset, size = header["columns"][name]
+                column = mapping[data_start + offset:data_start + offset + size].cast(typecode)
+                self._views.append(column)
+                setattr(self, name, column)
+        except BaseException:
+            self.close()
+            raise
+        self.count = header["count"]
+        self.names = header["names"]
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Releases the columns and unmaps the file.
+        """
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def id_of(self, row: int) -> str:
+        return str(self.ids[self.id_offsets[row]:self.id_offsets[row + 1]], 'utf-8')
+
+    def entry(self, row: int) -> dict:
+        """
+        Decodes a row into an entry dictionary.
+        """
+        names = self.names
+        completer = self.completer[row]
+        completer_role = self.completer_role[row]
+        completion = self.completion_timestamp[row]
+        return {
+            "id": str(self.ids[self.id_offsets[row]:self.id_offsets[row + 1]], 'utf-8'),
+            "creator": names[self.creator[row]],
+            "creator_role": names[self.creator_role[row]],
+            "created_timestamp": self.created_timestamp[row],
+            "description": str(self.descriptions[self.description_offsets[row]:self.description_offsets[row + 1]],
+                               'utf-8'),
+            "priority": _PRIORITIES[self.priority[row]],
+            "status": _STATUSES[self.status[row]],
+            "completer": None if completer == NULL_NAME else names[completer],
+            "completer_role": None if completer_role == NULL_NAME else names[completer_role],
+            "completion_timestamp": None if completion == NULL_TIMESTAMP else completion,
+        }
+
+    def find(self, prefix: str, limit: int) -> List[int]:
+        """
+        Returns up to limit rows whose ID starts with prefix, in ID order.
+        """
+        key = prefix.encode('utf-8')
+        order, ids, offsets = self.id_order, self.ids, self.id_offsets
+
+        def id_bytes(position: int) -> bytes:
+            row = order[position]
+            return ids[offsets[row]:offsets[row + 1]].tobytes()
+
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if id_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        rows = []
+        while lo < self.count and len(rows) < limit and id_bytes(lo).startswith(key):
+            rows.append(order[lo])
+            lo += 1
+        return rows
+
+    def row_of(self, log_id: str) -> Optional[int]:
+        """
+        Returns the row of an ID, or None if it isn't in the snapshot.
+        """
+        rows = self.find(log_id, 1)
+        return rows[0] if rows and self.id_of(rows[0]) == log_id else None
+
+    def ranges(self, pending_only: bool = False, status: Optional[List[str]] = None,
+               priority: Optional[List[str]] = None, since: Optional[int] = None,
+               until: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Returns the row ranges that match the status, priority and time
+        filters, in row order. Rows are sorted by (status, priority,
+        created_timestamp), so each combination is one binary search away.
+        """
+        statuses = [0] if pending_only else [0, 1]
+        if status is not None:
+            statuses = [code for code in statuses if _STATUSES[code] in status]
+        priorities = sorted(rank for name, rank in PRIORITY_MAP.items() if priority is None or name in priority)
+        ranges = []
+        for code in statuses:
+            lo = bisect.bisect_left(self.status, code)
+            hi = bisect.bisect_left(self.status, code + 1, lo)
+            for rank in priorities:
+                start = bisect.bisect_left(self.priority, rank, lo, hi)
+                end = bisect.bisect_left(self.priority, rank + 1, start, hi)
+                if since is not None:
+                    start = bisect.bisect_left(self.created_timestamp, since, start, end)
+                if until is not None:
+                    end = bisect.bisect_left(self.created_timestamp, until, start, end)
+                if start < end:
+                    ranges.append((start, end))
+        return ranges
+
+
+class ColumnarLog:
+    """
+    A snapshot with the journal replayed on top of it, as of opening.
+    The caller must hold the lock (shared or exclusive) while opening it.
+    """
+
+    def __init__(self, filepath: str, overlay: Optional[Tuple[Dict[str, dict], Dict[str, dict]]] = None):
+        """
+        Args:
+            filepath: The path to the columnar snapshot.
+            overlay: The (added, completions) to replay on top of it (see
+                index.replay_overlay); by default those of its journal.
+        """
+        self.snapshot = Snapshot(filepath)
+        try:
+            added, completions = index.journal_overlay(filepath) if overlay is None else overlay
+            # The latest completion of every snapshot row completed in the journal
+            self.completed_rows: Dict[int, dict] = {}
+            for log_id, record in completions.items():
+                row = self.snapshot.row_of(log_id)
+                if row is not None:
+                    self.completed_rows[row] = record
+            # Adds already folded into the snapshot (see storage._replay_journal) keep their row
+            self.added: Dict[str, dict] = {}
+            for log_id, entry in added.items():
+                row = self.snapshot.row_of(log_id)
+                if row is None:
+                    self.added[log_id] = entry
+                elif entry["status"] == "completed":
+                    self.completed_rows[row] = entry
+        except BaseException:
+            self.snapshot.close()
+            raise
+
+    def __enter__(self) -> 'ColumnarLog':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.snapshot.close()
+
+    def __len__(self) -> int:
+        return self.snapshot.count + len(self.added)
+
+    def _row_entry(self, row: int) -> dict:
+        entry = self.snapshot.entry(row)
+        if row in self.completed_rows:
+            storage.apply_completion(entry, self.completed_rows[row])
+        return entry
+
+    def get(self, log_id: str) -> Optional[dict]:
+        """
+        Returns the current state of an entry, or None if there is no such ID.
+        """
+        if log_id in self.added:
+            return dict(self.added[log_id])
+        row = self.snapshot.row_of(log_id)
+        return None if row is None else self._row_entry(row)
+
+    def resolve(self, id_or_prefix: str) -> str:
+        """
+        Resolves an ID or unique prefix to the full ID (see index.resolve_id).
+        """
+        if id_or_prefix in self.added:
+            return id_or_prefix
+        # Six candidates are enough to tell unique from ambiguous and to list a few
+        candidates = [self.snapshot.id_of(row) for row in self.snapshot.find(id_or_prefix, 6)]
+        candidates += [log_id for log_id in self.added if log_id.startswith(id_or_prefix)]
+        return index.resolve_id(id_or_prefix, candidates)
+
+    def apply(self, record: dict) -> None:
+        """
+        Applies a journal record written since opening, so later lookups see it.
+        """
+        if record["op"] == "add":
+            self.added[record["entry"]["id"]] = record["entry"]
+        elif record["id"] in self.added:
+            storage.apply_completion(self.added[record["id"]], record)
+        else:
+            self.completed_rows[self.snapshot.row_of(record["id"])] = record
+
+    def entries(self) -> Iterator[dict]:
+        """
+        Yields every entry in load order: the snapshot rows, then the journaled adds.
+        """
+        for row in range(self.snapshot.count):
+            yield self._row_entry(row)
+        yield from (dict(entry) for entry in self.added.values())
+
+    def ordered(self, pending_only: bool = False, **filters) -> Iterator[dict]:
+        """
+        Yields the entries that match the filters in 3-tier order, ties in
+        load order, like manager.select_logs over the whole log.
+
+        The snapshot rows are selected on the packed columns and only the
+        rows yielded are decoded. Journaled adds and completed rows, which
+        change place, are merged in from a heap.
+        """
+        snapshot = self.snapshot
+
+        def wanted(entry: dict) -> bool:
+            return (not pending_only or entry["status"] == "pending") and manager.matches(entry, **filters)
+
+        heap = [(manager.dict_sort_key(entry) + (snapshot.count + i,), entry)
+                for i, entry in enumerate(self.added.values()) if wanted(entry)]
+        for row in self.completed_rows:
+            entry = self._row_entry(row)
+            if wanted(entry):
+                heap.append((manager.dict_sort_key(entry) + (row,), entry))
+        heapq.heapify(heap)
+
+        ranges = snapshot.ranges(pending_only, filters.get('status'), filters.get('priority'),
+                                 filters.get('since'), filters.get('until'))
+        status, priority, created = snapshot.status, snapshot.priority, snapshot.created_timestamp
+        for row in self._rows(ranges, filters):
+            if heap:
+                key = (status[row], priority[row], created[row], row)
+                while heap and heap[0][0] < key:
+                    yield heapq.heappop(heap)[1]
+            yield snapshot.entry(row)
+        while heap:
+            yield heapq.heappop(heap)[1]
+
+    def after(self, after: Optional[paging.PageKey], pending_only: bool = False, **filters) -> Iterator[dict]:
+        """
+        Yields the entries that match the filters in page order (3-tier
+        order, ties by ID; see paging.py), strictly after a page key.
+
+        The row ranges are cut at the key with one more binary search, so
+        no row before it is looked at.
+        """
+        snapshot = self.snapshot
+
+        def wanted(entry: dict) -> bool:
+            return (not pending_only or entry["status"] == "pending") and manager.matches(entry, **filters)
+
+        extras = [entry for entry in self.added.values() if wanted(entry)]
+        extras += [entry for entry in map(self._row_entry, self.completed_rows) if wanted(entry)]
+
+        ranges = snapshot.ranges(pending_only, filters.get('status'), filters.get('priority'),
+                                 filters.get('since'), filters.get('until'))
+        if after is not None:
+            cut = []
+            for start, end in ranges:
+                group = (snapshot.status[start], snapshot.priority[start])
+                if group == after[:2]:
+                    start = bisect.bisect_left(snapshot.created_timestamp, after[2], start, end)
+                if group >= after[:2] and start < end:
+                    cut.append((start, end))
+            ranges = cut
+        return paging.merge_after(after, map(snapshot.entry, self._rows(ranges, filters)), extras)
+
+    def _rows(self, ranges: List[Tuple[int, int]], filters: dict) -> Iterator[int]:
+        """
+        Yields the rows of the ranges that still hold their snapshot state
+        and match the creator and role filters.
+        """
+        snapshot = self.snapshot
+        rows: Iterable[int] = itertools.chain.from_iterable(itertools.starmap(range, ranges))
+        if self.completed_rows:
+            rows = (row for row in rows if row not in self.completed_rows)
+        for field, names in (('creator', filters.get('creator')), ('creator_role', filters.get('role'))):
+            if names is not None:
+                codes = {code for code, name in enumerate(snapshot.names) if name in names}
+                column = getattr(snapshot, field)
+                rows = (row for row in rows if column[row] in codes)
+        return rows
+
+
+def compact(filepath: str) -> None:
+    """
+    Folds the journal into a new snapshot, archiving on the way like
+    storage.compact_logs. The caller must hold the exclusive lock.
+
+    Raises:
+        storage.CorruptLogError: If part of the log is damaged; it would be dropped.
+    """
+    _require_intact(filepath)
+    with ColumnarLog(filepath) as log:
+        logs = list(log.entries())
+    if os.path.exists(filepath) and os.path.getsize(filepath) > archive.AUTO_ARCHIVE_BYTES:
+        logs, _ = archive.archive_entries(filepath, logs, archive.ARCHIVE_AFTER_DAYS)
+    write_snapshot(filepath, logs)
+
+
+class ColumnarBackend(Backend):
+    """
+    The memory-mapped columnar snapshot with the JSON journal (see the module docstring).
+    """
+
+    def _open(self) -> ColumnarLog:
+        with storage.lock(self.filepath, exclusive=False), timings.phase('load'):
+            return ColumnarLog(self.filepath)
+
+    def commit(self, ops: List[dict]) -> Tuple[List[dict], dict]:
+        with storage.lock(self.filepath) as waited:
+            results = []
+            records = []
+            changes = []
+            with timings.phase('load'):
+                log = ColumnarLog(self.filepath)
+            with log:
+                for op in ops:
+                    try:
+                        if op["op"] == "add":
+                            record = storage.add_record(op["entry"])
+                            change = (None, dict(op["entry"]))
+                        elif op["op"] == "complete":
+                            before = log.get(log.resolve(op["id"]))
+                            entry = manager.mark_completed(
+                                models.from_dict(before), op["completer"], op["completer_role"]
+                            )
+                            record = storage.complete_record(entry)
+                            change = (before, models.to_dict(entry))
+                        else:
+                            raise ValueError(f"Unknown operation: {op['op']}")
+                    except ValueError as e:
+                        results.append({"status": "error", "message": str(e)})
+                        continue
+                    # Later operations in the same batch see this one
+                    log.apply(record)
+                    records.append(record)
+                    changes.append(change)
+                    results.append({"status": "success", "record": record})
+            stats.append_records(self.filepath, records, changes, compact=compact, entries=self._intact_entries)
+            history.record(self.filepath, changes, self._intact_entries)
+        return results, {"lock_wait_ms": round(waited * 1000, 3), "group_size": 1}
+
+    def read_hot(self, limit=None, pending_only=False, **filters) -> List[dict]:
+        with self._open() as log, timings.phase('decode'):
+            result = list(itertools.islice(log.ordered(pending_only, **filters), limit))
+        timings.count('entries_loaded', len(result))
+        return result
+
+    def iter_read(self, limit=None, pending_only=False, include_archived=False, **filters) -> Iterator[dict]:
+        if include_archived:
+            yield from super().iter_read(limit, pending_only, include_archived, **filters)
+            return
+        # The mapping stays valid when a writer replaces the file, so no lock is held while streaming
+        with self._open() as log:
+            yield from itertools.islice(log.ordered(pending_only, **filters), limit)
+
+    def read_after(self, after: Optional[paging.PageKey], limit: int, pending_only=False,
+                   **filters) -> List[dict]:
+        with self._open() as log, timings.phase('decode'):
+            return list(itertools.islice(log.after(after, pending_only, **filters), limit))
+
+    def version(self) -> list:
+        return index.log_version(self.filepath)
+
+    def merge_archived(self, hot: List[dict], limit=None, **filters) -> List[dict]:
+        with storage.lock(self.filepath, exclusive=False):
+            return super().merge_archived(hot, limit, **filters)
+
+    def resolve(self, id_or_prefix: str) -> str:
+        with self._open() as log:
+            return log.resolve(id_or_prefix)
+
+    def search(self, text: str, limit=search.DEFAULT_LIMIT, **filters) -> List[dict]:
+        # Ranking needs every description, so every row is decoded
+        return search.search_entries(self.export(), text, limit, **filters)
+
+    def search_candidates(self, text: str, **filters) -> dict:
+        return search.entry_candidates(self.export(), text, **filters)
+
+    def follower(self) -> 'ColumnarFollower':
+        return ColumnarFollower(self.filepath)
+
+    def archive(self, older_than_days: int) -> dict:
+        with storage.lock(self.filepath):
+            version = self.version()
+            _require_intact(self.filepath)
+            with ColumnarLog(self.filepath) as log:
+                logs = list(log.entries())
+            keep, segments = archive.archive_entries(self.filepath, logs, older_than_days)
+            write_snapshot(self.filepath, keep)
+            stats.restamp(self.filepath, version)
+        return {
+            "status": "success",
+            "archived": len(logs) - len(keep),
+            "remaining": len(keep),
+            "segments": segments,
+        }
+
+    def stats(self, rebuild: bool = False) -> stats.Summary:
+        # Like JsonBackend.stats
+        with storage.lock(self.filepath, exclusive=rebuild):
+            return stats.maintained(self.filepath, self.version(), self._entries, rebuild)
+
+    def _entries(self) -> List[dict]:
+        with ColumnarLog(self.filepath) as log:
+            return list(log.entries())
+
+    def _intact_entries(self) -> List[dict]:
+        _require_intact(self.filepath)
+        return self._entries()
+
+    def verify(self) -> dict:
+        with storage.lock(self.filepath, exclusive=False):
+            return integrity.verify(self.filepath, check_snapshot)
+
+    def repair(self, force: bool = False) -> dict:
+        with storage.lock(self.filepath):
+            return integrity.repair(self.filepath, self._salvage, lambda entries: write_snapshot(self.filepath, entries),
+                                    force)
+
+    def _salvage(self) -> Tuple[List[dict], List[Tuple[str, int, int]]]:
+        """
+        Returns the intact entries and the damaged ranges, like storage.read_logs.
+        """
+        damaged = [(self.filepath, start, end) for start, end, _ in check_snapshot(self.filepath)["damaged"]]
+        journal = storage.journal_path(self.filepath)
+        records, journal_damaged = storage.read_records(journal)
+        overlay = index.replay_overlay(records)
+        if damaged:
+            # Any row may span a damaged column: only the journaled adds are kept
+            entries = list(overlay[0].values())
+        else:
+            with ColumnarLog(self.filepath, overlay) as log:
+                entries = list(log.entries())
+        return entries, damaged + [(journal, start, end) for start, end in journal_damaged]
+
+    def export(self) -> List[dict]:
+        with self._open() as log:
+            return list(log.entries())
+
+    def import_entries(self, entries: List[dict]) -> None:
+        with storage.lock(self.filepath):
+            with ColumnarLog(self.filepath) as log:
+                if len(log):
+                    raise ValueError(f"{self.filepath} already holds entries; import into an empty database")
+            write_snapshot(self.filepath, entries)
+            stats.save(self.filepath, stats.summarize(self.filepath, entries), self.version())
+
+
+class ColumnarFollower(follow.JsonFollower):
+    """
+    Follows a columnar snapshot and its journal like a JSON log (see follow.py).
+    """
+
+    def _load_logs(self) -> List[dict]:
+        with ColumnarLog(self.filepath) as log:
+            return list(log.entries())
+
+    def _lookup(self) -> Callable[[str], Optional[dict]]:
+        with ColumnarLog(self.filepath) as log:
+            entries = {entry["id"]: entry for entry in log.entries()} if len(log) else {}
+        return entries.get
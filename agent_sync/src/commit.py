@@ -0,0 +1,214 @@
+"""
+Serializes writers across processes and merges queued writes (group commit).
+
+A writer first drops its operation into the queue directory next to the
+database, then waits for the exclusive lock. Whoever gets the lock applies
+every queued operation in one pass and one journal append, and leaves a
+result file for each of the other writers. When those writers get the lock
+in turn they find their result already there and return immediately, so N
+writers piling up behind the lock cost one write and one fsync instead of N.
+"""
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+from . import storage, manager, models, index, stats, history
+
+# Suffix of the queue directory that lives next to the database file.
+QUEUE_SUFFIX = '.commit'
+
+# Result files older than this were left by writers that died; they are removed.
+STALE_RESULT_SECONDS = 3600
+
+
+def queue_dir(filepath: str) -> str:
+    """
+    Returns the path of the group commit queue for a database file.
+
+    Args:
+        filepath: The path to the JSON database file.
+
+    Returns:
+        The path to the queue directory.
+    """
+    return filepath + QUEUE_SUFFIX
+
+
+def add_op(entry: dict, project: Optional[str] = None) -> dict:
+    """
+    Builds the queued operation for adding a validated entry.
+
+    Args:
+        entry: The new log entry as a dictionary (see manager.create_entry).
+        project: The project the entry belongs to, in a workspace sharded
+            by project (see workspace.py); the workspace removes it before
+            the operation reaches a shard.
+
+    Returns:
+        The operation dictionary.
+    """
+    op = {"op": "add", "entry": entry}
+    if project is not None:
+        op["project"] = project
+    return op
+
+
+def complete_op(log_id: str, completer: str, role: str) -> dict:
+    """
+    Builds the queued operation for completing an entry.
+
+    Args:
+        log_id: The ID (or unique ID prefix) of the log entry to complete.
+        completer: The name of the person or agent completing the entry.
+        role: The role of the completer.
+
+    Returns:
+        The operation dictionary.
+    """
+    return {"op": "complete", "id": log_id, "completer": completer, "completer_role": role}
+
+
+def _write_json(path: str, data: dict) -> None:
+    """
+    Writes a small JSON file atomically (temp file + rename).
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def _apply(filepath: str, ops: List[dict]) -> List[dict]:
+    """
+    Applies a group of operations and appends their journal records at once.
+    The caller must hold the exclusive lock.
+
+    Args:
+        filepath: The path to the JSON database file.
+        ops: The queued operations, in arrival order.
+
+    Returns:
+        One result per operation: {"status": "success", "record": ...} or
+        {"status": "error", "message": ...}. A failing operation doesn't
+        affect the others.
+    """
+    id_index = None
+    if any(op["op"] == "complete" for op in ops):
+        # Only completions need the current state; they look entries up by ID
+        id_index = index.IdIndex(filepath)
+        if not id_index.indexed:
+            # Written by an older version: rewrite it one entry per line once.
+            # A damaged log is not rewritten before `repair`; the loaded entries serve meanwhile
+            try:
+                storage.compact_logs(filepath)
+                id_index = index.IdIndex(filepath)
+            except storage.CorruptLogError:
+                pass
+
+    results = []
+    records = []
+    # (before, after) per entry written, for the summary and the history (see stats.update)
+    changes = []
+    for op in ops:
+        try:
+            if op["op"] == "add":
+                record = storage.add_record(op["entry"])
+                # Copied: a completion later in the group updates the entry in place
+                change = (None, dict(op["entry"]))
+            elif op["op"] == "complete":
+                log_id = id_index.resolve(op["id"])
+                before = dict(id_index.get(log_id))
+                entry = manager.mark_completed(models.from_dict(before), op["completer"], op["completer_role"])
+                record = storage.complete_record(entry)
+                change = (before, models.to_dict(entry))
+            else:
+                raise ValueError(f"Unknown operation: {op['op']}")
+        except ValueError as e:
+            results.append({"status": "error", "message": str(e)})
+            continue
+        if id_index is not None:
+            # Later operations in the same group see this one
+            id_index.apply(record)
+        records.append(record)
+        changes.append(change)
+        results.append({"status": "success", "record": record})
+
+    stats.append_records(filepath, records, changes, entries=lambda: storage.load_logs(filepath, intact=True))
+    history.record(filepath, changes, lambda: storage.load_logs(filepath, intact=True))
+    return results
+
+
+def _remove_stale_results(directory: str) -> None:
+    """
+    Removes result files whose writers never came back to collect them.
+    """
+    cutoff = time.time() - STALE_RESULT_SECONDS
+    for name in os.listdir(directory):
+        if name.endswith('.done'):
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def submit(filepath: str, ops: List[dict]) -> Tuple[List[dict], dict]:
+    """
+    Commits operations to the log, batching them with any other writers
+    that are waiting for the lock at the same time.
+
+    Args:
+        filepath: The path to the JSON database file.
+        ops: The operations to apply (see add_op/complete_op).
+
+    Returns:
+        A tuple of (results, meta). There is one result per operation (see
+        _apply). meta holds 'lock_wait_ms', the time spent waiting for the
+        lock, and 'group_size', the number of queued requests committed
+        together with this one (1 when there was no contention).
+    """
+    directory = queue_dir(filepath)
+    os.makedirs(directory, exist_ok=True)
+
+    # The name sorts by arrival time, so queued requests are applied in order
+    name = f"{time.time_ns():020d}-{os.getpid()}-{os.urandom(16).hex()}"
+    request_path = os.path.join(directory, name + '.req')
+    result_path = os.path.join(directory, name + '.done')
+    _write_json(request_path, {"ops": ops})
+
+    with storage.lock(filepath) as waited:
+        meta = {"lock_wait_ms": round(waited * 1000, 3)}
+
+        if os.path.exists(result_path):
+            # Another writer committed this request while we were waiting
+            with open(result_path, 'r', encoding='utf-8') as f:
+                done = json.load(f)
+            os.remove(result_path)
+            meta["group_size"] = done["group_size"]
+            return done["results"], meta
+
+        # We are the leader: commit everything that is queued
+        names = sorted(n[:-len('.req')] for n in os.listdir(directory) if n.endswith('.req'))
+        queued = []
+        for queued_name in names:
+            with open(os.path.join(directory, queued_name + '.req'), 'r', encoding='utf-8') as f:
+                queued.append((queued_name, json.load(f)["ops"]))
+
+        all_results = _apply(filepath, [op for _, queued_ops in queued for op in queued_ops])
+
+        own_results = []
+        position = 0
+        for queued_name, queued_ops in queued:
+            results = all_results[position:position + len(queued_ops)]
+            position += len(queued_ops)
+            if queued_name == name:
+                own_results = results
+            else:
+                _write_json(os.path.join(directory, queued_name + '.done'),
+                            {"results": results, "group_size": len(queued)})
+            os.remove(os.path.join(directory, queued_name + '.req'))
+
+        _remove_stale_results(directory)
+        meta["group_size"] = len(queued)
+        return own_results, meta
@@ -0,0 +1,166 @@
+"""
+Change feed for `read --follow`.
+
+A follower remembers which entries it has reported and in which status,
+and every poll returns only what changed since the previous one: an
+'added' event per new entry and a 'completed' event per entry that was
+completed. The first poll reports every existing entry as added.
+
+For the JSON log an idle poll costs two stat calls: the (inode, mtime,
+size) signatures of the snapshot and the journal are compared first. When
+only the journal grew, just the appended bytes are read. When the
+snapshot was rewritten (compaction or archive), the log is reloaded once
+and diffed against the statuses seen so far.
+"""
+import json
+import sys
+import time
+from typing import Callable, Dict, List, Optional, TextIO
+from . import storage, index
+
+# Seconds between two polls when no --interval is given.
+DEFAULT_INTERVAL = 1.0
+
+
+def added_event(entry: dict) -> dict:
+    """
+    Builds the event for an entry that appeared in the log.
+    """
+    return {"event": "added", "entry": entry}
+
+
+def completed_event(entry: dict) -> dict:
+    """
+    Builds the event for an entry that was marked as completed.
+    """
+    return {"event": "completed", "entry": entry}
+
+
+class JsonFollower:
+    """
+    Follows the JSON snapshot and its journal (see the module docstring).
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        # Status of every entry reported so far
+        self._statuses: Dict[str, str] = {}
+        self._signature = None
+        # Snapshot signature and journal position the statuses are based on
+        self._snapshot = None
+        self._journal_inode = None
+        self._journal_offset = 0
+
+    def _signatures(self) -> tuple:
+        return (index.snapshot_signature(self.filepath),
+                index.snapshot_signature(storage.journal_path(self.filepath)))
+
+    def _load_logs(self) -> List[dict]:
+        """
+        Returns every entry of the log in load order.
+        """
+        return storage.load_logs(self.filepath)
+
+    def _lookup(self) -> Callable[[str], Optional[dict]]:
+        """
+        Returns a function that returns the current state of an entry by ID.
+        """
+        return index.IdIndex(self.filepath).get
+
+    def poll(self) -> List[dict]:
+        """
+        Returns the events since the previous poll.
+        """
+        if self._signature is not None and self._signatures() == self._signature:
+            return []
+
+        with storage.lock(self.filepath, exclusive=False):
+            signature = self._signatures()
+            snapshot, journal = signature
+            # The journal only ever grows until a compaction rewrites the snapshot
+            if (self._signature is not None and snapshot == self._snapshot
+                    and (journal is None or self._journal_inode in (None, journal[0]))):
+                events = self._read_journal(journal)
+            else:
+                events = self._reload(snapshot, journal)
+        self._signature = signature
+        return events
+
+    def _reload(self, snapshot: Optional[list], journal: Optional[list]) -> List[dict]:
+        """
+        Reloads the whole log and diffs it against the statuses seen so far.
+        """
+        events = []
+        statuses = {}
+        for entry in self._load_logs():
+            previous = self._statuses.get(entry["id"])
+            if previous is None:
+                events.append(added_event(entry))
+            elif previous == "pending" and entry["status"] == "completed":
+                events.append(completed_event(entry))
+            statuses[entry["id"]] = entry["status"]
+        # Entries moved to the archive are simply forgotten
+        self._statuses = statuses
+        self._snapshot = snapshot
+        self._journal_inode = journal[0] if journal else None
+        self._journal_offset = journal[2] if journal else 0
+        return events
+
+    def _read_journal(self, journal: Optional[list]) -> List[dict]:
+        """
+        Turns the journal records appended since the previous poll into events.
+        """
+        if journal is None or journal[2] <= self._journal_offset:
+            return []
+        self._journal_inode = journal[0]
+        with open(storage.journal_path(self.filepath), 'rb') as f:
+            f.seek(self._journal_offset)
+            data = f.read()
+        # Writers append whole lines under the lock; a torn line never completes
+        self._journal_offset += len(data)
+
+        events = []
+        lookup = None
+        for line in data.splitlines():
+            try:
+                record = storage.decode_record(line)
+            except ValueError:
+                continue
+            if record.get("op") == "add":
+                entry = record["entry"]
+                if entry["id"] not in self._statuses:
+                    self._statuses[entry["id"]] = entry["status"]
+                    events.append(added_event(entry))
+            elif record.get("op") == "complete" and self._statuses.get(record["id"]) == "pending":
+                if lookup is None:
+                    lookup = self._lookup()
+                entry = lookup(record["id"])
+                if entry is None:
+                    # Archived since; like in _reload, it is simply forgotten
+                    del self._statuses[record["id"]]
+                    continue
+                self._statuses[record["id"]] = "completed"
+                storage.apply_completion(entry, record)
+                events.append(completed_event(entry))
+        return events
+
+
+def run(backend, interval: Optional[float] = None, out: Optional[TextIO] = None) -> None:
+    """
+    Writes the events of a backend's follower to out as NDJSON, one poll
+    every interval seconds, until interrupted.
+
+    Args:
+        backend: The storage backend (see backends.Backend.follower).
+        interval: Seconds between polls (default: DEFAULT_INTERVAL).
+        out: The stream to write to (default: stdout).
+    """
+    interval = DEFAULT_INTERVAL if interval is None else interval
+    out = out or sys.stdout
+    follower = backend.follower()
+    while True:
+        events = follower.poll()
+        if events:
+            out.write(''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events))
+            out.flush()
+        time.sleep(interval)
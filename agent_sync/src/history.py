@@ -0,0 +1,402 @@
+"""
+The event history behind `read --as-of` and `history --id`.
+
+The log only holds the current state of every entry, and compaction drops
+the journal that recorded how it got there. So every write is also
+recorded as events in the history directory next to the database file
+(status_log.json.history/). An event is the journal record of one add or
+completion (see storage.add_record/complete_record) with its sequence
+number 'seq' and 'at', the time it was committed, checksummed like the
+journal (see storage.encode_record). Commit times never go backwards,
+so the events are in time order.
+
+The events are cut into segments by checkpoints. A checkpoint is the
+materialized state of the whole log, archived entries included, after a
+number of events. It is a columnar snapshot (see columnar_backend.py), so
+it is mapped rather than parsed:
+
+    manifest.json                  the checkpoints: [{"seq": ..., "at": ...}, ...]
+    checkpoint-000000000000.cols   the state after 0 events
+    events-000000000000.ndjson     events 1, 2, ... up to the next checkpoint
+
+The state at any time is the last checkpoint taken at or before it, with
+at most checkpoint_events() events of its segment replayed on top.
+
+Only the last history_checkpoints() checkpoints are kept: taking one
+removes the oldest with its segment. The history holds at most that many
+copies of the log and reaches back about history_checkpoints() *
+checkpoint_events() events; earlier times are reported as not recorded.
+
+The first write to a log without a history (one created by an older
+version, or migrated) records the state before it as the first
+checkpoint, the baseline. The history starts there.
+"""
+import bisect
+import itertools
+import json
+import os
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+from . import storage, models, index, archive
+
+# Suffix of the history directory that lives next to the database file.
+HISTORY_SUFFIX = '.history'
+
+# The name of the checkpoint list in the history directory.
+MANIFEST_NAME = 'manifest.json'
+
+# A checkpoint is taken once a segment holds this many events, which bounds
+# the replay of a past state (see checkpoint_events).
+CHECKPOINT_EVENTS = 10000
+
+# Set this environment variable to a number of events to space checkpoints differently.
+CHECKPOINT_EVENTS_ENV = "AGENT_SYNC_CHECKPOINT_EVENTS"
+
+# The number of checkpoints kept; taking one more removes the oldest with its
+# segment (see history_checkpoints).
+HISTORY_CHECKPOINTS = 10
+
+# Set this environment variable to a number of checkpoints to keep a longer or shorter history.
+HISTORY_CHECKPOINTS_ENV = "AGENT_SYNC_HISTORY_CHECKPOINTS"
+
+# Bytes read back from the end of a segment to find its last event.
+_TAIL_BYTES = 64 * 1024
+
+
+def history_dir(filepath: str) -> str:
+    """
+    Returns the path of the history directory for a database file.
+
+    Args:
+        filepath: The path to the database file.
+
+    Returns:
+        The path to the history directory.
+    """
+    return filepath + HISTORY_SUFFIX
+
+
+def _positive_env(name: str, default: int, unit: str) -> int:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise ValueError(f"Invalid {name}: {value}. Must be a positive number of {unit}")
+    return number
+
+
+def checkpoint_events() -> int:
+    """
+    Returns the number of events between two checkpoints: the one named by
+    CHECKPOINT_EVENTS_ENV, else CHECKPOINT_EVENTS.
+
+    Raises:
+        ValueError: If CHECKPOINT_EVENTS_ENV is not a positive number.
+    """
+    return _positive_env(CHECKPOINT_EVENTS_ENV, CHECKPOINT_EVENTS, 'events')
+
+
+def history_checkpoints() -> int:
+    """
+    Returns the number of checkpoints kept: the one named by
+    HISTORY_CHECKPOINTS_ENV, else HISTORY_CHECKPOINTS.
+
+    Raises:
+        ValueError: If HISTORY_CHECKPOINTS_ENV is not a positive number.
+    """
+    return _positive_env(HISTORY_CHECKPOINTS_ENV, HISTORY_CHECKPOINTS, 'checkpoints')
+
+
+def _checkpoint_path(filepath: str, seq: int) -> str:
+    return os.path.join(history_dir(filepath), f"checkpoint-{seq:012d}.cols")
+
+
+def _events_path(filepath: str, seq: int) -> str:
+    return os.path.join(history_dir(filepath), f"events-{seq:012d}.ndjson")
+
+
+def load_manifest(filepath: str) -> Optional[dict]:
+    """
+    Reads the checkpoint list of a log.
+
+    Args:
+        filepath: The path to the database file.
+
+    Returns:
+        {"checkpoints": [{"seq": ..., "at": ...}, ...]} in order, or None
+        if no history has been recorded.
+    """
+    try:
+        with open(os.path.join(history_dir(filepath), MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(filepath: str, manifest: dict) -> None:
+    """
+    Writes the checkpoint list atomically (temp file + rename).
+    """
+    path = os.path.join(history_dir(filepath), MANIFEST_NAME)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+        storage.sync_file(f)
+    os.replace(temp_path, path)
+    storage.sync_directory(history_dir(filepath))
+
+
+def _last_event(path: str) -> Optional[dict]:
+    """
+    Returns the last complete event of a segment without reading all of it.
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        chunk = _TAIL_BYTES
+        while True:
+            start = max(0, size - chunk)
+            f.seek(start)
+            lines = f.read(size - start).splitlines()
+            # The first line read may have started before the chunk
+            for line in reversed(lines if start == 0 else lines[1:]):
+                try:
+                    return storage.decode_record(line)
+                except ValueError:
+                    # Torn by a crash, or damaged
+                    continue
+            if start == 0:
+                return None
+            chunk *= 4
+
+
+def _baseline(filepath: str, entries: Iterable[dict], changes: List[Tuple[Optional[dict], dict]]) -> List[dict]:
+    """
+    Returns the state of a log before a write: its entries and its archive
+    with the changes of the write undone.
+    """
+    state = {entry["id"]: entry for entry in entries}
+    for name in archive.list_segments(filepath):
+        for entry in archive.iter_segment(filepath, name):
+            # Left in both by a crash while archiving (see archive.archive_entries)
+            state.setdefault(entry["id"], entry)
+    for before, after in reversed(changes):
+        if before is None:
+            state.pop(after["id"], None)
+        else:
+            state[after["id"]] = before
+    return list(state.values())
+
+
+def _write_checkpoint(filepath: str, seq: int, entries: List[dict]) -> None:
+    # Imported here: the columnar backend builds on backends.py, which builds on this module
+    from . import columnar_backend
+    columnar_backend.write_snapshot(_checkpoint_path(filepath, seq), entries)
+
+
+def _state(filepath: str, checkpoint: dict, timestamp: Optional[int] = None):
+    """
+    Opens a checkpoint with the events of its segment replayed on top, up
+    to a time (all of them by default), as a columnar_backend.ColumnarLog.
+    """
+    from . import columnar_backend
+    events = storage.iter_records(_events_path(filepath, checkpoint["seq"]))
+    if timestamp is not None:
+        events = itertools.takewhile(lambda event: event["at"] <= timestamp, events)
+    return columnar_backend.ColumnarLog(_checkpoint_path(filepath, checkpoint["seq"]),
+                                        index.replay_overlay(events))
+
+
+def record(filepath: str, changes: List[Tuple[Optional[dict], dict]],
+           entries: Callable[[], Iterable[dict]]) -> None:
+    """
+    Appends the events of a write to the history. Once the current segment
+    holds checkpoint_events() events, takes a checkpoint and removes the
+    oldest beyond history_checkpoints(). The writer calls it right after
+    the write, under the same lock, so events are recorded in order.
+
+    Args:
+        filepath: The path to the database file.
+        changes: (before, after) per entry written, in order; before is None for adds.
+        entries: Returns the entries of the log, after the write. Only
+            called when the log has no history yet, to record the baseline;
+            raises storage.CorruptLogError if the log is damaged, and no
+            history is recorded until it has been repaired.
+    """
+    if not changes:
+        return
+    manifest = load_manifest(filepath)
+    if manifest is None:
+        try:
+            current = entries()
+        except storage.CorruptLogError:
+            # The baseline would record the damaged entries as never there, and repair would trust it
+            return
+        baseline = _baseline(filepath, current, changes)
+        os.makedirs(history_dir(filepath), exist_ok=True)
+        _write_checkpoint(filepath, 0, baseline)
+        # An empty baseline holds every time before the first event
+        manifest = {"checkpoints": [{"seq": 0, "at": int(time.time()) if baseline else 0}]}
+        _write_manifest(filepath, manifest)
+
+    checkpoint = manifest["checkpoints"][-1]
+    path = _events_path(filepath, checkpoint["seq"])
+    last = _last_event(path) or checkpoint
+    seq, at = last["seq"], max(int(time.time()), last["at"])
+    lines = []
+    for before, after in changes:
+        seq += 1
+        event = storage.add_record(after) if before is None else storage.complete_record(models.from_dict(after))
+        lines.append(storage.encode_record(dict({"seq": seq, "at": at}, **event)))
+    storage.append_lines(path, ''.join(lines))
+
+    if seq - checkpoint["seq"] >= checkpoint_events():
+        with _state(filepath, checkpoint) as log:
+            state = list(log.entries())
+        _write_checkpoint(filepath, seq, state)
+        manifest["checkpoints"].append({"seq": seq, "at": at})
+        removed = manifest["checkpoints"][:-history_checkpoints()]
+        del manifest["checkpoints"][:-history_checkpoints()]
+        # Out of the manifest first, so a crash can only leave unlisted files behind
+        _write_manifest(filepath, manifest)
+        for old in removed:
+            for path in (_checkpoint_path(filepath, old["seq"]), _events_path(filepath, old["seq"])):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def segments(filepath: str) -> List[Tuple[str, str]]:
+    """
+    Returns the files of the history: (checkpoint path, events path) per
+    checkpoint, oldest first; none if no history has been recorded.
+
+    Args:
+        filepath: The path to the database file.
+    """
+    manifest = load_manifest(filepath)
+    if manifest is None:
+        return []
+    return [(_checkpoint_path(filepath, checkpoint["seq"]), _events_path(filepath, checkpoint["seq"]))
+            for checkpoint in manifest["checkpoints"]]
+
+
+def latest(filepath: str) -> Optional[List[dict]]:
+    """
+    Returns every entry as of the last recorded write, archived ones
+    included: the last checkpoint with all the events after it.
+
+    Args:
+        filepath: The path to the database file.
+
+    Returns:
+        The entries as dictionaries, or None if no history has been recorded.
+    """
+    manifest = load_manifest(filepath)
+    if manifest is None:
+        return None
+    with _state(filepath, manifest["checkpoints"][-1]) as log:
+        return list(log.entries())
+
+
+def _require_manifest(filepath: str) -> dict:
+    manifest = load_manifest(filepath)
+    if manifest is None:
+        raise ValueError(f"No history has been recorded for {filepath} yet; "
+                         f"it starts with the next add or complete")
+    return manifest
+
+
+def read_as_of(filepath: str, timestamp: int, limit: Optional[int] = None, pending_only: bool = False,
+               **filters) -> List[dict]:
+    """
+    Returns the entries as they were at a time, in 3-tier order. Entries
+    archived since then are included.
+
+    Args:
+        filepath: The path to the database file.
+        timestamp: The time as a Unix timestamp; events committed at or
+            before it are included.
+        limit: The maximum number of entries to return. None returns all.
+        pending_only: Skip entries that were completed at that time.
+        **filters: The filters accepted by manager.matches.
+
+    Returns:
+        The entries as dictionaries.
+
+    Raises:
+        ValueError: If the history doesn't reach back that far.
+    """
+    checkpoints = _require_manifest(filepath)["checkpoints"]
+    position = bisect.bisect_right([checkpoint["at"] for checkpoint in checkpoints], timestamp) - 1
+    if position < 0:
+        raise ValueError(f"The history of {filepath} starts at {checkpoints[0]['at']}; "
+                         f"nothing is recorded before that")
+    with _state(filepath, checkpoints[position], timestamp) as log:
+        return list(itertools.islice(log.ordered(pending_only, **filters), limit))
+
+
+def entry_history(filepath: str, id_or_prefix: str) -> List[dict]:
+    """
+    Returns the events of one entry, oldest first.
+
+    The first checkpoint that holds the entry is found by binary search;
+    only the segments from the one before it on are scanned for the events.
+
+    Args:
+        filepath: The path to the database file.
+        id_or_prefix: The ID of the entry or a unique prefix of it, as of now.
+
+    Returns:
+        {"seq", "at", "event", "entry"} per event, where event is 'added',
+        'completed' (once per completion) or 'baseline' (the entry was
+        there when the history starts) and entry is its state right after.
+
+    Raises:
+        index.UnknownIdError: If no entry matches.
+        ValueError: If the prefix is ambiguous.
+    """
+    # Imported here: the columnar backend builds on backends.py, which builds on this module
+    from . import columnar_backend
+    checkpoints = _require_manifest(filepath)["checkpoints"]
+    with _state(filepath, checkpoints[-1]) as log:
+        log_id = log.resolve(id_or_prefix)
+
+    lo, hi = 0, len(checkpoints)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        with columnar_backend.Snapshot(_checkpoint_path(filepath, checkpoints[mid]["seq"])) as snapshot:
+            holds = snapshot.row_of(log_id) is not None
+        if holds:
+            hi = mid
+        else:
+            lo = mid + 1
+
+    events = []
+    entry = None
+    if lo == 0:
+        with columnar_backend.Snapshot(_checkpoint_path(filepath, checkpoints[0]["seq"])) as snapshot:
+            entry = snapshot.entry(snapshot.row_of(log_id))
+        events.append({"seq": checkpoints[0]["seq"], "at": checkpoints[0]["at"], "event": "baseline", "entry": entry})
+    # The add is in the segment before the first checkpoint that holds the entry
+    for checkpoint in checkpoints[max(lo - 1, 0):]:
+        for event in storage.iter_records(_events_path(filepath, checkpoint["seq"])):
+            if event["op"] == "add" and event["entry"]["id"] == log_id and entry is None:
+                entry = event["entry"]
+                events.append({"seq": event["seq"], "at": event["at"], "event": "added", "entry": entry})
+            elif event["op"] == "complete" and event["id"] == log_id and entry is not None:
+                # Each completion with its own completer and time, not the entry's current ones
+                entry = dict(entry)
+                storage.apply_completion(entry, event)
+                events.append({"seq": event["seq"], "at": event["at"], "event": "completed", "entry": entry})
+    if entry is None:
+        raise ValueError(f"The history of {filepath} is missing the add event of {log_id}")
+    return events
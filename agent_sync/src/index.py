@@ -0,0 +1,843 @@
+"""
+Indexes that answer lookups and queries without deserializing the whole log.
+
+The snapshot is written one entry per line (see storage.save_logs), so every
+entry has a byte offset. Two sidecar indexes point into it:
+
+-   The ID index (status_log.json.idx) maps each ID to its offset. It is a
+    header line followed by fixed-width lines sorted by ID, so a lookup is a
+    binary search over a handful of seeks.
+-   The query index (status_log.json.qidx) holds the secondary indexes used
+    by `read` filters: offsets per (status, priority), per creator and per
+    role, plus a time-sorted index on created_timestamp.
+
+Both record the (inode, mtime_ns, size) of the snapshot they were built from
+and are rebuilt on first use after the snapshot changes. Entries that are
+still only in the journal are overlaid from memory; the journal stays small
+between compactions.
+"""
+import bisect
+import heapq
+import itertools
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from . import storage, manager, paging
+from .models import PRIORITY_MAP, STATUSES
+
+# Suffix of the ID index file that lives next to the snapshot.
+INDEX_SUFFIX = '.idx'
+
+# Shortest ID prefix that is resolved to a full ID, like short git hashes.
+MIN_PREFIX_LENGTH = 4
+
+# Width of the zero-padded byte offset column.
+_OFFSET_WIDTH = 12
+
+_decoder = json.JSONDecoder()
+
+
+def index_path(filepath: str) -> str:
+    """
+    Returns the path of the ID index that belongs to a snapshot file.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        The path to the ID index file.
+    """
+    return filepath + INDEX_SUFFIX
+
+
+def snapshot_signature(filepath: str) -> Optional[List[int]]:
+    """
+    Returns [inode, mtime_ns, size] of the snapshot, or None if it doesn't exist.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+    """
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+def log_version(filepath: str) -> List[Optional[List[int]]]:
+    """
+    Returns the signatures of the snapshot and its journal. Every write
+    changes at least one of them.
+
+    Args:
+        filepath: The path to the snapshot file.
+    """
+    return [snapshot_signature(filepath), snapshot_signature(storage.journal_path(filepath))]
+
+
+class UnknownIdError(ValueError):
+    """
+    Raised when no entry matches an ID or ID prefix.
+    """
+
+
+def resolve_id(id_or_prefix: str, candidates: Iterable[str]) -> str:
+    """
+    Resolves an ID or a unique ID prefix against a set of known IDs.
+
+    An exact match always wins. Otherwise the prefix must be at least
+    MIN_PREFIX_LENGTH characters long and match exactly one ID.
+
+    Args:
+        id_or_prefix: The full ID or a prefix of it.
+        candidates: The known IDs that start with id_or_prefix.
+
+    Returns:
+        The full ID.
+
+    Raises:
+        UnknownIdError: If no entry matches.
+        ValueError: If the prefix is ambiguous.
+    """
+    matches = sorted(set(candidates))
+    if id_or_prefix in matches:
+        return id_or_prefix
+    if len(matches) == 1 and len(id_or_prefix) >= MIN_PREFIX_LENGTH:
+        return matches[0]
+    if len(matches) > 1 and len(id_or_prefix) >= MIN_PREFIX_LENGTH:
+        shown = ', '.join(matches[:5])
+        raise ValueError(f"ID prefix '{id_or_prefix}' is ambiguous; it matches {shown}")
+    raise UnknownIdError(f"Log entry with ID '{id_or_prefix}' not found")
+
+
+def build_id_index(filepath: str) -> bool:
+    """
+    (Re)builds the ID index from the snapshot.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        True if the index was written, False if the snapshot is not stored
+        one entry per line and has to be compacted first, or is damaged
+        (see storage.snapshot_damage).
+    """
+    signature = snapshot_signature(filepath)
+    if storage.snapshot_damage(filepath):
+        # Lookups go through storage.load_logs, which skips what is damaged
+        return False
+    pairs = []
+    # Whether the snapshot is in 3-tier order, as compaction writes it
+    in_order = True
+    previous = None
+    try:
+        for offset, entry in storage.iter_snapshot(filepath):
+            pairs.append((entry["id"], offset))
+            key = manager.dict_sort_key(entry)
+            if previous is not None and key < previous:
+                in_order = False
+            previous = key
+    except ValueError:
+        return False
+    pairs.sort()
+
+    keys = [json.dumps(log_id) for log_id, _ in pairs]
+    width = max((len(key) for key in keys), default=2)
+    header = json.dumps({"snapshot": signature, "count": len(pairs), "width": width, "sorted": in_order})
+
+    directory = os.path.dirname(filepath) or '.'
+    fd, temp_path = storage.temp_file(directory, '.idx.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='ascii') as f:
+            f.write(header + '\n')
+            for key, (_, offset) in zip(keys, pairs):
+                f.write(f"{key:<{width}} {offset:0{_OFFSET_WIDTH}d}\n")
+        os.replace(temp_path, index_path(filepath))
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return True
+
+
+class IdIndex:
+    """
+    Resolves IDs (or unique prefixes) and fetches single entries.
+
+    The snapshot part is answered from the on-disk ID index; the journal is
+    replayed into memory when the index is opened. Writers that batch several
+    operations call apply() so later lookups see the earlier ones.
+    If the snapshot can't be indexed, the whole log is loaded instead.
+
+    Attributes:
+        indexed (bool): Whether lookups use the on-disk index.
+        sorted (bool): Whether the snapshot is stored in 3-tier order.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.indexed = self._open_index()
+
+        # Entries added through the journal, with their completions applied
+        self._added: Dict[str, dict] = {}
+        # Latest journaled completion for entries that live in the snapshot
+        self._completions: Dict[str, dict] = {}
+
+        if self.indexed:
+            for record in storage.iter_journal(filepath):
+                self.apply(record)
+        else:
+            for entry in storage.load_logs(filepath):
+                self._added[entry["id"]] = entry
+
+    def _open_index(self) -> bool:
+        """
+        Loads the index header, rebuilding the index if it is stale.
+        """
+        signature = snapshot_signature(self.filepath)
+        self._count = 0
+        self.sorted = signature is None
+        if signature is None:
+            return True
+
+        for attempt in range(2):
+            try:
+                with open(index_path(self.filepath), 'rb') as f:
+                    header_line = f.readline()
+                header = json.loads(header_line)
+                if header["snapshot"] == signature:
+                    self._count = header["count"]
+                    self._width = header["width"]
+                    self.sorted = header["sorted"]
+                    self._data_start = len(header_line)
+                    self._line_length = self._width + 1 + _OFFSET_WIDTH + 1
+                    return True
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+            if attempt == 0 and not build_id_index(self.filepath):
+                return False
+        return False
+
+    def _line(self, f, position: int):
+        """
+        Returns the (id, offset) stored at a position of the index.
+        """
+        f.seek(self._data_start + position * self._line_length)
+        line = f.read(self._line_length).decode('ascii')
+        log_id, _ = _decoder.raw_decode(line)
+        return log_id, int(line[self._width + 1:self._width + 1 + _OFFSET_WIDTH])
+
+    def _snapshot_matches(self, prefix: str, limit: int) -> List[tuple]:
+        """
+        Binary searches the index for IDs starting with prefix.
+        """
+        if not self.indexed or self._count == 0:
+            return []
+        matches = []
+        with open(index_path(self.filepath), 'rb') as f:
+            lo, hi = 0, self._count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._line(f, mid)[0] < prefix:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            while lo < self._count and len(matches) < limit:
+                log_id, offset = self._line(f, lo)
+                if not log_id.startswith(prefix):
+                    break
+                matches.append((log_id, offset))
+                lo += 1
+        return matches
+
+    def resolve(self, id_or_prefix: str) -> str:
+        """
+        Resolves an ID or unique prefix to the full ID (see resolve_id).
+
+        Raises:
+            ValueError: If no entry matches, or the prefix is ambiguous.
+        """
+        if id_or_prefix in self._added:
+            return id_or_prefix
+        # Six candidates are enough to tell unique from ambiguous and to list a few
+        candidates = [log_id for log_id, _ in self._snapshot_matches(id_or_prefix, 6)]
+        candidates += [log_id for log_id in self._added if log_id.startswith(id_or_prefix)]
+        return resolve_id(id_or_prefix, candidates)
+
+    def get(self, log_id: str) -> Optional[dict]:
+        """
+        Returns the current state of an entry, or None if there is no such ID.
+
+        Args:
+            log_id: The full ID of the entry.
+        """
+        if log_id in self._added:
+            return self._added[log_id]
+
+        offset = self.offset_of(log_id)
+        if offset is None:
+            return None
+        entry = storage.read_snapshot_entry(self.filepath, offset)
+        if log_id in self._completions:
+            storage.apply_completion(entry, self._completions[log_id])
+        return entry
+
+    def offset_of(self, log_id: str) -> Optional[int]:
+        """
+        Returns the snapshot offset of an entry, or None if it isn't in the snapshot.
+
+        Args:
+            log_id: The full ID of the entry.
+        """
+        matches = self._snapshot_matches(log_id, 1)
+        if not matches or matches[0][0] != log_id:
+            return None
+        return matches[0][1]
+
+    def apply(self, record: dict) -> None:
+        """
+        Applies a journal record to the in-memory overlay.
+
+        Args:
+            record: The journal record (see storage.add_record/complete_record).
+        """
+        if record.get("op") == "add":
+            self._added.setdefault(record["entry"]["id"], record["entry"])
+        elif record.get("op") == "complete":
+            if record["id"] in self._added:
+                storage.apply_completion(self._added[record["id"]], record)
+            else:
+                self._completions[record["id"]] = record
+
+
+def _merge_journal(snapshot: Iterable[dict], id_index: IdIndex) -> Iterator[dict]:
+    """
+    Merges the entries of a sorted snapshot with the journal in 3-tier order.
+
+    Each entry is ranked by its sort key plus its load position (snapshot
+    line, then journal order), the same order as a stable sort of load_logs.
+    Journaled adds are kept in a heap. A snapshot entry completed in the
+    journal can only move towards the end, so it is pushed onto the heap
+    when the stream reaches it.
+    """
+    added = id_index._added
+    completions = id_index._completions
+    heap = [
+        (manager.dict_sort_key(entry) + (id_index._count + i,), entry)
+        for i, entry in enumerate(added.values())
+    ]
+    heapq.heapify(heap)
+    # Journaled adds that were already folded into the snapshot (see storage._replay_journal)
+    replayed = set()
+
+    for position, entry in enumerate(snapshot):
+        if entry["id"] in added:
+            replayed.add(entry["id"])
+        if entry["id"] in completions:
+            storage.apply_completion(entry, completions[entry["id"]])
+            heapq.heappush(heap, (manager.dict_sort_key(entry) + (position,), entry))
+            continue
+        if heap:
+            key = manager.dict_sort_key(entry) + (position,)
+            while heap and heap[0][0] < key:
+                yield from _unless_replayed(heapq.heappop(heap)[1], replayed)
+        yield entry
+
+    while heap:
+        yield from _unless_replayed(heapq.heappop(heap)[1], replayed)
+
+
+def _unless_replayed(entry: dict, replayed: set) -> Iterator[dict]:
+    """
+    Yields a journaled entry unless the snapshot already had it. The snapshot
+    copy has the same key and an earlier position, so it was yielded first.
+    """
+    if entry["id"] not in replayed:
+        yield entry
+
+
+def iter_ordered(filepath: str, pending_only: bool = False,
+                 parse_whole: bool = False) -> Optional[Iterator[dict]]:
+    """
+    Streams the entries in 3-tier order without sorting the log.
+
+    Compaction keeps the snapshot in 3-tier order, so it is read line by
+    line and only the journal is merged in: memory stays flat however large
+    the log is. The order equals manager.select_logs over
+    storage.load_logs, ties included. The caller must hold the lock (shared
+    or exclusive) until the stream is exhausted or closed.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        pending_only: Stop at the first completed entry.
+        parse_whole: Parse the snapshot in one go instead, which is faster
+            when every entry is needed and memory doesn't matter.
+
+    Returns:
+        An iterator over the entries as dictionaries, or None if the snapshot
+        is not stored in 3-tier order (e.g. written by an older version) and
+        the caller has to sort the log itself.
+    """
+    id_index = IdIndex(filepath)
+    if not id_index.indexed or not id_index.sorted:
+        return None
+
+    if parse_whole:
+        snapshot = storage.load_snapshot(filepath)
+    else:
+        snapshot = (entry for _, entry in storage.iter_snapshot(filepath))
+    stream = _merge_journal(snapshot, id_index)
+    if pending_only:
+        return itertools.takewhile(lambda entry: entry["status"] == "pending", stream)
+    return stream
+
+
+def iter_after(filepath: str, after: Optional[tuple] = None, pending_only: bool = False,
+               **filters) -> Optional[Iterator[dict]]:
+    """
+    Streams the entries that match the filters in page order (3-tier
+    order, ties by ID; see paging.py), strictly after a page key.
+
+    The snapshot is not read up to the key: every (status, priority)
+    range the filters allow is found by a binary search over the sorted
+    snapshot (see storage.iter_snapshot_ranges). Journaled adds and the
+    snapshot entries completed in the journal are merged in. The caller
+    must hold the lock (shared or exclusive) until the stream is
+    exhausted or closed.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        after: The page key to start after, or None to start at the beginning.
+        pending_only: Skip completed entries.
+        **filters: The filters accepted by manager.matches.
+
+    Returns:
+        An iterator over the entries as dictionaries, or None if the
+        snapshot is not stored in 3-tier order and the caller has to sort
+        the log itself.
+    """
+    id_index = IdIndex(filepath)
+    if not id_index.indexed or not id_index.sorted:
+        return None
+
+    def wanted(entry: dict) -> bool:
+        return (not pending_only or entry["status"] == "pending") and manager.matches(entry, **filters)
+
+    completions = id_index._completions
+    extras = [entry for entry in id_index._added.values() if wanted(entry)]
+    for log_id in completions:
+        # Completed entries moved away from their snapshot line
+        entry = id_index.get(log_id)
+        if entry is not None and wanted(entry):
+            extras.append(entry)
+
+    ranges = paging.seek_ranges(after, pending_only, filters.get('status'), filters.get('priority'),
+                                filters.get('since'), filters.get('until'))
+    snapshot = (
+        entry for entry in storage.iter_snapshot_ranges(filepath, ranges)
+        if entry["id"] not in completions and manager.matches(entry, **filters)
+    )
+    return paging.merge_after(after, snapshot, extras)
+
+
+def ordered(filepath: str, limit: Optional[int] = None, pending_only: bool = False) -> Optional[List[dict]]:
+    """
+    Returns the entries in 3-tier order without sorting the log (see
+    iter_ordered). With a limit or pending_only, reading stops as soon as
+    the result is complete and the rest of the snapshot is never parsed.
+    The caller must hold the lock (shared or exclusive).
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        limit: The maximum number of entries to return. None returns all.
+        pending_only: Stop at the first completed entry.
+
+    Returns:
+        The entries as dictionaries, or None if the caller has to sort the
+        log itself.
+    """
+    # Every entry is needed: parsing the file in one go is faster than line by line
+    stream = iter_ordered(filepath, pending_only, parse_whole=limit is None and not pending_only)
+    if stream is None:
+        return None
+    # Dropping the stream closes the snapshot file when reading stopped early
+    return list(itertools.islice(stream, limit))
+
+
+# Suffix of the query index file (secondary indexes) that lives next to the snapshot.
+QUERY_INDEX_SUFFIX = '.qidx'
+
+# Names of the query filters answered by the secondary indexes.
+FILTER_KEYS = ('status', 'priority', 'creator', 'role', 'since', 'until')
+
+# One line of the on-disk time index: signed timestamp and snapshot offset.
+_TIME_LINE = "{:+014d} {:0" + str(_OFFSET_WIDTH) + "d}\n"
+_TIME_LINE_LENGTH = 14 + 1 + _OFFSET_WIDTH + 1
+
+
+def query_index_path(filepath: str) -> str:
+    """
+    Returns the path of the query index that belongs to a snapshot file.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        The path to the query index file.
+    """
+    return filepath + QUERY_INDEX_SUFFIX
+
+
+def _time_key(item: tuple) -> int:
+    return item[0]
+
+
+class SecondaryIndex:
+    """
+    In-memory secondary indexes over a set of entries.
+
+    Entries are identified by an opaque key (the ID for the server, the
+    snapshot offset for the on-disk index). There are buckets per
+    (status, priority), per creator and per role, and a list of
+    (created_timestamp, key) pairs sorted by time.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[str, set] = {}
+        self.creators: Dict[str, set] = {}
+        self.roles: Dict[str, set] = {}
+        self.times: List[tuple] = []
+
+    @classmethod
+    def from_entries(cls, pairs: Iterable[tuple]) -> 'SecondaryIndex':
+        """
+        Builds the indexes from (key, entry dictionary) pairs.
+        """
+        secondary = cls()
+        for key, entry in pairs:
+            secondary._add_to_sets(key, entry)
+            secondary.times.append((entry["created_timestamp"], key))
+        # One sort instead of an insort per entry
+        secondary.times.sort(key=_time_key)
+        return secondary
+
+    def _add_to_sets(self, key, entry: dict) -> None:
+        self.buckets.setdefault(f"{entry['status']}:{entry['priority']}", set()).add(key)
+        self.creators.setdefault(entry["creator"], set()).add(key)
+        self.roles.setdefault(entry["creator_role"], set()).add(key)
+
+    def add(self, key, entry: dict) -> None:
+        """
+        Indexes a new entry.
+        """
+        self._add_to_sets(key, entry)
+        bisect.insort_right(self.times, (entry["created_timestamp"], key), key=_time_key)
+
+    def complete(self, key, entry: dict) -> None:
+        """
+        Moves an entry from its pending bucket to the completed one.
+        """
+        self.buckets.get(f"pending:{entry['priority']}", set()).discard(key)
+        self.buckets.setdefault(f"completed:{entry['priority']}", set()).add(key)
+
+    def lookup(self, status: Optional[List[str]] = None, priority: Optional[List[str]] = None,
+               creator: Optional[List[str]] = None, role: Optional[List[str]] = None,
+               since: Optional[int] = None, until: Optional[int] = None) -> Optional[set]:
+        """
+        Returns the keys of the entries that can match the filters.
+
+        The smallest of the filtered indexes drives the lookup and the other
+        bucket filters are applied by set membership, so the cost follows
+        the size of the smallest candidate set, not the log. The time range
+        is only applied when it drives the lookup; callers re-check every
+        entry with manager.matches anyway.
+
+        Returns:
+            A set of keys, or None if no filter was given.
+        """
+        options = []
+        if status is not None or priority is not None:
+            options.append([
+                self.buckets.get(f"{s}:{p}", set())
+                for s in (status or STATUSES) for p in (priority or PRIORITY_MAP)
+            ])
+        if creator is not None:
+            options.append([self.creators.get(name, set()) for name in creator])
+        if role is not None:
+            options.append([self.roles.get(name, set()) for name in role])
+
+        time_range = None
+        if since is not None or until is not None:
+            lo = 0 if since is None else bisect.bisect_left(self.times, since, key=_time_key)
+            hi = len(self.times) if until is None else bisect.bisect_left(self.times, until, key=_time_key)
+            time_range = (lo, max(lo, hi))
+
+        if not options and time_range is None:
+            return None
+
+        sizes = [sum(len(s) for s in sets) for sets in options]
+        if time_range is not None and (not sizes or time_range[1] - time_range[0] <= min(sizes)):
+            keys = {key for _, key in self.times[time_range[0]:time_range[1]]}
+            others = options
+        else:
+            driving = sizes.index(min(sizes))
+            keys = set().union(*options[driving])
+            others = options[:driving] + options[driving + 1:]
+
+        for sets in others:
+            keys = {key for key in keys if any(key in s for s in sets)}
+        return keys
+
+
+def build_query_index(filepath: str) -> bool:
+    """
+    (Re)builds the on-disk query index from the snapshot.
+
+    Layout: a JSON header line, then one JSON list of snapshot offsets per
+    bucket/creator/role value, then the time index as fixed-width
+    (timestamp, offset) lines sorted by time. The header records where each
+    part starts (relative to the end of the header) and how many offsets it
+    holds, so a query reads only the lists it needs and binary searches
+    the time index on disk.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        True if the index was written, False if the snapshot is not stored
+        one entry per line or is damaged.
+    """
+    signature = snapshot_signature(filepath)
+    if storage.snapshot_damage(filepath):
+        return False
+    try:
+        secondary = SecondaryIndex.from_entries(storage.iter_snapshot(filepath))
+    except ValueError:
+        return False
+
+    lists = {}
+    blobs = []
+    position = 0
+    for prefix, groups in (("bucket", secondary.buckets), ("creator", secondary.creators),
+                           ("role", secondary.roles)):
+        for value, keys in groups.items():
+            blob = (json.dumps(sorted(keys)) + '\n').encode('utf-8')
+            lists[f"{prefix}:{value}"] = [position, len(blob), len(keys)]
+            blobs.append(blob)
+            position += len(blob)
+
+    header = {
+        "snapshot": signature,
+        "lists": lists,
+        "times": [position, len(secondary.times)],
+    }
+
+    directory = os.path.dirname(filepath) or '.'
+    fd, temp_path = storage.temp_file(directory, '.qidx.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write((json.dumps(header, ensure_ascii=False) + '\n').encode('utf-8'))
+            for blob in blobs:
+                f.write(blob)
+            f.write(''.join(_TIME_LINE.format(ts, offset) for ts, offset in secondary.times).encode('ascii'))
+        os.replace(temp_path, query_index_path(filepath))
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return True
+
+
+class QueryIndex:
+    """
+    Reader for the on-disk query index of the snapshot (see build_query_index).
+    Rebuilt on first use after the snapshot changes.
+
+    Attributes:
+        indexed (bool): Whether the snapshot could be indexed.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.indexed = self._open()
+
+    def _open(self) -> bool:
+        signature = snapshot_signature(self.filepath)
+        self._lists = {}
+        self._times = (0, 0)
+        self._data_start = 0
+        if signature is None:
+            return True
+
+        for attempt in range(2):
+            try:
+                with open(query_index_path(self.filepath), 'rb') as f:
+                    header_line = f.readline()
+                header = json.loads(header_line)
+                if header["snapshot"] == signature:
+                    self._lists = header["lists"]
+                    self._times = tuple(header["times"])
+                    self._data_start = len(header_line)
+                    return True
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+            if attempt == 0 and not build_query_index(self.filepath):
+                return False
+        return False
+
+    def _read_list(self, f, name: str) -> List[int]:
+        if name not in self._lists:
+            return []
+        start, length, _ = self._lists[name]
+        f.seek(self._data_start + start)
+        return json.loads(f.read(length))
+
+    def _time_at(self, f, position: int) -> tuple:
+        f.seek(self._data_start + self._times[0] + position * _TIME_LINE_LENGTH)
+        line = f.read(_TIME_LINE_LENGTH)
+        return int(line[:14]), int(line[15:15 + _OFFSET_WIDTH])
+
+    def _time_bisect(self, f, timestamp: int) -> int:
+        lo, hi = 0, self._times[1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._time_at(f, mid)[0] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, status: Optional[List[str]] = None, priority: Optional[List[str]] = None,
+               creator: Optional[List[str]] = None, role: Optional[List[str]] = None,
+               since: Optional[int] = None, until: Optional[int] = None) -> Optional[List[int]]:
+        """
+        Returns the snapshot offsets of the entries that can match the
+        filters, using only the smallest filtered index. The entries must
+        still be checked with manager.matches.
+
+        Returns:
+            A sorted list of offsets, or None if no filter was given.
+        """
+        options = []
+        if status is not None or priority is not None:
+            options.append([f"bucket:{s}:{p}" for s in (status or STATUSES) for p in (priority or PRIORITY_MAP)])
+        if creator is not None:
+            options.append([f"creator:{name}" for name in creator])
+        if role is not None:
+            options.append([f"role:{name}" for name in role])
+
+        if not any(value is not None for value in (status, priority, creator, role, since, until)):
+            return None
+        if not self._times[1]:
+            # Empty or missing snapshot
+            return []
+
+        with open(query_index_path(self.filepath), 'rb') as f:
+            time_range = None
+            if since is not None or until is not None:
+                lo = 0 if since is None else self._time_bisect(f, since)
+                hi = self._times[1] if until is None else self._time_bisect(f, until)
+                time_range = (lo, max(lo, hi))
+
+            sizes = [sum(self._lists.get(name, (0, 0, 0))[2] for name in names) for names in options]
+            if time_range is not None and (not sizes or time_range[1] - time_range[0] <= min(sizes)):
+                lo, hi = time_range
+                f.seek(self._data_start + self._times[0] + lo * _TIME_LINE_LENGTH)
+                data = f.read((hi - lo) * _TIME_LINE_LENGTH)
+                return sorted(
+                    int(data[i + 15:i + 15 + _OFFSET_WIDTH])
+                    for i in range(0, len(data), _TIME_LINE_LENGTH)
+                )
+
+            names = options[sizes.index(min(sizes))]
+            offsets = set()
+            for name in names:
+                offsets.update(self._read_list(f, name))
+            return sorted(offsets)
+
+
+def journal_overlay(filepath: str) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """
+    Replays the journal into the entries it added and the completions of
+    snapshot entries.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        A tuple of (added, completions): the journaled entries by ID, with
+        their completions applied, and the latest completion record by ID
+        for entries that live in the snapshot.
+    """
+    return replay_overlay(storage.iter_journal(filepath))
+
+
+def replay_overlay(records: Iterable[dict]) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """
+    Replays journal records (or history events) into an overlay like
+    journal_overlay's.
+
+    Args:
+        records: The records in the order they were appended.
+
+    Returns:
+        A tuple of (added, completions), see journal_overlay.
+    """
+    added = {}
+    completions = {}
+    for record in records:
+        if record.get("op") == "add":
+            added.setdefault(record["entry"]["id"], record["entry"])
+        elif record.get("op") == "complete":
+            if record["id"] in added:
+                storage.apply_completion(added[record["id"]], record)
+            else:
+                completions[record["id"]] = record
+    return added, completions
+
+
+def query(filepath: str, **filters) -> List[dict]:
+    """
+    Returns the entries that match the query filters, with the journal
+    applied, in storage order (so manager.select_logs orders ties exactly
+    like sort_logs over the whole log).
+
+    Snapshot candidates come from the query index; journaled adds are
+    filtered in memory. Snapshot entries completed in the journal are looked
+    up through the ID index, since their status in the query index is stale.
+    The caller must hold the lock (shared or exclusive).
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        **filters: The filters accepted by manager.matches.
+
+    Returns:
+        The matching entries as dictionaries.
+    """
+    query_index = QueryIndex(filepath)
+    offsets = query_index.lookup(**filters) if query_index.indexed else None
+    if offsets is None:
+        return manager.filter_logs(storage.load_logs(filepath), **filters)
+
+    added, completions = journal_overlay(filepath)
+    snapshot_entries = dict(zip(offsets, storage.read_snapshot_entries(filepath, offsets)))
+
+    if completions and (filters.get('status') is None or 'completed' in filters['status']):
+        # Entries that were pending in the snapshot may have become matches
+        id_index = IdIndex(filepath)
+        for log_id in completions:
+            offset = id_index.offset_of(log_id)
+            if offset is not None and offset not in snapshot_entries:
+                snapshot_entries[offset] = storage.read_snapshot_entry(filepath, offset)
+
+    results = []
+    for offset in sorted(snapshot_entries):
+        entry = snapshot_entries[offset]
+        if entry["id"] in added:
+            # Replayed add of an entry that is already in the snapshot
+            continue
+        if entry["id"] in completions:
+            storage.apply_completion(entry, completions[entry["id"]])
+        results.append(entry)
+    results.extend(added.values())
+    return manager.filter_logs(results, **filters)
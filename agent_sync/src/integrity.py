@@ -0,0 +1,167 @@
+"""
+Finds damage in a log (`verify`) and rewrites it from what is intact (`repair`).
+
+Every file of a log carries checksums that tell damage apart from a write
+torn by a crash:
+
+-   journal records and history events end with the CRC32 of their line
+    (see storage.encode_record);
+-   the JSON snapshot has a CRC32 per storage.SUM_BLOCK_BYTES block, kept
+    in status_log.json.sums (see storage.save_logs);
+-   columnar snapshots and history checkpoints have one per column in
+    their header (see columnar_backend.check_snapshot);
+-   archive segments are gzip members, which end with the CRC32 of their data.
+
+verify reads every file once, a block or a line at a time, so its memory
+doesn't grow with the log. Until a damaged log is repaired, reads skip the
+damaged entries and the snapshot is not rewritten without them (see
+storage.CorruptLogError).
+
+repair rewrites the snapshot from the intact entries with the journal
+replayed, and restores the damaged ones from the history (see history.py):
+its last checkpoint with the events after it holds every entry as of the
+last write. The damaged files are copied aside first.
+"""
+import os
+import time
+from typing import Callable, List, Optional, Tuple
+from . import storage, archive, history
+
+# Suffix of the copy a damaged file is saved to before repair rewrites it.
+BACKUP_SUFFIX = '.damaged'
+
+
+def verify(filepath: str, check_snapshot: Callable[[str], dict]) -> dict:
+    """
+    Checks every file of a log against its checksums. The caller must
+    hold the lock (shared or exclusive).
+
+    Args:
+        filepath: The path to the database file.
+        check_snapshot: Checks the snapshot in the backend's format (e.g.
+            storage.check_snapshot), returning {"bytes", "entries",
+            "damaged": [(start, end, reason), ...], "checksummed"}.
+
+    Returns:
+        {"status": "success" or "error", "path", "files", "bytes",
+        "entries", "damaged", "unchecked"}: the number of files and bytes
+        read, the entries in the snapshot and added by the journal,
+        {"file", "start", "end", "reason"} per damaged byte range, and the
+        files written by an older version without checksums.
+    """
+    # Imported here: the columnar backend builds on backends.py, which builds on this module
+    from . import columnar_backend
+    files = []
+    entries = 0
+    # A log that has only been appended to has no snapshot yet
+    if os.path.exists(filepath):
+        files.append((filepath, check_snapshot(filepath)))
+        entries = files[0][1]["entries"]
+    journal = storage.journal_path(filepath)
+    if os.path.exists(journal):
+        files.append((journal, storage.check_records(journal)))
+        entries += files[-1][1]["adds"]
+    for name in archive.list_segments(filepath):
+        files.append((os.path.join(archive.archive_dir(filepath), name + archive.SEGMENT_EXTENSION),
+                      archive.check_segment(filepath, name)))
+    for checkpoint, events in history.segments(filepath):
+        files.append((checkpoint, columnar_backend.check_snapshot(checkpoint)))
+        if os.path.exists(events):
+            files.append((events, storage.check_records(events)))
+
+    damaged = [
+        {"file": path, "start": start, "end": end, "reason": reason}
+        for path, result in files for start, end, reason in result["damaged"]
+    ]
+    return {
+        "status": "error" if damaged else "success",
+        "path": filepath,
+        "files": len(files),
+        "bytes": sum(result["bytes"] for _, result in files),
+        "entries": entries,
+        "damaged": damaged,
+        "unchecked": [path for path, result in files
+                      if not result.get("checksummed", True) or result.get("unchecked")],
+    }
+
+
+def _history_intact(filepath: str) -> bool:
+    """
+    Returns whether the last checkpoint of the history and its events
+    pass their checksums, so history.latest can be trusted.
+    """
+    # Imported here, like in verify
+    from . import columnar_backend
+    files = history.segments(filepath)
+    if not files:
+        return False
+    checkpoint, events = files[-1]
+    return not columnar_backend.check_snapshot(checkpoint)["damaged"] and not storage.read_records(events)[1]
+
+
+def repair(filepath: str, salvage: Callable[[], Tuple[List[dict], List[Tuple[str, int, int]]]],
+           write: Callable[[List[dict]], None], force: bool = False) -> dict:
+    """
+    Rewrites a damaged log from its intact entries, restoring the damaged
+    ones from the history. Does nothing to a log that is intact. The
+    caller must hold the exclusive lock.
+
+    Without an intact history the damaged entries can't be restored, so
+    the log is only rewritten with force. Either way every intact entry
+    is written back.
+
+    Args:
+        filepath: The path to the database file.
+        salvage: Returns the intact entries of the log with the journal
+            replayed, and (path, start, end) per damaged byte range (e.g.
+            storage.read_logs).
+        write: Stores the entries as the new snapshot and removes the journal.
+        force: Rewrite the log even without an intact history.
+
+    Returns:
+        {"status": "success", "path", "repaired", "damaged", "recovered",
+        "history", "backups"}: whether anything was rewritten, the number
+        of damaged byte ranges, how many entries the history restored,
+        whether there was an intact history to restore them from (without
+        one, the damaged entries are lost), and the copies of the damaged
+        files.
+
+    Raises:
+        ValueError: If there is no intact history and force is not set.
+    """
+    entries, damaged = salvage()
+    result = {"status": "success", "path": filepath, "repaired": False, "damaged": len(damaged),
+              "recovered": 0, "history": False, "backups": []}
+    if not damaged:
+        return result
+
+    latest: Optional[List[dict]] = history.latest(filepath) if _history_intact(filepath) else None
+    if latest is None and not force:
+        raise ValueError(f"{filepath} has no intact history to restore its damaged entries from; "
+                         f"`repair --force` rewrites it from its {len(entries)} intact entries and the "
+                         f"damaged ones are lost (the damaged files are kept as backups)")
+    if latest is not None:
+        result["history"] = True
+        by_id = {entry["id"]: entry for entry in entries}
+        archived = {entry["id"] for name in archive.list_segments(filepath)
+                    for entry in archive.iter_segment(filepath, name)}
+        for entry in latest:
+            current = by_id.get(entry["id"])
+            if current is None and entry["id"] not in archived:
+                entries.append(entry)
+                result["recovered"] += 1
+            elif current is not None and current["status"] == "pending" and entry["status"] == "completed":
+                # The completion was in a damaged journal record
+                current.update(entry)
+                result["recovered"] += 1
+
+    # Imported here: only repair pays for it
+    import shutil
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    for path in sorted({path for path, _, _ in damaged}):
+        backup = f"{path}{BACKUP_SUFFIX}-{stamp}"
+        shutil.copyfile(path, backup)
+        result["backups"].append(backup)
+    write(entries)
+    result["repaired"] = True
+    return result
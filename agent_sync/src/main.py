@@ -1,26 +1,138 @@
 """
 The CLI Entry point for the Project Status Log tool.
+
+Agents run the CLI once per command, often in tight loops, so on a small
+log most of a command's time is interpreter startup. The common commands
+(add, read, complete, stats) are parsed by parse_fast without argparse,
+and the modules only some commands need (argparse, uuid, socket, datetime,
+gzip, sqlite3, ...) are imported where they are used, like this package's
+own modules for the other commands (commit, follow, archive, workspace,
+client, ...). The startup test in tests/test_main.py keeps them out of the
+common commands.
 """
-import argparse
 import json
+import os
 import sys
-from . import storage, manager, models
+import types
+from typing import Callable, List, Optional, Tuple
+from . import manager, models, index, backends, storage, timings, output
 
 # The default path to the JSON database file.
 DEFAULT_DB_PATH = "./status_log.json"
 
+# The default path to the database file when the SQLite backend is configured.
+DEFAULT_SQLITE_PATH = "./status_log.db"
+
+# Set this environment variable to 'sqlite' to use DEFAULT_SQLITE_PATH (default: 'json').
+BACKEND_ENV = "AGENT_SYNC_BACKEND"
+
+# Set this environment variable to a database file or workspace to use it instead of the defaults.
+DB_ENV = "AGENT_SYNC_DB"
+
+# Lock waits at least this long are reported in the human readable output.
+LOCK_WAIT_REPORT_MS = 10
+
+# Set this environment variable to bypass a running server and always work on the file directly.
+NO_SERVER_ENV = "AGENT_SYNC_NO_SERVER"
+
+# Set this environment variable to a file path to run the command under cProfile and dump the stats there.
+PROFILE_ENV = "AGENT_SYNC_PROFILE"
+
+
+def default_db_path() -> str:
+    """
+    Returns the database selected by the DB_ENV environment variable, or
+    else the default file of the backend selected by BACKEND_ENV.
+
+    Raises:
+        ValueError: If the variable names an unknown backend.
+    """
+    if os.environ.get(DB_ENV):
+        return os.environ[DB_ENV]
+    backend = os.environ.get(BACKEND_ENV, 'json').lower()
+    if backend == 'json':
+        return DEFAULT_DB_PATH
+    if backend == 'sqlite':
+        return DEFAULT_SQLITE_PATH
+    raise ValueError(f"Invalid {BACKEND_ENV}: {backend}. Must be one of ['json', 'sqlite']")
+
 
-def parse_arguments() -> argparse.Namespace:
+def _parse_time(value: str) -> int:
     """
-    Defines and parses CLI arguments for subcommands: add, read, complete.
+    Parses a --since/--until/--as-of value: a Unix timestamp or an ISO 8601
+    date or date-time (local time unless it carries a UTC offset).
+
+    Args:
+        value: The command line value.
+
+    Returns:
+        The Unix timestamp.
+
+    Raises:
+        ValueError: If the value is neither.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    # Imported here: most command lines give Unix timestamps, if any
+    import datetime
+    try:
+        return int(datetime.datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        raise ValueError(f"invalid time {value!r}; use a Unix timestamp or ISO 8601")
+
+
+def _time_argument(value: str) -> int:
+    """
+    _parse_time as an argparse type, so argparse reports its message.
+    """
+    # Imported already by parse_arguments
+    import argparse
+    try:
+        return _parse_time(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _add_filter_arguments(parser: 'argparse.ArgumentParser') -> None:
+    """
+    Adds the query filter options (see index.FILTER_KEYS) to a subcommand.
+    """
+    parser.add_argument('--status', action='append', choices=list(models.STATUSES),
+                        help='Only entries with this status (repeatable)')
+    parser.add_argument('--priority', action='append', choices=list(models.PRIORITY_MAP),
+                        help='Only entries with this priority (repeatable)')
+    parser.add_argument('--creator', action='append',
+                        help='Only entries created by this user (repeatable)')
+    parser.add_argument('--role', action='append', choices=list(models.ROLES),
+                        help='Only entries whose creator has this role (repeatable)')
+    parser.add_argument('--since', type=_time_argument, metavar='TIME',
+                        help='Only entries created at or after TIME (Unix timestamp or ISO 8601)')
+    parser.add_argument('--until', type=_time_argument, metavar='TIME',
+                        help='Only entries created before TIME (Unix timestamp or ISO 8601)')
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> types.SimpleNamespace:
+    """
+    Defines and parses CLI arguments for subcommands: add, read, search,
+    complete, stats, history, archive, verify, repair, migrate, init, serve.
+    Invalid arguments and -h exit here, with argparse's messages.
+
+    Args:
+        argv: The arguments after the program name (default: sys.argv[1:]).
 
     Returns:
         The parsed arguments as a namespace object.
     """
+    # Imported here: the common commands are parsed by parse_fast
+    import argparse
+    # For their defaults in the help
+    from . import archive, follow, paging, search, workspace
     parser = argparse.ArgumentParser(
         description="AI Project Status Log Tool - Manage tasks across AI agents"
     )
-    
+
     # Global flag for JSON output
     # This is crucial for Agent integration, allowing them to parse the output reliably.
     parser.add_argument(
@@ -28,128 +140,997 @@ def parse_arguments() -> argparse.Namespace:
         action='store_true',
         help='Output results as JSON for agent parsing'
     )
-    
+
+    # Global database path: a JSON, SQLite or columnar file, or a workspace directory
+    parser.add_argument(
+        '--db',
+        metavar='PATH',
+        help='The log to work on: a JSON file, a .db/.sqlite/.sqlite3 file, a .cols file or a workspace directory '
+             f'(default: ${DB_ENV}, else {DEFAULT_DB_PATH} or {DEFAULT_SQLITE_PATH} per ${BACKEND_ENV})'
+    )
+
+    # Global durability level of the writes (default: $AGENT_SYNC_DURABILITY or 'full')
+    parser.add_argument(
+        '--durability',
+        choices=storage.DURABILITY_LEVELS,
+        help="none: leave flushing to the OS (fastest), file: fsync the data, "
+             f"full: also fsync the directory (default: ${storage.DURABILITY_ENV} or {storage.DEFAULT_DURABILITY})"
+    )
+
+    # Global layout of the JSON output; implies --json
+    parser.add_argument(
+        '--format',
+        choices=output.FORMATS,
+        help='Layout of the JSON output (implies --json): indented, compact or one entry per line '
+             f'(default: {output.DEFAULT_FORMAT})'
+    )
+
+    # Global flag for the per-phase timings of the command
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        help='Report the time spent per phase (load, decode, model, select, serialize, write, fsync, lock wait); '
+             'with --json as meta.timings'
+    )
+
     # Create subcommands
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
-    
+
     # 'add' command
     add_parser = subparsers.add_parser('add', help='Add a new log entry')
-    add_parser.add_argument('--desc', required=True, help='Description of the task')
-    add_parser.add_argument('--priority', required=True, 
-                           choices=['tier0', 'tier1', 'tier2', 'tier3'],
+    add_parser.add_argument('--desc', help='Description of the task')
+    add_parser.add_argument('--priority',
+                           choices=list(models.PRIORITY_MAP),
                            help='Priority tier (tier0=critical, tier3=weak)')
-    add_parser.add_argument('--user', required=True, help='Creator name')
-    add_parser.add_argument('--role', required=True,
-                           choices=['planner', 'engineer', 'user'],
+    add_parser.add_argument('--user', help='Creator name')
+    add_parser.add_argument('--role',
+                           choices=list(models.ROLES),
                            help='Creator role')
-    
+    add_parser.add_argument('--batch', metavar='FILE',
+                           help='Add every NDJSON record in FILE ("-" for stdin) in one write. '
+                                'Records have desc, priority, user and role keys (and project); '
+                                '--user/--role/--project are used when a record omits them')
+    add_parser.add_argument('--project',
+                           help='The project of the entry, in a workspace sharded by project '
+                                '(a new project gets its own shard)')
+
     # 'read' command
     read_parser = subparsers.add_parser('read', help='Read and display all log entries (sorted)')
-    
+    read_parser.add_argument('--limit', type=int, metavar='N',
+                            help='Only show the first N entries in sorted order')
+    read_parser.add_argument('--pending-only', action='store_true',
+                            help='Skip completed entries')
+    _add_filter_arguments(read_parser)
+    read_parser.add_argument('--include-archived', action='store_true',
+                            help='Also read the completed entries moved to the archive')
+    read_parser.add_argument('--page-size', type=int, metavar='N',
+                            help='Show one page of at most N entries (ties in ID order) and the '
+                                 'cursor of the next page')
+    read_parser.add_argument('--cursor', metavar='TOKEN',
+                            help='Continue after the page that returned this next_cursor '
+                                 f'(default page size: {paging.DEFAULT_PAGE_SIZE}); pages stay '
+                                 'consistent while other agents write')
+    read_parser.add_argument('--as-of', type=_time_argument, metavar='TIME',
+                            help='Show the log as it was at TIME (Unix timestamp or ISO 8601), '
+                                 'archived entries included, rebuilt from the recorded history '
+                                 '(by default the last ~100,000 events)')
+    read_parser.add_argument('--follow', action='store_true',
+                            help='Keep running and print an NDJSON event for every entry that is '
+                                 'added or completed (existing entries are reported as added first)')
+    read_parser.add_argument('--interval', type=float, metavar='SECONDS',
+                            help=f'With --follow, check for changes every SECONDS seconds '
+                                 f'(default: {follow.DEFAULT_INTERVAL})')
+
+    # 'search' command
+    search_parser = subparsers.add_parser(
+        'search', help='Find entries by words in their description, best matches first'
+    )
+    search_parser.add_argument('text', help='The words to look for')
+    search_parser.add_argument('--limit', type=int, metavar='N', default=search.DEFAULT_LIMIT,
+                              help=f'Show at most N matches (default: {search.DEFAULT_LIMIT})')
+    _add_filter_arguments(search_parser)
+
     # 'complete' command
     complete_parser = subparsers.add_parser('complete', help='Mark a log entry as completed')
-    complete_parser.add_argument('--id', required=True, help='ID of the entry to complete')
+    complete_parser.add_argument('--id',
+                                help='ID of the entry to complete (a unique prefix of at least 4 characters is enough)')
+    complete_parser.add_argument('--ids-from', metavar='FILE',
+                                help='Complete every ID listed in FILE ("-" for stdin) in one write. '
+                                     'Lines are plain IDs or NDJSON objects with an id key '
+                                     '(and optionally user/role)')
     complete_parser.add_argument('--user', required=True, help='Completer name')
     complete_parser.add_argument('--role', required=True,
-                                choices=['planner', 'engineer', 'user'],
+                                choices=list(models.ROLES),
                                 help='Completer role')
-    
-    return parser.parse_args()
+
+    # 'stats' command
+    stats_parser = subparsers.add_parser(
+        'stats', help='Show entry counts and completion latency percentiles, kept up to date by every write'
+    )
+    stats_parser.add_argument('--rebuild', action='store_true',
+                              help='Recompute the statistics from the entries and report whether '
+                                   'the maintained ones matched')
+
+    # 'history' command
+    history_parser = subparsers.add_parser(
+        'history', help='Show when an entry was added and completed, and by whom'
+    )
+    history_parser.add_argument('--id', required=True, help='The ID of the entry (or a unique prefix)')
+
+    # 'archive' command
+    archive_parser = subparsers.add_parser(
+        'archive', help='Move old completed entries into compressed archive segments'
+    )
+    archive_parser.add_argument('--older-than', type=int, metavar='DAYS', default=archive.ARCHIVE_AFTER_DAYS,
+                               help=f'Archive entries completed at least DAYS days ago '
+                                    f'(default: {archive.ARCHIVE_AFTER_DAYS})')
+
+    # 'verify' and 'repair' commands
+    subparsers.add_parser(
+        'verify', help='Check every file of the log against its checksums (exits with 1 if something is damaged)'
+    )
+    repair_parser = subparsers.add_parser(
+        'repair', help='Rewrite a damaged log from its intact entries, restoring the damaged ones from the history'
+    )
+    repair_parser.add_argument('--force', action='store_true',
+                               help='Rewrite the log even without an intact history; the damaged entries are lost '
+                                    '(the damaged files are kept as backups)')
+
+    # 'migrate' command
+    migrate_parser = subparsers.add_parser(
+        'migrate', help='Copy every entry into another, empty database (e.g. JSON to SQLite)'
+    )
+    migrate_parser.add_argument('--to', required=True, metavar='PATH',
+                               help='The target database; a .db, .sqlite or .sqlite3 file is SQLite, '
+                                    'a .cols file columnar, anything else JSON')
+
+    # 'init' command
+    init_parser = subparsers.add_parser(
+        'init', help='Create a workspace in the --db directory: one log split across shard files'
+    )
+    init_parser.add_argument('--shard-by', choices=workspace.SHARD_BY, default='hash',
+                            help='hash: spread entries over a fixed number of shards by ID; '
+                                 'project: one shard per project (default: hash)')
+    init_parser.add_argument('--shards', type=int, metavar='N', default=workspace.DEFAULT_SHARDS,
+                            help=f'The number of shards with --shard-by hash (default: {workspace.DEFAULT_SHARDS})')
+
+    # 'serve' command
+    subparsers.add_parser(
+        'serve', help='Run a server that keeps the log in memory for fast CLI calls'
+    )
+
+    args = parser.parse_args(argv, namespace=types.SimpleNamespace())
+    error = _check_arguments(args)
+    if error is not None:
+        parser.error(error)
+    return args
+
+
+def _check_arguments(args: types.SimpleNamespace) -> Optional[str]:
+    """
+    Completes the parsed arguments with the values implied by others, and
+    checks the combinations of options argparse can't express.
+
+    Args:
+        args: The parsed arguments, completed in place.
+
+    Returns:
+        The error message, or None if the arguments are valid.
+    """
+    if args.format is not None:
+        args.json = True
+    args.format = args.format or output.DEFAULT_FORMAT
+
+    # Single-entry forms need their fields; batch forms read them per record
+    if args.command == 'add' and not args.batch:
+        missing = [f"--{name}" for name in ('desc', 'priority', 'user', 'role') if getattr(args, name) is None]
+        if missing:
+            return f"the following arguments are required without --batch: {', '.join(missing)}"
+    if args.command in ('read', 'search') and args.limit is not None and args.limit < 0:
+        return "--limit must not be negative"
+    if args.command == 'read' and args.follow:
+        conflicting = [option for option, value in (
+            ('--limit', args.limit), ('--pending-only', args.pending_only),
+            ('--include-archived', args.include_archived),
+            *((f'--{key}', getattr(args, key)) for key in index.FILTER_KEYS)
+        ) if value not in (None, False)]
+        if conflicting:
+            return f"--follow reports every change; it can't be combined with {', '.join(conflicting)}"
+    if args.command == 'read' and (args.page_size is not None or args.cursor is not None):
+        if args.page_size is not None and args.page_size <= 0:
+            return "--page-size must be positive"
+        conflicting = [option for option, value in (
+            ('--limit', args.limit), ('--include-archived', args.include_archived), ('--follow', args.follow),
+        ) if value not in (None, False)]
+        if conflicting:
+            return f"paging with --page-size/--cursor can't be combined with {', '.join(conflicting)}"
+        if args.page_size is None:
+            # Imported here: only paged reads need it
+            from . import paging
+            args.page_size = paging.DEFAULT_PAGE_SIZE
+    if args.command == 'read' and args.as_of is not None:
+        conflicting = [option for option, value in (
+            ('--follow', args.follow), ('--page-size/--cursor', args.page_size),
+        ) if value not in (None, False)]
+        if conflicting:
+            return f"--as-of can't be combined with {', '.join(conflicting)}"
+    if args.command == 'read' and args.interval is not None and (not args.follow or args.interval <= 0):
+        return "--interval needs --follow and must be positive"
+    if args.command == 'archive' and args.older_than < 0:
+        return "--older-than must not be negative"
+    if args.command == 'init' and args.db is None and not os.environ.get(DB_ENV):
+        return f"init needs the workspace directory in --db (or ${DB_ENV})"
+    if args.command == 'complete' and (args.id is None) == (args.ids_from is None):
+        return "exactly one of --id and --ids-from is required"
+    return None
+
+
+# The options parse_fast reads, global ones and those of the commands agents
+# run in tight loops: option -> (dest, value, repeatable). The value is None
+# for a flag, the tuple or mapping of the allowed values, or a function that
+# converts the value and raises ValueError if it is invalid. They must match
+# the definitions in parse_arguments.
+_GLOBAL_OPTIONS = {
+    '--json': ('json', None, False),
+    '--db': ('db', str, False),
+    '--durability': ('durability', storage.DURABILITY_LEVELS, False),
+    '--format': ('format', output.FORMATS, False),
+    '--timings': ('timings', None, False),
+}
+_FAST_OPTIONS = {
+    'add': {
+        '--desc': ('desc', str, False),
+        '--priority': ('priority', models.PRIORITY_MAP, False),
+        '--user': ('user', str, False),
+        '--role': ('role', models.ROLES, False),
+        '--batch': ('batch', str, False),
+        '--project': ('project', str, False),
+    },
+    'read': {
+        '--limit': ('limit', int, False),
+        '--pending-only': ('pending_only', None, False),
+        '--status': ('status', models.STATUSES, True),
+        '--priority': ('priority', models.PRIORITY_MAP, True),
+        '--creator': ('creator', str, True),
+        '--role': ('role', models.ROLES, True),
+        '--since': ('since', _parse_time, False),
+        '--until': ('until', _parse_time, False),
+        '--include-archived': ('include_archived', None, False),
+        '--page-size': ('page_size', int, False),
+        '--cursor': ('cursor', str, False),
+        '--as-of': ('as_of', _parse_time, False),
+        '--follow': ('follow', None, False),
+        '--interval': ('interval', float, False),
+    },
+    'complete': {
+        '--id': ('id', str, False),
+        '--ids-from': ('ids_from', str, False),
+        '--user': ('user', str, False),
+        '--role': ('role', models.ROLES, False),
+    },
+    'stats': {
+        '--rebuild': ('rebuild', None, False),
+    },
+}
+
+# The options of _FAST_OPTIONS a command can't do without.
+_FAST_REQUIRED = {'complete': ('user', 'role')}
+
+
+def _defaults(options: dict) -> dict:
+    """
+    Returns the values of the options of a table like _FAST_OPTIONS['read']
+    when they aren't given: False for flags, None otherwise.
+    """
+    return {dest: False if value is None else None for dest, value, _ in options.values()}
+
+
+def parse_fast(argv: List[str]) -> Optional[types.SimpleNamespace]:
+    """
+    Parses the command lines of the commands in _FAST_OPTIONS without
+    argparse, which takes longer to import and set up than those commands
+    take to run on a small log.
+
+    Only the plain forms are read: '--option value' and '--option=value'
+    with exact option names, global options before the command. Anything
+    else (other commands, -h, abbreviated options, invalid values or
+    combinations) is left to parse_arguments, which reports the errors.
+
+    Args:
+        argv: The arguments after the program name.
+
+    Returns:
+        The parsed arguments, equal to what parse_arguments returns, or
+        None if parse_arguments has to parse them.
+    """
+    values = dict(_defaults(_GLOBAL_OPTIONS), command=None)
+    options = _GLOBAL_OPTIONS
+    args = iter(argv)
+    for arg in args:
+        name, equals, value = arg.partition('=')
+        option = options.get(name)
+        if option is None:
+            if values['command'] is not None or arg not in _FAST_OPTIONS:
+                return None
+            values['command'] = arg
+            options = _FAST_OPTIONS[arg]
+            values.update(_defaults(options))
+            continue
+
+        dest, parse, repeatable = option
+        if parse is None:
+            if equals:
+                return None
+            values[dest] = True
+            continue
+        if not equals:
+            value = next(args, None)
+            # argparse decides whether a value that looks like an option is one ('-' is stdin)
+            if value is None or (value.startswith('-') and value != '-'):
+                return None
+        if callable(parse):
+            try:
+                value = parse(value)
+            except ValueError:
+                return None
+        elif value not in parse:
+            return None
+        if repeatable:
+            values[dest] = (values[dest] or []) + [value]
+        else:
+            values[dest] = value
+
+    if values['command'] is None:
+        return None
+    if any(values[dest] is None for dest in _FAST_REQUIRED.get(values['command'], ())):
+        return None
+    parsed = types.SimpleNamespace(**values)
+    if _check_arguments(parsed) is not None:
+        return None
+    return parsed
+
+
+def command_params(args: types.SimpleNamespace) -> dict:
+    """
+    Extracts the parameters of a subcommand, i.e. everything except the
+    command name and the global output flags.
+
+    Args:
+        args: The parsed arguments.
+
+    Returns:
+        The subcommand parameters as a dictionary.
+    """
+    params = dict(vars(args))
+    for name in ('command', 'db', 'json', 'format', 'timings'):
+        del params[name]
+    return params
+
+
+def _read_batch(source: str) -> List[Tuple[int, object]]:
+    """
+    Reads the records of a batch file, one JSON value per line.
+    Blank lines are skipped.
+
+    Args:
+        source: The path of the file, or '-' for stdin.
+
+    Returns:
+        (line number, record) pairs. A line that isn't valid JSON, or is a
+        number, is returned as its stripped text, so plain ID lists work too
+        (an ID prefix like 1e345678 parses as a number).
+    """
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        try:
+            with open(source, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError as e:
+            raise ValueError(f"Cannot read batch file {source}: {e.strerror}")
+
+    records = []
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = None
+        if record is None or isinstance(record, (int, float)):
+            record = line.strip()
+        records.append((line_no, record))
+    return records
+
+
+def _field(record: object, *names: str, default: Optional[str] = None) -> str:
+    """
+    Returns the first of several alternative keys present in a batch record.
+    Values must be strings: anything else would be stored as is and break
+    reading the log.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+    for name in names:
+        if record.get(name) is not None:
+            if not isinstance(record[name], str):
+                raise ValueError(f"Field '{name}' must be a string")
+            return record[name]
+    if default is None:
+        raise ValueError(f"Missing field '{names[0]}'")
+    return default
+
+
+def _commit_batch(backend: backends.Backend, prepared: List[Tuple[int, object]]) -> dict:
+    """
+    Commits the valid operations of a batch in one write and reports a
+    result for every record.
+
+    Args:
+        backend: The storage backend of the database.
+        prepared: (line number, operation or ValueError) pairs.
+
+    Returns:
+        The batch result: an overall status ('success', 'partial' or
+        'error'), per-record results, counts and the commit meta block.
+    """
+    ops = [op for _, op in prepared if not isinstance(op, ValueError)]
+    committed, meta = backend.commit(ops) if ops else ([], {"lock_wait_ms": 0.0, "group_size": 0})
+    committed = iter(committed)
+
+    results = []
+    for line_no, op in prepared:
+        if isinstance(op, ValueError):
+            results.append({"line": line_no, "status": "error", "message": str(op)})
+            continue
+        outcome = next(committed)
+        if outcome["status"] == "error":
+            results.append({"line": line_no, "status": "error", "message": outcome["message"]})
+        elif op["op"] == "add":
+            results.append({"line": line_no, "status": "success", "data": op["entry"]})
+        else:
+            results.append({"line": line_no, "status": "success", "id": outcome["record"]["id"]})
+
+    failed = sum(1 for r in results if r["status"] == "error")
+    succeeded = len(results) - failed
+    return {
+        "status": "success" if not failed else ("partial" if succeeded else "error"),
+        "succeeded": succeeded,
+        "failed": failed,
+        "results": results,
+        "meta": meta
+    }
+
+
+def _add_batch(backend: backends.Backend, params: dict) -> dict:
+    """
+    Validates every record of an add batch with manager.create_entry and
+    commits the valid ones together.
+    """
+    # Imported here, like in _execute
+    from . import commit
+    prepared = []
+    for line_no, record in _read_batch(params['batch']):
+        try:
+            new_entry = manager.create_entry(
+                description=_field(record, 'desc', 'description'),
+                priority=_field(record, 'priority'),
+                creator=_field(record, 'user', 'creator', default=params['user']),
+                role=_field(record, 'role', 'creator_role', default=params['role'])
+            )
+            project = record.get('project', params.get('project'))
+            if project is not None and not isinstance(project, str):
+                raise ValueError("Field 'project' must be a string")
+        except ValueError as e:
+            prepared.append((line_no, e))
+            continue
+        prepared.append((line_no, commit.add_op(models.to_dict(new_entry), project)))
+    return _commit_batch(backend, prepared)
+
+
+def _complete_batch(backend: backends.Backend, params: dict) -> dict:
+    """
+    Completes every ID of a batch together. IDs are resolved and validated
+    against the log while the lock is held, like a single complete.
+    """
+    from . import commit
+    prepared = []
+    for line_no, record in _read_batch(params['ids_from']):
+        try:
+            if isinstance(record, dict):
+                log_id = _field(record, 'id')
+                user = _field(record, 'user', 'completer', default=params['user'])
+                role = _field(record, 'role', 'completer_role', default=params['role'])
+            else:
+                log_id, user, role = str(record), params['user'], params['role']
+        except ValueError as e:
+            prepared.append((line_no, e))
+            continue
+        prepared.append((line_no, commit.complete_op(log_id, user, role)))
+    return _commit_batch(backend, prepared)
+
+
+def execute(filepath: str, command: str, params: dict) -> object:
+    """
+    Runs a subcommand directly against the database file.
+
+    Args:
+        filepath: The path to the database file or workspace; it selects
+            the storage backend (see backends.open_backend).
+        command: The subcommand name ('add', 'read', 'search', 'complete',
+            'stats', 'history', 'archive', 'verify', 'repair', 'migrate' or 'init').
+        params: The subcommand parameters (see command_params).
+
+    Returns:
+        The result in the shape of the command's JSON output.
+    """
+    if command == 'init':
+        # Imported here: the other commands find workspaces through backends.open_backend
+        from . import workspace
+        return workspace.init(filepath, params['shard_by'], params['shards'])
+    backend = backends.open_backend(filepath)
+    try:
+        return _execute(backend, command, params)
+    finally:
+        backend.close()
+
+
+def _execute(backend: backends.Backend, command: str, params: dict) -> object:
+    if command == 'add' and params.get('batch'):
+        return _add_batch(backend, params)
+
+    elif command == 'complete' and params.get('ids_from'):
+        return _complete_batch(backend, params)
+
+    elif command == 'add':
+        # Create the new entry object first to validate inputs
+        new_entry = manager.create_entry(
+            description=params['desc'],
+            priority=params['priority'],
+            creator=params['user'],
+            role=params['role']
+        )
+
+        # Imported here so reads don't load the write path
+        from . import commit
+        results, meta = backend.commit([commit.add_op(models.to_dict(new_entry), params.get('project'))])
+        if results[0]["status"] == "error":
+            raise ValueError(results[0]["message"])
+
+        return {
+            "status": "success",
+            "data": models.to_dict(new_entry),
+            "meta": meta
+        }
+
+    elif command == 'read' and params.get('as_of') is not None:
+        filters = {key: params.get(key) for key in index.FILTER_KEYS}
+        return backend.read_as_of(params['as_of'], params.get('limit'), params.get('pending_only'), **filters)
+
+    elif command == 'history':
+        return backend.history(params['id'])
+
+    elif command == 'read' and params.get('page_size') is not None:
+        filters = {key: params.get(key) for key in index.FILTER_KEYS}
+        return backend.page(params['page_size'], params.get('cursor'), params.get('pending_only'), **filters)
+
+    elif command == 'read':
+        filters = {key: params.get(key) for key in index.FILTER_KEYS}
+        return backend.read(params.get('limit'), params.get('pending_only'),
+                            params.get('include_archived'), **filters)
+
+    elif command == 'search':
+        filters = {key: params.get(key) for key in index.FILTER_KEYS}
+        return backend.search(params['text'], params.get('limit'), **filters)
+
+    elif command == 'stats':
+        summary = backend.stats(bool(params.get('rebuild')))
+        result = summary.report()
+        if params.get('rebuild'):
+            result["verified"] = summary.verified
+        return result
+
+    elif command == 'archive':
+        return backend.archive(params['older_than'])
+
+    elif command == 'verify':
+        return backend.verify()
+
+    elif command == 'repair':
+        return backend.repair(bool(params.get('force')))
+
+    elif command == 'migrate':
+        # One-shot copy into an empty database, e.g. from JSON to SQLite
+        entries = backend.export()
+        target = backends.open_backend(params['to'])
+        try:
+            target.import_entries(entries)
+        finally:
+            target.close()
+        return {
+            "status": "success",
+            "message": f"Copied {len(entries)} entries from {backend.filepath} to {params['to']}",
+            "count": len(entries)
+        }
+
+    elif command == 'complete':
+        # The entry is validated and completed against the state seen under the lock
+        from . import commit
+        results, meta = backend.commit([commit.complete_op(params['id'], params['user'], params['role'])])
+        if results[0]["status"] == "error":
+            raise ValueError(results[0]["message"])
+
+        # Report the full ID in case a prefix was given
+        log_id = results[0]["record"]["id"]
+        return {
+            "status": "success",
+            "message": f"Entry {log_id} marked as completed",
+            "id": log_id,
+            "meta": meta
+        }
+
+    raise ValueError(f"Unknown command: {command}")
+
+
+def print_result(args: types.SimpleNamespace, result: object) -> None:
+    """
+    Prints the result of a subcommand, either as JSON or human readable text.
+
+    Args:
+        args: The parsed arguments.
+        result: The result returned by execute (or by the server).
+    """
+    if args.json:
+        output.write_json(result, args.format, sys.stdout)
+
+    elif isinstance(result, dict) and "results" in result:
+        verb = "Added" if args.command == 'add' else "Completed"
+        icon = "✓" if result["status"] == "success" else "✗"
+        print(f"{icon} {verb} {result['succeeded']} of {len(result['results'])} entries")
+        for record in result["results"]:
+            if record["status"] == "error":
+                print(f"  line {record['line']}: {record['message']}")
+
+    elif args.command == 'add':
+        new_entry = models.from_dict(result["data"])
+        print(f"✓ Created entry: {new_entry.id}")
+        print(f"  Description: {new_entry.description}")
+        print(f"  Priority: {new_entry.priority}")
+        print(f"  Status: {new_entry.status}")
+
+    elif args.command == 'read' and isinstance(result, dict):
+        print_page(result)
+
+    elif args.command == 'read':
+        sorted_logs = [models.from_dict(d) for d in result]
+        if not sorted_logs:
+            print("No log entries found.")
+        else:
+            print(f"\n{'='*80}")
+            print(f"PROJECT STATUS LOG ({len(sorted_logs)} entries)")
+            print(f"{'='*80}\n")
+
+            for i, (entry, data) in enumerate(zip(sorted_logs, result), 1):
+                status_icon = "⏳" if entry.status == "pending" else "✓"
+                print(f"{i}. [{status_icon}] {entry.priority.upper()} - {entry.description}")
+                print(f"   ID: {entry.id}")
+                if "project" in data:
+                    print(f"   Project: {data['project']}")
+                print(f"   Creator: {entry.creator} ({entry.creator_role})")
+                if entry.status == "completed":
+                    print(f"   Completed by: {entry.completer} ({entry.completer_role})")
+                print()
+
+    elif args.command == 'search':
+        if not result:
+            print(f"No entries match '{args.text}'.")
+        for i, match in enumerate(result, 1):
+            status_icon = "⏳" if match["status"] == "pending" else "✓"
+            print(f"{i}. [{status_icon}] {match['priority'].upper()} - {match['description']}")
+            print(f"   ID: {match['id']}  (score {match['score']:.2f})")
+
+    elif args.command == 'complete':
+        print(f"✓ Entry {result['id']} marked as completed by {args.user}")
+
+    elif args.command == 'migrate':
+        print(f"✓ {result['message']}")
+
+    elif args.command == 'init':
+        shards = f"{len(result['shards'])} shards" if result["shard_by"] == 'hash' else "a shard per project"
+        print(f"✓ Created workspace {result['path']} with {shards}")
+
+    elif args.command == 'stats':
+        print_stats(result)
+
+    elif args.command == 'history':
+        print_history(result)
+
+    elif args.command == 'verify':
+        print_verify(result)
+
+    elif args.command == 'repair':
+        print_repair(result)
+
+    elif args.command == 'archive':
+        print(f"✓ Archived {result['archived']} completed entries "
+              f"({result['remaining']} remain in the log)")
+        if result["segments"]:
+            print(f"  Segments written: {', '.join(result['segments'])}")
+
+    # Surface lock contention on writes
+    if not args.json and isinstance(result, dict) and "meta" in result:
+        lock_wait_ms = result["meta"]["lock_wait_ms"]
+        if lock_wait_ms >= LOCK_WAIT_REPORT_MS:
+            print(f"  Waited {lock_wait_ms:.0f} ms for the log lock "
+                  f"(committed with {result['meta']['group_size']} queued request(s))")
+
+
+def print_page(result: dict) -> None:
+    """
+    Prints a page of `read --page-size` as text, with the option that
+    fetches the next page.
+    """
+    if not result["entries"]:
+        print("No log entries on this page.")
+    for entry in result["entries"]:
+        status_icon = "⏳" if entry["status"] == "pending" else "✓"
+        print(f"[{status_icon}] {entry['priority'].upper()} - {entry['description']}")
+        print(f"   ID: {entry['id']}")
+    if result["next_cursor"] is not None:
+        print(f"\nNext page: --cursor {result['next_cursor']}")
+    else:
+        print("\n(last page)")
+
+
+def print_history(events: List[dict]) -> None:
+    """
+    Prints the events of `history` as text, one line each.
+    """
+    entry = events[-1]["entry"]
+    print(f"{entry['id']}: {entry['priority'].upper()} - {entry['description']}")
+    # Imported here so the other commands don't pay for it
+    import datetime
+    for event in events:
+        at = datetime.datetime.fromtimestamp(event["at"]).isoformat(sep=' ')
+        state = event["entry"]
+        if event["event"] == "baseline":
+            print(f"  {at}  already {state['status']} when the history started "
+                  f"(created by {state['creator']} ({state['creator_role']}))")
+        elif event["event"] == "added":
+            print(f"  {at}  added by {state['creator']} ({state['creator_role']})")
+        else:
+            print(f"  {at}  completed by {state['completer']} ({state['completer_role']})")
+
+
+def print_verify(report: dict) -> None:
+    """
+    Prints the report of `verify` as text: a summary line, then every
+    damaged range and the files without checksums.
+    """
+    size = f"{report['files']} files, {report['bytes'] / 2**20:.1f} MB, {report['entries']} entries"
+    if report["damaged"]:
+        print(f"✗ {report['path']} is damaged ({size} checked)")
+        for damage in report["damaged"]:
+            print(f"  {damage['file']} bytes {damage['start']}-{damage['end']}: {damage['reason']}")
+        print("  Run `repair` to rewrite the log from what is intact")
+    else:
+        print(f"✓ {report['path']} is intact ({size} checked)")
+    if report["unchecked"]:
+        print("  Written without checksums (they get them when next rewritten): " + ", ".join(report["unchecked"]))
+
+
+def print_repair(result: dict) -> None:
+    """
+    Prints the summary of `repair` as text.
+    """
+    if not result["repaired"]:
+        print(f"✓ {result['path']} is intact; nothing to repair")
+        return
+    print(f"✓ Rewrote {result['path']} without its {result['damaged']} damaged region(s)")
+    if result["history"]:
+        print(f"  Restored {result['recovered']} entries from the history")
+    else:
+        print("  There was no intact history to restore the damaged entries from; they are lost")
+    print(f"  The damaged files were copied to {', '.join(result['backups'])}")
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """
+    Formats a latency in seconds for people, in its two largest units (e.g. '3h 20m').
+    """
+    if seconds is None:
+        return "-"
+    seconds = round(seconds)
+    parts = []
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60), ('s', 1)):
+        if seconds >= size or (unit == 's' and not parts):
+            parts.append(f"{seconds // size}{unit}")
+            seconds %= size
+    return " ".join(parts[:2])
+
+
+def print_stats(result: dict) -> None:
+    """
+    Prints the result of `stats` as text: counts per priority and role,
+    then the latency percentiles.
+    """
+    by_status = result["by_status"]
+    print(f"{result['total']} entries ({by_status['pending']} pending, {by_status['completed']} completed)")
+    for status, priorities in result["counts"].items():
+        if not priorities:
+            continue
+        print(f"\n{status.capitalize()}:")
+        for priority, roles in priorities.items():
+            per_role = ", ".join(f"{role} {count}" for role, count in roles.items())
+            print(f"  {priority}: {sum(roles.values()):>6}  ({per_role})")
+
+    # Imported here: the stats command is usually answered by the server
+    from . import stats
+    latency = result["latency"]
+    percentiles = [f"p{p}" for p in stats.PERCENTILES]
+    print(f"\nTime to complete ({latency['completed']} completed):")
+    rows = [("all", latency)] + list(latency["by_priority"].items())
+    for name, row in rows:
+        print(f"  {name:<6}" + "".join(f"  {p} {format_duration(row[p]):>8}" for p in percentiles))
+
+    if "verified" in result:
+        if result["verified"]:
+            print("\n✓ Rebuilt from the entries: the maintained statistics were correct")
+        else:
+            print("\n✗ Rebuilt from the entries: the maintained statistics were missing or out of date")
+
+
+def timings_report(db_path: str, result: object) -> dict:
+    """
+    Returns the timings of the command so far (see timings.report), with
+    the size of the log files and the number of entries in the result.
+    """
+    report = timings.report()
+    files = [db_path]
+    if backends.is_workspace(db_path):
+        # Imported here, like in backends.open_backend
+        from . import workspace
+        files = list(workspace.ShardedBackend(db_path).shard_paths().values())
+    report["file_bytes"] = sum(
+        os.path.getsize(path) for db_file in files
+        for path in (db_file, storage.journal_path(db_file)) if os.path.exists(path)
+    )
+    if isinstance(result, list):
+        report["entries_returned"] = len(result)
+    return report
+
+
+def print_timings(report: dict) -> None:
+    """
+    Prints a timings report to stderr, one phase per line.
+    """
+    counters = [f"{report['file_bytes'] / 2**20:.1f} MB on disk"]
+    if "entries_loaded" in report:
+        counters.append(f"{report['entries_loaded']} entries loaded")
+    if "entries_returned" in report:
+        counters.append(f"{report['entries_returned']} returned")
+    print(f"Timings: {report['total_ms']:.1f} ms ({', '.join(counters)})", file=sys.stderr)
+    for name, ms in report["phases_ms"].items():
+        print(f"  {name:<10} {ms:>10.1f} ms", file=sys.stderr)
 
 
 def main() -> None:
     """
-    The main function. Parses arguments and dispatches to the appropriate
-    business logic based on the provided subcommand.
+    The main function. Runs the command under cProfile when PROFILE_ENV
+    names a file to write the stats to.
     """
-    args = parse_arguments()
-    
+    profile_path = os.environ.get(PROFILE_ENV)
+    if not profile_path:
+        _main()
+        return
+    # Imported here so the regular CLI path doesn't pay for it
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(_main)
+    finally:
+        profiler.dump_stats(profile_path)
+
+
+def _main() -> None:
+    """
+    Parses arguments and dispatches to the appropriate business logic
+    based on the provided subcommand.
+
+    If a server is listening on the default socket, the command is forwarded
+    to it; otherwise it runs directly against the database file.
+    """
+    timings.reset()
+    args = parse_fast(sys.argv[1:]) or parse_arguments()
+
     if not args.command:
         print("Error: No command specified. Use -h for help.", file=sys.stderr)
         sys.exit(1)
-    
+
     try:
-        if args.command == 'add':
-            # Create the new entry object first to validate inputs
-            new_entry = manager.create_entry(
-                description=args.desc,
-                priority=args.priority,
-                creator=args.user,
-                role=args.role
-            )
-            
-            # More efficient add: load dicts, append a new dict, save dicts
-            log_dicts = storage.load_logs(DEFAULT_DB_PATH)
-            log_dicts.append(models.to_dict(new_entry))
-            storage.save_logs(DEFAULT_DB_PATH, log_dicts)
-            
-            # Output result
-            if args.json:
-                result = {
-                    "status": "success",
-                    "data": models.to_dict(new_entry)
-                }
-                json.dump(result, sys.stdout, indent=2)
-            else:
-                print(f"✓ Created entry: {new_entry.id}")
-                print(f"  Description: {new_entry.description}")
-                print(f"  Priority: {new_entry.priority}")
-                print(f"  Status: {new_entry.status}")
-        
-        elif args.command == 'read':
-            # Load and sort logs
-            log_dicts = storage.load_logs(DEFAULT_DB_PATH)
-            logs = [models.from_dict(d) for d in log_dicts]
-            sorted_logs = manager.sort_logs(logs)
-            
-            # Output result
-            if args.json:
-                result = [models.to_dict(entry) for entry in sorted_logs]
-                json.dump(result, sys.stdout, indent=2)
-            else:
-                if not sorted_logs:
-                    print("No log entries found.")
-                else:
-                    print(f"\n{'='*80}")
-                    print(f"PROJECT STATUS LOG ({len(sorted_logs)} entries)")
-                    print(f"{'='*80}\n")
-                    
-                    for i, entry in enumerate(sorted_logs, 1):
-                        status_icon = "⏳" if entry.status == "pending" else "✓"
-                        print(f"{i}. [{status_icon}] {entry.priority.upper()} - {entry.description}")
-                        print(f"   ID: {entry.id}")
-                        print(f"   Creator: {entry.creator} ({entry.creator_role})")
-                        if entry.status == "completed":
-                            print(f"   Completed by: {entry.completer} ({entry.completer_role})")
-                        print()
-        
-        elif args.command == 'complete':
-            # Load logs
-            log_dicts = storage.load_logs(DEFAULT_DB_PATH)
-            logs = [models.from_dict(d) for d in log_dicts]
-            
-            # Complete entry
-            updated_logs = manager.complete_entry(
-                log_id=args.id,
-                completer=args.user,
-                role=args.role,
-                logs=logs
-            )
-            
-            # Save updated logs
-            log_dicts = [models.to_dict(entry) for entry in updated_logs]
-            storage.save_logs(DEFAULT_DB_PATH, log_dicts)
-            
-            # Output result
-            if args.json:
-                result = {
-                    "status": "success",
-                    "message": f"Entry {args.id} marked as completed"
-                }
-                json.dump(result, sys.stdout, indent=2)
+        db_path = args.db or default_db_path()
+        # Checked up front, so a bad environment variable fails before any work
+        storage.set_durability(args.durability or storage.durability())
+        sharded = backends.is_workspace(db_path)
+        if getattr(args, 'project', None) is not None:
+            # Imported here: --project is only for workspaces
+            from . import workspace
+            if not sharded or workspace.load_manifest(db_path)["shard_by"] != 'project':
+                raise ValueError("--project needs a workspace sharded by project (see the init command)")
+
+        if args.command == 'serve':
+            if sharded:
+                raise ValueError("serve keeps a single JSON log in memory; serve each shard on its own")
+            if db_path.lower().endswith(backends.SQLITE_EXTENSIONS):
+                raise ValueError("serve keeps a JSON log in memory; the SQLite backend is indexed already")
+            if db_path.lower().endswith(backends.COLUMNAR_EXTENSIONS):
+                raise ValueError("serve keeps a JSON log in memory; the columnar backend is mapped already")
+            # Imported here so the regular CLI path doesn't pay for socketserver
+            from . import server
+            server.serve(db_path)
+            return
+
+        if args.command == 'read' and args.follow:
+            # Streams until interrupted, so it never goes through the server
+            # Imported here: only --follow streams
+            from . import follow
+            backend = backends.open_backend(db_path)
+            try:
+                follow.run(backend, args.interval)
+            except KeyboardInterrupt:
+                pass
+            except BrokenPipeError:
+                # The consumer went away: don't fail on the final flush of stdout
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            finally:
+                backend.close()
+            return
+
+        response = None
+        # A server serves a single log file
+        if not os.environ.get(NO_SERVER_ENV) and not sharded and args.command != 'init':
+            # Imported here: AGENT_SYNC_NO_SERVER skips it
+            from . import client
+            with timings.phase('server'):
+                response = client.request(
+                    client.socket_path(db_path), args.command, command_params(args)
+                )
+
+        if response is None or response["status"] == "unsupported":
+            if (args.command == 'read' and args.json and not args.timings
+                    and args.page_size is None and args.as_of is None):
+                # Streamed to stdout entry by entry, through the response cache
+                backend = backends.open_backend(db_path)
+                try:
+                    output.write_read(backend, command_params(args), args.format, sys.stdout)
+                finally:
+                    backend.close()
+                return
+            result = execute(db_path, args.command, command_params(args))
+        elif response["status"] == "success":
+            result = response["result"]
+        elif response.get("unexpected"):
+            raise RuntimeError(response["message"])
+        else:
+            raise ValueError(response["message"])
+
+        if args.timings and args.json:
+            # Taken before the output is written, which it can't include
+            report = timings_report(db_path, result)
+            if isinstance(result, dict):
+                result = dict(result, meta=dict(result.get("meta", {}), timings=report))
             else:
-                print(f"✓ Entry {args.id} marked as completed by {args.user}")
-    
+                result = {"data": result, "meta": {"timings": report}}
+
+        with timings.phase('serialize'):
+            print_result(args, result)
+        if args.timings and not args.json:
+            print_timings(timings_report(db_path, result))
+
+        # A batch where every record failed is an error; partial failures are not
+        if isinstance(result, dict) and result.get("status") == "error":
+            sys.exit(1)
+
     except ValueError as e:
         # Handle validation errors
         if args.json:
@@ -157,11 +1138,11 @@ def main() -> None:
                 "status": "error",
                 "message": str(e)
             }
-            json.dump(error, sys.stderr, indent=2)
+            output.write_json(error, args.format, sys.stderr)
         else:
             print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
-    
+
     except Exception as e:
         # Handle unexpected errors
         if args.json:
@@ -169,7 +1150,7 @@ def main() -> None:
                 "status": "error",
                 "message": f"Unexpected error: {str(e)}"
             }
-            json.dump(error, sys.stderr, indent=2)
+            output.write_json(error, args.format, sys.stderr)
         else:
             print(f"Unexpected error: {e}", file=sys.stderr)
         sys.exit(1)
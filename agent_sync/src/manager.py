@@ -1,10 +1,20 @@
 """
 Contains the core business logic, including CRUD operations and sorting.
 """
-import uuid
+import bisect
+import heapq
 import time
-from typing import List
-from .models import LogEntry, PRIORITY_MAP
+from typing import Iterable, List, Optional, Tuple
+from . import models
+from .models import LogEntry, PRIORITY_MAP, ROLES
+
+
+def _validate_role(role: str) -> None:
+    """
+    Raises a ValueError if the role is not one of models.ROLES.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Invalid role: {role}. Must be one of {list(ROLES)}")
 
 
 def create_entry(description: str, priority: str, creator: str, role: str) -> LogEntry:
@@ -23,7 +33,10 @@ def create_entry(description: str, priority: str, creator: str, role: str) -> Lo
     # Validate priority against the allowed keys in PRIORITY_MAP
     if priority not in PRIORITY_MAP:
         raise ValueError(f"Invalid priority: {priority}. Must be one of {list(PRIORITY_MAP.keys())}")
-    
+    _validate_role(role)
+
+    # Imported here so the commands that don't add entries don't pay for it
+    import uuid
     return LogEntry(
         id=str(uuid.uuid4()),  # Generate a unique ID
         creator=creator,
@@ -53,10 +66,7 @@ def complete_entry(log_id: str, completer: str, role: str, logs: List[LogEntry])
     found = False
     for entry in logs:
         if entry.id == log_id:
-            entry.status = 'completed'
-            entry.completer = completer
-            entry.completer_role = role
-            entry.completion_timestamp = int(time.time())
+            mark_completed(entry, completer, role)
             found = True
             break
     
@@ -66,6 +76,103 @@ def complete_entry(log_id: str, completer: str, role: str, logs: List[LogEntry])
     return logs
 
 
+def mark_completed(entry: LogEntry, completer: str, role: str) -> LogEntry:
+    """
+    Updates a single entry's status to 'completed' and records completion
+    details. Used when the entry was already located through an index.
+
+    Args:
+        entry: The log entry to complete.
+        completer: The name of the person or agent completing the entry.
+        role: The role of the completer.
+
+    Returns:
+        The updated LogEntry object.
+    """
+    _validate_role(role)
+    entry.status = 'completed'
+    entry.completer = completer
+    entry.completer_role = role
+    entry.completion_timestamp = int(time.time())
+    return entry
+
+
+def matches(data: dict, status: Optional[List[str]] = None, priority: Optional[List[str]] = None,
+            creator: Optional[List[str]] = None, role: Optional[List[str]] = None,
+            since: Optional[int] = None, until: Optional[int] = None) -> bool:
+    """
+    Checks an entry against query filters. Filters that are None are ignored;
+    list filters match any of their values.
+
+    Args:
+        data: The log entry as a dictionary.
+        status: Allowed statuses.
+        priority: Allowed priority tiers.
+        creator: Allowed creator names.
+        role: Allowed creator roles.
+        since: Earliest creation timestamp (inclusive).
+        until: Latest creation timestamp (exclusive).
+
+    Returns:
+        True if the entry passes every filter.
+    """
+    return (
+        (status is None or data['status'] in status)
+        and (priority is None or data['priority'] in priority)
+        and (creator is None or data['creator'] in creator)
+        and (role is None or data['creator_role'] in role)
+        and (since is None or data['created_timestamp'] >= since)
+        and (until is None or data['created_timestamp'] < until)
+    )
+
+
+def filter_logs(log_dicts: List[dict], **filters) -> List[dict]:
+    """
+    Returns the entries that pass the query filters (see matches),
+    keeping their order.
+
+    Args:
+        log_dicts: The log entries as dictionaries.
+        **filters: The filters accepted by matches.
+
+    Returns:
+        The matching entries.
+    """
+    return [d for d in log_dicts if matches(d, **filters)]
+
+
+def sort_key(entry: LogEntry) -> Tuple[int, int, int]:
+    """
+    Returns the 3-tier sorting key of a log entry (see sort_logs).
+
+    Args:
+        entry: The LogEntry object.
+
+    Returns:
+        A (status, priority, created_timestamp) tuple.
+    """
+    # The sorting key is a tuple, which Python compares element by element.
+    return (
+        0 if entry.status == 'pending' else 1,  # Primary sort: Pending (0) before Completed (1)
+        PRIORITY_MAP[entry.priority],           # Secondary sort: Priority value (0=tier0, 3=tier3)
+        entry.created_timestamp                 # Tertiary sort: Creation time (ascending/oldest first)
+    )
+
+
+def dict_sort_key(data: dict) -> Tuple[int, int, int]:
+    """
+    Returns the same key as sort_key for an entry that is still a dictionary,
+    so entries can be ranked before (or without) building LogEntry objects.
+
+    Args:
+        data: The log entry as a dictionary.
+
+    Returns:
+        A (status, priority, created_timestamp) tuple.
+    """
+    return (0 if data['status'] == 'pending' else 1, PRIORITY_MAP[data['priority']], data['created_timestamp'])
+
+
 def sort_logs(logs: List[LogEntry]) -> List[LogEntry]:
     """
     Implements the 3-tier sorting logic on a list of log entries.
@@ -80,9 +187,116 @@ def sort_logs(logs: List[LogEntry]) -> List[LogEntry]:
     Returns:
         The sorted list of LogEntry objects.
     """
-    # The sorting key is a tuple, which Python compares element by element.
-    return sorted(logs, key=lambda x: (
-        0 if x.status == 'pending' else 1,  # Primary sort: Pending (0) before Completed (1)
-        PRIORITY_MAP[x.priority],           # Secondary sort: Priority value (0=tier0, 3=tier3)
-        x.created_timestamp                 # Tertiary sort: Creation time (ascending/oldest first)
-    ))
+    return sorted(logs, key=sort_key)
+
+
+class SortedLog:
+    """
+    Keeps log entries in 3-tier order while they are added and completed,
+    so reads don't have to re-sort the whole log.
+
+    Entries are ordered by sort_key followed by their load position, which
+    breaks ties exactly like the stable sort in sort_logs. An add is a
+    bisection and an insert; a completion moves one entry from the pending
+    segment to the completed segment.
+    """
+
+    def __init__(self, logs: Iterable[LogEntry] = ()):
+        """
+        Args:
+            logs: The initial entries, in load order.
+        """
+        logs = list(logs)
+        # The key each entry is currently stored under, by ID
+        self._key_of = {entry.id: sort_key(entry) + (position,) for position, entry in enumerate(logs)}
+        self._next_position = len(logs)
+        self._entries: List[LogEntry] = sorted(logs, key=lambda entry: self._key_of[entry.id])
+        self._keys: List[tuple] = [self._key_of[entry.id] for entry in self._entries]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def entries(self) -> List[LogEntry]:
+        """
+        Returns the entries in 3-tier order. The list must not be modified.
+        """
+        return self._entries
+
+    def add(self, entry: LogEntry) -> int:
+        """
+        Inserts a new entry after every entry that was loaded or added before it.
+
+        Args:
+            entry: The new LogEntry.
+
+        Returns:
+            The position the entry was inserted at.
+        """
+        key = sort_key(entry) + (self._next_position,)
+        self._next_position += 1
+        self._key_of[entry.id] = key
+        position = bisect.bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._entries.insert(position, entry)
+        return position
+
+    def update(self, entry: LogEntry) -> Tuple[int, int]:
+        """
+        Moves an entry to the place of its current sort key, e.g. after it
+        was completed in place by mark_completed.
+
+        Args:
+            entry: The LogEntry, already modified.
+
+        Returns:
+            A (old_position, new_position) tuple. The new position applies
+            after the entry was removed from the old one.
+        """
+        old_key = self._key_of[entry.id]
+        old_position = bisect.bisect_left(self._keys, old_key)
+        del self._keys[old_position]
+        del self._entries[old_position]
+
+        key = sort_key(entry) + old_key[-1:]
+        self._key_of[entry.id] = key
+        position = bisect.bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._entries.insert(position, entry)
+        return old_position, position
+
+    def pending_count(self) -> int:
+        """
+        Returns the number of pending entries, which form the head of the order.
+        """
+        return bisect.bisect_left(self._keys, (1,))
+
+
+def select_logs(log_dicts: List[dict], limit: Optional[int] = None,
+                pending_only: bool = False) -> List[LogEntry]:
+    """
+    Returns the first entries in 3-tier order without sorting the whole log.
+
+    With a limit, heapq.nsmallest keeps only the best `limit` candidates
+    (O(n log k) instead of O(n log n)), and LogEntry objects are only built
+    for the entries that make the cut. nsmallest is stable, so the result is
+    exactly sort_logs(...)[:limit], ties included.
+
+    Args:
+        log_dicts: The log entries as dictionaries, in storage order.
+        limit: The maximum number of entries to return. None returns all.
+        pending_only: Skip completed entries.
+
+    Returns:
+        The selected LogEntry objects in 3-tier order.
+    """
+    if pending_only:
+        log_dicts = [d for d in log_dicts if d['status'] == 'pending']
+
+    if limit is None:
+        selected = sorted(log_dicts, key=dict_sort_key)
+    else:
+        selected = heapq.nsmallest(limit, log_dicts, key=dict_sort_key)
+    return [models.from_dict(d) for d in selected]
@@ -2,8 +2,12 @@
 Defines the data structures and type validation.
 """
 import dataclasses
+import sys
 from typing import Optional
 
+# Interns the short strings that repeat across entries (see from_dict).
+_intern = sys.intern
+
 # Defines the priority mapping for sorting.
 # Lower values indicate higher priority.
 # This mapping is critical for the 3-tier sorting logic.
@@ -14,11 +18,20 @@ PRIORITY_MAP = {
     "tier3": 3,  # Weak Warning - Low priority/Nice to have
 }
 
+# The roles a creator or completer can have.
+ROLES = ("planner", "engineer", "user")
+
+# The statuses an entry can have, in sort order.
+STATUSES = ("pending", "completed")
 
-@dataclasses.dataclass
+
+@dataclasses.dataclass(slots=True)
 class LogEntry:
     """
     A Dataclass representing a single row in the log.
+
+    The class is slotted: instances have no __dict__, which roughly halves
+    their memory footprint on large logs.
     
     Attributes:
         id (str): Unique UUID for the entry.
@@ -48,13 +61,27 @@ def to_dict(entry: LogEntry) -> dict:
     """
     Serializes the LogEntry object for JSON storage.
 
+    All fields are flat values, so the dictionary is built directly instead
+    of through dataclasses.asdict, which copies recursively.
+
     Args:
         entry: The LogEntry object to serialize.
 
     Returns:
         A dictionary representation of the LogEntry.
     """
-    return dataclasses.asdict(entry)
+    return {
+        "id": entry.id,
+        "creator": entry.creator,
+        "creator_role": entry.creator_role,
+        "created_timestamp": entry.created_timestamp,
+        "description": entry.description,
+        "priority": entry.priority,
+        "status": entry.status,
+        "completer": entry.completer,
+        "completer_role": entry.completer_role,
+        "completion_timestamp": entry.completion_timestamp,
+    }
 
 
 def from_dict(data: dict) -> LogEntry:
@@ -62,10 +89,30 @@ def from_dict(data: dict) -> LogEntry:
     Deserializes JSON data into a strictly typed LogEntry object.
     Handles missing optional fields.
 
+    The short values that repeat across the log (names, roles, priority,
+    status) are interned, so a large log keeps one copy of each instead of
+    one per entry.
+
     Args:
         data: The dictionary to deserialize.
 
     Returns:
         A LogEntry object.
+
+    Raises:
+        KeyError: If a required field is missing.
     """
-    return LogEntry(**data)
+    completer = data.get("completer")
+    completer_role = data.get("completer_role")
+    return LogEntry(
+        data["id"],
+        _intern(data["creator"]),
+        _intern(data["creator_role"]),
+        data["created_timestamp"],
+        data["description"],
+        _intern(data["priority"]),
+        _intern(data["status"]),
+        completer if completer is None else _intern(completer),
+        completer_role if completer_role is None else _intern(completer_role),
+        data.get("completion_timestamp"),
+    )
@@ -0,0 +1,261 @@
+"""
+JSON output of the CLI: the layouts of `--format` and the response cache
+of `read`.
+
+'pretty' is the indented JSON the CLI has always printed, 'compact' the
+same document without whitespace, and 'ndjson' one compact entry per line
+(results that are a single object are printed as one line). Lists are
+serialized entry by entry as they come out of the backend, so a read never
+holds the whole response in memory.
+
+A `read` response is rendered into a file under the response cache
+directory next to the JSON log, headed by the log's version (see
+backends.Backend.version) and the parameters, and copied to stdout from
+there. The next read with the same parameters and format copies that file
+as long as the log has not changed. Only the RESPONSE_CACHE_ENTRIES most
+recently used responses are kept. A response larger than
+RESPONSE_CACHE_MAX_BYTES, or one the cache can't store (e.g. a directory
+the reader can't write to), is streamed to stdout without being cached.
+"""
+import json
+import os
+import zlib
+from typing import Iterable, Iterator, Optional, TextIO
+from . import index, storage
+
+# The layouts of --format.
+FORMATS = ('pretty', 'compact', 'ndjson')
+
+# The layout used when no --format is given.
+DEFAULT_FORMAT = 'pretty'
+
+# Suffix of the response cache directory that lives next to the database file.
+RESPONSE_CACHE_SUFFIX = '.responses'
+
+# The number of cached responses kept; the least recently used are removed.
+RESPONSE_CACHE_ENTRIES = 4
+
+# Responses larger than this are streamed without being cached.
+RESPONSE_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+# Bytes copied at a time from a cached response.
+_COPY_CHUNK = 1024 * 1024
+
+
+def response_cache_dir(filepath: str) -> str:
+    """
+    Returns the path of the response cache for a database file.
+
+    Args:
+        filepath: The path to the JSON database file.
+
+    Returns:
+        The path to the cache directory.
+    """
+    return filepath + RESPONSE_CACHE_SUFFIX
+
+
+def dumps(value: object, fmt: str) -> str:
+    """
+    Serializes a single value in a layout (one of FORMATS), without a
+    trailing newline.
+    """
+    if fmt == 'pretty':
+        return json.dumps(value, indent=2)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_list(entries: Iterable[dict], fmt: str) -> Iterator[str]:
+    """
+    Serializes a list piece by piece, exactly as dumps would serialize it
+    as a whole (for 'ndjson': one line per entry).
+
+    Args:
+        entries: The list items, consumed lazily.
+        fmt: One of FORMATS.
+
+    Yields:
+        The pieces of the serialized list, in order.
+    """
+    if fmt == 'ndjson':
+        for entry in entries:
+            yield dumps(entry, fmt) + '\n'
+        return
+
+    empty = True
+    for entry in entries:
+        if fmt == 'pretty':
+            # Nested one level deeper than on its own
+            yield ('[\n  ' if empty else ',\n  ') + dumps(entry, fmt).replace('\n', '\n  ')
+        else:
+            yield ('[' if empty else ',') + dumps(entry, fmt)
+        empty = False
+    if empty:
+        yield '[]'
+    else:
+        yield '\n]' if fmt == 'pretty' else ']'
+
+
+def write_json(result: object, fmt: str, out: TextIO) -> None:
+    """
+    Writes a command result in a layout (one of FORMATS).
+
+    Args:
+        result: The result, a list of entries or a single object.
+        fmt: One of FORMATS.
+        out: The stream to write to.
+    """
+    if isinstance(result, list):
+        for piece in iter_list(result, fmt):
+            out.write(piece)
+    else:
+        out.write(dumps(result, fmt) + ('\n' if fmt == 'ndjson' else ''))
+
+
+def _copy(f, out: TextIO) -> None:
+    """
+    Copies a rendered response to a text stream, as bytes when it has a buffer.
+    """
+    buffer = getattr(out, 'buffer', None)
+    if buffer is None:
+        out.write(f.read().decode('utf-8'))
+        return
+    out.flush()
+    # Not shutil.copyfileobj: importing shutil takes longer than copying most responses
+    for chunk in iter(lambda: f.read(_COPY_CHUNK), b''):
+        buffer.write(chunk)
+    buffer.flush()
+
+
+def _render(f, header: bytes, pieces: Iterator[str], out: TextIO) -> Optional[bool]:
+    """
+    Renders a response into a cache file and copies it to a text stream.
+    Once the response outgrows RESPONSE_CACHE_MAX_BYTES, what was rendered
+    so far is copied and the rest streamed directly.
+
+    Args:
+        f: The empty cache file.
+        header: The header of the cached response.
+        pieces: The pieces of the response (see iter_list).
+        out: The stream to write to.
+
+    Returns:
+        True if the file holds the whole response, False if it was too
+        large, and None if nothing was written to out because the file
+        couldn't take the response (e.g. a full disk).
+    """
+    size = 0
+    rest = None
+    try:
+        f.write(header)
+        for piece in pieces:
+            data = piece.encode('utf-8')
+            if size + len(data) > RESPONSE_CACHE_MAX_BYTES:
+                rest = piece
+                break
+            f.write(data)
+            size += len(data)
+        f.flush()
+    except OSError:
+        return None
+    f.seek(len(header))
+    _copy(f, out)
+    if rest is None:
+        return True
+    out.write(rest)
+    for piece in pieces:
+        out.write(piece)
+    return False
+
+
+def _evict(directory: str) -> None:
+    """
+    Removes all but the RESPONSE_CACHE_ENTRIES most recently used responses.
+    """
+    paths = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            # Another reader's render in progress
+            continue
+        path = os.path.join(directory, name)
+        try:
+            paths.append((os.stat(path).st_mtime_ns, path))
+        except FileNotFoundError:
+            continue
+    paths.sort(reverse=True)
+    for _, path in paths[RESPONSE_CACHE_ENTRIES:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def write_read(backend, params: dict, fmt: str, out: TextIO) -> None:
+    """
+    Writes the result of `read` in a layout, streamed from the backend and
+    served from the response cache when the log has not changed.
+
+    Args:
+        backend: The storage backend (see backends.Backend.iter_read).
+        params: The parameters of the read command (see main.command_params).
+        fmt: One of FORMATS.
+        out: The stream to write to.
+    """
+    filters = {key: params.get(key) for key in index.FILTER_KEYS}
+    read_params = dict(filters, limit=params.get('limit'), pending_only=bool(params.get('pending_only')),
+                       include_archived=bool(params.get('include_archived')))
+
+    def entries() -> Iterator[dict]:
+        return backend.iter_read(read_params['limit'], read_params['pending_only'],
+                                 read_params['include_archived'], **filters)
+
+    # Taken before reading, so a write during the render can't go unnoticed
+    version = backend.version()
+    if version is None:
+        for piece in iter_list(entries(), fmt):
+            out.write(piece)
+        return
+
+    directory = response_cache_dir(backend.filepath)
+    key = json.dumps([fmt, read_params], sort_keys=True)
+    # Named by checksums, which don't need hashlib imported; the header holds the parameters,
+    # so two reads that share a name never serve each other's response
+    data = key.encode('utf-8')
+    path = os.path.join(directory, f"{zlib.crc32(data):08x}{zlib.adler32(data):08x}.json")
+    header = (json.dumps([version, key]) + '\n').encode('utf-8')
+    try:
+        cache_file = open(path, 'rb')
+    except OSError:
+        cache_file = None
+    if cache_file is not None:
+        with cache_file as f:
+            if f.readline() == header:
+                try:
+                    # Marks the response as recently used
+                    os.utime(path)
+                except OSError:
+                    pass
+                _copy(f, out)
+                return
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = storage.temp_file(directory, '.tmp')
+    except OSError:
+        fd = None
+    cached = None
+    if fd is not None:
+        try:
+            with os.fdopen(fd, 'w+b') as f:
+                cached = _render(f, header, iter_list(entries(), fmt), out)
+            # Only a render that no write overlapped matches the version it is cached under
+            if cached and backend.version() == version:
+                os.replace(temp_path, path)
+                _evict(directory)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    if cached is None:
+        # Nowhere to render to: streamed like an uncached read
+        for piece in iter_list(entries(), fmt):
+            out.write(piece)
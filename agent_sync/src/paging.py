@@ -0,0 +1,169 @@
+"""
+Cursor pagination for `read --page-size N --cursor TOKEN`.
+
+Pages follow the 3-tier order with ties broken by ID, so every entry has
+a unique page key (status, priority, created_timestamp, id). The cursor
+is the page key of the last entry of a page, encoded as an opaque token;
+the next page starts strictly after it. The backends seek to that key
+(see backends.Backend.read_after) instead of counting entries, so a page
+costs the same however deep into the log it is, and writes between two
+pages can't shift entries across them: an entry that exists unchanged
+for the whole walk is returned exactly once. An entry completed during
+the walk moves to the completed part of the order, so it may be seen
+again there.
+"""
+import binascii
+import heapq
+import itertools
+import json
+from typing import Iterable, Iterator, List, Optional, Tuple
+from . import manager
+from .models import PRIORITY_MAP
+
+# The page size of `read --cursor` without --page-size.
+DEFAULT_PAGE_SIZE = 50
+
+# A page key: (status, priority, created_timestamp) as in manager.dict_sort_key, then the ID.
+PageKey = Tuple[int, int, int, str]
+
+
+def page_key(data: dict) -> PageKey:
+    """
+    Returns the key that orders entries in pages: the 3-tier key, ties by ID.
+
+    Args:
+        data: The log entry as a dictionary.
+
+    Returns:
+        A (status, priority, created_timestamp, id) tuple.
+    """
+    return manager.dict_sort_key(data) + (data['id'],)
+
+
+def encode_cursor(key: PageKey) -> str:
+    """
+    Encodes a page key as a URL-safe token without padding.
+    """
+    data = json.dumps(list(key), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    # Imported here: only paged reads use cursors
+    import base64
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(token: str) -> PageKey:
+    """
+    Decodes a token made by encode_cursor.
+
+    Args:
+        token: The cursor given with --cursor.
+
+    Returns:
+        The page key of the last entry of the previous page.
+
+    Raises:
+        ValueError: If the token was not made by encode_cursor.
+    """
+    # Imported here, like in encode_cursor
+    import base64
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        status, priority, created, log_id = json.loads(data)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("Invalid cursor (pass the next_cursor of the previous page)")
+    if (status not in (0, 1) or priority not in PRIORITY_MAP.values()
+            or type(created) is not int or not isinstance(log_id, str)):
+        raise ValueError("Invalid cursor (pass the next_cursor of the previous page)")
+    return status, priority, created, log_id
+
+
+def by_id_within_ties(entries: Iterable[dict]) -> Iterator[dict]:
+    """
+    Turns a stream in 3-tier order (ties in any order) into page order by
+    sorting each run of equal 3-tier keys by ID. Only one run is held.
+    """
+    for _, tied in itertools.groupby(entries, key=manager.dict_sort_key):
+        tied = list(tied)
+        if len(tied) > 1:
+            tied.sort(key=lambda entry: entry['id'])
+        yield from tied
+
+
+def merge_after(after: Optional[PageKey], ordered: Iterable[dict], extras: Iterable[dict]) -> Iterator[dict]:
+    """
+    Merges a stream in 3-tier order with a few unsorted entries (e.g. from a
+    journal) into page order, starting strictly after a page key.
+
+    Args:
+        after: The page key to start after, or None to start at the beginning.
+        ordered: Entries in 3-tier order, ties in any order.
+        extras: Entries in no particular order.
+
+    Yields:
+        The entries in page order. An entry that is in both inputs with
+        the same page key (a replayed journal add) is yielded once.
+    """
+    stream = heapq.merge(by_id_within_ties(ordered), sorted(extras, key=page_key), key=page_key)
+    last = after
+    for entry in stream:
+        key = page_key(entry)
+        if last is not None and key <= last:
+            continue
+        last = key
+        yield entry
+
+
+def seek_ranges(after: Optional[PageKey], pending_only: bool = False, status: Optional[List[str]] = None,
+                priority: Optional[List[str]] = None, since: Optional[int] = None,
+                until: Optional[int] = None) -> List[Tuple[tuple, tuple]]:
+    """
+    Returns the ranges of 3-tier keys a page after a key can come from.
+
+    Every (status, priority) combination the filters allow is one range,
+    in order; the time filters bound it, and the range that holds the
+    cursor starts at its key. Ranges wholly before the cursor are left out.
+
+    Args:
+        after: The page key to start after, or None.
+        pending_only: Skip completed entries.
+        status, priority, since, until: The filters of manager.matches.
+
+    Returns:
+        (start, stop) pairs of 3-tier keys: a range holds the keys k with
+        start <= k < stop.
+    """
+    statuses = [0] if pending_only else [0, 1]
+    if status is not None:
+        statuses = [code for code in statuses if ('pending', 'completed')[code] in status]
+    priorities = sorted(rank for name, rank in PRIORITY_MAP.items() if priority is None or name in priority)
+    low = float('-inf') if since is None else since
+    high = float('inf') if until is None else until
+    ranges = []
+    for code in statuses:
+        for rank in priorities:
+            start, stop = (code, rank, low), (code, rank, high)
+            if after is not None:
+                if stop <= after[:3]:
+                    continue
+                start = max(start, after[:3])
+            if start < stop:
+                ranges.append((start, stop))
+    return ranges
+
+
+def page(entries: Iterable[dict], page_size: int) -> dict:
+    """
+    Cuts one page off a stream in page order.
+
+    Args:
+        entries: The entries after the cursor, in page order.
+        page_size: The maximum number of entries on the page.
+
+    Returns:
+        {"entries": [...], "next_cursor": token}, where next_cursor is None
+        on the last page.
+    """
+    # One entry more than the page tells whether another page follows
+    taken = list(itertools.islice(entries, page_size + 1))
+    result = taken[:page_size]
+    more = len(taken) > page_size
+    return {"entries": result, "next_cursor": encode_cursor(page_key(result[-1])) if more else None}
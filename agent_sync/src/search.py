@@ -0,0 +1,567 @@
+"""
+Full-text search over the entry descriptions, ranked with BM25.
+
+Descriptions are split into lowercase words (see tokenize). The search
+index (status_log.json.sidx) is an inverted index over the snapshot: for
+every word, the snapshot offsets of the entries that contain it and their
+precomputed BM25 term weights. Like the query index in index.py, it
+records the signature of the snapshot it was built from and is rebuilt on
+first use after the snapshot changes. Entries added since the last
+compaction are still in the journal; they are tokenized in memory, so a
+new entry is searchable right away.
+"""
+import array
+import bisect
+import gc
+import heapq
+import json
+import math
+import os
+import re
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from . import storage, manager, index
+
+# Suffix of the search index file that lives next to the snapshot.
+SEARCH_INDEX_SUFFIX = '.sidx'
+
+# BM25 parameters: how fast repeated words saturate, and how strongly long
+# descriptions are penalized.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Longer words are cut to this many characters, which bounds the width of
+# the term directory.
+MAX_TERM_LENGTH = 32
+
+# The number of results returned when no limit is given.
+DEFAULT_LIMIT = 20
+
+# Scores are reported to this many decimals.
+SCORE_DIGITS = 4
+
+# Words are runs of letters and digits (like SQLite's unicode61 tokenizer).
+_WORD = re.compile(r"[^\W_]+")
+
+# Widths of the posting list position and document frequency columns.
+_POSITION_WIDTH = 12
+_COUNT_WIDTH = 10
+
+# Array typecodes of the posting lists: snapshot offsets and term weights.
+_OFFSET_TYPE = 'q'
+_WEIGHT_TYPE = 'd'
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase words.
+
+    Args:
+        text: The text, e.g. a description or a search query.
+
+    Returns:
+        The words in order, repeats included.
+    """
+    return [word[:MAX_TERM_LENGTH] for word in _WORD.findall(text.lower())]
+
+
+def search_index_path(filepath: str) -> str:
+    """
+    Returns the path of the search index that belongs to a snapshot file.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        The path to the search index file.
+    """
+    return filepath + SEARCH_INDEX_SUFFIX
+
+
+def _term_weights(words: List[str], average: float) -> Dict[str, float]:
+    """
+    Returns the BM25 term frequency component of every word of a
+    description: tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average)).
+    """
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(words) / average) if average else BM25_K1
+    if len(set(words)) == len(words):
+        # Every word once, the common case for short descriptions
+        return dict.fromkeys(words, (BM25_K1 + 1) / (1 + norm))
+    frequencies = Counter(words)
+    return {word: tf * (BM25_K1 + 1) / (tf + norm) for word, tf in frequencies.items()}
+
+
+def build_search_index(filepath: str) -> bool:
+    """
+    (Re)builds the search index from the snapshot.
+
+    Layout: a JSON header line, then a term directory of fixed-width lines
+    sorted by term (term, position of its posting list, document
+    frequency), then the snapshot offsets of all posting lists and finally
+    their term weights, both as native binary arrays. A query binary
+    searches the directory and reads only the lists of its words.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        True if the index was written, False if the snapshot is not stored
+        one entry per line.
+    """
+    signature = index.snapshot_signature(filepath)
+    try:
+        offsets, entries = storage.load_snapshot_lines(filepath)
+    except ValueError:
+        return False
+
+    # Millions of small lists: the cyclic GC would rescan them over and over
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        descriptions = [tokenize(entry["description"]) for entry in entries]
+        del entries
+        length = sum(len(words) for words in descriptions)
+        average = length / len(descriptions) if descriptions else 0
+        postings: Dict[str, Tuple[list, list]] = {}
+        for offset, words in zip(offsets, descriptions):
+            for term, weight in _term_weights(words, average).items():
+                posting = postings.get(term)
+                if posting is None:
+                    postings[term] = ([offset], [weight])
+                else:
+                    posting[0].append(offset)
+                    posting[1].append(weight)
+        count = len(descriptions)
+        del descriptions
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    terms = sorted(postings)
+    keys = [json.dumps(term) for term in terms]
+    width = max((len(key) for key in keys), default=2)
+    all_offsets = array.array(_OFFSET_TYPE)
+    all_weights = array.array(_WEIGHT_TYPE)
+    lines = []
+    for key, term in zip(keys, terms):
+        term_offsets, term_weights = postings[term]
+        lines.append(f"{key:<{width}} {len(all_offsets):0{_POSITION_WIDTH}d} "
+                     f"{len(term_offsets):0{_COUNT_WIDTH}d}\n")
+        all_offsets.extend(term_offsets)
+        all_weights.extend(term_weights)
+
+    header = json.dumps({
+        "snapshot": signature, "byteorder": sys.byteorder, "count": count, "length": length,
+        "terms": [len(terms), width], "postings": len(all_offsets)
+    })
+
+    directory = os.path.dirname(filepath) or '.'
+    fd, temp_path = storage.temp_file(directory, '.sidx.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write((header + '\n').encode('ascii'))
+            f.write(''.join(lines).encode('ascii'))
+            all_offsets.tofile(f)
+            all_weights.tofile(f)
+        os.replace(temp_path, search_index_path(filepath))
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return True
+
+
+class SearchIndex:
+    """
+    Reader for the on-disk search index of the snapshot (see
+    build_search_index). Rebuilt on first use after the snapshot changes.
+
+    Attributes:
+        indexed (bool): Whether the snapshot could be indexed.
+        count (int): The number of entries in the snapshot.
+        length (int): The total number of words in their descriptions.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.indexed = self._open()
+
+    def _open(self) -> bool:
+        signature = index.snapshot_signature(self.filepath)
+        self.count = self.length = self._terms = 0
+        if signature is None:
+            return True
+
+        for attempt in range(2):
+            try:
+                with open(search_index_path(self.filepath), 'rb') as f:
+                    header_line = f.readline()
+                header = json.loads(header_line)
+                if header["snapshot"] == signature and header["byteorder"] == sys.byteorder:
+                    self.count = header["count"]
+                    self.length = header["length"]
+                    self._terms, self._width = header["terms"]
+                    self._line_length = self._width + 1 + _POSITION_WIDTH + 1 + _COUNT_WIDTH + 1
+                    self._data_start = len(header_line)
+                    self._offsets_start = self._data_start + self._terms * self._line_length
+                    self._weights_start = (self._offsets_start
+                                           + header["postings"] * array.array(_OFFSET_TYPE).itemsize)
+                    return True
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+            if attempt == 0 and not build_search_index(self.filepath):
+                return False
+        return False
+
+    def _term_at(self, f, position: int) -> str:
+        f.seek(self._data_start + position * self._line_length)
+        return json.loads(f.read(self._width))
+
+    def postings(self, terms: List[str]) -> Dict[str, Tuple[array.array, array.array]]:
+        """
+        Returns the posting lists of the terms that occur in the snapshot.
+
+        Args:
+            terms: The words to look up.
+
+        Returns:
+            The (snapshot offsets, term weights) arrays of each term found,
+            in offset order.
+        """
+        if not self._terms:
+            return {}
+        found = {}
+        with open(search_index_path(self.filepath), 'rb') as f:
+            for term in terms:
+                lo, hi = 0, self._terms
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if self._term_at(f, mid) < term:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                if lo == self._terms or self._term_at(f, lo) != term:
+                    continue
+                position, frequency = (int(column) for column in f.read(self._line_length - self._width).split())
+                term_offsets = array.array(_OFFSET_TYPE)
+                term_weights = array.array(_WEIGHT_TYPE)
+                f.seek(self._offsets_start + position * term_offsets.itemsize)
+                term_offsets.fromfile(f, frequency)
+                f.seek(self._weights_start + position * term_weights.itemsize)
+                term_weights.fromfile(f, frequency)
+                found[term] = (term_offsets, term_weights)
+        return found
+
+
+def rank_key(score: float, entry: dict) -> tuple:
+    """
+    Returns the sort key of a search result: the best score first, then
+    the oldest entry, then the ID. Every backend orders results this way,
+    so ties don't depend on how the log is stored.
+    """
+    return -score, entry["created_timestamp"], entry["id"]
+
+
+def _terms(text: str) -> List[str]:
+    """
+    Returns the distinct words of a search text, in order.
+
+    Raises:
+        ValueError: If text contains no words.
+    """
+    terms = list(dict.fromkeys(tokenize(text)))
+    if not terms:
+        raise ValueError("The search text contains no words")
+    return terms
+
+
+def entry_candidates(entries: List[dict], text: str, **filters) -> dict:
+    """
+    Returns the word statistics of entries held in memory and those that
+    match (see candidates).
+
+    Args:
+        entries: The log entries as dictionaries, in load order.
+        text: The search text.
+        **filters: The filters accepted by manager.matches.
+
+    Raises:
+        ValueError: If text contains no words.
+    """
+    terms = _terms(text)
+    descriptions = [tokenize(entry["description"]) for entry in entries]
+    frequencies = Counter(term for words in descriptions for term in set(words).intersection(terms))
+    return {
+        "count": len(descriptions),
+        "length": sum(len(words) for words in descriptions),
+        "frequencies": dict(frequencies),
+        "matches": [entry for entry, words in zip(entries, descriptions)
+                    if frequencies.keys() & words and manager.matches(entry, **filters)],
+    }
+
+
+def candidates(filepath: str, text: str, **filters) -> dict:
+    """
+    Returns what ranking a log together with others needs from it: the
+    word statistics of all its entries and, unranked, every entry that
+    contains a word of text and passes the filters. Statistics of several
+    logs add up, so rank scores their matches like one log holding all
+    their entries. The caller must hold the lock (shared or exclusive).
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        text: The search text.
+        **filters: The filters accepted by manager.matches.
+
+    Returns:
+        A dictionary with the 'count' of entries, the 'length' of their
+        descriptions in words, the document 'frequencies' of the words of
+        text that occur, and the 'matches' in load order.
+
+    Raises:
+        ValueError: If text contains no words.
+    """
+    terms = _terms(text)
+    search_index = SearchIndex(filepath)
+    if not search_index.indexed:
+        # Not stored one entry per line, or damaged: every entry is counted in memory
+        return entry_candidates(storage.load_logs(filepath), text, **filters)
+
+    added, completions = index.journal_overlay(filepath)
+    postings = search_index.postings(terms)
+    extra = list(added.values())
+    descriptions = [tokenize(entry["description"]) for entry in extra]
+    frequencies = {}
+    offsets = set()
+    for term in terms:
+        term_offsets = postings[term][0] if term in postings else []
+        frequency = len(term_offsets) + sum(1 for words in descriptions if term in words)
+        if frequency:
+            frequencies[term] = frequency
+        offsets.update(term_offsets)
+
+    offsets = sorted(offsets)
+    matches = []
+    for entry in storage.read_snapshot_entries(filepath, offsets):
+        if entry["id"] in added:
+            # Replayed add of an entry that is already in the snapshot; matched from the journal
+            continue
+        if entry["id"] in completions:
+            storage.apply_completion(entry, completions[entry["id"]])
+        matches.append(entry)
+    matches.extend(entry for entry, words in zip(extra, descriptions) if frequencies.keys() & words)
+    return {
+        "count": search_index.count + len(extra),
+        "length": search_index.length + sum(len(words) for words in descriptions),
+        "frequencies": frequencies,
+        "matches": [entry for entry in matches if manager.matches(entry, **filters)],
+    }
+
+
+def merge_candidates(parts: Iterable[dict]) -> dict:
+    """
+    Adds up the candidates of several logs (see candidates), keeping the
+    matches in the order of the parts.
+    """
+    merged = {"count": 0, "length": 0, "frequencies": Counter(), "matches": []}
+    for part in parts:
+        merged["count"] += part["count"]
+        merged["length"] += part["length"]
+        merged["frequencies"].update(part["frequencies"])
+        merged["matches"].extend(part["matches"])
+    merged["frequencies"] = dict(merged["frequencies"])
+    return merged
+
+
+def rank(found: dict, limit: Optional[int] = DEFAULT_LIMIT) -> List[dict]:
+    """
+    Scores candidates (see candidates) against their word statistics.
+
+    Args:
+        found: The candidates of one log, or of several merged.
+        limit: The maximum number of entries to return. None returns all matches.
+
+    Returns:
+        The matching entries as dictionaries in rank_key order, each with
+        its BM25 'score'.
+    """
+    count = found["count"]
+    average = found["length"] / count if count else 0
+    idfs = {term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in found["frequencies"].items()}
+    scored = []
+    for position, entry in enumerate(found["matches"]):
+        words = tokenize(entry["description"])
+        weights = _term_weights(words, average)
+        score = sum(idfs[term] * weights[term] for term in idfs.keys() & weights.keys())
+        scored.append((rank_key(score, entry), position, score, entry))
+    ranked = sorted(scored) if limit is None else heapq.nsmallest(limit, scored)
+    return [dict(entry, score=round(score, SCORE_DIGITS)) for _, _, score, entry in ranked]
+
+
+def search_entries(entries: List[dict], text: str, limit: Optional[int] = DEFAULT_LIMIT,
+                   **filters) -> List[dict]:
+    """
+    Ranks entries held in memory, scored like search scores a log: the
+    word statistics cover every entry, the filters only pick the results.
+
+    Args:
+        entries: The log entries as dictionaries, in load order.
+        text: The search text.
+        limit: The maximum number of entries to return. None returns all matches.
+        **filters: The filters accepted by manager.matches.
+
+    Returns:
+        The matching entries as dictionaries in rank_key order, each with
+        its BM25 'score'.
+
+    Raises:
+        ValueError: If text contains no words.
+    """
+    return rank(entry_candidates(entries, text, **filters), limit)
+
+
+def _allowed_offsets(filepath: str, completions: Dict[str, dict], filters: dict) -> Optional[set]:
+    """
+    Returns the snapshot offsets that can match the filters (see
+    index.query), or None if there are no filters.
+    """
+    if not any(value is not None for value in filters.values()):
+        return None
+    query_index = index.QueryIndex(filepath)
+    if not query_index.indexed:
+        return None
+    offsets = set(query_index.lookup(**filters))
+    if completions and (filters.get('status') is None or 'completed' in filters['status']):
+        # Entries that were pending in the snapshot may have become matches
+        id_index = index.IdIndex(filepath)
+        for log_id in completions:
+            offset = id_index.offset_of(log_id)
+            if offset is not None:
+                offsets.add(offset)
+    return offsets
+
+
+def _kth_score(scores: Dict[int, float], k: int) -> float:
+    return heapq.nlargest(k, scores.values())[-1]
+
+
+def search(filepath: str, text: str, limit: Optional[int] = DEFAULT_LIMIT, **filters) -> List[dict]:
+    """
+    Returns the entries whose description best matches text, best first.
+
+    Each word of text adds its BM25 weight to the entries that contain it,
+    so entries matching more (and rarer) words rank higher. Words are
+    scored from the rarest to the most common; once the entries scored so
+    far fill the limit by a margin the remaining words can't close
+    (MaxScore), the common words are only looked up for those entries
+    instead of walking their whole posting lists. The filters are applied
+    through the query index before scoring. The caller must hold the lock
+    (shared or exclusive).
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        text: The search text.
+        limit: The maximum number of entries to return. None returns all matches.
+        **filters: The filters accepted by manager.matches.
+
+    Returns:
+        The matching entries as dictionaries in rank_key order, each with
+        its BM25 'score'.
+
+    Raises:
+        ValueError: If text contains no words.
+    """
+    terms = _terms(text)
+    if limit == 0:
+        return []
+
+    search_index = SearchIndex(filepath)
+    if search_index.indexed:
+        added, completions = index.journal_overlay(filepath)
+        postings = search_index.postings(terms)
+        extra = list(added.values())
+        allowed = _allowed_offsets(filepath, completions, filters)
+        # Journaled entries are keyed after the end of the snapshot
+        base = (index.snapshot_signature(filepath) or [0, 0, 0])[2]
+    else:
+        # Not stored one entry per line, or damaged: every entry is scored in memory
+        added, completions, postings, allowed, base = {}, {}, {}, None, 0
+        extra = storage.load_logs(filepath)
+
+    # Journaled entries use the snapshot's average length, like the index
+    descriptions = [tokenize(entry["description"]) for entry in extra]
+    count = search_index.count + len(extra)
+    length = search_index.length + sum(len(words) for words in descriptions)
+    average = search_index.length / search_index.count if search_index.count else (length / count if count else 0)
+    lists = []
+    for term in terms:
+        term_offsets, term_weights = postings.get(term) or ([], [])
+        frequency = len(term_offsets)
+        for i, (entry, words) in enumerate(zip(extra, descriptions)):
+            if term in words:
+                frequency += 1
+                # Only entries that pass the filters are scored
+                if manager.matches(entry, **filters):
+                    term_offsets.append(base + i)
+                    term_weights.append(_term_weights(words, average)[term])
+        if frequency:
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            lists.append((idf, term_offsets, term_weights))
+    # Rarest (highest idf) first; bounds[i] caps what lists[i:] can still add
+    lists.sort(key=lambda item: -item[0])
+    bounds = [sum(idf * (BM25_K1 + 1) for idf, _, _ in lists[i:]) for i in range(len(lists))]
+
+    # Snapshot entries completed or re-added in the journal may still be rejected
+    # after scoring, so that many extra candidates are kept
+    keep = None if limit is None else limit + len(completions) + len(added)
+    scores: Dict[int, float] = {}
+    for i, (idf, term_offsets, term_weights) in enumerate(lists):
+        if keep is not None and len(scores) >= keep:
+            threshold = _kth_score(scores, keep)
+            if threshold > bounds[i]:
+                # Unscored entries can't reach the threshold any more: finish the
+                # candidates that still can by looking them up in the remaining lists
+                scores = {key: score for key, score in scores.items() if score + bounds[i] >= threshold}
+                for rest_idf, rest_offsets, rest_weights in lists[i:]:
+                    for key in scores:
+                        j = bisect.bisect_left(rest_offsets, key)
+                        if j < len(rest_offsets) and rest_offsets[j] == key:
+                            scores[key] += rest_idf * rest_weights[j]
+                break
+        if allowed is None:
+            contributions = zip(term_offsets, [idf * weight for weight in term_weights])
+        else:
+            contributions = ((key, idf * weight) for key, weight in zip(term_offsets, term_weights)
+                             if key >= base or key in allowed)
+        if scores:
+            for key, contribution in contributions:
+                scores[key] = scores.get(key, 0.0) + contribution
+        else:
+            scores = dict(contributions)
+
+    candidates = scores.items()
+    if keep is not None and len(scores) > keep:
+        # Cheaper than a keyed top-k over every candidate. Ties with the last
+        # one kept are kept too: rank_key breaks them
+        threshold = _kth_score(scores, keep)
+        candidates = [item for item in candidates if item[1] >= threshold]
+
+    offsets = sorted(key for key, _ in candidates if key < base)
+    snapshot_entries = dict(zip(offsets, storage.read_snapshot_entries(filepath, offsets))) if offsets else {}
+    results = []
+    for key, score in candidates:
+        if key < base:
+            entry = snapshot_entries[key]
+            if entry["id"] in added:
+                # Replayed add of an entry that is already in the snapshot; scored from the journal
+                continue
+            if entry["id"] in completions:
+                storage.apply_completion(entry, completions[entry["id"]])
+        else:
+            entry = extra[key - base]
+        if manager.matches(entry, **filters):
+            results.append((rank_key(score, entry), score, entry))
+    results.sort(key=lambda item: item[0])
+    return [dict(entry, score=round(score, SCORE_DIGITS)) for _, score, entry in results[:limit]]
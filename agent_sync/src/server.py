@@ -0,0 +1,198 @@
+"""
+Optional long-running server for the Project Status Log tool.
+
+The server keeps the parsed and sorted log in memory and answers CLI
+requests over a local Unix-domain socket, so a call no longer pays for
+loading the whole file. Requests are handled one at a time, which also
+serializes all writes in a single place.
+
+Protocol: the client sends one JSON line {"command": ..., "params": ...}
+and receives one JSON line with a 'status' of 'success', 'error' or
+'unsupported' (the client then falls back to running the command itself).
+"""
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+from typing import List, Optional
+from . import storage, models, client, index, api
+from .models import LogEntry
+
+# The parameters each command understands. Any other parameter that is set
+# makes the server answer 'unsupported' so the CLI handles it locally.
+SUPPORTED_PARAMS = {
+    'add': {'desc', 'priority', 'user', 'role'},
+    'read': {'limit', 'pending_only', *index.FILTER_KEYS},
+    'complete': {'id', 'user', 'role'},
+}
+
+
+class LogState(api.StatusLog):
+    """
+    The in-memory copy of the log (see api.StatusLog), with the request
+    handlers on top.
+
+    The state is revalidated against the snapshot and journal before every
+    request, so changes made by processes that bypass the server are picked up.
+    """
+
+    def __init__(self, filepath: str):
+        super().__init__(filepath)
+        # The ordered entries as dictionaries, kept in step with the order
+        self._read_result: Optional[List[dict]] = None
+
+    def _reloaded(self) -> None:
+        self._read_result = None
+
+    def _added(self, entry: LogEntry, position: int) -> None:
+        if self._read_result is not None:
+            self._read_result.insert(position, models.to_dict(entry))
+
+    def _completed(self, entry: LogEntry, old_position: int, position: int) -> None:
+        # The entry moves from the pending to the completed segment
+        if self._read_result is not None:
+            del self._read_result[old_position]
+            self._read_result.insert(position, models.to_dict(entry))
+
+    def handle_add(self, params: dict) -> dict:
+        entry = self.add(params['desc'], params['priority'], params['user'], params['role'])
+        return {
+            "status": "success",
+            "data": models.to_dict(entry),
+            "meta": {"lock_wait_ms": round(self.lock_wait * 1000, 3), "group_size": 1}
+        }
+
+    def handle_read(self, params: dict) -> List[dict]:
+        filters = {key: params.get(key) for key in index.FILTER_KEYS}
+        if any(value is not None for value in filters.values()):
+            entries = self.query(params.get('limit'), params.get('pending_only'), **filters)
+            return [models.to_dict(entry) for entry in entries]
+
+        self._revalidate()
+        if self._read_result is None:
+            self._read_result = [models.to_dict(entry) for entry in self._ordered]
+        result = self._read_result
+
+        if params.get('pending_only'):
+            result = result[:self._ordered.pending_count()]
+        if params.get('limit') is not None:
+            result = result[:params['limit']]
+        return result
+
+    def handle_complete(self, params: dict) -> dict:
+        entry = self.complete(params['id'], params['user'], params['role'])
+        return {
+            "status": "success",
+            "message": f"Entry {entry.id} marked as completed",
+            "id": entry.id,
+            "meta": {"lock_wait_ms": round(self.lock_wait * 1000, 3), "group_size": 1}
+        }
+
+    def handle(self, request: dict) -> dict:
+        """
+        Executes a single request.
+
+        Args:
+            request: The decoded request with 'command' and 'params' keys.
+
+        Returns:
+            The response dictionary to send back to the client.
+        """
+        command = request.get("command")
+        params = request.get("params", {})
+
+        supported = SUPPORTED_PARAMS.get(command)
+        if supported is None or any(
+            key not in supported and value not in (None, False) for key, value in params.items()
+        ):
+            return {"status": "unsupported"}
+
+        try:
+            result = getattr(self, 'handle_' + command)(params)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        except Exception as e:
+            # Drop the in-memory state; it is reloaded from disk on the next request
+            self._signature = None
+            return {"status": "error", "unexpected": True, "message": str(e)}
+        return {"status": "success", "result": result}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Reads one JSON request line and writes one JSON response line.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            response = {"status": "error", "message": f"Malformed request: {e}"}
+        else:
+            response = self.server.state.handle(request)
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+class LogServer(socketserver.UnixStreamServer):
+    """
+    A single-threaded Unix-domain socket server; requests never run concurrently.
+    """
+
+    def __init__(self, sock_path: str, state: LogState):
+        self.state = state
+        super().__init__(sock_path, _RequestHandler)
+
+
+def _remove_stale_socket(sock_path: str) -> None:
+    """
+    Removes a socket file left behind by a server that is no longer running.
+
+    Raises:
+        RuntimeError: If another server is still listening on the socket.
+    """
+    if not os.path.exists(sock_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(sock_path)
+    except ConnectionRefusedError:
+        os.remove(sock_path)
+    else:
+        raise RuntimeError(f"A server is already listening on {sock_path}")
+    finally:
+        probe.close()
+
+
+def serve(filepath: str, sock_path: Optional[str] = None) -> None:
+    """
+    Runs the server until it is interrupted (Ctrl-C or SIGTERM).
+
+    Args:
+        filepath: The path to the JSON database file.
+        sock_path: The socket to listen on. Defaults to the database path
+            with client.SOCKET_SUFFIX appended, where the CLI looks for it.
+    """
+    sock_path = sock_path or client.socket_path(filepath)
+    _remove_stale_socket(sock_path)
+
+    state = LogState(filepath)
+    with storage.lock(filepath, exclusive=False):
+        state.refresh()
+
+    # Turn SIGTERM into a normal exit so the socket file gets cleaned up
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    with LogServer(sock_path, state) as server:
+        print(f"Serving {filepath} on {sock_path} ({len(state)} entries)", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(sock_path):
+                os.remove(sock_path)
@@ -0,0 +1,433 @@
+"""
+SQLite storage backend (stdlib sqlite3), selected for '.db' database files.
+
+Entries live in one table in WAL mode, so readers never block the writer
+and a write touches only its own rows instead of rewriting the log.
+`read` is an ORDER BY over an index on the 3-tier key, with LIMIT and the
+filters pushed into the query; a page of `read --page-size` seeks to its
+cursor on a second index that appends the ID. `search` ranks an FTS5
+index over the descriptions, kept in sync by triggers, with its bm25()
+function. The summary of `stats` is a single row, updated in the
+transaction of every write (see stats.py). Writers serialize on SQLite's
+own lock (BEGIN IMMEDIATE), waiting up to BUSY_TIMEOUT_SECONDS for it.
+"""
+import json
+import os
+import sqlite3
+import time
+from typing import Iterator, List, Optional, Tuple
+from . import manager, models, storage, index, archive, search, follow, stats, timings, paging, history
+from . import integrity
+from .backends import Backend
+from .models import PRIORITY_MAP
+
+# How long a writer waits for another writer's transaction before failing.
+BUSY_TIMEOUT_SECONDS = 30
+
+# PRAGMA synchronous for every durability level (see storage.durability).
+# EXTRA is FULL plus a sync of the directory when a journal is removed.
+SYNCHRONOUS = {'none': 'OFF', 'file': 'FULL', 'full': 'EXTRA'}
+
+# The columns of an entry, in LogEntry field order.
+FIELDS = (
+    "id", "creator", "creator_role", "created_timestamp", "description", "priority",
+    "status", "completer", "completer_role", "completion_timestamp",
+)
+
+# seq is the load order, which breaks ties like the stable sort in sort_logs.
+# The two rank columns are the 3-tier key as numbers, derived by SQLite.
+_PRIORITY_RANK = "CASE priority {} END".format(
+    " ".join(f"WHEN '{name}' THEN {rank}" for name, rank in PRIORITY_MAP.items())
+)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS logs (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    creator TEXT NOT NULL,
+    creator_role TEXT NOT NULL,
+    created_timestamp INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    status TEXT NOT NULL,
+    completer TEXT,
+    completer_role TEXT,
+    completion_timestamp INTEGER,
+    status_rank INTEGER GENERATED ALWAYS AS (CASE status WHEN 'pending' THEN 0 ELSE 1 END) VIRTUAL,
+    priority_rank INTEGER GENERATED ALWAYS AS ({_PRIORITY_RANK}) VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS logs_order ON logs (status_rank, priority_rank, created_timestamp);
+CREATE INDEX IF NOT EXISTS logs_page ON logs (status_rank, priority_rank, created_timestamp, id);
+CREATE INDEX IF NOT EXISTS logs_completed ON logs (completion_timestamp);
+CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(
+    description, content='logs', content_rowid='seq', tokenize='unicode61 remove_diacritics 0'
+);
+CREATE TRIGGER IF NOT EXISTS logs_fts_insert AFTER INSERT ON logs BEGIN
+    INSERT INTO logs_fts (rowid, description) VALUES (new.seq, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS logs_fts_delete AFTER DELETE ON logs BEGIN
+    INSERT INTO logs_fts (logs_fts, rowid, description) VALUES ('delete', old.seq, old.description);
+END;
+CREATE TABLE IF NOT EXISTS summary (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    data TEXT NOT NULL
+);
+"""
+
+_COLUMNS = ", ".join(FIELDS)
+_ORDER = "ORDER BY status_rank, priority_rank, created_timestamp, seq"
+# The page order of paging.py, which breaks ties by ID instead.
+_PAGE_KEY = "status_rank, priority_rank, created_timestamp, id"
+
+
+class SqliteBackend(Backend):
+    """
+    Stores the log in a SQLite database (see the module docstring).
+    """
+
+    def __init__(self, filepath: str):
+        super().__init__(filepath)
+        # Autocommit mode: transactions are opened explicitly
+        self.connection = sqlite3.connect(filepath, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(f"PRAGMA synchronous={SYNCHRONOUS[storage.durability()]}")
+        has_fts = self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'logs_fts'").fetchone()
+        has_summary = self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'summary'").fetchone()
+        self.connection.executescript(_SCHEMA)
+        if not has_fts:
+            # Databases created before search existed: index the rows they hold
+            self.connection.execute("INSERT INTO logs_fts (logs_fts) VALUES ('rebuild')")
+        if not has_summary:
+            # A new database starts with an empty summary; one that holds rows
+            # already gets it on its first `stats`
+            self._begin()
+            if not self.connection.execute("SELECT 1 FROM logs LIMIT 1").fetchone() and self._summary() is None:
+                self._store_summary(stats.Summary())
+            self.connection.execute("COMMIT")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _row(self, row: tuple) -> dict:
+        return dict(zip(FIELDS, row))
+
+    def _begin(self) -> float:
+        """
+        Opens a write transaction and returns the seconds spent waiting for it.
+        """
+        start = time.perf_counter()
+        self.connection.execute("BEGIN IMMEDIATE")
+        return time.perf_counter() - start
+
+    def _get(self, log_id: str):
+        row = self.connection.execute(f"SELECT {_COLUMNS} FROM logs WHERE id = ?", (log_id,)).fetchone()
+        return None if row is None else self._row(row)
+
+    def resolve(self, id_or_prefix: str) -> str:
+        """
+        Resolves an ID or unique prefix through the index on id (see index.resolve_id).
+        """
+        if self._get(id_or_prefix) is not None:
+            return id_or_prefix
+        # Six candidates are enough to tell unique from ambiguous and to list a few
+        rows = self.connection.execute(
+            "SELECT id FROM logs WHERE id >= ? ORDER BY id LIMIT 6", (id_or_prefix,)
+        ).fetchall()
+        return index.resolve_id(id_or_prefix, (row[0] for row in rows if row[0].startswith(id_or_prefix)))
+
+    def _summary(self):
+        """
+        Returns the stored summary, or None if there is none yet.
+        """
+        row = self.connection.execute("SELECT data FROM summary WHERE id = 0").fetchone()
+        return None if row is None else stats.Summary.from_dict(json.loads(row[0]))
+
+    def _store_summary(self, summary: stats.Summary) -> None:
+        self.connection.execute("INSERT OR REPLACE INTO summary (id, data) VALUES (0, ?)",
+                                (json.dumps(summary.to_dict(), separators=(',', ':')),))
+
+    def _insert(self, entries: List[dict]) -> None:
+        self.connection.executemany(
+            f"INSERT INTO logs ({_COLUMNS}) VALUES ({', '.join('?' * len(FIELDS))})",
+            ([entry.get(field) for field in FIELDS] for entry in entries)
+        )
+
+    def commit(self, ops: List[dict]) -> Tuple[List[dict], dict]:
+        waited = self._begin()
+        results = []
+        # (before, after) per entry written, for the summary and the history
+        changes = []
+        try:
+            for op in ops:
+                # A savepoint per operation, so a failing one doesn't affect the others
+                self.connection.execute("SAVEPOINT op")
+                try:
+                    if op["op"] == "add":
+                        self._insert([op["entry"]])
+                        record = storage.add_record(op["entry"])
+                        change = (None, op["entry"])
+                    elif op["op"] == "complete":
+                        log_id = self.resolve(op["id"])
+                        before = self._get(log_id)
+                        entry = manager.mark_completed(
+                            models.from_dict(before), op["completer"], op["completer_role"]
+                        )
+                        self.connection.execute(
+                            "UPDATE logs SET status = ?, completer = ?, completer_role = ?, "
+                            "completion_timestamp = ? WHERE id = ?",
+                            (entry.status, entry.completer, entry.completer_role,
+                             entry.completion_timestamp, entry.id)
+                        )
+                        record = storage.complete_record(entry)
+                        change = (before, models.to_dict(entry))
+                    else:
+                        raise ValueError(f"Unknown operation: {op['op']}")
+                except (ValueError, sqlite3.IntegrityError) as e:
+                    self.connection.execute("ROLLBACK TO op")
+                    self.connection.execute("RELEASE op")
+                    results.append({"status": "error", "message": str(e)})
+                    continue
+                self.connection.execute("RELEASE op")
+                changes.append(change)
+                results.append({"status": "success", "record": record})
+            summary = self._summary()
+            if summary is not None and changes:
+                for before, after in changes:
+                    summary.apply(before, after)
+                self._store_summary(summary)
+            # Still in the transaction, whose lock keeps writers in order
+            history.record(self.filepath, changes, self.export)
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return results, {"lock_wait_ms": round(waited * 1000, 3), "group_size": 1}
+
+    def _conditions(self, pending_only=False, status=None, priority=None,
+                    creator=None, role=None, since=None, until=None) -> Tuple[List[str], list]:
+        """
+        Translates the read filters into WHERE conditions and their arguments.
+        """
+        conditions = []
+        args = []
+        for column, values in (("status", status), ("priority", priority),
+                               ("creator", creator), ("creator_role", role)):
+            if values is not None:
+                conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+                args.extend(values)
+        if pending_only:
+            conditions.append("status_rank = 0")
+        if since is not None:
+            conditions.append("created_timestamp >= ?")
+            args.append(since)
+        if until is not None:
+            conditions.append("created_timestamp < ?")
+            args.append(until)
+        return conditions, args
+
+    def _select(self, limit=None, pending_only=False, **filters) -> sqlite3.Cursor:
+        conditions, args = self._conditions(pending_only, **filters)
+        sql = f"SELECT {_COLUMNS} FROM logs"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " " + _ORDER
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return self.connection.execute(sql, args)
+
+    def read_hot(self, limit=None, pending_only=False, **filters) -> List[dict]:
+        with timings.phase('load'):
+            rows = self._select(limit, pending_only, **filters).fetchall()
+        timings.count('entries_loaded', len(rows))
+        with timings.phase('model'):
+            return [self._row(row) for row in rows]
+
+    def iter_read(self, limit=None, pending_only=False, include_archived=False, **filters) -> Iterator[dict]:
+        if include_archived:
+            return super().iter_read(limit, pending_only, include_archived, **filters)
+        # Rows come off the cursor as they are consumed
+        return map(self._row, self._select(limit, pending_only, **filters))
+
+    def read_after(self, after: Optional[paging.PageKey], limit: int, pending_only=False,
+                   **filters) -> List[dict]:
+        # A row value comparison on the logs_page index: the scan starts at the cursor
+        conditions, args = self._conditions(**filters)
+        if pending_only:
+            # As a range, so SQLite still seeks with the row value (status_rank = 0 would scan from the start)
+            conditions.append("status_rank < 1")
+        if after is not None:
+            conditions.append(f"({_PAGE_KEY}) > (?, ?, ?, ?)")
+            args.extend(after)
+        sql = f"SELECT {_COLUMNS} FROM logs"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {_PAGE_KEY} LIMIT ?"
+        with timings.phase('load'):
+            rows = self.connection.execute(sql, args + [limit]).fetchall()
+        timings.count('entries_loaded', len(rows))
+        return [self._row(row) for row in rows]
+
+    def search(self, text: str, limit=search.DEFAULT_LIMIT, **filters) -> List[dict]:
+        terms = list(dict.fromkeys(search.tokenize(text)))
+        if not terms:
+            raise ValueError("The search text contains no words")
+        # Any of the words; a word cut by tokenize matches as a prefix
+        match = " OR ".join(
+            f'"{term}"' + ("*" if len(term) == search.MAX_TERM_LENGTH else "") for term in terms
+        )
+        conditions, args = self._conditions(**filters)
+        sql = (f"SELECT {', '.join('logs.' + field for field in FIELDS)}, -bm25(logs_fts) "
+               f"FROM logs_fts JOIN logs ON logs.seq = logs_fts.rowid WHERE logs_fts MATCH ?")
+        for condition in conditions:
+            sql += " AND " + condition
+        # Like search.rank_key
+        sql += " ORDER BY bm25(logs_fts), logs.created_timestamp, logs.id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return [
+            dict(self._row(row[:-1]), score=round(row[-1], search.SCORE_DIGITS))
+            for row in self.connection.execute(sql, [match] + args)
+        ]
+
+    def search_candidates(self, text: str, **filters) -> dict:
+        # The word statistics of FTS5 aren't exposed: every description is counted
+        return search.entry_candidates(self.export(), text, **filters)
+
+    def follower(self) -> 'SqliteFollower':
+        return SqliteFollower(self)
+
+    def archive(self, older_than_days: int) -> dict:
+        now = time.time()
+        cutoff = now - older_than_days * 86400
+        old = "status = 'completed' AND completion_timestamp < ?"
+        self._begin()
+        try:
+            entries = [self._row(row) for row in self.connection.execute(
+                f"SELECT {_COLUMNS} FROM logs WHERE {old} ORDER BY seq", (cutoff,)
+            )]
+            # Segments are written before the rows go, like for the JSON log
+            _, segments = archive.archive_entries(self.filepath, entries, older_than_days, now)
+            self.connection.execute(f"DELETE FROM logs WHERE {old}", (cutoff,))
+            remaining = self.connection.execute("SELECT count(*) FROM logs").fetchone()[0]
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return {"status": "success", "archived": len(entries), "remaining": remaining, "segments": segments}
+
+    def stats(self, rebuild: bool = False) -> stats.Summary:
+        if not rebuild:
+            summary = self._summary()
+            if summary is not None:
+                return summary
+        self._begin()
+        try:
+            stored = self._summary()
+            with timings.phase('model'):
+                summary = stats.summarize(self.filepath, self.export())
+            if rebuild:
+                summary.verified = stats.matches(summary, stored)
+            self._store_summary(summary)
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return summary
+
+    def verify(self) -> dict:
+        return integrity.verify(self.filepath, self._check)
+
+    def _check(self, filepath: str) -> dict:
+        """
+        Checks the database with SQLite's own integrity_check, for integrity.verify.
+        SQLite pages carry no checksums; the check walks every table and index.
+        """
+        result = {"bytes": os.path.getsize(filepath), "entries": 0, "damaged": [], "checksummed": False}
+        try:
+            problems = [row[0] for row in self.connection.execute("PRAGMA integrity_check")]
+            result["entries"] = self.connection.execute("SELECT count(*) FROM logs").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            problems = [str(e)]
+        result["damaged"] = [(0, result["bytes"], problem) for problem in problems if problem != 'ok']
+        return result
+
+    def repair(self, force: bool = False) -> dict:
+        report = self.verify()
+        if any(damage["file"] == self.filepath for damage in report["damaged"]):
+            raise ValueError(f"{self.filepath} is damaged; SQLite databases are recovered with the .recover "
+                             f"command of the sqlite3 shell")
+        return {"status": "success", "path": self.filepath, "repaired": False, "damaged": 0, "recovered": 0,
+                "history": False, "backups": []}
+
+    def export(self) -> List[dict]:
+        return [self._row(row) for row in self.connection.execute(f"SELECT {_COLUMNS} FROM logs ORDER BY seq")]
+
+    def import_entries(self, entries: List[dict]) -> None:
+        self._begin()
+        try:
+            if self.connection.execute("SELECT 1 FROM logs LIMIT 1").fetchone():
+                raise ValueError(f"{self.filepath} already holds entries; import into an empty database")
+            self._insert(entries)
+            self._store_summary(stats.summarize(self.filepath, entries))
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+
+class SqliteFollower:
+    """
+    Follows a SQLite database for `read --follow` (see follow.py).
+
+    An idle poll is one PRAGMA data_version, which only changes when another
+    connection commits. New rows are those past the highest seq seen;
+    completions are found through the index on completion_timestamp.
+    """
+
+    def __init__(self, backend: SqliteBackend):
+        self.connection = backend.connection
+        self._version = None
+        self._seq = 0
+        # Latest completion seen, and the IDs completed in that second
+        self._completed_at = None
+        self._completed_ids = set()
+
+    def poll(self) -> List[dict]:
+        version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version:
+            return []
+        self._version = version
+
+        # One read transaction, so both queries see the same state
+        self.connection.execute("BEGIN")
+        try:
+            added = self.connection.execute(
+                f"SELECT seq, {_COLUMNS} FROM logs WHERE seq > ? ORDER BY seq", (self._seq,)
+            ).fetchall()
+            completed = []
+            if self._completed_at is not None:
+                completed = self.connection.execute(
+                    f"SELECT seq, {_COLUMNS} FROM logs WHERE completion_timestamp >= ? AND seq <= ? "
+                    f"ORDER BY completion_timestamp, seq", (self._completed_at, self._seq)
+                ).fetchall()
+            latest = self.connection.execute("SELECT max(completion_timestamp) FROM logs").fetchone()[0]
+        finally:
+            self.connection.execute("COMMIT")
+
+        events = [follow.added_event(dict(zip(FIELDS, row[1:]))) for row in added]
+        for row in completed:
+            entry = dict(zip(FIELDS, row[1:]))
+            if entry["id"] not in self._completed_ids:
+                events.append(follow.completed_event(entry))
+
+        if added:
+            self._seq = added[-1][0]
+        if latest is not None and latest != self._completed_at:
+            self._completed_ids = set()
+        self._completed_at = latest
+        # Later completions in the same second must still be reported once
+        for row in added + completed:
+            if row[1 + FIELDS.index("completion_timestamp")] == latest:
+                self._completed_ids.add(row[1])
+        return events
@@ -0,0 +1,425 @@
+"""
+Summary statistics behind the `stats` command, maintained on every write.
+
+A summary holds the number of entries per (status, priority, creator role)
+and a latency sketch per priority: the time from creation to completion of
+every completed entry. Archived entries are included, so archiving never
+changes a summary. Both parts are updated in constant time when an entry
+is added or completed, and summaries of several logs merge by adding them
+up (see workspace.py).
+
+The sketch is a histogram over logarithmic buckets: every latency falls
+into a bucket that is narrower than LATENCY_ACCURACY of its values, so any
+percentile is off by at most that fraction, however many entries there are.
+
+JSON and columnar logs keep their summary in a sidecar file
+(status_log.json.stats) that records the log version it describes (see
+index.log_version). Writers update it under the exclusive lock; a sidecar
+that doesn't match the log, because something wrote around it, is rebuilt
+from the entries by the next write or `stats --rebuild`. Until then `stats`
+computes the summary from the entries without saving it, so reading never
+writes. The SQLite backend keeps it in a table, updated in the write
+transaction.
+"""
+import json
+import math
+import os
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from . import storage, index, archive, timings
+from .models import STATUSES
+
+# Suffix of the summary sidecar that lives next to the database file.
+STATS_SUFFIX = '.stats'
+
+# The largest relative error of a reported latency.
+LATENCY_ACCURACY = 0.01
+
+# The latency percentiles `stats` reports.
+PERCENTILES = (50, 90, 99)
+
+# Consecutive bucket bounds grow by this factor.
+_GAMMA = (1 + LATENCY_ACCURACY) / (1 - LATENCY_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+def stats_path(filepath: str) -> str:
+    """
+    Returns the path of the summary sidecar for a database file.
+
+    Args:
+        filepath: The path to the database file.
+
+    Returns:
+        The path to the sidecar.
+    """
+    return filepath + STATS_SUFFIX
+
+
+def _latency(entry: dict) -> int:
+    # A clock that went backwards between creation and completion counts as no wait
+    return max(0, entry["completion_timestamp"] - entry["created_timestamp"])
+
+
+class LatencySketch:
+    """
+    Latencies in seconds, counted per logarithmic bucket (see the module docstring).
+
+    Bucket 0 holds latencies under a second; bucket k > 0 holds those in
+    (GAMMA^(k-2), GAMMA^(k-1)].
+
+    Attributes:
+        buckets (Dict[int, int]): The number of latencies per bucket.
+        count (int): The number of latencies.
+    """
+
+    def __init__(self, buckets: Optional[Dict[int, int]] = None):
+        self.buckets: Dict[int, int] = dict(buckets or {})
+        self.count = sum(self.buckets.values())
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, LatencySketch) and self.buckets == other.buckets
+
+    @staticmethod
+    def _bucket(value: int) -> int:
+        return 0 if value < 1 else math.ceil(math.log(value) / _LOG_GAMMA) + 1
+
+    @staticmethod
+    def _value(bucket: int) -> float:
+        # Equally far, relatively, from both bounds of the bucket
+        return 0.0 if bucket == 0 else 2 * _GAMMA ** (bucket - 1) / (_GAMMA + 1)
+
+    def add(self, value: int, count: int = 1) -> None:
+        """
+        Counts a latency. A negative count removes latencies counted before.
+        """
+        bucket = self._bucket(value)
+        remaining = self.buckets.get(bucket, 0) + count
+        if remaining:
+            self.buckets[bucket] = remaining
+        else:
+            del self.buckets[bucket]
+        self.count += count
+
+    def merge(self, other: 'LatencySketch') -> None:
+        """
+        Adds the latencies of another sketch to this one.
+        """
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Returns the p-th percentile (0-100), or None if the sketch is empty.
+        """
+        if not self.count:
+            return None
+        # The nearest rank, counted from 0
+        rank = round(p / 100 * (self.count - 1))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen > rank:
+                return self._value(bucket)
+        return self._value(max(self.buckets))
+
+    def to_dict(self) -> Dict[str, int]:
+        return {str(bucket): count for bucket, count in sorted(self.buckets.items())}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, int]) -> 'LatencySketch':
+        return cls({int(bucket): count for bucket, count in data.items()})
+
+
+class Summary:
+    """
+    Entry counts and completion latencies of a log (see the module docstring).
+
+    Attributes:
+        counts (Dict[Tuple[str, str, str], int]): The number of entries per
+            (status, priority, creator_role).
+        latencies (Dict[str, LatencySketch]): The completion latencies per priority.
+        verified (Optional[bool]): After a rebuild, whether the maintained
+            summary matched the entries; None when nothing was rebuilt.
+    """
+
+    def __init__(self):
+        self.counts: Dict[Tuple[str, str, str], int] = {}
+        self.latencies: Dict[str, LatencySketch] = {}
+        self.verified: Optional[bool] = None
+
+    def __eq__(self, other: object) -> bool:
+        return (isinstance(other, Summary) and self.counts == other.counts
+                and {k: v for k, v in self.latencies.items() if v.count}
+                == {k: v for k, v in other.latencies.items() if v.count})
+
+    def _count(self, entry: dict, sign: int) -> None:
+        key = (entry["status"], entry["priority"], entry["creator_role"])
+        remaining = self.counts.get(key, 0) + sign
+        if remaining:
+            self.counts[key] = remaining
+        else:
+            del self.counts[key]
+        if entry["status"] == "completed" and entry.get("completion_timestamp") is not None:
+            self.latencies.setdefault(entry["priority"], LatencySketch()).add(_latency(entry), sign)
+
+    def add(self, entry: dict) -> None:
+        """
+        Counts an entry in its current state.
+        """
+        self._count(entry, 1)
+
+    def remove(self, entry: dict) -> None:
+        """
+        Uncounts an entry counted in this state before.
+        """
+        self._count(entry, -1)
+
+    def apply(self, before: Optional[dict], after: dict) -> None:
+        """
+        Applies a write: an entry that was added (before is None) or changed.
+        """
+        if before is not None:
+            self.remove(before)
+        self.add(after)
+
+    def merge(self, other: 'Summary') -> None:
+        """
+        Adds the counts and latencies of another summary to this one.
+        """
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        for priority, sketch in other.latencies.items():
+            self.latencies.setdefault(priority, LatencySketch()).merge(sketch)
+
+    def to_dict(self) -> dict:
+        return {
+            "counts": [[*key, count] for key, count in sorted(self.counts.items())],
+            "latencies": {priority: sketch.to_dict() for priority, sketch in sorted(self.latencies.items())
+                          if sketch.count},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Summary':
+        summary = cls()
+        summary.counts = {(status, priority, role): count for status, priority, role, count in data["counts"]}
+        summary.latencies = {priority: LatencySketch.from_dict(buckets)
+                             for priority, buckets in data["latencies"].items()}
+        return summary
+
+    def report(self) -> dict:
+        """
+        Returns the summary as the `stats` command prints it: the counts
+        nested by status, priority and role, and the latency percentiles
+        (in seconds) overall and per priority.
+        """
+        # Pending first, like reads
+        counts: Dict[str, Dict[str, Dict[str, int]]] = {status: {} for status in STATUSES}
+        for (status, priority, role), count in sorted(self.counts.items()):
+            counts[status].setdefault(priority, {})[role] = count
+
+        def percentiles(sketch: LatencySketch) -> dict:
+            result = {"completed": sketch.count}
+            for p in PERCENTILES:
+                value = sketch.percentile(p)
+                result[f"p{p}"] = None if value is None else round(value)
+            return result
+
+        overall = LatencySketch()
+        for sketch in self.latencies.values():
+            overall.merge(sketch)
+        latency = percentiles(overall)
+        latency["by_priority"] = {priority: percentiles(sketch)
+                                  for priority, sketch in sorted(self.latencies.items()) if sketch.count}
+        return {
+            "total": sum(self.counts.values()),
+            "by_status": {status: sum(c for (s, _, _), c in self.counts.items() if s == status)
+                          for status in STATUSES},
+            "counts": counts,
+            "latency": latency,
+        }
+
+
+def summarize(filepath: str, entries: Iterable[dict]) -> Summary:
+    """
+    Builds the summary of a log from scratch: its entries and those in its archive.
+
+    Args:
+        filepath: The path to the database file, whose archive is included.
+        entries: The entries of the hot log.
+
+    Returns:
+        The summary.
+    """
+    summary = Summary()
+    ids = set()
+    for entry in entries:
+        summary.add(entry)
+        ids.add(entry["id"])
+    for name in archive.list_segments(filepath):
+        for entry in archive.iter_segment(filepath, name):
+            # Left in both by a crash while archiving (see archive.archive_entries)
+            if entry["id"] not in ids:
+                summary.add(entry)
+    return summary
+
+
+def load(filepath: str, version: list) -> Optional[Summary]:
+    """
+    Reads the sidecar of a log.
+
+    Args:
+        filepath: The path to the database file.
+        version: The current version of the log (see index.log_version).
+
+    Returns:
+        The summary, or None if the sidecar is missing, unreadable or
+        describes another version of the log.
+    """
+    try:
+        with timings.phase('load'), open(stats_path(filepath), 'rb') as f:
+            header = json.loads(f.readline())
+            body = f.readline()
+        if header["version"] != version or zlib.crc32(body) != header["crc"]:
+            return None
+        return Summary.from_dict(json.loads(body))
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError):
+        # Torn by a crash during save; rebuilt like a missing one
+        return None
+
+
+def save(filepath: str, summary: Summary, version: list) -> None:
+    """
+    Writes the sidecar of a log: a header line with the version and a
+    checksum, then the summary. It is derived data, so it is not synced.
+
+    The file is overwritten in place, which costs a fraction of writing a
+    temporary file and renaming it. A save torn by a crash fails the
+    checksum and counts as missing (see load).
+
+    Args:
+        filepath: The path to the database file.
+        summary: The summary of the log.
+        version: The version of the log it describes (see index.log_version).
+    """
+    # dumps: the C encoder; dump would encode piece by piece in Python
+    body = json.dumps(summary.to_dict(), separators=(',', ':')).encode('utf-8') + b'\n'
+    header = json.dumps({"version": version, "crc": zlib.crc32(body)}).encode('utf-8') + b'\n'
+    # Opened without O_TRUNC and truncated after the write: truncating to
+    # zero first is slower on some filesystems
+    fd = os.open(stats_path(filepath), os.O_WRONLY | os.O_CREAT, 0o666)
+    with os.fdopen(fd, 'wb') as f, timings.phase('write'):
+        f.write(header + body)
+        f.truncate()
+
+
+def update(filepath: str, before: list, after: list, changes: List[Tuple[Optional[dict], dict]],
+           entries: Optional[Callable[[], Iterable[dict]]] = None) -> None:
+    """
+    Applies the entries changed by a write to the sidecar. The caller must
+    hold the exclusive lock.
+
+    Args:
+        filepath: The path to the database file.
+        before: The version of the log before the write.
+        after: The version of the log after the write.
+        changes: (before, after) per entry written; before is None for adds.
+        entries: Returns the entries of the hot log, after the write. Only
+            called when the sidecar is out of date already, to rebuild it;
+            without it, or if it raises storage.CorruptLogError, the sidecar
+            is left out of date.
+    """
+    summary = load(filepath, before)
+    if summary is None:
+        if any(signature is not None for signature in before):
+            if entries is None:
+                return
+            try:
+                with timings.phase('model'):
+                    summary = summarize(filepath, entries())
+            except storage.CorruptLogError:
+                # Counted from the salvaged entries by `stats` until the log is repaired
+                return
+            save(filepath, summary, after)
+            return
+        # The write created the log
+        summary = Summary()
+    for old, new in changes:
+        summary.apply(old, new)
+    save(filepath, summary, after)
+
+
+def append_records(filepath: str, records: List[dict], changes: List[Tuple[Optional[dict], dict]],
+                   compact: Optional[Callable[[str], None]] = None,
+                   entries: Optional[Callable[[], Iterable[dict]]] = None) -> None:
+    """
+    Appends journal records (see storage.append_records) and applies the
+    entries they changed to the sidecar. The caller must hold the exclusive lock.
+
+    Args:
+        filepath: The path to the database file.
+        records: The journal records to append.
+        changes: (before, after) per entry the records change; before is None for adds.
+        compact: Folds the journal into the snapshot (see storage.append_records).
+        entries: Returns the entries of the hot log, to rebuild an out of date sidecar (see update).
+    """
+    before = index.log_version(filepath)
+    storage.append_records(filepath, records, compact)
+    if records:
+        update(filepath, before, index.log_version(filepath), changes, entries)
+
+
+def restamp(filepath: str, before: list) -> None:
+    """
+    Carries the sidecar over a rewrite that kept every entry, such as
+    archiving. The caller must hold the exclusive lock.
+
+    Args:
+        filepath: The path to the database file.
+        before: The version of the log before the rewrite.
+    """
+    summary = load(filepath, before)
+    if summary is not None:
+        save(filepath, summary, index.log_version(filepath))
+
+
+def matches(summary: Summary, stored: Optional[Summary]) -> bool:
+    """
+    Returns True if a summary rebuilt from the entries matches the stored
+    one. A log without entries may have none stored: it was never written,
+    or its sidecar never saved, and an empty summary describes it.
+    """
+    return summary == (Summary() if stored is None else stored)
+
+
+def maintained(filepath: str, version: list, entries: Callable[[], Iterable[dict]],
+               rebuild: bool = False) -> Summary:
+    """
+    Returns the summary of a log from its sidecar, or from the entries if
+    the sidecar is out of date. The caller must hold at least the shared
+    lock, and the exclusive lock to rebuild.
+
+    Args:
+        filepath: The path to the database file.
+        version: The current version of the log (see index.log_version).
+        entries: Returns the entries of the hot log, only called if the
+            sidecar is out of date or to rebuild.
+        rebuild: Recompute the summary even if the sidecar is current, save
+            it, and record in its `verified` whether the sidecar was right.
+
+    Returns:
+        The summary.
+    """
+    stored = load(filepath, version)
+    if stored is not None and not rebuild:
+        return stored
+    with timings.phase('model'):
+        summary = summarize(filepath, entries())
+    if rebuild:
+        summary.verified = matches(summary, stored)
+        if summary != stored:
+            save(filepath, summary, version)
+    return summary
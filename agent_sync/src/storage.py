@@ -1,16 +1,650 @@
 """
 Handles reading from and writing to the status_log.json file.
+
+The log is kept as a snapshot (status_log.json) plus an append-only journal
+(status_log.json.journal). Adds and completions are appended to the journal
+as single JSON lines, so their cost does not depend on the size of the log.
+The journal is replayed on top of the snapshot when loading, and folded back
+into the snapshot once it grows past JOURNAL_COMPACT_BYTES.
+
+Both carry checksums, so damage is told apart from a write torn by a
+crash. Every journal record ends with the CRC32 of the rest of its line
+(see encode_record). The snapshot stays plain JSON; the CRC32 of every
+SUM_BLOCK_BYTES block of it is kept in status_log.json.sums, which names
+the snapshot it was computed for by inode and size. Entries in a block
+that fails its checksum, or on a line that can't be parsed, are skipped
+when loading, and rewriting the snapshot without them is refused until
+`repair` restores them (see integrity.py).
 """
+import bisect
+import contextlib
+import itertools
 import json
 import os
-import tempfile
-from typing import List
+import re
+import time
+import zlib
+from typing import Callable, Iterator, List, Optional, Tuple
+from . import manager, timings
 from .models import LogEntry
 
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, writers are not serialized
+    fcntl = None
+
+# Suffix of the append-only journal file that lives next to the snapshot.
+JOURNAL_SUFFIX = '.journal'
+
+# Suffix of the lock file used to serialize writers across processes.
+LOCK_SUFFIX = '.lock'
+
+# Suffix of the snapshot checksums that live next to the snapshot.
+SUMS_SUFFIX = '.sums'
+
+# The snapshot is checksummed in blocks of this many bytes.
+SUM_BLOCK_BYTES = 64 * 1024
+
+# Every journal record ends with this and its checksum (see encode_record).
+_CRC_MARK = b', "crc": '
+
+# Where a line starts an entry of the snapshot (see _next_entry).
+_ENTRY_START = re.compile(rb'(?:^|\n)[ \t]*\{')
+
+# Once the journal grows past this many bytes it is compacted into the snapshot.
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+# How hard writes try to survive a crash of the machine (see durability):
+# 'none' leaves flushing to the OS, 'file' fsyncs the data it writes, 'full'
+# also fsyncs the directory so new and renamed files keep their names.
+DURABILITY_LEVELS = ('none', 'file', 'full')
+
+# The level used when neither set_durability nor DURABILITY_ENV chose one.
+DEFAULT_DURABILITY = 'full'
+
+# Set this environment variable to one of DURABILITY_LEVELS to pick the level.
+DURABILITY_ENV = "AGENT_SYNC_DURABILITY"
+
+# The level chosen by set_durability, overriding DURABILITY_ENV.
+_durability = None
+
+
+def journal_path(filepath: str) -> str:
+    """
+    Returns the path of the journal that belongs to a snapshot file.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        The path to the journal file.
+    """
+    return filepath + JOURNAL_SUFFIX
+
+
+def sums_path(filepath: str) -> str:
+    """
+    Returns the path of the checksums that belong to a snapshot file.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        The path to the checksum file.
+    """
+    return filepath + SUMS_SUFFIX
+
+
+class CorruptLogError(ValueError):
+    """
+    Raised when the snapshot would be rewritten while parts of the log fail
+    their checksums: the rewrite would drop them for good.
+    """
+
+    def __init__(self, filepath: str, damaged: List[Tuple[str, int, int]]):
+        """
+        Args:
+            filepath: The path to the database file.
+            damaged: (path, start, end) of every damaged byte range.
+        """
+        self.damaged = damaged
+        files = sorted({path for path, _, _ in damaged})
+        super().__init__(f"{filepath} is damaged ({len(damaged)} region(s) in {', '.join(files)} fail their "
+                         f"checksums); the entries there are skipped. Run `verify` for details and "
+                         f"`repair` to restore them")
+
+
+def set_durability(level: str) -> None:
+    """
+    Sets the durability level of every write made by this process.
+
+    Args:
+        level: One of DURABILITY_LEVELS.
+
+    Raises:
+        ValueError: If the level is unknown.
+    """
+    global _durability
+    if level not in DURABILITY_LEVELS:
+        raise ValueError(f"Invalid durability: {level}. Must be one of {list(DURABILITY_LEVELS)}")
+    _durability = level
+
+
+def durability() -> str:
+    """
+    Returns the durability level: the one set by set_durability, else the
+    one named by DURABILITY_ENV, else DEFAULT_DURABILITY.
+
+    Raises:
+        ValueError: If DURABILITY_ENV names an unknown level.
+    """
+    if _durability is not None:
+        return _durability
+    level = os.environ.get(DURABILITY_ENV, DEFAULT_DURABILITY).lower()
+    if level not in DURABILITY_LEVELS:
+        raise ValueError(f"Invalid {DURABILITY_ENV}: {level}. Must be one of {list(DURABILITY_LEVELS)}")
+    return level
+
+
+def sync_file(f) -> None:
+    """
+    Flushes a file opened for writing and, unless the durability level is
+    'none', fsyncs its data.
+    """
+    with timings.phase('write'):
+        f.flush()
+    if durability() != 'none':
+        with timings.phase('fsync'):
+            os.fsync(f.fileno())
+
+
+def sync_directory(directory: str) -> None:
+    """
+    Fsyncs a directory at the 'full' durability level, so files created,
+    renamed or removed in it survive a crash of the machine.
+    """
+    # Windows can't open a directory; its renames are durable once the file is
+    if durability() != 'full' or os.name == 'nt':
+        return
+    with timings.phase('fsync'):
+        fd = os.open(directory or '.', os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+@contextlib.contextmanager
+def lock(filepath: str, exclusive: bool = True) -> Iterator[float]:
+    """
+    Holds an advisory lock on the log for the duration of the block.
+
+    Writers take the exclusive lock around their whole read-modify-write
+    cycle; readers take the shared lock so they never see a snapshot and
+    journal from two different compactions. The lock is not re-entrant:
+    load_logs, append_records and friends don't lock themselves, callers do.
+
+    A reader that can't create the lock file (e.g. in a directory it
+    can't write to) locks the existing one read-only, or reads unlocked
+    when there is none: no writer has locked the log yet.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        exclusive: Take the exclusive (writer) lock instead of the shared one.
+
+    Yields:
+        The number of seconds spent waiting for the lock.
+    """
+    if fcntl is None:
+        yield 0.0
+        return
+
+    try:
+        fd = os.open(filepath + LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        if exclusive:
+            raise
+        try:
+            fd = os.open(filepath + LOCK_SUFFIX, os.O_RDONLY)
+        except FileNotFoundError:
+            yield 0.0
+            return
+    try:
+        start = time.perf_counter()
+        with timings.phase('lock_wait'):
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield time.perf_counter() - start
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+def add_record(entry: dict) -> dict:
+    """
+    Builds the journal record for a newly added entry.
+
+    Args:
+        entry: The new log entry as a dictionary.
+
+    Returns:
+        The journal record.
+    """
+    return {"op": "add", "entry": entry}
+
+
+def complete_record(entry: LogEntry) -> dict:
+    """
+    Builds the journal record for a completed entry.
+
+    Args:
+        entry: The LogEntry after it has been marked as completed.
+
+    Returns:
+        The journal record.
+    """
+    return {
+        "op": "complete",
+        "id": entry.id,
+        "completer": entry.completer,
+        "completer_role": entry.completer_role,
+        "completion_timestamp": entry.completion_timestamp,
+    }
+
 
-def load_logs(filepath: str) -> List[dict]:
+def encode_record(record: dict) -> str:
     """
-    Reads the JSON file. If the file doesn't exist, returns an empty list.
+    Serializes a record as a line of an append-only file, ending with the
+    CRC32 of the line without it: {..., "crc": 1234567890}.
+
+    Args:
+        record: The record, a non-empty dictionary without a 'crc' key.
+
+    Returns:
+        The line, newline included.
+    """
+    line = json.dumps(record, ensure_ascii=False)
+    return f'{line[:-1]}, "crc": {zlib.crc32(line.encode("utf-8"))}}}\n'
+
+
+def _unseal(line: bytes) -> Tuple[bytes, Optional[bool]]:
+    """
+    Splits the checksum off a line written by encode_record.
+
+    Returns:
+        The line without its checksum, and whether the checksum matched
+        (None if the line has none: written by an older version, or torn).
+    """
+    mark = line.rfind(_CRC_MARK)
+    if mark < 0 or not line.endswith(b'}') or not line[mark + len(_CRC_MARK):-1].isdigit():
+        return line, None
+    body = line[:mark] + b'}'
+    return body, zlib.crc32(body) == int(line[mark + len(_CRC_MARK):-1])
+
+
+def decode_record(line: bytes) -> dict:
+    """
+    Decodes a line written by encode_record (or an older line without a checksum).
+
+    Args:
+        line: The line, with or without its newline.
+
+    Returns:
+        The record, without its checksum.
+
+    Raises:
+        ValueError: If the line is torn or fails its checksum.
+    """
+    body, intact = _unseal(line.rstrip(b'\n'))
+    if intact is False:
+        raise ValueError("Record fails its checksum")
+    return json.loads(body)
+
+
+def read_records(path: str) -> Tuple[List[dict], List[Tuple[int, int]]]:
+    """
+    Reads the lines of an append-only file such as the journal, skipping
+    a line torn by a crash and the lines that fail their checksums.
+
+    Args:
+        path: The path to the file. A missing file has no records.
+
+    Returns:
+        A tuple of (records, damaged): the decoded lines in the order they
+        were appended, and the (start, end) byte ranges of the lines that
+        failed their checksums.
+    """
+    records, damaged = [], []
+    if not os.path.exists(path):
+        return records, damaged
+
+    # Files read this way are kept small, so they are read and decoded in one go
+    with timings.phase('load'), open(path, 'rb') as f:
+        data = f.read()
+    timings.count('bytes_read', len(data))
+    with timings.phase('decode'):
+        start = 0
+        for line in data.split(b'\n'):
+            end = start + len(line)
+            if line:
+                body, intact = _unseal(line)
+                if intact is False:
+                    damaged.append((start, end))
+                else:
+                    try:
+                        records.append(json.loads(body))
+                    except ValueError:
+                        # A torn write from a crash can only leave a partial line; skip it.
+                        pass
+            start = end + 1
+    return records, damaged
+
+
+def check_records(path: str) -> dict:
+    """
+    Checks the lines of an append-only file against their checksums in one
+    streaming pass, for `verify`.
+
+    Args:
+        path: The path to the file.
+
+    Returns:
+        {"bytes": ..., "records": ..., "adds": ..., "damaged": [(start, end, reason), ...],
+        "unchecked": ...}, where adds counts the intact add records and
+        unchecked the intact lines without a checksum (written by an older
+        version).
+    """
+    result = {"bytes": 0, "records": 0, "adds": 0, "damaged": [], "unchecked": 0}
+    if not os.path.exists(path):
+        return result
+    with open(path, 'rb') as f:
+        start = 0
+        for line in f:
+            end = start + len(line)
+            body, intact = _unseal(line.rstrip(b'\n'))
+            if intact is False:
+                result["damaged"].append((start, end, "record fails its checksum"))
+            elif body.strip():
+                try:
+                    record = json.loads(body)
+                    result["records"] += 1
+                    result["adds"] += record.get("op") == "add"
+                    result["unchecked"] += intact is None
+                except ValueError:
+                    # Torn by a crash: replay skips it, nothing was acknowledged
+                    pass
+            start = end
+    result["bytes"] = start
+    return result
+
+
+def block_sums(data: bytes) -> List[int]:
+    """
+    Returns the CRC32 of every SUM_BLOCK_BYTES block of data.
+    """
+    view = memoryview(data)
+    return [zlib.crc32(view[i:i + SUM_BLOCK_BYTES]) for i in range(0, len(data), SUM_BLOCK_BYTES)]
+
+
+def load_sums(filepath: str) -> Optional[List[int]]:
+    """
+    Returns the block checksums of the snapshot, or None if there are none
+    for the snapshot as it is now (written by an older version, or left
+    behind by a crash between writing them and renaming the snapshot).
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+    """
+    try:
+        with open(sums_path(filepath), encoding='utf-8') as f:
+            sums = json.load(f)
+        st = os.stat(filepath)
+    except (FileNotFoundError, ValueError):
+        return None
+    # Unlike the indexes, not keyed by mtime: a write in place must still show up as damage
+    if sums.get("snapshot") != [st.st_ino, st.st_size] or sums.get("block") != SUM_BLOCK_BYTES:
+        return None
+    return sums["crcs"]
+
+
+def _damaged_blocks(data: bytes, sums: Optional[List[int]]) -> List[Tuple[int, int]]:
+    """
+    Returns the (start, end) byte ranges of the blocks of a snapshot that
+    fail their checksums, adjacent blocks merged.
+    """
+    damaged = []
+    if sums is None:
+        return damaged
+    for i, crc in enumerate(block_sums(data)):
+        if i >= len(sums) or crc != sums[i]:
+            start = i * SUM_BLOCK_BYTES
+            end = min(len(data), start + SUM_BLOCK_BYTES)
+            if damaged and damaged[-1][1] == start:
+                damaged[-1] = (damaged[-1][0], end)
+            else:
+                damaged.append((start, end))
+    return damaged
+
+
+def snapshot_damage(filepath: str) -> List[Tuple[int, int]]:
+    """
+    Checks the snapshot against its checksums, streaming it block by block.
+    Indexes are only built over a snapshot that passes.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        The (start, end) byte ranges that fail their checksums; none if
+        the snapshot has no checksums to check.
+    """
+    sums = load_sums(filepath)
+    damaged = []
+    if sums is None:
+        return damaged
+    with open(filepath, 'rb') as f:
+        i = 0
+        while True:
+            block = f.read(SUM_BLOCK_BYTES)
+            if not block:
+                break
+            if i >= len(sums) or zlib.crc32(block) != sums[i]:
+                damaged.append((i * SUM_BLOCK_BYTES, i * SUM_BLOCK_BYTES + len(block)))
+            i += 1
+    return damaged
+
+
+def check_snapshot(filepath: str) -> dict:
+    """
+    Checks the snapshot for `verify` in one streaming pass: every block
+    against its checksum and every line for being an entry. Memory holds
+    a block and a line at a time.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        {"bytes": ..., "entries": ..., "damaged": [(start, end, reason), ...],
+        "checksummed": ...}, where checksummed tells whether the snapshot
+        has checksums (see load_sums).
+    """
+    result = {"bytes": 0, "entries": 0, "damaged": [], "checksummed": False}
+    if not os.path.exists(filepath):
+        return result
+    sums = load_sums(filepath)
+    result["checksummed"] = sums is not None
+    damaged = result["damaged"]
+
+    def bad_line(start: int, end: int, reason: str) -> None:
+        # Lines in a block that fails its checksum are reported with the block
+        if not (damaged and damaged[-1][0] < end and start < damaged[-1][1]):
+            damaged.append((start, end, reason))
+
+    with open(filepath, 'rb') as f:
+        first, second = f.readline(), f.readline()
+        if sums is None and not (first == b'[\n' and second[:1] in (b'{', b']', b'')):
+            # Written by an older version, which indented the whole list
+            f.seek(0)
+            data = f.read()
+            result["bytes"] = len(data)
+            try:
+                result["entries"] = len(json.loads(data))
+            except ValueError:
+                entries, ranges = _salvage(data, [])
+                result["entries"] = len(entries)
+                damaged.extend((start, end, "unreadable entry") for start, end in ranges)
+            return result
+        f.seek(0)
+        i = 0
+        offset = 0
+        # The unfinished line at the end of the previous block, and where it starts
+        partial = b''
+        line_start = 0
+        state = 'open'
+        while True:
+            block = f.read(SUM_BLOCK_BYTES)
+            if not block:
+                break
+            if sums is not None and (i >= len(sums) or zlib.crc32(block) != sums[i]):
+                if damaged and damaged[-1][1] == offset and damaged[-1][2] == "block fails its checksum":
+                    damaged[-1] = (damaged[-1][0], offset + len(block), damaged[-1][2])
+                else:
+                    damaged.append((offset, offset + len(block), "block fails its checksum"))
+            lines = (partial + block).split(b'\n')
+            partial = lines.pop()
+            for line in lines:
+                end = line_start + len(line) + 1
+                if state == 'open':
+                    state = 'entries'
+                    if line != b'[':
+                        bad_line(line_start, end, "unreadable start of the snapshot")
+                elif state == 'entries' and line.strip() == b']':
+                    state = 'closed'
+                elif state == 'entries':
+                    try:
+                        if "id" not in _parse_snapshot_line(line):
+                            raise ValueError("Entry has no ID")
+                        result["entries"] += 1
+                    except (ValueError, TypeError):
+                        bad_line(line_start, end, "unreadable entry")
+                elif state == 'closed' and line.strip():
+                    bad_line(line_start, end, "data after the end of the snapshot")
+                line_start = end
+            offset += len(block)
+            i += 1
+    if sums is not None and i < len(sums):
+        damaged.append((offset, offset, "truncated: blocks are missing"))
+    elif state == 'entries' or partial:
+        bad_line(line_start, offset, "truncated")
+    result["bytes"] = offset
+    return result
+
+
+def _next_entry(data: bytes, start: int) -> int:
+    """
+    Returns the offset of the first entry that starts on a line at or after
+    start, or -1. Entries are flat objects and JSON strings can't hold a
+    newline, so a line whose first non-blank character is '{' starts one,
+    whether the list was written one entry per line or indented.
+    """
+    match = _ENTRY_START.search(data, start)
+    return -1 if match is None else match.end() - 1
+
+
+def _salvage(data: bytes, damaged: List[Tuple[int, int]]) -> Tuple[List[dict], List[Tuple[int, int]]]:
+    """
+    Parses a damaged snapshot entry by entry, skipping the entries that
+    overlap a damaged block or can't be parsed. Works on the snapshots of
+    save_logs and on the indented lists written by older versions.
+
+    Returns:
+        The entries that could be read, and the damaged ranges with the
+        unparseable entries (up to the next entry) added, in file order.
+    """
+    # One character per byte, so the decoder's positions are byte offsets
+    text = data.decode('latin-1')
+    decoder = json.JSONDecoder()
+    ends = [end for _, end in damaged]
+    found = list(damaged)
+
+    def overlaps(start: int, end: int) -> bool:
+        # The first damaged range that ends after start
+        i = bisect.bisect_right(ends, start)
+        return i < len(ends) and damaged[i][0] < end
+
+    def check_gap(start: int, end: int, pattern: bytes) -> None:
+        if not re.fullmatch(pattern, data[start:end]) and not overlaps(start, end):
+            found.append((start, end))
+
+    entries = []
+    gap = rb'\s*\[\s*'
+    previous = 0
+    start = _next_entry(data, 0)
+    while start != -1:
+        if gap is not None:
+            check_gap(previous, start, gap)
+        try:
+            end = decoder.raw_decode(text, start)[1]
+            if not overlaps(start, end):
+                # Decoded again as UTF-8; the latin-1 text only told where the entry ends
+                entry = json.loads(data[start:end])
+                if not isinstance(entry, dict) or "id" not in entry:
+                    raise ValueError("Entry has no ID")
+                entries.append(entry)
+            gap = rb'\s*,\s*'
+            previous = end
+            start = _next_entry(data, end)
+        except ValueError:
+            following = _next_entry(data, start + 1)
+            end = len(data) if following == -1 else following
+            if not overlaps(start, end):
+                found.append((start, end))
+            gap = None
+            previous = start = following
+    if gap is not None:
+        # Truncated, or damage after the last entry
+        check_gap(previous, len(data), rb'\s*\]\s*' if entries or previous else rb'\s*\[\s*\]\s*')
+    return entries, sorted(found)
+
+
+def read_snapshot(filepath: str) -> Tuple[List[dict], List[Tuple[int, int]]]:
+    """
+    Reads the JSON snapshot, skipping what is damaged. If the file doesn't
+    exist, returns no entries. The journal is not applied.
+
+    The whole file is checked against its checksums (when it has them)
+    and parsed in one go; only a damaged snapshot is parsed line by line.
+
+    Args:
+        filepath: The path to the JSON file.
+
+    Returns:
+        A tuple of (entries, damaged): the log entries as dictionaries, and
+        the (start, end) byte ranges that were skipped.
+    """
+    if not os.path.exists(filepath):
+        return [], []
+
+    with timings.phase('load'), open(filepath, 'rb') as f:
+        data = f.read()
+    timings.count('bytes_read', len(data))
+    with timings.phase('decode'):
+        damaged = _damaged_blocks(data, load_sums(filepath))
+        logs = None
+        if not damaged:
+            try:
+                logs = json.loads(data)
+            except ValueError:
+                pass
+        if logs is None:
+            logs, damaged = _salvage(data, damaged)
+    timings.count('entries_loaded', len(logs))
+    return logs, damaged
+
+
+def load_snapshot(filepath: str) -> List[dict]:
+    """
+    Reads the JSON snapshot. If the file doesn't exist, returns an empty list.
+    Damaged entries are skipped (see read_snapshot). The journal is not applied.
 
     Args:
         filepath: The path to the JSON file.
@@ -18,14 +652,434 @@ def load_logs(filepath: str) -> List[dict]:
     Returns:
         A list of log entries as dictionaries.
     """
+    return read_snapshot(filepath)[0]
+
+
+def iter_journal(filepath: str) -> Iterator[dict]:
+    """
+    Streams the records of the journal in the order they were appended.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Yields:
+        The journal records (see add_record/complete_record).
+    """
+    return iter_records(journal_path(filepath))
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    """
+    Streams the records of an append-only file such as the journal,
+    skipping a line torn by a crash and the lines that fail their
+    checksums (see read_records). A missing file has none.
+
+    Args:
+        path: The path to the file.
+
+    Yields:
+        The decoded lines in the order they were appended.
+    """
+    yield from read_records(path)[0]
+
+
+def apply_completion(entry: dict, record: dict) -> None:
+    """
+    Applies a journaled completion to an entry dictionary in place.
+
+    Args:
+        entry: The log entry as a dictionary.
+        record: The completion record (see complete_record).
+    """
+    entry["status"] = "completed"
+    entry["completer"] = record["completer"]
+    entry["completer_role"] = record["completer_role"]
+    entry["completion_timestamp"] = record["completion_timestamp"]
+
+
+def _replay_journal(records: List[dict], logs: List[dict]) -> List[dict]:
+    """
+    Applies the journal records on top of the snapshot entries.
+
+    Replay is idempotent: an add for an ID that is already present is skipped
+    and a completion simply overwrites the completion fields again. This keeps
+    the log correct if a crash happens after a compaction has written the
+    snapshot but before the journal was removed.
+
+    Args:
+        records: The journal records, in the order they were appended.
+        logs: The entries loaded from the snapshot. Modified in place.
+
+    Returns:
+        The list of log entries with the journal applied.
+    """
+    by_id = None
+    for record in records:
+        if by_id is None:
+            by_id = {entry["id"]: entry for entry in logs}
+
+        if record.get("op") == "add":
+            entry = record["entry"]
+            if entry["id"] not in by_id:
+                by_id[entry["id"]] = entry
+                logs.append(entry)
+        elif record.get("op") == "complete":
+            entry = by_id.get(record["id"])
+            if entry is not None:
+                apply_completion(entry, record)
+    return logs
+
+
+def read_logs(filepath: str) -> Tuple[List[dict], List[Tuple[str, int, int]]]:
+    """
+    Reads the snapshot and replays the journal on top of it, skipping
+    the entries and records that are damaged (see read_snapshot and
+    read_records).
+
+    Args:
+        filepath: The path to the JSON file.
+
+    Returns:
+        A tuple of (entries, damaged): the log entries as dictionaries, and
+        (path, start, end) for every byte range that was skipped.
+    """
+    logs, damaged = read_snapshot(filepath)
+    records, journal_damaged = read_records(journal_path(filepath))
+    damaged = ([(filepath, start, end) for start, end in damaged] +
+               [(journal_path(filepath), start, end) for start, end in journal_damaged])
+    return _replay_journal(records, logs), damaged
+
+
+def load_logs(filepath: str, intact: bool = False) -> List[dict]:
+    """
+    Reads the snapshot and replays the journal on top of it.
+    If neither file exists, returns an empty list. Damaged entries and
+    records are skipped (see read_logs).
+
+    Args:
+        filepath: The path to the JSON file.
+        intact: Refuse to skip anything, for callers that rewrite the snapshot.
+
+    Returns:
+        A list of log entries as dictionaries.
+
+    Raises:
+        CorruptLogError: If intact is set and something is damaged.
+    """
+    logs, damaged = read_logs(filepath)
+    if intact and damaged:
+        raise CorruptLogError(filepath, damaged)
+    return logs
+
+
+def _parse_snapshot_line(line: bytes) -> dict:
+    """
+    Decodes one entry line of a snapshot written by save_logs.
+    """
+    line = line.rstrip(b'\n')
+    if line.endswith(b','):
+        line = line[:-1]
+    if not line.startswith(b'{'):
+        raise ValueError("Snapshot is not stored one entry per line")
+    return json.loads(line)
+
+
+def iter_snapshot(filepath: str) -> Iterator[Tuple[int, dict]]:
+    """
+    Streams the entries of the snapshot together with their byte offsets.
+    The journal is not applied.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Yields:
+        (offset, entry) pairs in file order.
+
+    Raises:
+        ValueError: If the snapshot was not written one entry per line
+            (e.g. by an older version that pretty-printed the whole list).
+    """
     if not os.path.exists(filepath):
-        return []
-    
+        return
+
+    with open(filepath, 'rb') as f:
+        if f.readline().strip() != b'[':
+            raise ValueError("Snapshot is not stored one entry per line")
+        offset = f.tell()
+        for line in f:
+            if line.strip() == b']':
+                return
+            yield offset, _parse_snapshot_line(line)
+            offset += len(line)
+    raise ValueError("Snapshot is truncated")
+
+
+def _seek_key(f, lo: int, hi: int, target: tuple) -> int:
+    """
+    Binary searches the bytes of a snapshot stored in 3-tier order for the
+    first entry line whose 3-tier key is at least target.
+
+    Args:
+        f: The snapshot file, opened in binary mode.
+        lo: The offset of the first entry line.
+        hi: The size of the file.
+        target: A 3-tier key (see manager.dict_sort_key).
+
+    Returns:
+        The offset of that line, or of the closing ']' if there is none.
+    """
+    # Every line starting before lo has a smaller key; hi is the end of the
+    # file or the start of a line whose key is at least target
+    while lo < hi:
+        mid = (lo + hi) // 2
+        # The first line that starts at mid or after it
+        f.seek(mid - 1)
+        f.readline()
+        position = f.tell()
+        if position >= hi:
+            hi = mid
+            continue
+        line = f.readline()
+        if line.strip() == b']' or manager.dict_sort_key(_parse_snapshot_line(line)) >= target:
+            hi = position
+        else:
+            lo = position + len(line)
+    return lo
+
+
+def iter_snapshot_ranges(filepath: str, ranges: List[Tuple[tuple, tuple]]) -> Iterator[dict]:
+    """
+    Streams the snapshot entries whose 3-tier key falls into key ranges,
+    from a snapshot stored in 3-tier order. The start of every range is
+    found by a binary search over the file, so only the entries yielded
+    and a few probes per range are parsed. The journal is not applied.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        ranges: (start, stop) pairs of 3-tier keys in order; a range holds
+            the keys k with start <= k < stop (see paging.seek_ranges).
+
+    Yields:
+        The entries in file order.
+
+    Raises:
+        ValueError: If the snapshot was not written one entry per line.
+    """
+    if not ranges or not os.path.exists(filepath):
+        return
+
+    with open(filepath, 'rb') as f:
+        if f.readline().strip() != b'[':
+            raise ValueError("Snapshot is not stored one entry per line")
+        data_start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        for start, stop in ranges:
+            f.seek(_seek_key(f, data_start, size, start))
+            for line in f:
+                if line.strip() == b']':
+                    return
+                entry = _parse_snapshot_line(line)
+                if manager.dict_sort_key(entry) >= stop:
+                    break
+                yield entry
+
+
+def load_snapshot_lines(filepath: str) -> Tuple[List[int], List[dict]]:
+    """
+    Reads the whole snapshot in one go together with the byte offset of
+    every entry. Faster than iter_snapshot when all entries are needed.
+    The journal is not applied.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Returns:
+        A tuple of (offsets, entries) in file order.
+
+    Raises:
+        ValueError: If the snapshot was not written one entry per line, or
+            is damaged.
+    """
+    if not os.path.exists(filepath):
+        return [], []
+
+    with timings.phase('load'), open(filepath, 'rb') as f:
+        data = f.read()
+    timings.count('bytes_read', len(data))
+    # '[', one line per entry, ']' and the empty string after the final newline
+    lines = data.split(b'\n')
+    if not lines or lines[0] != b'[':
+        raise ValueError("Snapshot is not stored one entry per line")
+    if _damaged_blocks(data, load_sums(filepath)):
+        raise ValueError("Snapshot fails its checksums")
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return []
+        with timings.phase('decode'):
+            entries = json.loads(data)
+    except json.JSONDecodeError:
+        raise ValueError("Snapshot is truncated")
+    timings.count('entries_loaded', len(entries))
+    if len(lines) != len(entries) + 3:
+        raise ValueError("Snapshot is not stored one entry per line")
+    if not entries:
+        return [], entries
+    offsets = list(itertools.accumulate((len(line) + 1 for line in lines[1:-3]), initial=len(b'[\n')))
+    return offsets, entries
+
+
+def read_snapshot_entry(filepath: str, offset: int) -> dict:
+    """
+    Reads a single entry from the snapshot without parsing the rest of it.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        offset: The byte offset of the entry line (see iter_snapshot).
+
+    Returns:
+        The log entry as a dictionary, without the journal applied.
+    """
+    with open(filepath, 'rb') as f:
+        f.seek(offset)
+        return _parse_snapshot_line(f.readline())
+
+
+def read_snapshot_entries(filepath: str, offsets: List[int]) -> List[dict]:
+    """
+    Reads several entries from the snapshot through one file handle.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        offsets: The byte offsets of the entry lines, ideally sorted.
+
+    Returns:
+        The log entries as dictionaries, in the order of offsets.
+    """
+    entries = []
+    if not offsets:
+        # The log may have no snapshot yet, only a journal
+        return entries
+    with open(filepath, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            entries.append(_parse_snapshot_line(f.readline()))
+    return entries
+
+
+def append_records(filepath: str, records: List[dict],
+                   compact: Optional[Callable[[str], None]] = None) -> None:
+    """
+    Appends journal records and syncs them (see durability), then compacts
+    the journal into the snapshot if it has grown past JOURNAL_COMPACT_BYTES.
+
+    All records are written with a single write call, so a batch either lands
+    completely or leaves at most one torn line that replay skips. Compaction
+    is put off while the log is damaged (see CorruptLogError). The caller
+    must hold the exclusive lock.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+        records: The journal records to append (see add_record/complete_record).
+        compact: Folds the journal into the snapshot (default: compact_logs);
+            snapshots in another format bring their own.
+    """
+    if not records:
+        return
+
+    with timings.phase('serialize'):
+        data = ''.join(encode_record(record) for record in records)
+    if append_lines(journal_path(filepath), data) >= JOURNAL_COMPACT_BYTES:
+        try:
+            (compact or compact_logs)(filepath)
+        except CorruptLogError:
+            # The records are safe in the journal; the snapshot is rewritten by `repair`
+            pass
+
+
+def append_lines(path: str, data: str) -> int:
+    """
+    Appends newline-terminated lines to a file with a single write call and
+    syncs them (see durability).
+
+    Args:
+        path: The path to the file, created if it doesn't exist.
+        data: The lines to append.
+
+    Returns:
+        The size of the file afterwards.
+    """
+    with open(path, 'ab+') as f:
+        # Terminate a torn line left by a crash so it cannot swallow this batch
+        created = f.seek(0, os.SEEK_END) == 0
+        if not created:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                data = '\n' + data
+        with timings.phase('write'):
+            f.write(data.encode('utf-8'))
+        sync_file(f)
+        size = f.tell()
+    if created:
+        sync_directory(os.path.dirname(path))
+    return size
+
+
+def compact_logs(filepath: str) -> None:
+    """
+    Folds the journal back into the snapshot and removes it.
+    The caller must hold the exclusive lock.
+
+    The snapshot is written in 3-tier order (see manager.sort_logs), so
+    readers can stream it instead of sorting it (see index.ordered). The sort
+    is stable and load order breaks ties, so the order of the log as a whole
+    doesn't change.
+
+    Once the snapshot is larger than archive.AUTO_ARCHIVE_BYTES, completed
+    entries older than archive.ARCHIVE_AFTER_DAYS are moved to the archive
+    on the way.
+
+    Args:
+        filepath: The path to the JSON snapshot file.
+
+    Raises:
+        CorruptLogError: If part of the log is damaged; it would be dropped.
+    """
+    logs = load_logs(filepath, intact=True)
+    # Imported here: the archive module builds on this one
+    from . import archive
+    if os.path.exists(filepath) and os.path.getsize(filepath) > archive.AUTO_ARCHIVE_BYTES:
+        logs, _ = archive.archive_entries(filepath, logs, archive.ARCHIVE_AFTER_DAYS)
+    save_logs(filepath, sorted(logs, key=manager.dict_sort_key))
+
+
+def temp_file(directory: str, suffix: str) -> Tuple[int, str]:
+    """
+    Creates a new file with a unique name, readable only by its owner, to
+    be renamed over the file it replaces. The same as tempfile.mkstemp,
+    which takes longer to import than most commands take to write.
+
+    Args:
+        directory: The directory of the file it replaces.
+        suffix: The end of the name.
+
+    Returns:
+        A tuple of (file descriptor open for reading and writing, path).
+    """
+    while True:
+        path = os.path.join(directory, f"tmp{os.urandom(6).hex()}{suffix}")
+        try:
+            return os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600), path
+        except FileExistsError:
+            continue
+
+
+def _write_sums(filepath: str, signature: List[int], crcs: List[int]) -> None:
+    """
+    Writes the block checksums of a snapshot atomically (temp file + rename).
+    """
+    temp_path = sums_path(filepath) + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({"snapshot": signature, "block": SUM_BLOCK_BYTES, "crcs": crcs}, f)
+    # Not synced: checksums lost in a crash only leave the snapshot unchecked (see load_sums)
+    os.replace(temp_path, sums_path(filepath))
 
 
 def save_logs(filepath: str, logs: List[dict]) -> None:
@@ -34,7 +1088,12 @@ def save_logs(filepath: str, logs: List[dict]) -> None:
     to prevent data corruption.
 
     This ensures that if the program crashes during writing, the original
-    file remains intact.
+    file remains intact. The data is synced before the rename and the
+    directory after it, as far as the durability level asks. The snapshot
+    written here is the complete state of the log, so any journal is
+    removed afterwards. Its block checksums are written before the rename
+    and name the new file, so a crash in between leaves them unused rather
+    than wrong.
 
     Args:
         filepath: The path to the destination JSON file.
@@ -42,21 +1101,38 @@ def save_logs(filepath: str, logs: List[dict]) -> None:
     """
     # Get directory of target file
     directory = os.path.dirname(filepath) or '.'
-    
+
     # Create temp file in same directory for atomic rename
-    # We use mkstemp to ensure a unique filename
-    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.json.tmp')
-    
+    # We use temp_file to ensure a unique filename
+    fd, temp_path = temp_file(directory, '.json.tmp')
+
     try:
-        # Write to temp file first
-        with os.fdopen(fd, 'w', encoding='utf-8') as f:
-            json.dump(logs, f, indent=2, ensure_ascii=False)
-        
+        # Write to temp file first, one entry per line. The file is still a
+        # valid JSON list, and every entry can be read back from its offset.
+        with os.fdopen(fd, 'wb') as f:
+            with timings.phase('serialize'):
+                data = ',\n'.join(json.dumps(entry, ensure_ascii=False) for entry in logs)
+                data = ('[\n' + data + ('\n]\n' if logs else ']\n')).encode('utf-8')
+            with timings.phase('write'):
+                f.write(data)
+            sync_file(f)
+            st = os.fstat(f.fileno())
+        _write_sums(filepath, [st.st_ino, st.st_size], block_sums(data))
+
         # Atomic rename: This operation is atomic on POSIX and Windows (Python 3.3+)
         # It replaces the target file with the temp file in one go.
         os.replace(temp_path, filepath)
+        # The rename must be on disk before the journal is removed below
+        sync_directory(directory)
     except Exception:
         # Clean up temp file on error to avoid clutter
         if os.path.exists(temp_path):
             os.remove(temp_path)
         raise
+
+    # The snapshot now holds everything the journal recorded. Replay is
+    # idempotent, so a crash before this point cannot duplicate entries.
+    try:
+        os.remove(journal_path(filepath))
+    except FileNotFoundError:
+        pass
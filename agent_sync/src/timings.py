@@ -0,0 +1,73 @@
+"""
+Per-phase timings of a command, for `--timings` and the `meta.timings`
+block of `--json` results.
+
+The code on the hot paths marks its phases with `with timings.phase(name)`.
+Phases nest: while an inner phase runs, the outer one is paused, so every
+phase reports its own time only and the phases add up to at most the total.
+A phase costs two perf_counter calls, so the timings are always collected
+and only reported on request.
+"""
+import contextlib
+import time
+from typing import Dict, Iterator, List
+
+# The phases in the order they are reported.
+PHASES = ('lock_wait', 'load', 'decode', 'model', 'select', 'serialize', 'write', 'fsync', 'server')
+
+_started = time.perf_counter()
+_seconds: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+_counts: Dict[str, int] = {}
+# [name, resumed_at] of the running phases, innermost last
+_stack: List[list] = []
+
+
+def reset() -> None:
+    """
+    Forgets everything measured so far and restarts the total.
+    """
+    global _started
+    _started = time.perf_counter()
+    _seconds.update(dict.fromkeys(PHASES, 0.0))
+    _counts.clear()
+    _stack.clear()
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Adds the time spent in the block to a phase (one of PHASES).
+    """
+    now = time.perf_counter()
+    if _stack:
+        outer = _stack[-1]
+        _seconds[outer[0]] += now - outer[1]
+    _stack.append([name, now])
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        _seconds[name] += now - _stack.pop()[1]
+        if _stack:
+            _stack[-1][1] = now
+
+
+def count(name: str, value: int) -> None:
+    """
+    Adds to a counter reported next to the phases, e.g. the entries parsed.
+    """
+    _counts[name] = _counts.get(name, 0) + value
+
+
+def report() -> dict:
+    """
+    Returns what was measured since the start (or the last reset).
+
+    Returns:
+        {"total_ms": ..., "phases_ms": {phase: ms}, **counters}. Phases that
+        took no time are left out; "other" is the time outside every phase.
+    """
+    total = time.perf_counter() - _started
+    phases = {name: round(seconds * 1000, 3) for name, seconds in _seconds.items() if seconds}
+    phases["other"] = round(max(0.0, total - sum(_seconds.values())) * 1000, 3)
+    return dict({"total_ms": round(total * 1000, 3), "phases_ms": phases}, **_counts)
@@ -0,0 +1,487 @@
+"""
+Workspaces: one logical log split across several shard files.
+
+A workspace is a directory with a manifest, workspace.json, that names its
+shards and how entries are assigned to them:
+
+    {"shard_by": "hash", "shards": {"0": "shard-0.json", "1": "shard-1.json"}}
+    {"shard_by": "project", "shards": {"api": "api.json", "web": "../web/status_log.json"}}
+
+'hash' shards spread entries by their ID: the shard is derived from the
+first index.MIN_PREFIX_LENGTH characters, so even a short ID prefix names
+the shard that holds it. 'project' shards hold one project each; adding to
+a new project creates its shard. Shard paths are relative to the workspace
+directory and their extension selects the backend, like any --db path.
+
+Writers lock and rewrite only the shard they write to. A cross-shard read
+reads every shard (in a process pool once the shards are large enough for
+the parallel parse to pay for the processes) and k-way merges their sorted
+results in 3-tier order. Ties keep the shard order of the manifest, so the
+result equals sorting the shards' entries concatenated in that order.
+A search gathers the word statistics and matches of every shard and ranks
+them once, like one log holding all the entries (see search.candidates).
+`stats` adds up the summaries each shard maintains.
+"""
+import heapq
+import itertools
+import json
+import os
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from . import backends, storage, manager, index, search, stats, timings, paging, history
+
+# The name of the manifest file in the workspace directory.
+MANIFEST_NAME = backends.WORKSPACE_MANIFEST_NAME
+
+# How entries are assigned to shards.
+SHARD_BY = ('hash', 'project')
+
+# The number of shards `init --shard-by hash` creates by default.
+DEFAULT_SHARDS = 4
+
+# Reads across shards whose files add up to at least this many bytes run in a process pool.
+PARALLEL_READ_BYTES = 16 * 1024 * 1024
+
+# Project names double as file names.
+_PROJECT_NAME = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_.-]*$')
+
+
+def manifest_path(path: str) -> str:
+    """
+    Returns the path of the manifest for a workspace directory (or the
+    manifest path itself).
+    """
+    if os.path.basename(path) == MANIFEST_NAME:
+        return path
+    return os.path.join(path, MANIFEST_NAME)
+
+
+# Tells a workspace from a log file (defined with open_backend, which needs it first).
+is_workspace = backends.is_workspace
+
+
+def load_manifest(path: str) -> dict:
+    """
+    Reads and validates a workspace manifest.
+
+    Args:
+        path: The workspace directory or its manifest.
+
+    Returns:
+        The manifest as a dictionary.
+
+    Raises:
+        ValueError: If there is no manifest or it is invalid.
+    """
+    try:
+        with open(manifest_path(path), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"No workspace at {path}; create one with the init command") from None
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid workspace manifest {manifest_path(path)}: {e}") from None
+    if (not isinstance(manifest, dict) or manifest.get("shard_by") not in SHARD_BY
+            or not isinstance(manifest.get("shards"), dict)):
+        raise ValueError(f"Invalid workspace manifest {manifest_path(path)}: "
+                         f"expected 'shard_by' (one of {list(SHARD_BY)}) and a 'shards' object")
+    if manifest["shard_by"] == 'hash' and not manifest["shards"]:
+        raise ValueError(f"Invalid workspace manifest {manifest_path(path)}: no shards")
+    return manifest
+
+
+def _write_manifest(path: str, manifest: dict) -> None:
+    """
+    Writes a manifest atomically (temp file + rename).
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        storage.sync_file(f)
+    os.replace(temp_path, path)
+    storage.sync_directory(os.path.dirname(path))
+
+
+def init(path: str, shard_by: str = 'hash', shards: int = DEFAULT_SHARDS) -> dict:
+    """
+    Creates a workspace.
+
+    Args:
+        path: The workspace directory; it is created if needed.
+        shard_by: One of SHARD_BY.
+        shards: The number of shards for 'hash'; 'project' starts without any.
+
+    Returns:
+        A summary with the 'path' of the manifest and the 'shards' created.
+
+    Raises:
+        ValueError: If the directory already holds a workspace or the arguments are invalid.
+    """
+    if shard_by not in SHARD_BY:
+        raise ValueError(f"Invalid shard_by: {shard_by}. Must be one of {list(SHARD_BY)}")
+    if shard_by == 'hash' and shards < 1:
+        raise ValueError("A workspace sharded by hash needs at least one shard")
+    if os.path.isfile(path):
+        raise ValueError(f"{path} is a file; a workspace is a directory")
+    os.makedirs(path, exist_ok=True)
+    manifest = manifest_path(path)
+    if os.path.exists(manifest):
+        raise ValueError(f"{path} already holds a workspace")
+
+    names = [str(i) for i in range(shards)] if shard_by == 'hash' else []
+    _write_manifest(manifest, {
+        "shard_by": shard_by,
+        "shards": {name: f"shard-{name}.json" for name in names},
+    })
+    return {"status": "success", "path": manifest, "shard_by": shard_by, "shards": names}
+
+
+def _cpu_count() -> int:
+    """
+    Returns the number of CPUs this process may run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _read_shard(filepath: str, limit: Optional[int], pending_only: bool, include_archived: bool,
+                filters: dict) -> List[dict]:
+    """
+    Reads one shard; runs in the worker processes of a parallel read.
+    """
+    backend = backends.open_backend(filepath)
+    try:
+        return backend.read(limit, pending_only, include_archived, **filters)
+    finally:
+        backend.close()
+
+
+class ShardedBackend(backends.Backend):
+    """
+    A workspace, served through the Backend interface of its shards.
+
+    Entries read from a workspace sharded by project carry the name of
+    their 'project'.
+
+    Attributes:
+        filepath (str): The path to the manifest.
+        directory (str): The workspace directory.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: The workspace directory or its manifest.
+
+        Raises:
+            ValueError: If there is no valid manifest.
+        """
+        super().__init__(manifest_path(path))
+        self.directory = os.path.dirname(self.filepath)
+        self._manifest = load_manifest(self.filepath)
+        self._signature = index.snapshot_signature(self.filepath)
+        self._shards: Dict[str, backends.Backend] = {}
+
+    @property
+    def shard_by(self) -> str:
+        return self._manifest["shard_by"]
+
+    def shard_paths(self) -> Dict[str, str]:
+        """
+        Returns the path of every shard by name, in manifest order. A
+        manifest changed by another process (a new project) is reread.
+        """
+        signature = index.snapshot_signature(self.filepath)
+        if signature != self._signature:
+            self._manifest = load_manifest(self.filepath)
+            self._signature = signature
+        return {name: os.path.join(self.directory, path) for name, path in self._manifest["shards"].items()}
+
+    def _shard(self, name: str) -> backends.Backend:
+        if name not in self._shards:
+            self._shards[name] = backends.open_backend(self.shard_paths()[name])
+        return self._shards[name]
+
+    def close(self) -> None:
+        for backend in self._shards.values():
+            backend.close()
+        self._shards.clear()
+
+    def _hash_shard(self, id_or_prefix: str) -> str:
+        """
+        Returns the shard of an ID (or of any prefix that can be resolved).
+        """
+        names = list(self.shard_paths())
+        key = id_or_prefix[:index.MIN_PREFIX_LENGTH].encode('utf-8')
+        return names[zlib.crc32(key) % len(names)]
+
+    def _project_shard(self, project: Optional[str]) -> str:
+        """
+        Returns the shard of a project, registering a new project in the manifest.
+        """
+        if not project:
+            raise ValueError("This workspace is sharded by project; add needs --project")
+        if project in self.shard_paths():
+            return project
+        if not _PROJECT_NAME.match(project):
+            raise ValueError(f"Invalid project name: {project}. Use letters, digits, '_', '.' and '-'")
+        with storage.lock(self.filepath):
+            manifest = load_manifest(self.filepath)
+            if project not in manifest["shards"]:
+                manifest["shards"][project] = f"{project}.json"
+                _write_manifest(self.filepath, manifest)
+        self._signature = None
+        return project
+
+    def _locate(self, id_or_prefix: str) -> Tuple[str, str]:
+        """
+        Returns the shard holding an entry and its full ID.
+
+        Raises:
+            index.UnknownIdError: If no shard holds a match.
+            ValueError: If the prefix is ambiguous, within a shard or across shards.
+        """
+        if self.shard_by == 'hash':
+            name = self._hash_shard(id_or_prefix)
+            return name, self._shard(name).resolve(id_or_prefix)
+
+        found = []
+        for name in self.shard_paths():
+            try:
+                found.append((name, self._shard(name).resolve(id_or_prefix)))
+            except index.UnknownIdError:
+                continue
+        if not found:
+            raise index.UnknownIdError(f"Log entry with ID '{id_or_prefix}' not found")
+        if len(found) > 1:
+            shown = ', '.join(f"{log_id} ({name})" for name, log_id in found[:5])
+            raise ValueError(f"ID prefix '{id_or_prefix}' is ambiguous; it matches {shown}")
+        return found[0]
+
+    def resolve(self, id_or_prefix: str) -> str:
+        return self._locate(id_or_prefix)[1]
+
+    def _route(self, op: dict) -> Tuple[str, dict]:
+        """
+        Returns the shard an operation goes to and the operation to commit there.
+        """
+        if op["op"] == "add":
+            if self.shard_by == 'hash':
+                if op.get("project"):
+                    raise ValueError("This workspace is sharded by hash; it has no projects")
+                name = self._hash_shard(op["entry"]["id"])
+            else:
+                name = self._project_shard(op.get("project"))
+            return name, {key: value for key, value in op.items() if key != "project"}
+        if op["op"] == "complete":
+            name, log_id = self._locate(op["id"])
+            return name, dict(op, id=log_id)
+        raise ValueError(f"Unknown operation: {op['op']}")
+
+    def commit(self, ops: List[dict]) -> Tuple[List[dict], dict]:
+        # Grouped by shard: one commit, and one lock, per shard written to
+        results: List[Optional[dict]] = [None] * len(ops)
+        groups: Dict[str, List[Tuple[int, dict]]] = {}
+        for position, op in enumerate(ops):
+            try:
+                name, routed = self._route(op)
+            except ValueError as e:
+                results[position] = {"status": "error", "message": str(e)}
+                continue
+            groups.setdefault(name, []).append((position, routed))
+
+        meta = {"lock_wait_ms": 0.0, "group_size": 0}
+        for name, group in groups.items():
+            committed, shard_meta = self._shard(name).commit([op for _, op in group])
+            for (position, _), result in zip(group, committed):
+                results[position] = result
+            meta["lock_wait_ms"] = round(meta["lock_wait_ms"] + shard_meta["lock_wait_ms"], 3)
+            meta["group_size"] += shard_meta["group_size"]
+        return results, meta
+
+    def _data_bytes(self, paths: Iterable[str]) -> int:
+        return sum(
+            os.path.getsize(path) for shard in paths
+            for path in (shard, storage.journal_path(shard)) if os.path.exists(path)
+        )
+
+    def _merge(self, results: Dict[str, List[dict]], key, limit: Optional[int]) -> List[dict]:
+        """
+        Merges the sorted results of the shards, keeping ties in shard order.
+        """
+        if self.shard_by == 'project':
+            for name, entries in results.items():
+                for entry in entries:
+                    entry["project"] = name
+        with timings.phase('select'):
+            return list(itertools.islice(heapq.merge(*results.values(), key=key), limit))
+
+    def read(self, limit=None, pending_only=False, include_archived=False, **filters) -> List[dict]:
+        paths = self.shard_paths()
+        workers = min(len(paths), _cpu_count())
+        if workers > 1 and self._data_bytes(paths.values()) >= PARALLEL_READ_BYTES:
+            # Parsing is CPU bound: threads would wait for each other on the GIL.
+            # Imported here so the regular CLI path doesn't pay for it
+            from concurrent.futures import ProcessPoolExecutor
+            with timings.phase('load'), ProcessPoolExecutor(max_workers=workers) as pool:
+                shard_results = pool.map(
+                    _read_shard, paths.values(), *(itertools.repeat(arg) for arg in
+                                                   (limit, pending_only, include_archived, filters))
+                )
+                results = dict(zip(paths, shard_results))
+        else:
+            results = {name: self._shard(name).read(limit, pending_only, include_archived, **filters)
+                       for name in paths}
+        return self._merge(results, manager.dict_sort_key, limit)
+
+    def read_hot(self, limit=None, pending_only=False, **filters) -> List[dict]:
+        return self.read(limit, pending_only, **filters)
+
+    def read_after(self, after: Optional[paging.PageKey], limit: int, pending_only=False,
+                   **filters) -> List[dict]:
+        # IDs are unique across the shards, so the merged pages are in page order too
+        results = {name: self._shard(name).read_after(after, limit, pending_only, **filters)
+                   for name in self.shard_paths()}
+        return self._merge(results, paging.page_key, limit)
+
+    def _recorded_shards(self) -> Dict[str, str]:
+        """
+        Returns the shards that have a history, failing for one that holds
+        entries without it. A shard never written to has nothing to tell.
+        """
+        paths = {}
+        for name, path in self.shard_paths().items():
+            if history.load_manifest(path) is not None:
+                paths[name] = path
+            elif self._shard(name).read_hot(1):
+                raise ValueError(f"No history has been recorded for {path} yet; "
+                                 f"it starts with the next add or complete")
+        return paths
+
+    def read_as_of(self, timestamp: int, limit=None, pending_only=False, **filters) -> List[dict]:
+        # Every shard keeps its own history
+        results = {name: self._shard(name).read_as_of(timestamp, limit, pending_only, **filters)
+                   for name in self._recorded_shards()}
+        return self._merge(results, manager.dict_sort_key, limit)
+
+    def history(self, id_or_prefix: str) -> List[dict]:
+        # Archived entries are in no shard's log, so every shard's history is asked
+        found = []
+        for name in self._recorded_shards():
+            try:
+                found.append((name, self._shard(name).history(id_or_prefix)))
+            except index.UnknownIdError:
+                continue
+        if not found:
+            raise index.UnknownIdError(f"Log entry with ID '{id_or_prefix}' not found")
+        if len(found) > 1:
+            shown = ', '.join(f"{events[0]['entry']['id']} ({name})" for name, events in found[:5])
+            raise ValueError(f"ID prefix '{id_or_prefix}' is ambiguous; it matches {shown}")
+        return found[0][1]
+
+    def version(self) -> Optional[list]:
+        versions = [index.snapshot_signature(self.filepath)]
+        for name in self.shard_paths():
+            version = self._shard(name).version()
+            if version is None:
+                return None
+            versions.append(version)
+        return versions
+
+    def search(self, text: str, limit=search.DEFAULT_LIMIT, **filters) -> List[dict]:
+        # Scored once against the statistics of all shards: each shard's own
+        # (document frequencies, average length) would make scores incomparable
+        found = self.search_candidates(text, **filters)
+        with timings.phase('select'):
+            return search.rank(found, limit)
+
+    def search_candidates(self, text: str, **filters) -> dict:
+        parts = {name: self._shard(name).search_candidates(text, **filters) for name in self.shard_paths()}
+        if self.shard_by == 'project':
+            for name, part in parts.items():
+                for entry in part["matches"]:
+                    entry["project"] = name
+        return search.merge_candidates(parts.values())
+
+    def follower(self) -> 'ShardedFollower':
+        return ShardedFollower(self)
+
+    def archive(self, older_than_days: int) -> dict:
+        summary = {"status": "success", "archived": 0, "remaining": 0, "segments": []}
+        for name in self.shard_paths():
+            result = self._shard(name).archive(older_than_days)
+            summary["archived"] += result["archived"]
+            summary["remaining"] += result["remaining"]
+            summary["segments"] = sorted(set(summary["segments"]) | set(result["segments"]))
+        return summary
+
+    def stats(self, rebuild: bool = False) -> stats.Summary:
+        summary = stats.Summary()
+        verified = []
+        for name in self.shard_paths():
+            shard = self._shard(name).stats(rebuild)
+            summary.merge(shard)
+            verified.append(shard.verified)
+        if rebuild:
+            summary.verified = all(verified)
+        return summary
+
+    def verify(self) -> dict:
+        report = {"status": "success", "path": self.directory, "files": 0, "bytes": 0, "entries": 0,
+                  "damaged": [], "unchecked": []}
+        for name in self.shard_paths():
+            shard = self._shard(name).verify()
+            for key in ("files", "bytes", "entries", "damaged", "unchecked"):
+                report[key] += shard[key]
+        if report["damaged"]:
+            report["status"] = "error"
+        return report
+
+    def repair(self, force: bool = False) -> dict:
+        summary = {"status": "success", "path": self.directory, "repaired": False, "damaged": 0, "recovered": 0,
+                   "history": True, "backups": []}
+        for name in self.shard_paths():
+            result = self._shard(name).repair(force)
+            if result["repaired"]:
+                summary["repaired"] = True
+                summary["history"] = summary["history"] and result["history"]
+            for key in ("damaged", "recovered", "backups"):
+                summary[key] += result[key]
+        summary["history"] = summary["history"] and summary["repaired"]
+        return summary
+
+    def export(self) -> List[dict]:
+        return [entry for name in self.shard_paths() for entry in self._shard(name).export()]
+
+    def import_entries(self, entries: List[dict]) -> None:
+        if self.shard_by == 'project':
+            raise ValueError("Entries have no project; migrate into the file of a project's shard instead")
+        if self.export():
+            raise ValueError(f"{self.directory} already holds entries; import into an empty database")
+        groups: Dict[str, List[dict]] = {}
+        for entry in entries:
+            groups.setdefault(self._hash_shard(entry["id"]), []).append(entry)
+        for name, group in groups.items():
+            self._shard(name).import_entries(group)
+
+
+class ShardedFollower:
+    """
+    Follows every shard of a workspace, including shards created later.
+    """
+
+    def __init__(self, backend: ShardedBackend):
+        self._backend = backend
+        self._followers = {}
+
+    def poll(self) -> List[dict]:
+        """
+        Returns the events of all shards since the previous poll.
+        """
+        events = []
+        for name in self._backend.shard_paths():
+            if name not in self._followers:
+                self._followers[name] = self._backend._shard(name).follower()
+            events += self._followers[name].poll()
+        return events
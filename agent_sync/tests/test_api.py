@@ -0,0 +1,93 @@
+"""
+Tests for the in-process StatusLog API in api.py.
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+# Assuming the project structure allows this import
+from ..src import api
+from ..src import main
+from ..src import manager
+from ..src import models
+from ..src import storage
+
+
+class TestStatusLog(unittest.TestCase):
+    """
+    Test suite for the cached queries and in-place writes.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+        self.log = api.StatusLog.open(self.db_path)
+        for i, priority in enumerate(["tier2", "tier0", "tier3", "tier0", "tier1", "tier2"]):
+            self.log.add(f"Task {i}", priority, f"user{i % 2}", "engineer")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _expected(self, limit=None, pending_only=False, **filters):
+        logs = manager.filter_logs(storage.load_logs(self.db_path), **filters)
+        return [models.to_dict(entry) for entry in manager.select_logs(logs, limit, pending_only)]
+
+    def _query(self, *args, **kwargs):
+        return [models.to_dict(entry) for entry in self.log.query(*args, **kwargs)]
+
+    def test_queries_match_read(self):
+        """
+        Tests that queries return what `read` would, with and without filters.
+        """
+        self.log.complete(self.log.query(limit=1)[0].id[:8], "claude", "engineer")
+
+        self.assertEqual(self._query(), self._expected())
+        self.assertEqual(self._query(3, True), self._expected(3, True))
+        self.assertEqual(self._query(priority=["tier0", "tier2"], status=["pending"]),
+                         self._expected(priority=["tier0", "tier2"], status=["pending"]))
+        self.assertEqual(self._query(2, creator=["user1"]), self._expected(2, creator=["user1"]))
+        self.assertEqual([models.to_dict(entry) for entry in self.log.iter_sorted(pending_only=True)],
+                         self._expected(pending_only=True))
+
+    def test_reparses_only_when_another_process_writes(self):
+        """
+        Tests that own writes update the cache in place and only a change
+        made elsewhere reloads the file.
+        """
+        with mock.patch.object(storage, 'load_logs', wraps=storage.load_logs) as load_logs:
+            self.log.query()
+            added = self.log.add("Mine", "tier0", "gemini", "engineer")
+            self.log.complete(added.id, "claude", "engineer")
+            self.assertEqual(self._query(), self._expected())
+            # _expected loads the file itself, once
+            self.assertEqual(load_logs.call_count, 1)
+
+            main.execute(self.db_path, 'add', {'user': 'other', 'role': 'engineer',
+                                               'desc': 'Theirs', 'priority': 'tier0'})
+            self.assertIn("Theirs", [entry.description for entry in self.log.query()])
+            self.assertEqual(load_logs.call_count, 2)
+
+    def test_own_compaction_reloads(self):
+        """
+        Tests that a write which compacts the journal leaves a correct cache.
+        """
+        with mock.patch.object(storage, 'JOURNAL_COMPACT_BYTES', 1):
+            self.log.add("Compacted", "tier1", "gemini", "engineer")
+        self.assertFalse(os.path.exists(storage.journal_path(self.db_path)))
+        self.assertEqual(self._query(), self._expected())
+
+    def test_rejects_sqlite_and_bad_input(self):
+        """
+        Tests that SQLite paths, unknown IDs and invalid priorities are rejected.
+        """
+        with self.assertRaises(ValueError):
+            api.StatusLog(os.path.join(self.tmpdir.name, "status_log.db"))
+        with self.assertRaises(ValueError):
+            self.log.complete("nope0000", "claude", "engineer")
+        with self.assertRaises(ValueError):
+            self.log.add("Bad", "tier9", "gemini", "engineer")
+        self.assertEqual(len(self.log), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+Tests for archiving completed entries into segments in archive.py.
+"""
+import os
+import random
+import unittest
+import tempfile
+# Assuming the project structure allows this import
+from ..src import archive
+from ..src import main
+from ..src import manager
+from ..src import storage
+
+# 2024-05-15 12:00 UTC
+NOW = 1715774400
+DAY = 86400
+
+
+def _entry(log_id, status, priority="tier1", created=0, completed=None):
+    return {
+        "id": log_id, "creator": "user1", "creator_role": "engineer",
+        "created_timestamp": created, "description": f"Task {log_id}",
+        "priority": priority, "status": status,
+        "completer": "user2" if status == "completed" else None,
+        "completer_role": "engineer" if status == "completed" else None,
+        "completion_timestamp": completed
+    }
+
+
+class TestArchive(unittest.TestCase):
+    """
+    Test suite for the archive command and read --include-archived.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+
+        rng = random.Random(5)
+        self.logs = []
+        for i in range(200):
+            created = NOW - rng.randint(0, 120) * DAY
+            if rng.random() < 0.3:
+                self.logs.append(_entry(f"p{i}", "pending", rng.choice(["tier0", "tier2"]), created))
+            else:
+                # A few distinct timestamps produce ties across segments
+                created = NOW - rng.choice([100, 90, 70]) * DAY
+                completed = created + rng.randint(0, 60) * DAY
+                self.logs.append(_entry(f"c{i}", "completed", rng.choice(["tier0", "tier2"]), created, completed))
+        storage.save_logs(self.db_path, self.logs)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _read(self, **params):
+        params = dict({'limit': None, 'pending_only': False, 'include_archived': True}, **params)
+        return [d["id"] for d in main.execute(self.db_path, 'read', params)]
+
+    def test_archive_moves_old_completed_entries(self):
+        """
+        Tests that only completed entries past the cutoff leave the hot log.
+        """
+        result = archive.archive_logs(self.db_path, 30, now=NOW)
+
+        hot = storage.load_logs(self.db_path)
+        cutoff = NOW - 30 * DAY
+        self.assertTrue(all(d["status"] == "pending" or d["completion_timestamp"] >= cutoff for d in hot))
+        self.assertEqual(result["archived"] + result["remaining"], 200)
+        self.assertEqual(result["segments"], archive.list_segments(self.db_path))
+
+        archived = 0
+        for name in result["segments"]:
+            for entry in archive.iter_segment(self.db_path, name):
+                self.assertEqual(archive.segment_name(entry["completion_timestamp"]), name)
+                self.assertLess(entry["completion_timestamp"], cutoff)
+                archived += 1
+        self.assertEqual(archived, result["archived"])
+
+    def test_include_archived_matches_a_full_sort(self):
+        """
+        Tests that merging the segments gives the order of the log before archiving.
+        """
+        expected = [e.id for e in manager.select_logs(self.logs)]
+        archive.archive_logs(self.db_path, 30, now=NOW)
+
+        self.assertEqual(sorted(self._read()), sorted(expected))
+        # Entries with equal keys may swap places across segments; the key order must match
+        key_of = {d["id"]: manager.dict_sort_key(d) for d in self.logs}
+        self.assertEqual([key_of[i] for i in self._read()], [key_of[i] for i in expected])
+        for limit in (0, 1, 70, 150):
+            self.assertEqual(self._read(limit=limit), self._read()[:limit])
+
+        self.assertNotEqual(len(self._read(include_archived=False)), 200)
+        self.assertEqual(self._read(pending_only=True), [i for i in expected if i.startswith("p")])
+
+    def test_filters_apply_to_archived_entries(self):
+        """
+        Tests filtered reads over the archive, including pruning by --since.
+        """
+        archive.archive_logs(self.db_path, 30, now=NOW)
+        for filters in ({'priority': ['tier0']}, {'since': NOW - 80 * DAY}, {'status': ['pending']}):
+            expected = [e.id for e in manager.select_logs(manager.filter_logs(self.logs, **filters))]
+            self.assertEqual(sorted(self._read(**filters)), sorted(expected), filters)
+
+    def test_rearchiving_does_not_duplicate(self):
+        """
+        Tests a crash after the segments were written but before the hot log was.
+        """
+        storage.save_logs(self.db_path, self.logs)
+        archive.archive_entries(self.db_path, storage.load_logs(self.db_path), 30, now=NOW)
+        self.assertEqual(len(self._read()), 200)
+
+        archive.archive_logs(self.db_path, 30, now=NOW)
+        self.assertEqual(len(self._read()), 200)
+        archived = sum(1 for name in archive.list_segments(self.db_path)
+                       for _ in archive.iter_segment(self.db_path, name))
+        self.assertEqual(archived + len(storage.load_logs(self.db_path)), 200)
+
+    def test_compaction_archives_past_the_threshold(self):
+        """
+        Tests the automatic archiving done by compaction on large snapshots.
+        """
+        storage.compact_logs(self.db_path)
+        self.assertEqual(archive.list_segments(self.db_path), [])
+
+        threshold = archive.AUTO_ARCHIVE_BYTES
+        archive.AUTO_ARCHIVE_BYTES = 0
+        try:
+            storage.compact_logs(self.db_path)
+        finally:
+            archive.AUTO_ARCHIVE_BYTES = threshold
+        self.assertNotEqual(archive.list_segments(self.db_path), [])
+        self.assertEqual(len(self._read()), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Tests for the benchmark workload and the regression check in bench/.
+"""
+import unittest
+# Assuming the project structure allows this import
+from ..bench import suite
+from ..bench import workload
+
+
+class TestBench(unittest.TestCase):
+    """
+    Test suite for the synthetic logs and compare.
+    """
+
+    def test_workload_is_reproducible(self):
+        """
+        Tests that a seed always yields the same log and the mix is honoured.
+        """
+        first = workload.generate_logs(500, seed=3, pending_ratio=0.5,
+                                       priority_mix={"tier0": 1}, description_length=80)
+        self.assertEqual(first, workload.generate_logs(500, seed=3, pending_ratio=0.5,
+                                                       priority_mix={"tier0": 1}, description_length=80))
+        self.assertEqual({d["priority"] for d in first}, {"tier0"})
+        self.assertTrue(all(len(d["description"]) >= 80 for d in first))
+        self.assertTrue(150 < sum(d["status"] == "pending" for d in first) < 350)
+
+        self.assertEqual(workload.parse_priority_mix("tier0=1, tier3=2.5"), {"tier0": 1.0, "tier3": 2.5})
+        with self.assertRaises(ValueError):
+            workload.parse_priority_mix("tier9=1")
+
+    def test_compare_flags_regressions(self):
+        """
+        Tests the verdicts for slower, faster, unchanged and larger cases.
+        """
+        def document(*results):
+            return {"results": [
+                {"case": case, "size": 1000, "wall_s": wall, "peak_rss_bytes": rss}
+                for case, wall, rss in results
+            ]}
+
+        old = document(("a", 1.0, 100), ("b", 1.0, 100), ("c", 1.0, 100), ("d", 1.0, 100), ("gone", 1.0, 1))
+        new = document(("a", 1.2, 100), ("b", 0.5, 100), ("c", 1.05, 100), ("d", 1.0, 150), ("added", 1.0, 1))
+
+        rows = suite.compare(old, new, threshold=0.1)
+        self.assertEqual({row["case"]: row["verdict"] for row in rows}, {
+            "a": "regression", "b": "improvement", "c": "same", "d": "regression"
+        })
+
+
+    def test_compare_matches_durability_levels(self):
+        """
+        Tests that write cases are compared level by level, and that results
+        without a level match the cases that don't write.
+        """
+        old = {"results": [{"case": "load_logs", "size": 10, "wall_s": 1.0},
+                           {"case": "cli_add", "size": 10, "durability": "none", "wall_s": 1.0}]}
+        new = {"results": [{"case": "load_logs", "size": 10, "durability": None, "wall_s": 1.0},
+                           {"case": "cli_add", "size": 10, "durability": "full", "wall_s": 9.0},
+                           {"case": "cli_add", "size": 10, "durability": "none", "wall_s": 0.5}]}
+
+        rows = suite.compare(old, new, threshold=0.1)
+        self.assertEqual([(row["case"], row["durability"], row["verdict"]) for row in rows],
+                         [("load_logs", None, "same"), ("cli_add", "none", "improvement")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Tests for the memory-mapped columnar backend in columnar_backend.py.
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+# Assuming the project structure allows this import
+from ..src import backends
+from ..src import columnar_backend
+from ..src import main
+from ..src import manager
+from ..src import models
+from ..src import storage
+
+
+def _add(db_path, desc, priority, user='user1', role='engineer'):
+    return main.execute(db_path, 'add', {'user': user, 'role': role, 'desc': desc,
+                                         'priority': priority})["data"]["id"]
+
+
+def _complete(db_path, log_id):
+    main.execute(db_path, 'complete', {'id': log_id, 'user': 'user2', 'role': 'planner'})
+
+
+def _read(db_path, **params):
+    return main.execute(db_path, 'read', dict({'limit': None, 'pending_only': False}, **params))
+
+
+class TestColumnarBackend(unittest.TestCase):
+    """
+    Test suite for reads and writes on a columnar log.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.cols")
+        self.ids = []
+        for i in range(40):
+            user, role = ('user1', 'engineer') if i % 3 else ('user3', 'planner')
+            # Equal timestamps, so ties have to keep load order
+            with mock.patch('time.time', return_value=1700000000 + i // 4):
+                self.ids.append(_add(self.db_path, f"Task {i} über", f"tier{i % 4}", user, role))
+        for log_id in self.ids[:6]:
+            _complete(self.db_path, log_id)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _expected(self, limit=None, pending_only=False, **filters):
+        backend = backends.open_backend(self.db_path)
+        logs = manager.filter_logs(backend.export(), **filters)
+        return [models.to_dict(entry) for entry in manager.select_logs(logs, limit, pending_only)]
+
+    def _check_reads(self):
+        for params in ({}, {'limit': 5}, {'pending_only': True, 'limit': 12},
+                       {'status': ['completed']}, {'priority': ['tier0', 'tier2'], 'status': ['pending']},
+                       {'creator': ['user3'], 'limit': 4}, {'role': ['engineer'], 'priority': ['tier1']},
+                       {'since': 1700000002, 'until': 1700000007}):
+            with self.subTest(params=params):
+                self.assertEqual(_read(self.db_path, **params), self._expected(**params))
+
+    def test_reads_with_journal(self):
+        """
+        Tests that reads over the snapshot and a journal of adds and
+        completions match sorting the whole log.
+        """
+        self._check_reads()
+        with storage.lock(self.db_path):
+            columnar_backend.compact(self.db_path)
+        self.assertFalse(os.path.exists(storage.journal_path(self.db_path)))
+        self._check_reads()
+
+        for log_id in self.ids[10:14]:
+            _complete(self.db_path, log_id[:8])
+        with mock.patch('time.time', return_value=1700000003):
+            self.ids.append(_add(self.db_path, "Late", 'tier0'))
+        _complete(self.db_path, self.ids[-1])
+        self._check_reads()
+        self.assertEqual(len(_read(self.db_path)), 41)
+
+    def test_compacts_journal(self):
+        """
+        Tests that a journal past the compaction threshold is folded into
+        the snapshot.
+        """
+        with mock.patch.object(storage, 'JOURNAL_COMPACT_BYTES', 1):
+            _complete(self.db_path, self.ids[20])
+        self.assertFalse(os.path.exists(storage.journal_path(self.db_path)))
+        with open(self.db_path, 'rb') as f:
+            self.assertEqual(f.readline(), columnar_backend.MAGIC)
+        self._check_reads()
+
+    def test_resolve(self):
+        """
+        Tests resolving full IDs, unique prefixes and unknown IDs.
+        """
+        with storage.lock(self.db_path):
+            columnar_backend.compact(self.db_path)
+        late = _add(self.db_path, "Late", 'tier0')
+        backend = backends.open_backend(self.db_path)
+        for log_id in (self.ids[7], late):
+            self.assertEqual(backend.resolve(log_id), log_id)
+            self.assertEqual(backend.resolve(log_id[:10]), log_id)
+        with self.assertRaisesRegex(ValueError, "not found"):
+            backend.resolve("zzzzzzzz")
+
+    def test_migrate_and_search(self):
+        """
+        Tests that a JSON log migrates into a columnar one with the same
+        reads and search results.
+        """
+        json_path = os.path.join(self.tmpdir.name, "copy.json")
+        main.execute(self.db_path, 'migrate', {'to': json_path})
+        self.assertEqual(_read(json_path), _read(self.db_path))
+        cols_path = os.path.join(self.tmpdir.name, "copy.cols")
+        main.execute(json_path, 'migrate', {'to': cols_path})
+        self.assertEqual(_read(cols_path), _read(json_path))
+
+        params = {'text': 'task über', 'limit': 5, 'status': ['pending']}
+        self.assertEqual(main.execute(cols_path, 'search', params), main.execute(json_path, 'search', params))
+        with self.assertRaises(ValueError):
+            main.execute(json_path, 'migrate', {'to': cols_path})
+
+    def test_empty_and_foreign_files(self):
+        """
+        Tests that a missing log reads empty and a file in another format is rejected.
+        """
+        path = os.path.join(self.tmpdir.name, "empty.cols")
+        self.assertEqual(_read(path), [])
+        with open(path, 'w') as f:
+            f.write("[]")
+        with self.assertRaisesRegex(ValueError, "not a columnar log"):
+            _read(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Tests for the locked, group-committed writes in commit.py.
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+# Assuming the project structure allows this import
+from ..src import commit
+from ..src import manager
+from ..src import models
+from ..src import storage
+
+
+def _new_entry(description):
+    return models.to_dict(manager.create_entry(
+        description=description,
+        priority="tier2",
+        creator="gemini-cli",
+        role="engineer"
+    ))
+
+
+def _add_many(db_path, worker, count):
+    for i in range(count):
+        commit.submit(db_path, [commit.add_op(_new_entry(f"worker {worker} task {i}"))])
+
+
+class TestCommit(unittest.TestCase):
+    """
+    Test suite for commit.submit.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_add_and_complete(self):
+        """
+        Tests that committed operations are persisted and reported.
+        """
+        entry = _new_entry("Fix memory leak")
+        results, meta = commit.submit(self.db_path, [commit.add_op(entry)])
+        self.assertEqual(results[0]["status"], "success")
+        self.assertEqual(meta["group_size"], 1)
+        self.assertIn("lock_wait_ms", meta)
+
+        results, _ = commit.submit(self.db_path, [commit.complete_op(entry["id"], "claude", "engineer")])
+        self.assertEqual(results[0]["status"], "success")
+        self.assertEqual(storage.load_logs(self.db_path)[0]["status"], "completed")
+
+    def test_failed_operation_does_not_block_others(self):
+        """
+        Tests that an invalid completion is reported without losing the rest.
+        """
+        entry = _new_entry("Update docs")
+        results, _ = commit.submit(self.db_path, [
+            commit.complete_op("missing", "claude", "engineer"),
+            commit.add_op(entry),
+        ])
+        self.assertEqual(results[0]["status"], "error")
+        self.assertIn("not found", results[0]["message"])
+        self.assertEqual(results[1]["status"], "success")
+        self.assertEqual([d["id"] for d in storage.load_logs(self.db_path)], [entry["id"]])
+
+    def test_queued_writers_are_committed_together(self):
+        """
+        Tests that the lock holder commits requests queued by other writers
+        and leaves their results behind for them.
+        """
+        queued = _new_entry("Queued by another agent")
+        directory = commit.queue_dir(self.db_path)
+        os.makedirs(directory)
+        with open(os.path.join(directory, "00000000000000000001-1-other.req"), 'w', encoding='utf-8') as f:
+            json.dump({"ops": [commit.add_op(queued)]}, f)
+
+        own = _new_entry("Own request")
+        results, meta = commit.submit(self.db_path, [commit.add_op(own)])
+
+        self.assertEqual(results[0]["record"]["entry"]["id"], own["id"])
+        self.assertEqual(meta["group_size"], 2)
+        # The queued request came first and was committed in the same append
+        self.assertEqual([d["id"] for d in storage.load_logs(self.db_path)], [queued["id"], own["id"]])
+        with open(os.path.join(directory, "00000000000000000001-1-other.done"), 'r', encoding='utf-8') as f:
+            done = json.load(f)
+        self.assertEqual(done["results"][0]["status"], "success")
+        self.assertEqual(done["group_size"], 2)
+
+    def test_concurrent_writers_do_not_lose_updates(self):
+        """
+        Tests that adds from several processes at once all survive.
+        """
+        workers = [
+            multiprocessing.Process(target=_add_many, args=(self.db_path, worker, 10))
+            for worker in range(6)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+
+        self.assertEqual(len(storage.load_logs(self.db_path)), 60)
+        self.assertFalse([n for n in os.listdir(commit.queue_dir(self.db_path)) if n.endswith('.req')])
+
+
+if __name__ == '__main__':
+    unittest.main()
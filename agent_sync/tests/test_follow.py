@@ -0,0 +1,151 @@
+"""
+Tests for the change feed of `read --follow` in follow.py.
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+# Assuming the project structure allows this import
+from ..src import backends
+from ..src import columnar_backend
+from ..src import main
+from ..src import storage
+
+
+def _add(db_path, desc):
+    return main.execute(db_path, 'add', {'user': 'user1', 'role': 'engineer',
+                                         'desc': desc, 'priority': 'tier1'})["data"]["id"]
+
+
+def _complete(db_path, log_id):
+    main.execute(db_path, 'complete', {'id': log_id, 'user': 'user2', 'role': 'engineer'})
+
+
+def _events(follower):
+    return [(event["event"], event["entry"]["description"], event["entry"]["status"])
+            for event in follower.poll()]
+
+
+class FollowTests:
+    """
+    Scenarios every backend's follower must pass.
+    """
+
+    filename = None
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, self.filename)
+        self.backend = backends.open_backend(self.db_path)
+
+    def tearDown(self):
+        self.backend.close()
+        self.tmpdir.cleanup()
+
+    def test_reports_existing_then_changes(self):
+        """
+        Tests that the first poll reports every entry and later polls only
+        what was added or completed since.
+        """
+        first = _add(self.db_path, "first")
+        _complete(self.db_path, _add(self.db_path, "done"))
+
+        follower = self.backend.follower()
+        self.assertCountEqual(_events(follower), [("added", "first", "pending"), ("added", "done", "completed")])
+        self.assertEqual(_events(follower), [])
+
+        second = _add(self.db_path, "second")
+        _complete(self.db_path, first)
+        self.assertCountEqual(_events(follower), [("added", "second", "pending"), ("completed", "first", "completed")])
+
+        _complete(self.db_path, second)
+        _add(self.db_path, "third")
+        self.assertCountEqual(_events(follower), [("completed", "second", "completed"), ("added", "third", "pending")])
+        self.assertEqual(_events(follower), [])
+
+
+class TestJsonFollower(FollowTests, unittest.TestCase):
+    """
+    Test suite for following the JSON snapshot and journal.
+    """
+
+    filename = "status_log.json"
+
+    def test_idle_poll_only_stats(self):
+        """
+        Tests that a poll without changes doesn't open any file.
+        """
+        _add(self.db_path, "first")
+        follower = self.backend.follower()
+        follower.poll()
+        with mock.patch('builtins.open', side_effect=AssertionError("file opened")):
+            self.assertEqual(follower.poll(), [])
+
+    def test_changes_across_compaction(self):
+        """
+        Tests that changes folded into the snapshot before the next poll are
+        still reported once.
+        """
+        first = _add(self.db_path, "first")
+        follower = self.backend.follower()
+        follower.poll()
+
+        _complete(self.db_path, first)
+        _add(self.db_path, "second")
+        with storage.lock(self.db_path):
+            storage.compact_logs(self.db_path)
+        self.assertCountEqual(_events(follower), [("completed", "first", "completed"), ("added", "second", "pending")])
+
+        _add(self.db_path, "third")
+        self.assertEqual(_events(follower), [("added", "third", "pending")])
+
+    def test_completion_of_a_missing_entry(self):
+        """
+        Tests that a completion of an entry no longer in the log (e.g.
+        archived before the poll) is skipped instead of ending the feed.
+        """
+        first = _add(self.db_path, "first")
+        follower = self.backend.follower()
+        follower.poll()
+
+        _complete(self.db_path, first)
+        _add(self.db_path, "second")
+        with mock.patch.object(follower, '_lookup', return_value=lambda log_id: None):
+            self.assertEqual(_events(follower), [("added", "second", "pending")])
+        _add(self.db_path, "third")
+        self.assertEqual(_events(follower), [("added", "third", "pending")])
+
+
+class TestColumnarFollower(FollowTests, unittest.TestCase):
+    """
+    Test suite for following a columnar snapshot and its journal.
+    """
+
+    filename = "status_log.cols"
+
+    def test_changes_across_compaction(self):
+        """
+        Tests that changes folded into a new snapshot before the next poll are
+        still reported once.
+        """
+        first = _add(self.db_path, "first")
+        follower = self.backend.follower()
+        follower.poll()
+
+        _complete(self.db_path, first)
+        _add(self.db_path, "second")
+        with storage.lock(self.db_path):
+            columnar_backend.compact(self.db_path)
+        self.assertCountEqual(_events(follower), [("completed", "first", "completed"), ("added", "second", "pending")])
+
+
+class TestSqliteFollower(FollowTests, unittest.TestCase):
+    """
+    Test suite for following a SQLite database.
+    """
+
+    filename = "status_log.db"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+"""
+Tests for the event history in history.py (`read --as-of` and `history --id`).
+"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+# Assuming the project structure allows this import
+from ..src import history
+from ..src import index
+from ..src import main
+from ..src import storage
+from ..src import workspace
+
+
+def _add(db_path, desc, priority, created):
+    with mock.patch('time.time', return_value=created):
+        return main.execute(db_path, 'add', {'user': 'user1', 'role': 'engineer', 'desc': desc,
+                                             'priority': priority})["data"]["id"]
+
+
+def _complete(db_path, log_id, completed):
+    with mock.patch('time.time', return_value=completed):
+        main.execute(db_path, 'complete', {'id': log_id, 'user': 'user2', 'role': 'planner'})
+
+
+class TestHistory(unittest.TestCase):
+    """
+    Test suite for rebuilding past states and the events of an entry.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(history, 'CHECKPOINT_EVENTS', 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, db_path):
+        """
+        Adds and completes entries at known times, and returns the log as it
+        was after every write together with the IDs.
+        """
+        states, ids = {}, []
+        for i in range(8):
+            now = 1000 + 100 * i
+            ids.append(_add(db_path, f"Task {i}", f"tier{i % 4}", now))
+            states[now] = main.execute(db_path, 'read', {'include_archived': True})
+            if i % 3 == 2:
+                _complete(db_path, ids[i - 2], now + 50)
+                states[now + 50] = main.execute(db_path, 'read', {'include_archived': True})
+        return states, ids
+
+    def test_as_of(self):
+        """
+        Tests that every past state is rebuilt, on every backend, replaying
+        one segment after the nearest checkpoint.
+        """
+        ws = os.path.join(self.tmpdir.name, "ws")
+        workspace.init(ws, 'hash', 2)
+        for target in ("status_log.json", "status_log.db", "status_log.cols", "ws"):
+            path = os.path.join(self.tmpdir.name, target)
+            with self.subTest(target=target):
+                states, _ = self._write(path)
+                for timestamp, expected in states.items():
+                    self.assertEqual(main.execute(path, 'read', {'as_of': timestamp}), expected, timestamp)
+                    self.assertEqual(main.execute(path, 'read', {'as_of': timestamp + 1, 'limit': 2}), expected[:2])
+                self.assertEqual(main.execute(path, 'read', {'as_of': 999}), [])
+
+        path = os.path.join(self.tmpdir.name, "status_log.json")
+        read = []
+        real = storage.iter_records
+
+        def tracking(records_path):
+            read.append(os.path.basename(records_path))
+            return real(records_path)
+
+        with mock.patch.object(storage, 'iter_records', side_effect=tracking):
+            result = main.execute(path, 'read', {'as_of': 1350, 'pending_only': True, 'priority': ['tier1']})
+        self.assertEqual([entry["description"] for entry in result], ["Task 1"])
+        self.assertEqual(read, ["events-000000000003.ndjson"])
+
+    def test_entry_events(self):
+        """
+        Tests the events of an entry, including one that was archived since.
+        """
+        path = os.path.join(self.tmpdir.name, "status_log.json")
+        _, ids = self._write(path)
+        main.execute(path, 'archive', {'older_than': 0})
+
+        events = main.execute(path, 'history', {'id': ids[3][:8]})
+        self.assertEqual([(event["event"], event["seq"], event["at"]) for event in events],
+                         [("added", 5, 1300), ("completed", 8, 1550)])
+        self.assertEqual(events[0]["entry"]["status"], "pending")
+        self.assertEqual(events[1]["entry"]["completer"], "user2")
+        self.assertEqual([event["event"] for event in main.execute(path, 'history', {'id': ids[7]})], ["added"])
+
+        # Completed again: each completion keeps its own completer and time
+        with mock.patch('time.time', return_value=2000):
+            main.execute(path, 'complete', {'id': ids[7], 'user': 'user3', 'role': 'engineer'})
+        with mock.patch('time.time', return_value=2100):
+            main.execute(path, 'complete', {'id': ids[7], 'user': 'user4', 'role': 'planner'})
+        events = main.execute(path, 'history', {'id': ids[7]})
+        self.assertEqual([(event["event"], event["at"]) for event in events],
+                         [("added", 1700), ("completed", 2000), ("completed", 2100)])
+        self.assertEqual([(event["entry"]["completer"], event["entry"]["completion_timestamp"]) for event in events],
+                         [(None, None), ("user3", 2000), ("user4", 2100)])
+        with self.assertRaises(index.UnknownIdError):
+            main.execute(path, 'history', {'id': 'ffffffff'})
+
+        stdout = io.StringIO()
+        with mock.patch.object(sys, 'argv', ['main', '--db', path, 'history', '--id', ids[3]]), \
+                mock.patch.dict(os.environ, {main.NO_SERVER_ENV: "1"}), contextlib.redirect_stdout(stdout):
+            main.main()
+        self.assertIn("completed by user2 (planner)", stdout.getvalue())
+
+    def test_baseline(self):
+        """
+        Tests that a log written without a history starts one at its next
+        write, with the state before that write.
+        """
+        path = os.path.join(self.tmpdir.name, "status_log.json")
+        log_id = _add(path, "Before", 'tier0', 1000)
+        # As if written by a version without the history
+        shutil.rmtree(history.history_dir(path))
+        with self.assertRaises(ValueError):
+            main.execute(path, 'read', {'as_of': 5000})
+
+        _complete(path, log_id, 2000)
+        self.assertEqual(main.execute(path, 'read', {'as_of': 2000}), main.execute(path, 'read', {}))
+        self.assertEqual(history.load_manifest(path), {"checkpoints": [{"seq": 0, "at": 2000}]})
+        with self.assertRaises(ValueError):
+            main.execute(path, 'read', {'as_of': 1999})
+        self.assertEqual([event["event"] for event in main.execute(path, 'history', {'id': log_id})],
+                         ["baseline", "completed"])
+
+    def test_old_checkpoints_removed(self):
+        """
+        Tests that only the last history_checkpoints() checkpoints are kept,
+        and that the history starts at the oldest of them.
+        """
+        path = os.path.join(self.tmpdir.name, "status_log.json")
+        with mock.patch.object(history, 'HISTORY_CHECKPOINTS', 2):
+            states, ids = self._write(path)
+        checkpoints = history.load_manifest(path)["checkpoints"]
+        self.assertEqual([checkpoint["seq"] for checkpoint in checkpoints], [6, 9])
+        self.assertEqual(sorted(os.listdir(history.history_dir(path))),
+                         ["checkpoint-000000000006.cols", "checkpoint-000000000009.cols",
+                          "events-000000000006.ndjson", "events-000000000009.ndjson", history.MANIFEST_NAME])
+
+        for timestamp, expected in states.items():
+            if timestamp >= checkpoints[0]["at"]:
+                self.assertEqual(main.execute(path, 'read', {'as_of': timestamp}), expected, timestamp)
+            else:
+                with self.assertRaises(ValueError):
+                    main.execute(path, 'read', {'as_of': timestamp})
+        events = main.execute(path, 'history', {'id': ids[0]})
+        self.assertEqual([(event["event"], event["seq"]) for event in events], [("baseline", 6)])
+        self.assertEqual(events[0]["entry"]["status"], "completed")
+
+    def test_checkpoint_events_env(self):
+        """
+        Tests the environment variables that space and count the checkpoints.
+        """
+        with mock.patch.dict(os.environ, {history.CHECKPOINT_EVENTS_ENV: "50"}):
+            self.assertEqual(history.checkpoint_events(), 50)
+        with mock.patch.dict(os.environ, {history.CHECKPOINT_EVENTS_ENV: "0"}), self.assertRaises(ValueError):
+            history.checkpoint_events()
+        with mock.patch.dict(os.environ, {history.HISTORY_CHECKPOINTS_ENV: "3"}):
+            self.assertEqual(history.history_checkpoints(), 3)
+        with mock.patch.dict(os.environ, {history.HISTORY_CHECKPOINTS_ENV: "x"}), self.assertRaises(ValueError):
+            history.history_checkpoints()
+
+
+if __name__ == '__main__':
+    unittest.main()
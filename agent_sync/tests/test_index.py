@@ -0,0 +1,284 @@
+"""
+Tests for the ID and query indexes in index.py.
+"""
+import json
+import os
+import random
+import tempfile
+import unittest
+# Assuming the project structure allows this import
+from ..src import index
+from ..src import manager
+from ..src import storage
+
+
+def _entry(log_id, status="pending"):
+    return {
+        "id": log_id, "creator": "user1", "creator_role": "engineer",
+        "created_timestamp": 1000, "description": f"Task {log_id}",
+        "priority": "tier1", "status": status, "completer": None,
+        "completer_role": None, "completion_timestamp": None
+    }
+
+
+class TestIdIndex(unittest.TestCase):
+    """
+    Test suite for IdIndex lookups and prefix resolution.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+        storage.save_logs(self.db_path, [
+            _entry("1f0c4e2a-aaaa"),
+            _entry("1f0c4e2a-bbbb"),
+            _entry("7d3e9b10-cccc"),
+            _entry("e5a1"),
+        ])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_snapshot_is_valid_json(self):
+        """
+        Tests that the one-entry-per-line snapshot is still a JSON list.
+        """
+        with open(self.db_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), 4)
+
+    def test_exact_and_prefix_lookup(self):
+        """
+        Tests resolving full IDs and unique prefixes.
+        """
+        id_index = index.IdIndex(self.db_path)
+        self.assertTrue(id_index.indexed)
+        self.assertEqual(id_index.resolve("7d3e9b10-cccc"), "7d3e9b10-cccc")
+        self.assertEqual(id_index.resolve("7d3e"), "7d3e9b10-cccc")
+        self.assertEqual(id_index.get("7d3e9b10-cccc")["description"], "Task 7d3e9b10-cccc")
+        self.assertIsNone(id_index.get("7d3e"))
+
+    def test_exact_match_wins_over_prefix(self):
+        """
+        Tests that a full ID is used even when it is also a prefix of another.
+        """
+        storage.append_records(self.db_path, [storage.add_record(_entry("e5a1-longer"))])
+        self.assertEqual(index.IdIndex(self.db_path).resolve("e5a1"), "e5a1")
+
+    def test_ambiguous_prefix(self):
+        """
+        Tests that a prefix matching several IDs is rejected and lists them.
+        """
+        with self.assertRaises(ValueError) as context:
+            index.IdIndex(self.db_path).resolve("1f0c")
+        self.assertIn("ambiguous", str(context.exception))
+        self.assertIn("1f0c4e2a-aaaa", str(context.exception))
+
+    def test_short_prefix_is_not_resolved(self):
+        """
+        Tests that prefixes shorter than MIN_PREFIX_LENGTH are treated as IDs.
+        """
+        with self.assertRaises(ValueError) as context:
+            index.IdIndex(self.db_path).resolve("7d3")
+        self.assertIn("not found", str(context.exception))
+
+    def test_journal_is_overlaid(self):
+        """
+        Tests that journaled adds and completions are visible to lookups.
+        """
+        completion = {
+            "op": "complete", "id": "7d3e9b10-cccc", "completer": "claude",
+            "completer_role": "engineer", "completion_timestamp": 2000
+        }
+        storage.append_records(self.db_path, [storage.add_record(_entry("9999-journal")), completion])
+
+        id_index = index.IdIndex(self.db_path)
+        self.assertEqual(id_index.resolve("9999"), "9999-journal")
+        self.assertEqual(id_index.get("7d3e9b10-cccc")["status"], "completed")
+
+    def test_index_is_rebuilt_after_compaction(self):
+        """
+        Tests that a stale index is rebuilt from the new snapshot.
+        """
+        index.IdIndex(self.db_path)
+        storage.append_records(self.db_path, [storage.add_record(_entry("abcd-new"))])
+        storage.compact_logs(self.db_path)
+
+        id_index = index.IdIndex(self.db_path)
+        self.assertEqual(id_index.resolve("abcd"), "abcd-new")
+        self.assertEqual(id_index.get("abcd-new")["id"], "abcd-new")
+
+    def test_pretty_printed_snapshot_falls_back(self):
+        """
+        Tests that snapshots written by older versions still resolve.
+        """
+        with open(self.db_path, 'w', encoding='utf-8') as f:
+            json.dump([_entry("old-style-id")], f, indent=2)
+
+        id_index = index.IdIndex(self.db_path)
+        self.assertFalse(id_index.indexed)
+        self.assertEqual(id_index.resolve("old-style"), "old-style-id")
+
+
+class TestQuery(unittest.TestCase):
+    """
+    Test suite for filtered queries through the secondary indexes.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+
+        rng = random.Random(7)
+        logs = []
+        for i in range(300):
+            entry = _entry(f"id-{i:04d}", rng.choice(["pending", "completed"]))
+            entry["priority"] = rng.choice(["tier0", "tier1", "tier2", "tier3"])
+            entry["creator"] = rng.choice(["gemini", "claude", "human"])
+            entry["creator_role"] = rng.choice(["planner", "engineer", "user"])
+            entry["created_timestamp"] = rng.randint(0, 100)
+            logs.append(entry)
+        storage.save_logs(self.db_path, logs)
+
+        # Journal: new entries plus completions of snapshot and journal entries
+        records = [storage.add_record(_entry(f"new-{i}")) for i in range(5)]
+        pending = [d["id"] for d in logs if d["status"] == "pending"][:10] + ["new-0"]
+        records += [{
+            "op": "complete", "id": log_id, "completer": "claude",
+            "completer_role": "engineer", "completion_timestamp": 5000
+        } for log_id in pending]
+        storage.append_records(self.db_path, records)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _check(self, **filters):
+        expected = manager.filter_logs(storage.load_logs(self.db_path), **filters)
+        actual = index.query(self.db_path, **filters)
+        self.assertEqual([d["id"] for d in actual], [d["id"] for d in expected], filters)
+        self.assertEqual(actual, expected)
+
+    def test_matches_a_full_scan(self):
+        """
+        Tests that indexed queries return exactly what filtering the full log
+        returns, in the same order, with the journal applied.
+        """
+        self._check(status=["pending"])
+        self._check(status=["completed"])
+        self._check(status=["completed"], priority=["tier0", "tier1"])
+        self._check(priority=["tier3"])
+        self._check(creator=["gemini"], role=["user"])
+        self._check(creator=["nobody"])
+        self._check(since=40, until=45)
+        self._check(since=90)
+        self._check(until=3, status=["pending"])
+        self._check(status=["pending"], creator=["claude", "human"], since=10, until=90)
+
+    def test_no_filters_is_not_indexed(self):
+        """
+        Tests that a query without filters falls back to the full log.
+        """
+        self.assertEqual(len(index.query(self.db_path)), 305)
+
+    def test_journal_without_snapshot(self):
+        """
+        Tests a query on a log that has only been appended to so far.
+        """
+        db_path = os.path.join(self.tmpdir.name, "new_log.json")
+        storage.append_records(db_path, [storage.add_record(_entry("a"))])
+        self.assertEqual(index.query(db_path, priority=["tier1"]), [_entry("a")])
+        self.assertEqual(index.query(db_path, priority=["tier0"]), [])
+
+    def test_secondary_index_updates(self):
+        """
+        Tests the in-memory secondary indexes kept up to date on add/complete.
+        """
+        secondary = index.SecondaryIndex()
+        entry = _entry("a")
+        secondary.add("a", entry)
+        secondary.add("b", dict(_entry("b"), created_timestamp=50))
+        self.assertEqual(secondary.lookup(status=["pending"]), {"a", "b"})
+        self.assertEqual(secondary.lookup(until=100), {"b"})
+
+        secondary.complete("a", dict(entry, status="completed"))
+        self.assertEqual(secondary.lookup(status=["pending"]), {"b"})
+        self.assertEqual(secondary.lookup(status=["completed"], priority=["tier1"]), {"a"})
+        self.assertIsNone(secondary.lookup())
+
+
+
+class TestOrdered(unittest.TestCase):
+    """
+    Test suite for streaming the sorted snapshot merged with the journal.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _random_entry(self, rng, log_id):
+        entry = _entry(log_id, rng.choice(["pending", "pending", "completed"]))
+        entry["priority"] = rng.choice(["tier0", "tier1", "tier2", "tier3"])
+        # A narrow timestamp range produces plenty of ties
+        entry["created_timestamp"] = rng.randint(0, 5)
+        return entry
+
+    def _complete(self, log_id):
+        return {
+            "op": "complete", "id": log_id, "completer": "claude",
+            "completer_role": "engineer", "completion_timestamp": 5000
+        }
+
+    def _check(self):
+        logs = storage.load_logs(self.db_path)
+        for limit in (None, 0, 1, 10, 1000):
+            for pending_only in (False, True):
+                expected = [e.id for e in manager.select_logs(logs, limit, pending_only)]
+                actual = index.ordered(self.db_path, limit, pending_only)
+                self.assertEqual([d["id"] for d in actual], expected, (limit, pending_only))
+
+    def test_matches_a_full_sort(self):
+        """
+        Tests the merged stream against sorting load_logs, with journaled
+        adds and completions of both snapshot and journal entries.
+        """
+        for seed in range(10):
+            rng = random.Random(seed)
+            storage.save_logs(self.db_path, [self._random_entry(rng, f"s{i}") for i in range(60)])
+            storage.compact_logs(self.db_path)
+
+            records = [storage.add_record(self._random_entry(rng, f"j{i}")) for i in range(20)]
+            pending = [d["id"] for d in storage.load_logs(self.db_path) if d["status"] == "pending"]
+            records += [self._complete(log_id) for log_id in rng.sample(pending, 10)]
+            records += [self._complete(f"j{i}") for i in range(0, 20, 3)]
+            storage.append_records(self.db_path, records)
+            self._check()
+
+    def test_replayed_journal_is_not_duplicated(self):
+        """
+        Tests a journal that was already folded into the snapshot by a
+        compaction that crashed before removing it.
+        """
+        rng = random.Random(3)
+        storage.append_records(self.db_path, [storage.add_record(self._random_entry(rng, f"j{i}")) for i in range(20)])
+        with open(storage.journal_path(self.db_path), 'rb') as f:
+            journal = f.read()
+        storage.compact_logs(self.db_path)
+        with open(storage.journal_path(self.db_path), 'wb') as f:
+            f.write(journal)
+        self._check()
+
+    def test_unsorted_snapshot_is_not_streamed(self):
+        """
+        Tests that a snapshot written in insertion order is left to the caller.
+        """
+        storage.save_logs(self.db_path, [_entry("b", "completed"), _entry("a")])
+        self.assertIsNone(index.ordered(self.db_path))
+        storage.compact_logs(self.db_path)
+        self.assertEqual([d["id"] for d in index.ordered(self.db_path)], ["a", "b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,255 @@
+"""
+Tests for the checksums of the log files and the `verify` and `repair`
+commands (integrity.py).
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+# Assuming the project structure allows this import
+from ..src import archive
+from ..src import backends
+from ..src import columnar_backend
+from ..src import history
+from ..src import integrity
+from ..src import main
+from ..src import storage
+
+
+def _add_many(db_path, count):
+    return [main.execute(db_path, 'add', {'user': 'user1', 'role': 'engineer', 'desc': f"Task {i}",
+                                          'priority': 'tier1'})["data"]["id"]
+            for i in range(count)]
+
+
+def _completed(db_path):
+    return [entry["id"] for entry in main.execute(db_path, 'read', {}) if entry["status"] == "completed"]
+
+
+def _write_legacy(db_path, count):
+    """
+    Writes a log the way the first versions did: an indented list, without
+    checksums, journal or history. Returns the IDs.
+    """
+    ids = _add_many(db_path, count)
+    logs = storage.load_logs(db_path)
+    shutil.rmtree(history.history_dir(db_path))
+    for path in (storage.sums_path(db_path), storage.journal_path(db_path)):
+        if os.path.exists(path):
+            os.remove(path)
+    with open(db_path, 'w', encoding='utf-8') as f:
+        json.dump(logs, f, indent=2, ensure_ascii=False)
+    return ids
+
+
+def _flip(path, offset):
+    """
+    Changes the digit at or after offset, so the file still parses and only
+    the checksums can tell.
+    """
+    with open(path, 'r+b') as f:
+        data = f.read()
+        while not chr(data[offset]).isdigit():
+            offset += 1
+        f.seek(offset)
+        f.write(b'1' if data[offset:offset + 1] != b'1' else b'2')
+
+
+class TestIntegrity(unittest.TestCase):
+    """
+    Test suite for finding and repairing damage in the log files.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+        # Small blocks, so one flipped byte damages a few entries of a small log
+        patcher = mock.patch.object(storage, 'SUM_BLOCK_BYTES', 256)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_record_round_trip(self):
+        """
+        Tests that records carry the CRC of their line and that lines written
+        without one are still read.
+        """
+        record = {"op": "complete", "id": "abc", "completer": "user2"}
+        line = storage.encode_record(record)
+        self.assertIn('"crc": ', line)
+        self.assertEqual(storage.decode_record(line.encode('utf-8')), record)
+        self.assertEqual(storage.decode_record(b'{"op": "complete", "id": "abc"}'), {"op": "complete", "id": "abc"})
+        with self.assertRaises(ValueError):
+            storage.decode_record(line.replace('abc', 'abd').encode('utf-8'))
+
+    def test_journal_only(self):
+        """
+        Tests that a log without a snapshot yet is verified from its journal.
+        """
+        _add_many(self.db_path, 2)
+        self.assertFalse(os.path.exists(self.db_path))
+        report = main.execute(self.db_path, 'verify', {})
+        self.assertEqual(report["status"], "success")
+        self.assertEqual(report["entries"], 2)
+        self.assertEqual(report["unchecked"], [])
+
+    def test_damaged_snapshot(self):
+        """
+        Tests that a damaged snapshot is read without its damaged entries,
+        reported, left alone by compaction and archiving, and repaired from
+        the history.
+        """
+        ids = _add_many(self.db_path, 30)
+        storage.compact_logs(self.db_path)
+        self.assertEqual(main.execute(self.db_path, 'verify', {})["status"], "success")
+
+        _flip(self.db_path, os.path.getsize(self.db_path) // 2)
+        logs = main.execute(self.db_path, 'read', {})
+        self.assertTrue(0 < len(logs) < 30)
+        report = main.execute(self.db_path, 'verify', {})
+        self.assertEqual(report["status"], "error")
+        self.assertEqual([damage["file"] for damage in report["damaged"]], [self.db_path])
+
+        # Writes still go to the journal; rewriting the snapshot is refused
+        main.execute(self.db_path, 'add', {'user': 'user1', 'role': 'engineer', 'desc': 'After', 'priority': 'tier0'})
+        main.execute(self.db_path, 'complete', {'id': ids[0], 'user': 'user2', 'role': 'planner'})
+        with self.assertRaises(storage.CorruptLogError):
+            storage.compact_logs(self.db_path)
+        with self.assertRaises(storage.CorruptLogError):
+            archive.archive_logs(self.db_path, 0)
+        with self.assertRaises(storage.CorruptLogError):
+            storage.load_logs(self.db_path, intact=True)
+
+        result = main.execute(self.db_path, 'repair', {})
+        self.assertTrue(result["repaired"])
+        self.assertTrue(result["history"])
+        self.assertEqual(result["recovered"], 30 - len(logs))
+        self.assertTrue(all(os.path.exists(backup) for backup in result["backups"]))
+        self.assertTrue(result["backups"][0].startswith(self.db_path + integrity.BACKUP_SUFFIX))
+
+        logs = main.execute(self.db_path, 'read', {})
+        self.assertEqual(len(logs), 31)
+        self.assertTrue(set(ids) <= {entry["id"] for entry in logs})
+        self.assertEqual(_completed(self.db_path), [ids[0]])
+        self.assertEqual(main.execute(self.db_path, 'verify', {})["status"], "success")
+        self.assertFalse(main.execute(self.db_path, 'repair', {})["repaired"])
+
+    def test_damaged_journal(self):
+        """
+        Tests that a journal record failing its checksum is skipped and its
+        change restored by repair.
+        """
+        ids = _add_many(self.db_path, 5)
+        storage.compact_logs(self.db_path)
+        main.execute(self.db_path, 'complete', {'id': ids[2], 'user': 'user2', 'role': 'planner'})
+        _flip(storage.journal_path(self.db_path), 0)
+
+        self.assertEqual(_completed(self.db_path), [])
+        report = main.execute(self.db_path, 'verify', {})
+        self.assertEqual([damage["file"] for damage in report["damaged"]], [storage.journal_path(self.db_path)])
+
+        result = main.execute(self.db_path, 'repair', {})
+        self.assertEqual(result["recovered"], 1)
+        self.assertFalse(os.path.exists(storage.journal_path(self.db_path)))
+        self.assertEqual(_completed(self.db_path), [ids[2]])
+
+    def test_repair_without_history(self):
+        """
+        Tests that without a history, repair only rewrites the log with
+        --force, and keeps what is intact.
+        """
+        _add_many(self.db_path, 30)
+        storage.compact_logs(self.db_path)
+        _flip(self.db_path, os.path.getsize(self.db_path) // 2)
+        intact = main.execute(self.db_path, 'read', {})
+        shutil.rmtree(history.history_dir(self.db_path))
+
+        with self.assertRaisesRegex(ValueError, "--force"):
+            main.execute(self.db_path, 'repair', {})
+        self.assertEqual(main.execute(self.db_path, 'read', {}), intact)
+        result = main.execute(self.db_path, 'repair', {'force': True})
+        self.assertTrue(result["repaired"])
+        self.assertFalse(result["history"])
+        self.assertEqual(result["recovered"], 0)
+        self.assertEqual(main.execute(self.db_path, 'read', {}), intact)
+
+    def test_damaged_legacy_snapshot(self):
+        """
+        Tests that one bad byte in an indented snapshot without checksums
+        only loses the entry it is in.
+        """
+        ids = _write_legacy(self.db_path, 50)
+        with open(self.db_path, 'r+b') as f:
+            data = f.read()
+            # The opening brace of an entry in the middle
+            f.seek(data.index(b'{', len(data) // 2))
+            f.write(b'#')
+
+        logs = main.execute(self.db_path, 'read', {})
+        self.assertEqual(len(logs), 49)
+        self.assertTrue({entry["id"] for entry in logs} < set(ids))
+        report = main.execute(self.db_path, 'verify', {})
+        self.assertEqual(report["entries"], 49)
+        self.assertEqual(len(report["damaged"]), 1)
+        self.assertEqual(report["damaged"][0]["reason"], "unreadable entry")
+
+        # The history doesn't start from the damaged state, so repair can't trust it
+        new = _add_many(self.db_path, 1)
+        self.assertIsNone(history.load_manifest(self.db_path))
+        with self.assertRaises(ValueError):
+            main.execute(self.db_path, 'repair', {})
+        result = main.execute(self.db_path, 'repair', {'force': True})
+        self.assertFalse(result["history"])
+        self.assertEqual({entry["id"] for entry in main.execute(self.db_path, 'read', {})},
+                         {entry["id"] for entry in logs} | set(new))
+        self.assertEqual(main.execute(self.db_path, 'verify', {})["status"], "success")
+
+    def test_damaged_columns(self):
+        """
+        Tests that a column failing its checksum is reported and repaired.
+        """
+        cols_path = os.path.join(self.tmpdir.name, "status_log.cols")
+        ids = _add_many(cols_path, 30)
+        columnar_backend.compact(cols_path)
+        _flip(cols_path, os.path.getsize(cols_path) - 64)
+
+        report = main.execute(cols_path, 'verify', {})
+        self.assertEqual(report["status"], "error")
+        with self.assertRaises(storage.CorruptLogError):
+            columnar_backend.compact(cols_path)
+
+        result = main.execute(cols_path, 'repair', {})
+        self.assertTrue(result["history"])
+        self.assertEqual(main.execute(cols_path, 'verify', {})["status"], "success")
+        self.assertEqual(sorted(entry["id"] for entry in backends.open_backend(cols_path).export()), sorted(ids))
+
+    def test_verify_exit_code(self):
+        """
+        Tests that `verify` exits with 1 when something is damaged.
+        """
+        _add_many(self.db_path, 30)
+        storage.compact_logs(self.db_path)
+
+        def run():
+            stdout = io.StringIO()
+            with mock.patch.object(sys, 'argv', ['main', '--db', self.db_path, 'verify']), \
+                    mock.patch.dict(os.environ, {main.NO_SERVER_ENV: "1"}), contextlib.redirect_stdout(stdout):
+                main.main()
+            return stdout.getvalue()
+
+        self.assertIn("is intact", run())
+        _flip(self.db_path, os.path.getsize(self.db_path) // 2)
+        with self.assertRaises(SystemExit) as cm:
+            run()
+        self.assertEqual(cm.exception.code, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,304 @@
+"""
+Tests for the command execution in main.py.
+"""
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+# Assuming the project structure allows this import
+from ..src import main
+from ..src import storage
+
+
+class TestBatch(unittest.TestCase):
+    """
+    Test suite for add --batch and complete --ids-from.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, name, lines):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def _add_batch(self, lines, user=None, role=None):
+        path = self._write("batch.ndjson", lines)
+        return main.execute(self.db_path, 'add', {
+            'desc': None, 'priority': None, 'user': user, 'role': role, 'batch': path
+        })
+
+    def test_add_batch_with_partial_failures(self):
+        """
+        Tests that valid records are added and invalid ones are reported.
+        """
+        result = self._add_batch([
+            json.dumps({"desc": "Fix leak", "priority": "tier0", "user": "gemini", "role": "engineer"}),
+            json.dumps({"desc": "Bad priority", "priority": "tier9", "user": "gemini", "role": "engineer"}),
+            "",
+            "not json",
+            json.dumps({"description": "Docs", "priority": "tier2"}),
+        ], user="claude", role="planner")
+
+        self.assertEqual(result["status"], "partial")
+        self.assertEqual(result["succeeded"], 2)
+        self.assertEqual(result["failed"], 2)
+        self.assertEqual([r["line"] for r in result["results"]], [1, 2, 4, 5])
+        self.assertIn("Invalid priority", result["results"][1]["message"])
+        self.assertIn("JSON object", result["results"][2]["message"])
+        # Missing user/role fall back to the command line values
+        self.assertEqual(result["results"][3]["data"]["creator"], "claude")
+
+        logs = storage.load_logs(self.db_path)
+        self.assertEqual([d["description"] for d in logs], ["Fix leak", "Docs"])
+
+    def test_add_batch_is_one_append(self):
+        """
+        Tests that a whole batch lands in the journal with a single commit.
+        """
+        result = self._add_batch([
+            json.dumps({"desc": f"Finding {i}", "priority": "tier1"}) for i in range(50)
+        ], user="scanner", role="engineer")
+
+        self.assertEqual(result["succeeded"], 50)
+        self.assertEqual(result["meta"]["group_size"], 1)
+        self.assertEqual(len(storage.load_logs(self.db_path)), 50)
+
+    def test_add_batch_rejects_invalid_role(self):
+        """
+        Tests that roles are validated even though argparse never sees them.
+        """
+        result = self._add_batch([
+            json.dumps({"desc": "Task", "priority": "tier1", "user": "x", "role": "admin"})
+        ])
+        self.assertEqual(result["status"], "error")
+        self.assertIn("Invalid role", result["results"][0]["message"])
+
+    def test_add_batch_rejects_non_string_fields(self):
+        """
+        Tests that a record with a non-string field is rejected on its own
+        and the log stays readable.
+        """
+        result = self._add_batch([
+            json.dumps({"desc": 42, "priority": "tier1"}),
+            json.dumps({"desc": "Task", "priority": ["tier1"]}),
+            json.dumps({"desc": "Task", "priority": "tier1", "project": {"name": "x"}}),
+            json.dumps({"desc": "Docs", "priority": "tier2"}),
+        ], user="claude", role="planner")
+
+        self.assertEqual(result["status"], "partial")
+        self.assertEqual([r["status"] for r in result["results"]], ["error", "error", "error", "success"])
+        self.assertIn("'desc' must be a string", result["results"][0]["message"])
+        self.assertIn("'priority' must be a string", result["results"][1]["message"])
+        self.assertIn("'project' must be a string", result["results"][2]["message"])
+        self.assertEqual([d["description"] for d in storage.load_logs(self.db_path)], ["Docs"])
+
+    def test_complete_batch(self):
+        """
+        Tests completing plain IDs, prefixes and NDJSON objects in one go.
+        """
+        added = self._add_batch([
+            json.dumps({"desc": f"Task {i}", "priority": "tier1"}) for i in range(3)
+        ], user="gemini", role="engineer")
+        ids = [r["data"]["id"] for r in added["results"]]
+
+        path = self._write("ids.txt", [
+            ids[0],
+            ids[1][:8],
+            json.dumps({"id": ids[2], "user": "human", "role": "user"}),
+            "missing-id",
+            # Parses as a number; looked up as text, like any other ID
+            "1e345678",
+        ])
+        result = main.execute(self.db_path, 'complete', {
+            'id': None, 'ids_from': path, 'user': 'claude', 'role': 'engineer'
+        })
+
+        self.assertEqual(result["status"], "partial")
+        self.assertEqual([r["status"] for r in result["results"]], ["success"] * 3 + ["error"] * 2)
+        self.assertEqual(result["results"][1]["id"], ids[1])
+        self.assertIn("1e345678", result["results"][4]["message"])
+
+        by_id = {d["id"]: d for d in storage.load_logs(self.db_path)}
+        self.assertTrue(all(by_id[i]["status"] == "completed" for i in ids))
+        self.assertEqual(by_id[ids[2]]["completer"], "human")
+
+
+class TestParseFast(unittest.TestCase):
+    """
+    Test suite for parsing the common commands without argparse.
+    """
+
+    def test_matches_argparse(self):
+        """
+        Tests that parse_fast returns exactly what parse_arguments does.
+        """
+        for argv in (
+            ['read'],
+            ['--json', 'read', '--limit', '5'],
+            ['--db', 'x.json', '--format', 'ndjson', '--durability=none', '--timings', 'read', '--pending-only',
+             '--priority', 'tier0', '--priority=tier1', '--status', 'pending', '--creator', 'gemini',
+             '--role', 'engineer', '--since', '100', '--until', '2025-01-01'],
+            ['read', '--include-archived', '--limit=3'],
+            ['read', '--cursor', 'WzAsMV0'],
+            ['read', '--page-size', '10', '--pending-only'],
+            ['read', '--as-of', '2025-06-01T12:00'],
+            ['read', '--follow', '--interval', '0.5'],
+            ['add', '--desc', 'Fix leak', '--priority', 'tier0', '--user', 'gemini', '--role', 'engineer'],
+            ['add', '--desc=', '--priority', 'tier3', '--user', 'u', '--role', 'user', '--project', 'api'],
+            ['add', '--batch', '-', '--user', 'scanner', '--role', 'engineer'],
+            ['complete', '--id', '1f0c4e2a', '--user', 'claude', '--role', 'planner'],
+            ['--json', 'complete', '--ids-from', 'ids.txt', '--user', 'claude', '--role', 'planner'],
+            ['stats'],
+            ['stats', '--rebuild'],
+        ):
+            with self.subTest(argv=argv):
+                self.assertIsNotNone(main.parse_fast(argv))
+                self.assertEqual(main.parse_fast(argv), main.parse_arguments(argv))
+
+    def test_leaves_the_rest_to_argparse(self):
+        """
+        Tests that other commands, other forms and invalid arguments are
+        left to parse_arguments, which reports the errors.
+        """
+        for argv in (
+            [],
+            ['-h'],
+            ['search', 'leak'],
+            ['read', '--pend'],
+            ['add', '--batch', '-', '--user', 'scanner', '--role', 'engineer', '--desc', '-x'],
+        ):
+            with self.subTest(argv=argv):
+                self.assertIsNone(main.parse_fast(argv))
+
+        for argv in (
+            ['read', '--json'],
+            ['read', 'extra'],
+            ['read', '--limit'],
+            ['read', '--limit', 'x'],
+            ['read', '--limit', '-1'],
+            ['read', '--priority', 'tier9'],
+            ['read', '--since', 'yesterday'],
+            ['read', '--follow', '--limit', '3'],
+            ['read', '--pending-only=yes'],
+            ['add', '--desc', 'Fix leak', '--priority', 'tier0', '--user', 'gemini'],
+            ['add', '--desc', '-x', '--priority', 'tier0', '--user', 'gemini', '--role', 'engineer'],
+            ['complete', '--id', '1f0c4e2a', '--user', 'claude'],
+            ['complete', '--user', 'claude', '--role', 'planner'],
+        ):
+            with self.subTest(argv=argv):
+                self.assertIsNone(main.parse_fast(argv))
+                with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                    main.parse_arguments(argv)
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Test suite for the startup cost of the common commands.
+    """
+
+    # Modules the common commands start without: each takes milliseconds to
+    # import, more than those commands take to run on a small log.
+    DEFERRED = ('argparse', 'uuid', 'socket', 'tempfile', 'shutil', 'hashlib', 'datetime', 'calendar', 'gzip',
+                'base64', 'sqlite3', 'mmap', 'socketserver', 'cProfile')
+
+    # This package's modules for the write path and the other commands, which reads start without.
+    READ_DEFERRED = tuple(f'agent_sync.src.{name}' for name in (
+        'commit', 'stats', 'history', 'archive', 'integrity', 'follow', 'workspace', 'sqlite_backend',
+        'columnar_backend', 'server'))
+
+    # The budget for importing the CLI, in microseconds: the cumulative time -X importtime reports for
+    # agent_sync.src.main, standard library dependencies included. It measures about 18ms; the rest
+    # is room for slower machines.
+    IMPORT_BUDGET_US = 30000
+
+    # Import timings vary from run to run: the fastest of these many is compared with the budget.
+    IMPORT_RUNS = 5
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _imports(self, *argv):
+        """
+        Runs the CLI under -X importtime and returns the modules it imported
+        with the output.
+        """
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', 'agent_sync.src.main', '--db', self.db_path, *argv],
+            cwd=root, env=dict(os.environ, **{main.NO_SERVER_ENV: "1"}), capture_output=True, text=True
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        modules = {line.split('|')[-1].strip() for line in process.stderr.splitlines()
+                   if line.startswith('import time:')}
+        return modules, process.stdout
+
+    def test_common_commands_defer_imports(self):
+        """
+        Tests that add, read, complete and stats don't import the modules
+        only other commands need.
+        """
+        add = ['--json', 'add', '--desc', 'Task', '--priority', 'tier1', '--user', 'gemini', '--role', 'engineer']
+        # The first write also starts the history with a checkpoint
+        self._imports(*add)
+        modules, out = self._imports(*add)
+        log_id = json.loads(out)["data"]["id"]
+        # Only add creates IDs
+        self.assertEqual(sorted(modules.intersection(self.DEFERRED)), ['uuid'])
+
+        for argv in (
+            ['read', '--limit', '5'],
+            # Rendered into the response cache, then copied from there
+            ['--json', 'read', '--pending-only'],
+            ['--json', 'read', '--pending-only'],
+            ['complete', '--id', log_id[:8], '--user', 'claude', '--role', 'planner'],
+            ['stats'],
+        ):
+            with self.subTest(argv=argv):
+                modules, _ = self._imports(*argv)
+                self.assertIn('agent_sync.src.backends', modules)
+                self.assertEqual(sorted(modules.intersection(self.DEFERRED)), [])
+                if 'read' in argv:
+                    self.assertEqual(sorted(modules.intersection(self.READ_DEFERRED)), [])
+
+    def test_import_budget(self):
+        """
+        Tests that importing the CLI, which every command starts with, stays
+        within IMPORT_BUDGET_US.
+        """
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        # Timed with the bytecode cached, like an installed package: the first run writes the cache
+        env = {name: value for name, value in os.environ.items() if name != 'PYTHONDONTWRITEBYTECODE'}
+        env['PYTHONPYCACHEPREFIX'] = os.path.join(self.tmpdir.name, 'pycache')
+        timings = []
+        for _ in range(1 + self.IMPORT_RUNS):
+            process = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', 'import agent_sync.src.main'],
+                cwd=root, env=env, capture_output=True, text=True
+            )
+            self.assertEqual(process.returncode, 0, process.stderr)
+            cumulative = [int(line.split('|')[1]) for line in process.stderr.splitlines()
+                          if line.startswith('import time:') and line.endswith('| agent_sync.src.main')]
+            self.assertEqual(len(cumulative), 1, process.stderr)
+            timings.append(cumulative[0])
+        fastest = min(timings[1:])
+        self.assertLessEqual(fastest, self.IMPORT_BUDGET_US,
+                             f"importing the CLI took {fastest}us (budget: {self.IMPORT_BUDGET_US}us)")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -84,6 +84,28 @@ class TestManager(unittest.TestCase):
         self.assertEqual(completed.completer_role, "engineer")
         self.assertIsNotNone(completed.completion_timestamp)
 
+    def test_mark_completed(self):
+        """
+        Tests completing an entry that was already located.
+        """
+        entry = models.LogEntry(
+            id="test-id-789",
+            creator="user1",
+            creator_role="planner",
+            created_timestamp=1000,
+            description="Ship release",
+            priority="tier1",
+            status="pending"
+        )
+
+        completed = manager.mark_completed(entry, "claude-code", "engineer")
+
+        self.assertIs(completed, entry)
+        self.assertEqual(entry.status, "completed")
+        self.assertEqual(entry.completer, "claude-code")
+        self.assertEqual(entry.completer_role, "engineer")
+        self.assertIsNotNone(entry.completion_timestamp)
+
     def test_complete_nonexistent_entry(self):
         """
         Tests that completing a non-existent entry is handled correctly.
@@ -0,0 +1,63 @@
+"""
+Tests for the data model and its (de)serialization in models.py.
+"""
+import dataclasses
+import json
+import unittest
+# Assuming the project structure allows this import
+from ..src import models
+
+
+class TestModels(unittest.TestCase):
+    """
+    Test suite for LogEntry, to_dict and from_dict.
+    """
+
+    def _entry(self):
+        return models.LogEntry(
+            id="1", creator="gemini-cli", creator_role="engineer",
+            created_timestamp=1000, description="Fix memory leak",
+            priority="tier1", status="completed",
+            completer="claude-code", completer_role="engineer",
+            completion_timestamp=2000
+        )
+
+    def test_round_trip_matches_asdict(self):
+        """
+        Tests that the hand-rolled to_dict produces what asdict did, field order included.
+        """
+        entry = self._entry()
+        data = models.to_dict(entry)
+        self.assertEqual(list(data.items()), list(dataclasses.asdict(entry).items()))
+        self.assertEqual(models.from_dict(data), entry)
+
+    def test_missing_optional_fields(self):
+        """
+        Tests that pending entries may omit the completion fields.
+        """
+        data = models.to_dict(self._entry())
+        for key in ("completer", "completer_role", "completion_timestamp"):
+            del data[key]
+        entry = models.from_dict(data)
+        self.assertIsNone(entry.completer)
+        self.assertIsNone(entry.completion_timestamp)
+
+        del data["priority"]
+        with self.assertRaises(KeyError):
+            models.from_dict(data)
+
+    def test_slots_and_interning(self):
+        """
+        Tests that entries have no __dict__ and repeated strings are shared.
+        """
+        first, second = (models.from_dict(d) for d in json.loads(json.dumps(
+            [models.to_dict(self._entry()), models.to_dict(self._entry())]
+        )))
+        self.assertFalse(hasattr(first, '__dict__'))
+        self.assertIs(first.creator, second.creator)
+        self.assertIs(first.status, second.status)
+        self.assertIs(first.completer_role, second.completer_role)
+
+
+if __name__ == '__main__':
+    unittest.main()
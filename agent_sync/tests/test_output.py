@@ -0,0 +1,192 @@
+"""
+Tests for the JSON output layouts and the read response cache in output.py.
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+# Assuming the project structure allows this import
+from ..src import backends
+from ..src import main
+from ..src import output
+
+
+def _add(db_path, desc, priority='tier1'):
+    return main.execute(db_path, 'add', {'user': 'user1', 'role': 'engineer',
+                                         'desc': desc, 'priority': priority})["data"]["id"]
+
+
+@contextlib.contextmanager
+def _read_only(directory):
+    """
+    Makes a directory read-only. Root ignores the permission, so creating
+    files in it is refused here as well.
+    """
+    directory = os.path.abspath(directory)
+    real_open, real_mkdir = os.open, os.mkdir
+
+    def refuse(path):
+        if os.path.dirname(os.path.abspath(path)).startswith(directory):
+            raise PermissionError(13, "Permission denied", path)
+
+    def checked_open(path, flags, *args, **kwargs):
+        if flags & os.O_CREAT and not os.path.exists(path):
+            refuse(path)
+        return real_open(path, flags, *args, **kwargs)
+
+    def checked_mkdir(path, *args, **kwargs):
+        refuse(path)
+        return real_mkdir(path, *args, **kwargs)
+
+    os.chmod(directory, 0o555)
+    try:
+        with mock.patch('os.open', checked_open), mock.patch('os.mkdir', checked_mkdir):
+            yield
+    finally:
+        os.chmod(directory, 0o755)
+
+
+class TestOutput(unittest.TestCase):
+    """
+    Test suite for --format and the streamed, cached read output.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        self.addCleanup(os.chdir, cwd)
+        self.db_path = "status_log.json"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _main(self, *argv):
+        """
+        Runs the CLI on ./status_log.json and returns its stdout.
+        """
+        stdout = io.StringIO()
+        with mock.patch.object(sys, 'argv', ['main', *argv]), \
+                mock.patch.dict(os.environ, {main.NO_SERVER_ENV: "1"}), \
+                contextlib.redirect_stdout(stdout):
+            main.main()
+        return stdout.getvalue()
+
+    def _expected(self, **params):
+        return main.execute(self.db_path, 'read', dict({'limit': None, 'pending_only': False}, **params))
+
+    def test_iter_list_matches_dumps(self):
+        """
+        Tests that a list streamed piece by piece is the document json.dumps writes.
+        """
+        entries = [{"id": "a", "description": "Fix über\nleak", "tags": [1, 2]}, {"id": "b"}]
+        for items in ([], entries[:1], entries):
+            self.assertEqual(''.join(output.iter_list(iter(items), 'pretty')), json.dumps(items, indent=2))
+            compact = ''.join(output.iter_list(iter(items), 'compact'))
+            self.assertEqual(json.loads(compact), items)
+            self.assertNotIn(' ', compact.replace('Fix über', ''))
+            lines = ''.join(output.iter_list(iter(items), 'ndjson')).splitlines()
+            self.assertEqual([json.loads(line) for line in lines], items)
+
+    def test_read_formats(self):
+        """
+        Tests that every layout of read carries the entries execute returns.
+        """
+        for i, priority in enumerate(['tier2', 'tier0', 'tier3']):
+            _add(self.db_path, f"Task {i}", priority)
+        expected = self._expected()
+
+        self.assertEqual(self._main('--json', 'read'), json.dumps(expected, indent=2))
+        self.assertEqual(json.loads(self._main('--format', 'compact', 'read')), expected)
+        lines = self._main('--format', 'ndjson', 'read').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+        self.assertEqual(json.loads(self._main('--format', 'compact', 'read', '--limit', '1')), expected[:1])
+
+        # Objects are a single line in ndjson
+        out = self._main('--format', 'ndjson', 'add', '--desc', 'New', '--priority', 'tier0',
+                         '--user', 'gemini', '--role', 'engineer')
+        self.assertEqual(out.count('\n'), 1)
+        self.assertEqual(json.loads(out)["data"]["description"], "New")
+
+    def test_cached_until_the_log_changes(self):
+        """
+        Tests that a repeated read is served from the cache and an add
+        invalidates it.
+        """
+        _add(self.db_path, "First")
+        with mock.patch.object(backends.JsonBackend, 'iter_read', autospec=True,
+                               side_effect=backends.JsonBackend.iter_read) as iter_read:
+            first = self._main('--format', 'ndjson', 'read')
+            self.assertEqual(self._main('--format', 'ndjson', 'read'), first)
+            self.assertEqual(iter_read.call_count, 1)
+
+            _add(self.db_path, "Second", 'tier0')
+            lines = self._main('--format', 'ndjson', 'read').splitlines()
+            self.assertEqual(iter_read.call_count, 2)
+        self.assertEqual([json.loads(line) for line in lines], self._expected())
+
+    def test_cache_keeps_most_recent_responses(self):
+        """
+        Tests that only RESPONSE_CACHE_ENTRIES responses are kept.
+        """
+        _add(self.db_path, "First")
+        for limit in range(1, output.RESPONSE_CACHE_ENTRIES + 3):
+            self._main('--format', 'compact', 'read', '--limit', str(limit))
+        directory = output.response_cache_dir(os.path.abspath(self.db_path))
+        self.assertEqual(len(os.listdir(directory)), output.RESPONSE_CACHE_ENTRIES)
+
+    def test_read_only_directory(self):
+        """
+        Tests that reads print their result from a directory they can't
+        write to, with or without a lock file and a cached response.
+        """
+        for i, priority in enumerate(['tier2', 'tier0']):
+            _add(self.db_path, f"Task {i}", priority)
+        expected = self._expected()
+        self._main('--format', 'compact', 'read')
+        os.remove(self.db_path + main.storage.LOCK_SUFFIX)
+
+        with _read_only(self.tmpdir.name):
+            self.assertEqual(self._main('--json', 'read'), json.dumps(expected, indent=2))
+            self.assertEqual(json.loads(self._main('--format', 'compact', 'read')), expected)
+            self.assertIn("Task 1", self._main('read'))
+        self.assertEqual(len(os.listdir(output.response_cache_dir(self.db_path))), 1)
+        self.assertFalse(os.path.exists(self.db_path + main.storage.LOCK_SUFFIX))
+
+    def test_large_response_not_cached(self):
+        """
+        Tests that a response over RESPONSE_CACHE_MAX_BYTES is printed whole
+        but not cached.
+        """
+        for i in range(5):
+            _add(self.db_path, f"Task {i}")
+        expected = self._expected()
+        with mock.patch.object(output, 'RESPONSE_CACHE_MAX_BYTES', 400):
+            self.assertEqual(self._main('--json', 'read'), json.dumps(expected, indent=2))
+            self.assertEqual(os.listdir(output.response_cache_dir(self.db_path)), [])
+            self.assertEqual(json.loads(self._main('--format', 'compact', 'read', '--limit', '1')), expected[:1])
+        self.assertEqual(len(os.listdir(output.response_cache_dir(self.db_path))), 1)
+
+    def test_sqlite_streams_without_cache(self):
+        """
+        Tests that the SQLite backend streams its rows and writes no cache.
+        """
+        self.db_path = "status_log.db"
+        for i, priority in enumerate(['tier3', 'tier0']):
+            _add(self.db_path, f"Task {i}", priority)
+        backend = backends.open_backend(self.db_path)
+        try:
+            stream = io.StringIO()
+            output.write_read(backend, {'limit': None}, 'ndjson', stream)
+        finally:
+            backend.close()
+        self.assertEqual([json.loads(line) for line in stream.getvalue().splitlines()], self._expected())
+        self.assertFalse(os.path.exists(output.response_cache_dir(self.db_path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
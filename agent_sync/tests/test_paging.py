@@ -0,0 +1,171 @@
+"""
+Tests for cursor pagination of `read` in paging.py and the backends.
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+# Assuming the project structure allows this import
+from ..src import backends
+from ..src import main
+from ..src import paging
+from ..src import storage
+from ..src import workspace
+
+
+def _add(db_path, desc, priority, created):
+    with mock.patch('time.time', return_value=created):
+        return main.execute(db_path, 'add', {'user': 'user1', 'role': 'engineer', 'desc': desc,
+                                             'priority': priority})["data"]["id"]
+
+
+def _complete(db_path, log_id):
+    main.execute(db_path, 'complete', {'id': log_id, 'user': 'user2', 'role': 'planner'})
+
+
+def _page(db_path, page_size, cursor=None, **filters):
+    return main.execute(db_path, 'read', dict(filters, page_size=page_size, cursor=cursor))
+
+
+def _walk(db_path, page_size, between=None, **filters):
+    """
+    Reads every page, calling between() after each one, and returns the entries seen.
+    """
+    seen, cursor = [], None
+    while True:
+        result = _page(db_path, page_size, cursor, **filters)
+        seen.extend(result["entries"])
+        cursor = result["next_cursor"]
+        if cursor is None:
+            return seen
+        if between is not None:
+            between()
+
+
+class TestCursor(unittest.TestCase):
+    """
+    Test suite for the cursor tokens.
+    """
+
+    def test_round_trip(self):
+        """
+        Tests that a page key survives encoding, and that other tokens are rejected.
+        """
+        key = (1, 3, 1700000000, "é-id")
+        token = paging.encode_cursor(key)
+        self.assertNotIn('=', token)
+        self.assertEqual(paging.decode_cursor(token), key)
+        for token in ("", "not a cursor!", paging.encode_cursor((2, 0, 0, "x")),
+                      paging.encode_cursor((0, 0, "0", "x"))):
+            with self.assertRaises(ValueError):
+                paging.decode_cursor(token)
+
+
+class TestPaging(unittest.TestCase):
+    """
+    Test suite for paging through a log while it changes, on every backend.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.json_path = os.path.join(self.tmpdir.name, "status_log.json")
+        self.rng = random.Random(3)
+        # Few distinct timestamps, so many entries tie on the 3-tier key
+        self.ids = [_add(self.json_path, f"Task {i}", f"tier{i % 4}", self.rng.randrange(6)) for i in range(40)]
+        with mock.patch.object(storage, 'JOURNAL_COMPACT_BYTES', 1):
+            _complete(self.json_path, self.ids[0])
+        # The rest stay in the journal
+        for i in range(40, 50):
+            self.ids.append(_add(self.json_path, f"Task {i}", f"tier{i % 4}", self.rng.randrange(6)))
+        for i in range(5, 50, 9):
+            _complete(self.json_path, self.ids[i])
+
+        self.paths = [self.json_path]
+        ws = os.path.join(self.tmpdir.name, "ws")
+        workspace.init(ws, 'hash', 3)
+        for target in ("status_log.db", "status_log.cols", "ws"):
+            path = os.path.join(self.tmpdir.name, target)
+            main.execute(self.json_path, 'migrate', {'to': path})
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _sorted(self, db_path, **filters):
+        backend = backends.open_backend(db_path)
+        try:
+            return sorted(backend.read(**filters), key=paging.page_key)
+        finally:
+            backend.close()
+
+    def test_pages_match_the_order(self):
+        """
+        Tests that the pages of an unchanging log are the log in page order, with and without filters.
+        """
+        for path in self.paths:
+            for filters in ({}, {'pending_only': True}, {'priority': ['tier1', 'tier3'], 'since': 2},
+                            {'status': ['completed']}):
+                with self.subTest(path=os.path.basename(path), filters=filters):
+                    self.assertEqual(_walk(path, 4, **filters), self._sorted(path, **filters))
+            with self.subTest(path=os.path.basename(path)):
+                self.assertEqual(_page(path, 100), {"entries": self._sorted(path), "next_cursor": None})
+
+    def test_consistent_under_writes(self):
+        """
+        Tests that entries left alone during the walk are each returned once,
+        in order, while others are added and completed between pages.
+        """
+        for path in self.paths:
+            with self.subTest(path=os.path.basename(path)):
+                before = self._sorted(path)
+                completed = set()
+
+                def write():
+                    _add(path, "Added meanwhile", f"tier{self.rng.randrange(4)}", self.rng.randrange(6))
+                    log_id = self.rng.choice([entry["id"] for entry in self._sorted(path, pending_only=True)])
+                    completed.add(log_id)
+                    _complete(path, log_id)
+
+                seen = _walk(path, 3, between=write)
+                keys = [paging.page_key(entry) for entry in seen]
+                self.assertEqual(keys, sorted(set(keys)))
+                ids = [entry["id"] for entry in seen]
+                for entry in before:
+                    if entry["id"] not in completed:
+                        self.assertEqual(ids.count(entry["id"]), 1, entry["id"])
+
+    def test_cli(self):
+        """
+        Tests the --page-size and --cursor options and their conflicts.
+        """
+        def run(*argv):
+            stdout = io.StringIO()
+            with mock.patch.object(sys, 'argv', ['main', '--db', self.json_path, *argv]), \
+                    mock.patch.dict(os.environ, {main.NO_SERVER_ENV: "1"}), \
+                    contextlib.redirect_stdout(stdout):
+                main.main()
+            return stdout.getvalue()
+
+        first = json.loads(run('--json', 'read', '--page-size', '20'))
+        rest = json.loads(run('--json', 'read', '--cursor', first["next_cursor"]))
+        self.assertIsNone(rest["next_cursor"])
+        self.assertEqual(first["entries"] + rest["entries"], self._sorted(self.json_path))
+        self.assertIn(f"--cursor {first['next_cursor']}", run('read', '--page-size', '20'))
+
+        for argv in (('--page-size', '0'), ('--page-size', '5', '--limit', '5'),
+                     ('--cursor', first["next_cursor"], '--include-archived')):
+            with self.subTest(argv=argv), self.assertRaises(SystemExit), \
+                    contextlib.redirect_stderr(io.StringIO()):
+                run('read', *argv)
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()) as stderr:
+            run('read', '--cursor', 'bogus')
+        self.assertIn("Invalid cursor", stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
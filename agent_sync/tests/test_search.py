@@ -0,0 +1,174 @@
+"""
+Tests for the full-text search in search.py.
+"""
+import json
+import math
+import os
+import random
+import tempfile
+import unittest
+# Assuming the project structure allows this import
+from ..src import main
+from ..src import manager
+from ..src import search
+from ..src import storage
+from ..src import workspace
+
+WORDS = ["login", "crash", "safari", "cache", "parser", "flaky", "docs", "leak", "timeout", "oauth"]
+
+
+def _entry(i, description, status="pending", priority="tier1"):
+    return {
+        "id": f"{i:08x}-0000", "creator": "user1", "creator_role": "engineer",
+        "created_timestamp": 1000 + i, "description": description,
+        "priority": priority, "status": status,
+        "completer": "user2" if status == "completed" else None,
+        "completer_role": "engineer" if status == "completed" else None,
+        "completion_timestamp": 2000 if status == "completed" else None
+    }
+
+
+def _bm25(logs, text):
+    """
+    Scores every entry from scratch, for comparison.
+    """
+    terms = set(search.tokenize(text))
+    descriptions = [search.tokenize(d["description"]) for d in logs]
+    average = sum(len(words) for words in descriptions) / len(logs)
+    scores = {}
+    for entry, words in zip(logs, descriptions):
+        score = 0.0
+        for term in terms:
+            tf = words.count(term)
+            if tf:
+                frequency = sum(term in other for other in descriptions)
+                idf = math.log(1 + (len(logs) - frequency + 0.5) / (frequency + 0.5))
+                norm = search.BM25_K1 * (1 - search.BM25_B + search.BM25_B * len(words) / average)
+                score += idf * tf * (search.BM25_K1 + 1) / (tf + norm)
+        if score:
+            scores[entry["id"]] = score
+    return scores
+
+
+class TestSearch(unittest.TestCase):
+    """
+    Test suite for ranking, filters and the journal overlay.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+
+        # A skewed vocabulary: some words are rare, some are everywhere
+        rng = random.Random(7)
+        self.logs = []
+        for i in range(400):
+            words = [rng.choice(WORDS[:rng.randint(1, len(WORDS))]) for _ in range(rng.randint(1, 8))]
+            self.logs.append(_entry(i, " ".join(words).capitalize() + f" #{i % 50}",
+                                    rng.choice(["pending", "completed"]), rng.choice(["tier0", "tier2"])))
+        storage.save_logs(self.db_path, self.logs)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _search(self, text, limit=None, **filters):
+        params = dict({key: None for key in ('status', 'priority', 'creator', 'role', 'since', 'until')},
+                      text=text, limit=limit, **filters)
+        return main.execute(self.db_path, 'search', params)
+
+    def test_tokenize(self):
+        """
+        Tests that words are lowercased and split on anything but letters and digits.
+        """
+        self.assertEqual(search.tokenize("Fix OAuth-login (v2_beta), ÜBER!"),
+                         ["fix", "oauth", "login", "v2", "beta", "über"])
+        self.assertEqual(search.tokenize("x" * 40), ["x" * search.MAX_TERM_LENGTH])
+
+    def test_ranking_matches_bm25(self):
+        """
+        Tests scores and order against BM25 computed from scratch.
+        """
+        for text in ["login", "oauth timeout", "crash safari 7", "leak docs cache"]:
+            expected = _bm25(self.logs, text)
+            result = self._search(text)
+            self.assertEqual([d["id"] for d in result],
+                             sorted(expected, key=lambda log_id: (-round(expected[log_id], 9), log_id)))
+            for d in result:
+                self.assertAlmostEqual(d["score"], expected[d["id"]], places=3)
+
+    def test_limit_and_filters(self):
+        """
+        Tests that a limit returns the top of the full ranking (pruned scoring
+        included) and that filters are applied.
+        """
+        for text in ["login", "oauth timeout", "login cache 3", "flaky leak parser docs"]:
+            everything = self._search(text)
+            for limit in (1, 5, 20):
+                self.assertEqual(self._search(text, limit), everything[:limit])
+
+            pending = self._search(text, 5, status=["pending"], priority=["tier0"])
+            self.assertEqual(pending, [d for d in everything if d["status"] == "pending"
+                                       and d["priority"] == "tier0"][:5])
+
+    def test_journal_entries_are_searchable(self):
+        """
+        Tests that adds and completions in the journal are seen without
+        rebuilding the index.
+        """
+        self._search("login")
+        with open(search.search_index_path(self.db_path), 'rb') as f:
+            header = f.readline()
+
+        main.execute(self.db_path, 'add', {'user': 'user1', 'role': 'engineer',
+                                           'desc': 'Websocket reconnect storm', 'priority': 'tier0'})
+        [found] = self._search("reconnect")
+        self.assertEqual(found["description"], "Websocket reconnect storm")
+
+        target = self._search("oauth", 1, status=["pending"])[0]
+        main.execute(self.db_path, 'complete', {'id': target["id"], 'user': 'user2', 'role': 'engineer'})
+        self.assertIn(target["id"], [d["id"] for d in self._search("oauth", status=["completed"])])
+        self.assertNotIn(target["id"], [d["id"] for d in self._search("oauth", status=["pending"])])
+
+        with open(search.search_index_path(self.db_path), 'rb') as f:
+            self.assertEqual(f.readline(), header)
+
+    def test_ties_are_ordered_the_same_everywhere(self):
+        """
+        Tests that equal scores are ordered by creation time, then ID, on
+        every backend, so migrating a log doesn't change the order.
+        """
+        # Loaded newest first; entries 2k and 2k + 1 share a timestamp
+        logs = [dict(_entry(i, "Login crash"), created_timestamp=2000 - i // 2) for i in range(6)]
+        logs += [_entry(6 + i, f"Login crash in the {word} module") for i, word in enumerate(WORDS[:4])]
+        db_path = os.path.join(self.tmpdir.name, "ties.json")
+        storage.save_logs(db_path, logs)
+        ws = os.path.join(self.tmpdir.name, "ws")
+        workspace.init(ws, 'hash', 2)
+
+        params = {key: None for key in ('status', 'priority', 'creator', 'role', 'since', 'until')}
+        expected = main.execute(db_path, 'search', dict(params, text="login", limit=None))
+        self.assertEqual([d["id"] for d in expected[:6]], [logs[i]["id"] for i in (4, 5, 2, 3, 0, 1)])
+        for target in ("ties.cols", "ties.db", "ws"):
+            path = os.path.join(self.tmpdir.name, target)
+            main.execute(db_path, 'migrate', {'to': path})
+            for limit in (None, 3):
+                with self.subTest(target=target, limit=limit):
+                    result = main.execute(path, 'search', dict(params, text="login", limit=limit))
+                    self.assertEqual([d["id"] for d in result], [d["id"] for d in expected][:limit])
+
+    def test_unindexed_snapshot_and_empty_text(self):
+        """
+        Tests the in-memory fallback for a pretty-printed snapshot and that
+        text without words is rejected.
+        """
+        expected = self._search("crash safari")
+        with open(self.db_path, 'w', encoding='utf-8') as f:
+            json.dump(self.logs, f, indent=2)
+        self.assertEqual(self._search("crash safari"), expected)
+
+        with self.assertRaises(ValueError):
+            self._search("?!")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Tests for the in-memory server in server.py and its client.
+"""
+import os
+import tempfile
+import threading
+import unittest
+# Assuming the project structure allows this import
+from ..src import client
+from ..src import server
+from ..src import storage
+
+
+class TestServer(unittest.TestCase):
+    """
+    Test suite for the server state and the socket round trip.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+        self.state = server.LogState(self.db_path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _add(self, description, priority="tier1"):
+        response = self.state.handle({
+            "command": "add",
+            "params": {"desc": description, "priority": priority, "user": "gemini", "role": "engineer"}
+        })
+        self.assertEqual(response["status"], "success")
+        return response["result"]["data"]
+
+    def test_writes_reach_the_file(self):
+        """
+        Tests that adds and completions served from memory are persisted.
+        """
+        entry = self._add("Fix memory leak")
+        response = self.state.handle({
+            "command": "complete",
+            "params": {"id": entry["id"], "user": "claude", "role": "engineer"}
+        })
+        self.assertEqual(response["status"], "success")
+
+        on_disk = storage.load_logs(self.db_path)
+        self.assertEqual(on_disk[0]["status"], "completed")
+
+    def test_read_is_sorted(self):
+        """
+        Tests that read returns entries in the 3-tier order.
+        """
+        low = self._add("Low", "tier3")
+        high = self._add("High", "tier0")
+        self.state.handle({"command": "complete", "params": {"id": high["id"], "user": "c", "role": "user"}})
+        critical = self._add("Critical", "tier0")
+
+        result = self.state.handle({"command": "read", "params": {}})["result"]
+        self.assertEqual([d["id"] for d in result], [critical["id"], low["id"], high["id"]])
+
+    def test_read_limit_and_pending_only(self):
+        """
+        Tests that the served read honours --limit and --pending-only.
+        """
+        first = self._add("First", "tier0")
+        second = self._add("Second", "tier1")
+        done = self._add("Done", "tier0")
+        self.state.handle({"command": "complete", "params": {"id": done["id"], "user": "c", "role": "user"}})
+
+        pending = self.state.handle({"command": "read", "params": {"pending_only": True}})["result"]
+        self.assertEqual([d["id"] for d in pending], [first["id"], second["id"]])
+        top = self.state.handle({"command": "read", "params": {"limit": 1}})["result"]
+        self.assertEqual([d["id"] for d in top], [first["id"]])
+
+    def test_picks_up_external_writes(self):
+        """
+        Tests that changes made without the server are seen on the next request.
+        """
+        self._add("Served")
+        self.state.handle({"command": "read", "params": {}})
+        storage.append_records(self.db_path, [storage.add_record({
+            "id": "external", "creator": "human", "creator_role": "user",
+            "created_timestamp": 1, "description": "Direct", "priority": "tier2",
+            "status": "pending", "completer": None, "completer_role": None,
+            "completion_timestamp": None
+        })])
+
+        result = self.state.handle({"command": "read", "params": {}})["result"]
+        self.assertIn("external", [d["id"] for d in result])
+
+    def test_complete_nonexistent_entry(self):
+        """
+        Tests that validation errors are returned, not raised.
+        """
+        response = self.state.handle({
+            "command": "complete",
+            "params": {"id": "missing", "user": "claude", "role": "engineer"}
+        })
+        self.assertEqual(response["status"], "error")
+        self.assertIn("not found", response["message"])
+
+    def test_unknown_parameters_are_unsupported(self):
+        """
+        Tests that options the server doesn't implement are left to the CLI.
+        """
+        response = self.state.handle({"command": "read", "params": {"something_new": 5}})
+        self.assertEqual(response["status"], "unsupported")
+
+    def test_socket_round_trip(self):
+        """
+        Tests a request over a real Unix-domain socket.
+        """
+        sock_path = client.socket_path(self.db_path)
+        self.assertIsNone(client.request(sock_path, "read", {}))
+
+        with server.LogServer(sock_path, self.state) as log_server:
+            thread = threading.Thread(target=log_server.serve_forever)
+            thread.start()
+            try:
+                response = client.request(sock_path, "add", {
+                    "desc": "Over the socket", "priority": "tier2", "user": "gemini", "role": "planner"
+                })
+                self.assertEqual(response["status"], "success")
+                self.assertEqual(response["result"]["data"]["description"], "Over the socket")
+            finally:
+                log_server.shutdown()
+                thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
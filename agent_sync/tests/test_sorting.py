@@ -1,6 +1,7 @@
 """
 Critical tests for the 3-tier sorting logic in manager.py.
 """
+import random
 import unittest
 import time
 # Assuming the project structure allows this import
@@ -125,5 +126,94 @@ class TestSorting(unittest.TestCase):
         self.assertEqual(sorted_logs[2].id, "1")  # tier2
 
 
+class TestSelection(unittest.TestCase):
+    """
+    Test suite for top-K selection, which must match sort_logs exactly.
+    """
+
+    def _random_dicts(self, count):
+        rng = random.Random(42)
+        logs = []
+        for i in range(count):
+            status = rng.choice(["pending", "completed"])
+            logs.append(models.to_dict(models.LogEntry(
+                id=str(i), creator="user1", creator_role="engineer",
+                # A narrow timestamp range produces plenty of ties
+                created_timestamp=rng.randint(0, 20), description=f"task {i}",
+                priority=rng.choice(list(models.PRIORITY_MAP)), status=status,
+                completer="user2" if status == "completed" else None,
+                completer_role="engineer" if status == "completed" else None,
+                completion_timestamp=100 if status == "completed" else None
+            )))
+        return logs
+
+    def test_limit_matches_sort_logs(self):
+        """
+        Tests that the top-K selection equals the head of a full sort, ties included.
+        """
+        log_dicts = self._random_dicts(500)
+        expected = [e.id for e in manager.sort_logs([models.from_dict(d) for d in log_dicts])]
+
+        for limit in (0, 1, 7, 250, 500, 1000):
+            selected = manager.select_logs(log_dicts, limit=limit)
+            self.assertEqual([e.id for e in selected], expected[:limit])
+        self.assertEqual([e.id for e in manager.select_logs(log_dicts)], expected)
+
+    def test_pending_only(self):
+        """
+        Tests that pending_only drops completed entries and keeps the order.
+        """
+        log_dicts = self._random_dicts(200)
+        expected = [
+            e.id for e in manager.sort_logs([models.from_dict(d) for d in log_dicts])
+            if e.status == "pending"
+        ]
+
+        self.assertEqual([e.id for e in manager.select_logs(log_dicts, pending_only=True)], expected)
+        self.assertEqual([e.id for e in manager.select_logs(log_dicts, limit=5, pending_only=True)], expected[:5])
+
+
+class TestSortedLog(unittest.TestCase):
+    """
+    Property tests for the incrementally maintained order, which must always
+    equal sort_logs over the entries in load order.
+    """
+
+    def _entry(self, rng, i):
+        return models.LogEntry(
+            id=str(i), creator="user1", creator_role="engineer",
+            created_timestamp=rng.randint(0, 10), description=f"task {i}",
+            priority=rng.choice(list(models.PRIORITY_MAP)),
+            status=rng.choice(["pending", "pending", "completed"])
+        )
+
+    def test_matches_sort_logs(self):
+        """
+        Tests random sequences of adds and completions against a full sort.
+        """
+        for seed in range(20):
+            rng = random.Random(seed)
+            logs = [self._entry(rng, i) for i in range(rng.randint(0, 30))]
+            ordered = manager.SortedLog(logs)
+
+            for step in range(100):
+                pending = [entry for entry in logs if entry.status == "pending"]
+                if pending and rng.random() < 0.4:
+                    entry = rng.choice(pending)
+                    manager.mark_completed(entry, "user2", "engineer")
+                    _, position = ordered.update(entry)
+                    self.assertIs(ordered.entries()[position], entry)
+                else:
+                    entry = self._entry(rng, len(logs))
+                    entry.status = "pending"
+                    logs.append(entry)
+                    position = ordered.add(entry)
+                    self.assertIs(ordered.entries()[position], entry)
+
+                expected = [entry.id for entry in manager.sort_logs(logs)]
+                self.assertEqual([entry.id for entry in ordered], expected, (seed, step))
+                self.assertEqual(ordered.pending_count(), sum(e.status == "pending" for e in logs))
+
+
 if __name__ == '__main__':
     unittest.main()
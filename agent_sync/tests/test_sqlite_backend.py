@@ -0,0 +1,188 @@
+"""
+Tests for the SQLite backend in sqlite_backend.py and migrate.
+"""
+import os
+import random
+import time
+import unittest
+import tempfile
+# Assuming the project structure allows this import
+from ..src import backends
+from ..src import main
+from ..src import manager
+from ..src import models
+from ..src import storage
+
+DAY = 86400
+
+
+def _entry(log_id, status, priority, created, completed=None):
+    return {
+        "id": log_id, "creator": f"user{created % 3}", "creator_role": "engineer",
+        "created_timestamp": created, "description": f"Task {log_id}",
+        "priority": priority, "status": status,
+        "completer": "user2" if status == "completed" else None,
+        "completer_role": "engineer" if status == "completed" else None,
+        "completion_timestamp": completed
+    }
+
+
+class TestSqliteBackend(unittest.TestCase):
+    """
+    Test suite for running the commands against a .db file.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.json_path = os.path.join(self.tmpdir.name, "status_log.json")
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.db")
+
+        rng = random.Random(11)
+        self.logs = []
+        for i in range(300):
+            # Few distinct timestamps, so the load order has to break ties
+            created = 1700000000 + rng.randint(0, 20)
+            status = "pending" if rng.random() < 0.4 else "completed"
+            self.logs.append(_entry(
+                f"{i:04x}{rng.randrange(16 ** 4):04x}", status,
+                rng.choice(list(models.PRIORITY_MAP)), created,
+                created + DAY if status == "completed" else None
+            ))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _import(self):
+        backend = backends.open_backend(self.db_path)
+        try:
+            backend.import_entries(self.logs)
+        finally:
+            backend.close()
+
+    def _read(self, **params):
+        params = dict({'limit': None, 'pending_only': False}, **params)
+        return main.execute(self.db_path, 'read', params)
+
+    def test_open_backend_by_extension(self):
+        """
+        Tests that the extension of the database file selects the backend.
+        """
+        json_backend = backends.open_backend(self.json_path)
+        self.assertIsInstance(json_backend, backends.JsonBackend)
+        sqlite_backend = backends.open_backend(self.db_path)
+        try:
+            self.assertNotIsInstance(sqlite_backend, backends.JsonBackend)
+        finally:
+            sqlite_backend.close()
+
+    def test_read_order_matches_sort_logs(self):
+        """
+        Tests that read returns the 3-tier order of manager.select_logs,
+        including ties, limits, pending_only and filters.
+        """
+        self._import()
+
+        def expected(limit=None, pending_only=False, **filters):
+            logs = [d for d in self.logs if manager.matches(d, **filters)]
+            return [models.to_dict(e) for e in manager.select_logs(logs, limit, pending_only)]
+
+        self.assertEqual(self._read(), expected())
+        self.assertEqual(self._read(limit=7), expected(limit=7))
+        self.assertEqual(self._read(pending_only=True), expected(pending_only=True))
+        self.assertEqual(self._read(priority=["tier0", "tier3"], limit=10),
+                         expected(limit=10, priority=["tier0", "tier3"]))
+        self.assertEqual(self._read(creator=["user1"], since=1700000005, until=1700000015),
+                         expected(creator=["user1"], since=1700000005, until=1700000015))
+
+    def test_add_and_complete(self):
+        """
+        Tests add, complete by unique prefix and the errors for unknown and
+        ambiguous IDs.
+        """
+        main.execute(self.db_path, 'add', {'user': 'user1', 'role': 'engineer',
+                                           'desc': 'Write docs', 'priority': 'tier0'})
+        added = self._read()[0]
+        self.assertEqual(added["description"], "Write docs")
+
+        result = main.execute(self.db_path, 'complete', {'id': added["id"][:8], 'user': 'user2', 'role': 'user'})
+        self.assertEqual(result["id"], added["id"])
+        self.assertEqual(self._read()[0]["status"], "completed")
+
+        with self.assertRaises(ValueError):
+            main.execute(self.db_path, 'complete', {'id': 'nope', 'user': 'user2', 'role': 'user'})
+
+        # Two IDs share the prefix "abcd12"
+        self.logs = [_entry("abcd1201", "pending", "tier1", 1), _entry("abcd1202", "pending", "tier1", 2)]
+        os.remove(self.db_path)
+        self._import()
+        with self.assertRaises(ValueError) as cm:
+            main.execute(self.db_path, 'complete', {'id': 'abcd12', 'user': 'user2', 'role': 'user'})
+        self.assertIn("ambiguous", str(cm.exception).lower())
+
+    def test_migrate_round_trip(self):
+        """
+        Tests migrating JSON to SQLite and back, and that the target must be empty.
+        """
+        storage.save_logs(self.json_path, self.logs)
+        expected = main.execute(self.json_path, 'read', {'limit': None, 'pending_only': False})
+
+        result = main.execute(self.json_path, 'migrate', {'to': self.db_path})
+        self.assertEqual(result["count"], len(self.logs))
+        self.assertEqual(self._read(), expected)
+
+        back_path = os.path.join(self.tmpdir.name, "back.json")
+        main.execute(self.db_path, 'migrate', {'to': back_path})
+        self.assertEqual(main.execute(back_path, 'read', {'limit': None, 'pending_only': False}), expected)
+
+        with self.assertRaises(ValueError):
+            main.execute(self.json_path, 'migrate', {'to': self.db_path})
+
+    def test_search(self):
+        """
+        Tests that search ranks through the FTS index, applies filters and
+        follows inserts and archived (deleted) rows.
+        """
+        now = int(time.time())
+        self.logs = [
+            _entry("aaaa0001", "pending", "tier1", now, None),
+            _entry("aaaa0002", "completed", "tier1", now - 90 * DAY, now - 60 * DAY),
+        ]
+        self.logs[0]["description"] = "Login crash on Safari"
+        self.logs[1]["description"] = "Login button misaligned"
+        self._import()
+        main.execute(self.db_path, 'add', {'user': 'user1', 'role': 'engineer',
+                                           'desc': 'Safari crash when the login cookie expires', 'priority': 'tier0'})
+
+        def search(text, **filters):
+            params = dict({'text': text, 'limit': 20, 'status': None, 'priority': None}, **filters)
+            return [d["description"] for d in main.execute(self.db_path, 'search', params)]
+
+        self.assertEqual(search("safari crash"), ["Login crash on Safari", "Safari crash when the login cookie expires"])
+        self.assertEqual(search("login", status=["completed"]), ["Login button misaligned"])
+        self.assertEqual(search("misaligned button", limit=1), ["Login button misaligned"])
+
+        main.execute(self.db_path, 'archive', {'older_than': 30})
+        self.assertEqual(search("misaligned"), [])
+
+    def test_archive(self):
+        """
+        Tests that archive removes old completed rows and read
+        --include-archived still returns them in order.
+        """
+        now = time.time()
+        self.logs = [
+            _entry("old1", "completed", "tier1", int(now) - 90 * DAY, int(now) - 60 * DAY),
+            _entry("new1", "completed", "tier1", int(now) - 2 * DAY, int(now) - DAY),
+            _entry("pend", "pending", "tier2", int(now) - 90 * DAY),
+        ]
+        self._import()
+        everything = self._read()
+
+        result = main.execute(self.db_path, 'archive', {'older_than': 30})
+        self.assertEqual((result["archived"], result["remaining"]), (1, 2))
+        self.assertEqual([d["id"] for d in self._read()], ["pend", "new1"])
+        self.assertEqual(self._read(include_archived=True), everything)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+Tests for the summary behind the stats command in stats.py.
+"""
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+# Assuming the project structure allows this import
+from ..src import api
+from ..src import backends
+from ..src import main
+from ..src import stats
+from ..src import storage
+from ..src import workspace
+
+
+def _add(db_path, desc, priority, role='engineer'):
+    return main.execute(db_path, 'add', {'user': 'user1', 'role': role, 'desc': desc,
+                                         'priority': priority})["data"]["id"]
+
+
+def _complete(db_path, log_id):
+    main.execute(db_path, 'complete', {'id': log_id, 'user': 'user2', 'role': 'planner'})
+
+
+def _stats(db_path, rebuild=False):
+    return main.execute(db_path, 'stats', {'rebuild': rebuild})
+
+
+class TestLatencySketch(unittest.TestCase):
+    """
+    Test suite for the latency percentiles.
+    """
+
+    def test_percentiles_within_accuracy(self):
+        """
+        Tests that percentiles are within LATENCY_ACCURACY of the exact ones,
+        also after merging and removing latencies.
+        """
+        rng = random.Random(7)
+        values = sorted(int(rng.lognormvariate(8, 2)) + 1 for _ in range(5000))
+        first, second = stats.LatencySketch(), stats.LatencySketch()
+        for i, value in enumerate(values):
+            (first if i % 2 else second).add(value)
+        first.merge(second)
+        for removed in values[:100]:
+            first.add(removed, -1)
+        values = values[100:]
+
+        self.assertEqual(first.count, len(values))
+        for p in (1, 50, 90, 99, 100):
+            exact = values[round(p / 100 * (len(values) - 1))]
+            self.assertLessEqual(abs(first.percentile(p) - exact), exact * stats.LATENCY_ACCURACY, p)
+        self.assertIsNone(stats.LatencySketch().percentile(50))
+
+
+class TestStats(unittest.TestCase):
+    """
+    Test suite for the maintained summary of a JSON log.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "status_log.json")
+        self.ids = []
+        for i in range(12):
+            with mock.patch('time.time', return_value=1000 * i):
+                self.ids.append(_add(self.db_path, f"Task {i}", f"tier{i % 3}", ('engineer', 'user')[i % 2]))
+        for i in range(0, 12, 3):
+            with mock.patch('time.time', return_value=20000 + 500 * i):
+                _complete(self.db_path, self.ids[i])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_counts_and_latencies(self):
+        """
+        Tests the counts and percentiles of a log, served without reading it.
+        """
+        with mock.patch.object(storage, 'load_logs', side_effect=AssertionError("log read")):
+            result = _stats(self.db_path)
+        self.assertEqual(result["total"], 12)
+        self.assertEqual(result["by_status"], {"pending": 8, "completed": 4})
+        self.assertEqual(result["counts"]["completed"], {"tier0": {"engineer": 2, "user": 2}})
+        self.assertEqual(result["counts"]["pending"]["tier1"], {"engineer": 2, "user": 2})
+        # Latencies 20000, 18500, 17000 and 15500 seconds
+        latency = result["latency"]
+        self.assertEqual(latency["completed"], 4)
+        self.assertAlmostEqual(latency["p50"], 18500, delta=185)
+        self.assertAlmostEqual(latency["p99"], 20000, delta=200)
+        self.assertEqual(list(latency["by_priority"]), ["tier0"])
+
+        self.assertTrue(_stats(self.db_path, rebuild=True)["verified"])
+
+    def test_kept_up_to_date(self):
+        """
+        Tests that compaction, archiving and the Python API keep the sidecar
+        current, and that writes around it are caught by a rebuild.
+        """
+        with mock.patch.object(storage, 'JOURNAL_COMPACT_BYTES', 1):
+            _complete(self.db_path, self.ids[1])
+        self.assertFalse(os.path.exists(storage.journal_path(self.db_path)))
+        main.execute(self.db_path, 'archive', {'older_than': 0})
+        log = api.StatusLog.open(self.db_path)
+        log.complete(self.ids[2][:8], 'user3', 'engineer')
+        log.add("From the API", 'tier3', 'user3', 'planner')
+
+        with mock.patch.object(storage, 'load_logs', side_effect=AssertionError("log read")):
+            result = _stats(self.db_path)
+        self.assertEqual(result["by_status"], {"pending": 7, "completed": 6})
+        self.assertEqual(_stats(self.db_path, rebuild=True), dict(result, verified=True))
+
+        # A write that bypasses the summary leaves it out of date: counted from the entries
+        # without saving it, then rebuilt by the next write
+        storage.append_records(self.db_path, [storage.add_record(dict(storage.load_logs(self.db_path)[0], id="x"))])
+        with mock.patch.object(stats, 'save', side_effect=AssertionError("sidecar saved")):
+            self.assertEqual(_stats(self.db_path)["total"], 14)
+        _add(self.db_path, "After", 'tier1')
+        with mock.patch.object(storage, 'load_logs', side_effect=AssertionError("log read")):
+            self.assertEqual(_stats(self.db_path)["total"], 15)
+        self.assertTrue(_stats(self.db_path, rebuild=True)["verified"])
+
+        # Out of date when rebuilt: reported, and saved by the rebuild
+        storage.append_records(self.db_path, [storage.add_record(dict(storage.load_logs(self.db_path)[0], id="y"))])
+        self.assertFalse(_stats(self.db_path, rebuild=True)["verified"])
+        self.assertTrue(_stats(self.db_path, rebuild=True)["verified"])
+
+        # A wrong summary for the current log is caught by --rebuild
+        summary = stats.load(self.db_path, backends.JsonBackend(self.db_path).version())
+        summary.remove(storage.load_logs(self.db_path)[0])
+        stats.save(self.db_path, summary, backends.JsonBackend(self.db_path).version())
+        self.assertEqual(_stats(self.db_path)["total"], 15)
+        self.assertFalse(_stats(self.db_path, rebuild=True)["verified"])
+        self.assertEqual(_stats(self.db_path)["total"], 16)
+
+    def test_empty_logs(self):
+        """
+        Tests that logs without entries, and workspaces with an empty shard,
+        pass a rebuild without a sidecar ever saved.
+        """
+        empty = os.path.join(self.tmpdir.name, "empty.json")
+        result = _stats(empty, rebuild=True)
+        self.assertEqual((result["total"], result["verified"]), (0, True))
+
+        ws = os.path.join(self.tmpdir.name, "ws")
+        workspace.init(ws, 'hash', 4)
+        _add(ws, "Only one", 'tier1')
+        self.assertEqual(len([path for path in workspace.ShardedBackend(ws).shard_paths().values()
+                              if os.path.exists(storage.journal_path(path))]), 1)
+        result = _stats(ws, rebuild=True)
+        self.assertEqual((result["total"], result["verified"]), (1, True))
+
+    def test_backends_agree(self):
+        """
+        Tests that SQLite, columnar and workspace logs maintain the same summary.
+        """
+        expected = _stats(self.db_path)
+        ws = os.path.join(self.tmpdir.name, "ws")
+        workspace.init(ws, 'hash', 2)
+        for target in ("status_log.db", "status_log.cols", "ws"):
+            path = os.path.join(self.tmpdir.name, target)
+            with self.subTest(target=target):
+                main.execute(self.db_path, 'migrate', {'to': path})
+                self.assertEqual(_stats(path), expected)
+                _complete(path, self.ids[4])
+                log_id = _add(path, "Late", 'tier2')
+                _complete(path, log_id)
+                self.assertTrue(_stats(path, rebuild=True)["verified"])
+                self.assertEqual(_stats(path)["by_status"], {"pending": 7, "completed": 6})
+
+
+if __name__ == '__main__':
+    unittest.main()
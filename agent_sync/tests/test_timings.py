@@ -0,0 +1,95 @@
+"""
+Tests for the per-phase timings in timings.py and their CLI reporting.
+"""
+import contextlib
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import unittest
+from unittest import mock
+# Assuming the project structure allows this import
+from ..src import main
+from ..src import timings
+
+
+class TestTimings(unittest.TestCase):
+    """
+    Test suite for phase accounting, --timings and the profiler switch.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        self.addCleanup(os.chdir, cwd)
+        self.addCleanup(timings.reset)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _main(self, *argv):
+        """
+        Runs the CLI on ./status_log.json and returns its stdout and stderr.
+        """
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch.object(sys, 'argv', ['main', *argv]), \
+                mock.patch.dict(os.environ, {main.NO_SERVER_ENV: "1"}), \
+                contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            main.main()
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_nested_phases_report_own_time(self):
+        """
+        Tests that an inner phase pauses the outer one.
+        """
+        clock = iter([0.0, 1.0, 3.0, 5.0, 6.0, 10.0])
+        with mock.patch('time.perf_counter', lambda: next(clock)):
+            timings.reset()
+            with timings.phase('load'):
+                with timings.phase('decode'):
+                    pass
+            timings.count('entries_loaded', 7)
+            report = timings.report()
+        self.assertEqual(report["phases_ms"], {"load": 3000.0, "decode": 2000.0, "other": 5000.0})
+        self.assertEqual((report["total_ms"], report["entries_loaded"]), (10000.0, 7))
+
+    def test_timings_flag(self):
+        """
+        Tests the meta block of --json results, lists included, and the
+        human readable report on stderr.
+        """
+        out, _ = self._main('--json', '--timings', 'add', '--desc', 'Fix leak', '--priority', 'tier0',
+                            '--user', 'gemini', '--role', 'engineer')
+        meta = json.loads(out)["meta"]
+        self.assertIn("lock_wait_ms", meta)
+        self.assertIn("write", meta["timings"]["phases_ms"])
+
+        out, _ = self._main('--json', '--timings', 'read')
+        result = json.loads(out)
+        self.assertEqual(len(result["data"]), 1)
+        self.assertEqual(result["meta"]["timings"]["entries_returned"], 1)
+        self.assertGreater(result["meta"]["timings"]["file_bytes"], 0)
+
+        # Without the flag the output keeps its shape
+        self.assertIsInstance(json.loads(self._main('--json', 'read')[0]), list)
+
+        _, err = self._main('--timings', 'read')
+        self.assertTrue(err.startswith("Timings: "))
+        self.assertIn("serialize", err)
+
+    def test_profile_environment_variable(self):
+        """
+        Tests that the command runs under cProfile and its stats are dumped.
+        """
+        path = os.path.join(self.tmpdir.name, "read.prof")
+        with mock.patch.dict(os.environ, {main.PROFILE_ENV: path}):
+            self._main('read')
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn("_main", functions)
+
+
+if __name__ == '__main__':
+    unittest.main()
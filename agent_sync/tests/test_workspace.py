@@ -0,0 +1,206 @@
+"""
+Tests for sharded workspaces in workspace.py.
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+# Assuming the project structure allows this import
+from ..src import backends
+from ..src import index
+from ..src import main
+from ..src import manager
+from ..src import models
+from ..src import storage
+from ..src import workspace
+
+
+def _add(db_path, desc, priority, project=None):
+    return main.execute(db_path, 'add', {'user': 'user1', 'role': 'engineer', 'desc': desc,
+                                         'priority': priority, 'project': project})["data"]["id"]
+
+
+def _read(db_path, **params):
+    return main.execute(db_path, 'read', dict({'limit': None, 'pending_only': False}, **params))
+
+
+class TestHashWorkspace(unittest.TestCase):
+    """
+    Test suite for a workspace sharded by ID.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "ws")
+        workspace.init(self.path, 'hash', 3)
+        self.ids = [_add(self.path, f"Task {i}", f"tier{i % 4}") for i in range(24)]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _expected(self, limit=None, pending_only=False, **filters):
+        backend = backends.open_backend(self.path)
+        try:
+            logs = manager.filter_logs(backend.export(), **filters)
+        finally:
+            backend.close()
+        return [models.to_dict(entry) for entry in manager.select_logs(logs, limit, pending_only)]
+
+    def test_entries_are_spread_and_merged(self):
+        """
+        Tests that every shard gets entries and reads merge them in 3-tier order.
+        """
+        backend = workspace.ShardedBackend(self.path)
+        try:
+            sizes = [len(backends.open_backend(path).export()) for path in backend.shard_paths().values()]
+        finally:
+            backend.close()
+        self.assertEqual(sum(sizes), 24)
+        self.assertTrue(all(sizes))
+
+        main.execute(self.path, 'complete', {'id': self.ids[3][:8], 'user': 'user2', 'role': 'engineer'})
+        self.assertEqual(_read(self.path), self._expected())
+        self.assertEqual(_read(self.path, limit=5, pending_only=True), self._expected(5, True))
+        self.assertEqual(_read(self.path, priority=['tier1'], status=['pending']),
+                         self._expected(priority=['tier1'], status=['pending']))
+
+        # The process pool gives the same result
+        with mock.patch.object(workspace, 'PARALLEL_READ_BYTES', 0), \
+                mock.patch.object(workspace, '_cpu_count', lambda: 2):
+            self.assertEqual(_read(self.path), self._expected())
+
+    def test_writes_touch_only_their_shard(self):
+        """
+        Tests that completing by a short prefix locks and writes one shard.
+        """
+        backend = workspace.ShardedBackend(self.path)
+        paths = list(backend.shard_paths().values())
+        backend.close()
+        before = {path: index.snapshot_signature(storage.journal_path(path)) for path in paths}
+
+        with mock.patch.object(storage, 'lock', wraps=storage.lock) as lock:
+            main.execute(self.path, 'complete', {'id': self.ids[0][:4], 'user': 'user2', 'role': 'engineer'})
+        locked = {call.args[0] for call in lock.call_args_list}
+        changed = [path for path in paths
+                   if index.snapshot_signature(storage.journal_path(path)) != before[path]]
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(locked, set(changed))
+
+    def test_migrate_into_workspace(self):
+        """
+        Tests that a plain log can be migrated into an empty workspace and back.
+        """
+        target = os.path.join(self.tmpdir.name, "copy")
+        workspace.init(target, 'hash', 2)
+        main.execute(self.path, 'migrate', {'to': target})
+        # Ties are ordered by shard, and the copy has other shards
+        copied, original = _read(target), _read(self.path)
+        self.assertCountEqual(copied, original)
+        self.assertEqual([manager.dict_sort_key(d) for d in copied], [manager.dict_sort_key(d) for d in original])
+        with self.assertRaises(ValueError):
+            main.execute(self.path, 'migrate', {'to': target})
+
+    def test_search_ranks_like_one_log(self):
+        """
+        Tests that a search scores the entries of all shards like a single
+        log holding them, not against each shard's own word statistics.
+        """
+        rng = random.Random(3)
+        words = ["login", "crash", "safari", "cache", "parser", "flaky", "docs", "leak"]
+        single = os.path.join(self.tmpdir.name, "single.json")
+        storage.save_logs(single, [
+            dict(models.to_dict(manager.create_entry(
+                " ".join(rng.choice(words[:rng.randint(1, len(words))]) for _ in range(rng.randint(1, 6))),
+                'tier1', 'user1', 'engineer'
+            )), created_timestamp=1000 + i) for i in range(90)
+        ])
+        target = os.path.join(self.tmpdir.name, "copy")
+        workspace.init(target, 'hash', 3)
+        main.execute(single, 'migrate', {'to': target})
+
+        for text in ("login", "leak docs", "safari crash parser"):
+            params = dict({key: None for key in ('status', 'priority', 'creator', 'role', 'since', 'until')},
+                          text=text, limit=None)
+            expected = {d["id"]: d["score"] for d in main.execute(single, 'search', params)}
+            for limit in (None, 5):
+                with self.subTest(text=text, limit=limit):
+                    result = main.execute(target, 'search', dict(params, limit=limit))
+                    self.assertEqual(len(result), len(expected) if limit is None else limit)
+                    self.assertEqual([d["id"] for d in result], list(expected)[:limit])
+                    for d in result:
+                        self.assertAlmostEqual(d["score"], expected[d["id"]], places=3)
+
+
+class TestProjectWorkspace(unittest.TestCase):
+    """
+    Test suite for a workspace with a shard per project, through the CLI.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "ws")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _main(self, *argv):
+        """
+        Runs the CLI on the workspace and returns its stdout.
+        """
+        stdout = io.StringIO()
+        with mock.patch.object(sys, 'argv', ['main', '--db', self.path, *argv]), \
+                mock.patch.dict(os.environ, {main.NO_SERVER_ENV: "1"}), \
+                contextlib.redirect_stdout(stdout):
+            main.main()
+        return stdout.getvalue()
+
+    def test_projects_are_shards(self):
+        """
+        Tests that adding to a new project creates its shard and that reads
+        report the project of every entry.
+        """
+        self._main('init', '--shard-by', 'project')
+        self._main('add', '--project', 'api', '--desc', 'Fix leak', '--priority', 'tier1',
+                   '--user', 'gemini', '--role', 'engineer')
+        self._main('add', '--project', 'web', '--desc', 'Fix layout', '--priority', 'tier0',
+                   '--user', 'gemini', '--role', 'engineer')
+        self.assertEqual(workspace.load_manifest(self.path)["shards"], {"api": "api.json", "web": "web.json"})
+
+        result = json.loads(self._main('--json', 'read'))
+        self.assertEqual([(d["project"], d["description"]) for d in result],
+                         [("web", "Fix layout"), ("api", "Fix leak")])
+
+        self._main('complete', '--id', result[1]["id"][:6], '--user', 'claude', '--role', 'engineer')
+        self.assertEqual(json.loads(self._main('--json', 'read', '--status', 'completed'))[0]["project"], "api")
+
+        with self.assertRaises(SystemExit):
+            with contextlib.redirect_stderr(io.StringIO()):
+                self._main('add', '--desc', 'Nowhere', '--priority', 'tier0', '--user', 'gemini', '--role', 'engineer')
+
+    def test_prefix_ambiguous_across_shards(self):
+        """
+        Tests that a prefix matching entries in two shards is rejected.
+        """
+        workspace.init(self.path, 'project')
+        for project, log_id in (("api", "abcd-1"), ("web", "abcd-2")):
+            _add(self.path, "Seed", "tier1", project)
+            shard = os.path.join(self.path, f"{project}.json")
+            entries = [dict(storage.load_logs(shard)[0], id=log_id)]
+            os.remove(storage.journal_path(shard))
+            storage.save_logs(shard, entries)
+
+        with self.assertRaises(ValueError) as caught:
+            main.execute(self.path, 'complete', {'id': 'abcd', 'user': 'claude', 'role': 'engineer'})
+        self.assertIn("ambiguous", str(caught.exception))
+        with self.assertRaisesRegex(ValueError, "not found"):
+            main.execute(self.path, 'complete', {'id': 'ffff', 'user': 'claude', 'role': 'engineer'})
+        main.execute(self.path, 'complete', {'id': 'abcd-2', 'user': 'claude', 'role': 'engineer'})
+
+
+if __name__ == '__main__':
+    unittest.main()